@@ -0,0 +1,172 @@
+import asyncio
+import json
+import weakref
+
+import aiohttp
+
+from CBLClient.Args import Args
+from CBLClient.Batch import Batch
+from CBLClient.Client import Client
+
+
+class AsyncClient(object):
+    """ asyncio counterpart of Client.
+
+    Speaks the same Args / ValueSerializer wire format as Client, but
+    invokeMethod is a coroutine, so a single event loop can drive many
+    TestServer instances concurrently:
+
+        clients = [AsyncClient(url) for url in base_urls]
+        await asyncio.gather(*[c.invokeMethod("flushMemory") for c in clients])
+
+    Unless a session is passed in, every client on the same event loop
+    shares one aiohttp.ClientSession (and its connection pool). The shared
+    session is reference counted and closed with the last client using it.
+    A session passed in belongs to the caller and is never closed here.
+    """
+
+    # event loop -> [shared session, number of clients using it]
+    _shared_sessions = weakref.WeakKeyDictionary()
+    limit_per_host = 8
+
+    def __init__(self, base_url, session=None):
+        self.base_url = base_url
+        self.session = session
+        self._uses_shared_session = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+    def _get_session(self):
+        # aiohttp sessions must be created inside a running event loop
+        if self.session is None:
+            loop = asyncio.get_running_loop()
+            shared = AsyncClient._shared_sessions.get(loop)
+            if shared is None or shared[0].closed:
+                connector = aiohttp.TCPConnector(limit_per_host=AsyncClient.limit_per_host)
+                shared = [aiohttp.ClientSession(connector=connector), 0]
+                AsyncClient._shared_sessions[loop] = shared
+            shared[1] += 1
+            self.session = shared[0]
+            self._uses_shared_session = True
+        return self.session
+
+    async def close(self):
+        """ Release this client's hold on the shared session """
+        if not self._uses_shared_session:
+            return
+        loop = asyncio.get_running_loop()
+        shared = AsyncClient._shared_sessions.get(loop)
+        self.session = None
+        self._uses_shared_session = False
+        if shared is None:
+            return
+        shared[1] -= 1
+        if shared[1] <= 0:
+            del AsyncClient._shared_sessions[loop]
+            await shared[0].close()
+
+    async def _post(self, url, body):
+        session = self._get_session()
+        async with session.post(url, data=json.dumps(body),
+                                headers={"Content-Type": "application/json"}) as resp:
+            content = await resp.read()
+            return resp.status, content
+
+    @staticmethod
+    def _raise(err, content):
+        if content:
+            if isinstance(content, bytes):
+                content = content.decode('utf8', 'ignore')
+            raise Exception(str(err) + content)
+        raise Exception(str(err))
+
+    async def invokeMethod(self, method, args=None, ignore_deserialize=False):
+        url = self.base_url + "/" + method
+        content = None
+        try:
+            status, content = await self._post(url, Client._serializeArgs(args))
+            if status >= 400:
+                raise Exception("{} Error for url: {}".format(status, url))
+            if status == 200:
+                return Client._deserializeResponse(url, content, ignore_deserialize)
+        except Exception as err:
+            self._raise(err, content)
+
+    def batch(self):
+        """ Returns an AsyncBatch that queues invocations for a single round trip """
+        return AsyncBatch(self)
+
+    async def invokeMethods(self, calls, refs=None):
+        """ Coroutine version of Client.invokeMethods, same wire contract """
+        if not calls:
+            return []
+        if Client.batchSupported(self.base_url):
+            url = self.base_url + "/batch"
+            try:
+                status, content = await self._post(url, Client._batchBody(calls))
+            except Exception as err:
+                raise Exception(str(err))
+            if status != 404:
+                return Client._batchResults(url, status, content, calls, refs)
+            Client.setBatchSupported(self.base_url, False)
+
+        results = []
+        for i, (method, args) in enumerate(calls):
+            try:
+                result = await self.invokeMethod(method, args)
+            except Exception as err:
+                raise Client.BatchCallException(i, method, err)
+            if refs is not None:
+                refs[i].resolve(result)
+            results.append(result)
+        return results
+
+    async def release(self, obj):
+        args = Args()
+        args.setMemoryPointer("object", obj)
+        await self.invokeMethod("release", args)
+
+
+class AsyncBatch(Batch):
+    """ Batch whose execute() is a coroutine, for use with AsyncClient """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None and not self._executed:
+            await self.execute()
+        return False
+
+    async def execute(self):
+        if self._executed:
+            raise Exception("Batch has already been executed")
+        self._executed = True
+
+        if not self._calls:
+            return []
+
+        results = await self._client.invokeMethods(self._calls, self._refs)
+        for ref, result in zip(self._refs, results):
+            if not ref.is_resolved():
+                ref.resolve(result)
+        return results
+
+
+class AsyncWrapper(object):
+    """ close() / async context manager support for wrappers over AsyncClient """
+
+    async def close(self):
+        await self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
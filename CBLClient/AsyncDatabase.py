@@ -0,0 +1,109 @@
+from CBLClient.Args import Args
+from CBLClient.AsyncClient import AsyncClient, AsyncWrapper
+from CBLClient.AsyncDocument import AsyncDocument
+from CBLClient.Database import Database
+from keywords.utils import log_info
+
+
+class AsyncDatabase(AsyncWrapper, Database):
+    """ Database API over AsyncClient.
+
+    Single-RPC methods are inherited from Database and return awaitables.
+    Helpers that chain several RPCs are coroutines here; the document
+    building and update logic they share with Database lives in its
+    static helpers.
+    """
+
+    def __init__(self, base_url, client=None, session=None):
+        if client is None:
+            client = AsyncClient(base_url, session=session)
+        super(AsyncDatabase, self).__init__(base_url, client=client)
+
+    async def create_bulk_docs(self, number, id_prefix, db, channels=None, generator=None, attachments_generator=None, id_start_num=0, attachment_file_list=None, collection=None,
+                               batch_size=None):
+        log_info("PUT {} docs to with prefix {}".format(number, id_prefix))
+        doc_ids = []
+        for added_docs in self._bulk_doc_batches(number, id_prefix, channels, generator, attachments_generator, id_start_num, attachment_file_list, batch_size):
+            if collection:
+                await self._collection.collectionSaveDocuments(db, added_docs, collection)
+            else:
+                await self.saveDocuments(db, added_docs)
+            doc_ids.extend(added_docs.keys())
+        return doc_ids
+
+    async def delete_bulk_docs(self, database, doc_ids=[]):
+        if not doc_ids:
+            doc_ids = await self.getDocIds(database)
+        args = Args()
+        args.setMemoryPointer("database", database)
+        args.setArray("doc_ids", doc_ids)
+        return await self._client.invokeMethod("database_deleteBulkDocs", args)
+
+    async def _get_docs_to_update(self, database, doc_ids):
+        if not doc_ids:
+            doc_ids = await self.getDocIds(database)
+        docs = await self.getDocuments(database, doc_ids)
+        if len(docs) < 1:
+            raise Exception("cbl docs are empty , cannot update docs")
+        return docs
+
+    async def update_bulk_docs(self, database, number_of_updates=1, doc_ids=[], key="updates-cbl"):
+        log_info("updating bulk docs")
+        docs = await self._get_docs_to_update(database, doc_ids)
+        for _ in range(number_of_updates):
+            updated_docs = {doc: self._increment_updates(docs[doc], key) for doc in docs}
+            await self.updateDocuments(database, updated_docs)
+
+    async def update_all_docs_individually(self, database, num_of_updates=1):
+        doc_ids = await self.getDocIds(database)
+        doc_obj = AsyncDocument(self.base_url, client=self._client)
+        for i in range(num_of_updates):
+            for doc_id in doc_ids:
+                doc_mem = await self.getDocument(database, doc_id)
+                doc_mut = await doc_obj.toMutable(doc_mem)
+                doc_body = self._increment_updates(await doc_obj.toMap(doc_mut))
+                await self.updateDocument(database, doc_body, doc_id)
+
+    async def deleteDBIfExists(self, db_name):
+        if await self.exists(db_name):
+            await self.deleteDBbyName(db_name)
+
+    async def deleteDBIfExistsCreateNew(self, db_name):
+        await self.deleteDBIfExists(db_name)
+        return await self.create(db_name)
+
+    async def cbl_delete_bulk_docs(self, cbl_db):
+        cbl_doc_ids = await self.getDocIds(cbl_db)
+        for id in cbl_doc_ids:
+            doc = await self.getDocument(cbl_db, id)
+            await self.delete(cbl_db, doc)
+
+    async def getBulkDocs(self, cbl_db):
+        cbl_doc_ids = await self.getDocIds(cbl_db)
+        return await self.getDocuments(cbl_db, cbl_doc_ids)
+
+    async def update_bulk_docs_with_blob(self, database, dictionary, blob, liteserv_platform, number_of_updates=1, doc_ids=[]):
+        """ dictionary and blob must be Dictionary / Blob built with an AsyncClient (client=...) """
+        log_info("updating bulk docs")
+        docs = await self._get_docs_to_update(database, doc_ids)
+        db_path = await self.getPath(database) if liteserv_platform == "net-msft" else None
+        image_path, as_content = self._blob_image_source(liteserv_platform, db_path)
+        updated_docs = {}
+        for _ in range(number_of_updates):
+            for doc in docs:
+                doc_body = self._increment_updates(docs[doc])
+                mutable_dictionary = await dictionary.toMutableDictionary(doc_body)
+                image_content = await blob.createImageContent(image_path)
+                if as_content:
+                    blob_value = await blob.create("image/jpeg", content=image_content)
+                else:
+                    blob_value = await blob.create("image/jpeg", stream=image_content)
+                await dictionary.setBlob(mutable_dictionary, "_attachments", blob_value)
+                updated_docs[doc] = doc_body
+            await self.updateDocuments(database, updated_docs)
+
+    async def update_bulk_docs_by_deleting_blobs(self, database, doc_ids=[]):
+        docs = await self._get_docs_to_update(database, doc_ids)
+        for doc in docs:
+            del docs[doc]["_attachments"]
+        await self.updateDocuments(database, docs)
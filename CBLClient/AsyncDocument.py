@@ -0,0 +1,11 @@
+from CBLClient.AsyncClient import AsyncClient, AsyncWrapper
+from CBLClient.Document import Document
+
+
+class AsyncDocument(AsyncWrapper, Document):
+    """ Document API over AsyncClient; every method returns an awaitable """
+
+    def __init__(self, base_url, client=None, session=None):
+        if client is None:
+            client = AsyncClient(base_url, session=session)
+        super(AsyncDocument, self).__init__(base_url, client=client)
@@ -0,0 +1,122 @@
+import asyncio
+
+from CBLClient.Args import Args
+from CBLClient.AsyncClient import AsyncClient, AsyncWrapper
+from CBLClient.Authenticator import Authenticator
+from CBLClient.Replication import Replication, ReplicatorIdleState, ReplicatorStatus
+from keywords.utils import log_info
+
+
+class AsyncReplication(AsyncWrapper, Replication):
+    """ Replication API over AsyncClient.
+
+    Single-RPC methods are inherited from Replication and return awaitables.
+    The wait / stop helpers are coroutines that sleep with asyncio.sleep,
+    so many replicators on many devices can be awaited from one loop; their
+    decisions come from ReplicatorIdleState, shared with Replication.
+    """
+
+    def __init__(self, base_url, client=None, session=None):
+        if client is None:
+            client = AsyncClient(base_url, session=session)
+        super(AsyncReplication, self).__init__(base_url, client=client)
+
+    async def stop(self, replicator, max_times=15):
+        args = Args()
+        args.setMemoryPointer("replicator", replicator)
+        await self._client.invokeMethod("replicator_stop", args)
+        count = 0
+        activity_level = await self.getActivitylevel(replicator)
+        while activity_level != "stopped" and count < max_times:
+            await asyncio.sleep(2)
+            count += 1
+            activity_level = await self.getActivitylevel(replicator)
+        if activity_level != "stopped":
+            raise Exception("Failed to stop the replicator: {}".format(activity_level))
+
+    async def configure_and_replicate(self, source_db, replicator_authenticator=None, target_db=None, target_url=None, replication_type="push_pull", continuous=True,
+                                      channels=None, err_check=True, wait_until_idle=True, heartbeat=None, auto_purge=None, encryptor=None):
+        repl_config = await self.configure(source_db, continuous=continuous, replication_type=replication_type, channels=channels,
+                                           replicator_authenticator=replicator_authenticator, heartbeat=heartbeat, auto_purge=auto_purge,
+                                           encryptor=encryptor, **self._replicate_target(target_db, target_url))
+        repl = await self.create(repl_config)
+        await self.start(repl)
+        if wait_until_idle:
+            await self.wait_until_replicator_idle(repl, err_check)
+        else:
+            await self.yield_for_replicator_connected(repl)
+        return repl
+
+    async def yield_for_replicator_connected(self, repl, max_times=5, sleep_time=0.5):
+        count = 0
+        # Sleep until replicator gets connected
+        activity_level = await self.getActivitylevel(repl)
+        while count < max_times:
+            await asyncio.sleep(sleep_time)
+            if activity_level == "connecting":
+                count += 1
+            else:
+                break
+
+    async def getStatusSnapshot(self, replicator):
+        return ReplicatorStatus(*await self._client.invokeMethods(self._status_snapshot_calls(replicator)))
+
+    async def _poll_status(self, replicator, change_listener):
+        results = await self._client.invokeMethods(self._status_snapshot_calls(replicator, change_listener))
+        return ReplicatorStatus(*results[:-1]), results[-1]
+
+    async def wait_until_replicator_idle(self, repl, err_check=True, max_times=150, sleep_time=2, max_timeout=600, idle_checks=20):
+        repl_config = await self.getConfig(repl)
+        isContinous = await self.isContinuous(repl_config)
+        log_info("The current replicator sets continuous to {}".format(isContinous))
+        state = ReplicatorIdleState(isContinous, max_times=max_times, max_timeout=max_timeout, max_idle_count=idle_checks)
+
+        change_listener = await self.addChangeListener(repl)
+        try:
+            status, events = await self._poll_status(repl, change_listener)
+            while state.polling():
+                state.log(status.activity_level, status.completed, status.total)
+                settling, done = state.on_activity(status.activity_level, status.completed, status.total)
+                if done:
+                    break
+                if err_check:
+                    state.check_error(status.error)
+
+                await asyncio.sleep(sleep_time)
+                status, latest_events = await self._poll_status(repl, change_listener)
+                state.on_events(latest_events != events, settling)
+                events = latest_events
+
+                if state.on_progress(status.activity_level, status.completed, status.total):
+                    break
+        finally:
+            await self.removeChangeListener(repl, change_listener)
+
+    async def _session_authenticator(self, baseUrl, sg_admin_url, sg_db, username, sg_client, auth):
+        # sg_client is the blocking MobileRestClient; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        cookie, session_id = await loop.run_in_executor(
+            None, lambda: sg_client.create_session(sg_admin_url, sg_db, username, auth=auth))
+        authenticator = Authenticator(baseUrl, client=self._client)
+        replicator_authenticator = await authenticator.authentication(session_id, cookie, authentication_type="session")
+        return (cookie, session_id), replicator_authenticator
+
+    async def create_session_configure_replicate(self, baseUrl, sg_admin_url, sg_db, username, password,
+                                                 channels, sg_client, cbl_db, sg_blip_url, replication_type=None,
+                                                 continuous=True, max_retries=None, max_retry_wait_time=None, encryptor=None, auth=None, collection=None):
+        session, replicator_authenticator = await self._session_authenticator(baseUrl, sg_admin_url, sg_db, username, sg_client, auth)
+        repl_config = await self.configure(cbl_db, sg_blip_url, continuous=continuous, channels=channels,
+                                           replication_type=replication_type,
+                                           replicator_authenticator=replicator_authenticator,
+                                           max_retries=max_retries, max_retry_wait_time=max_retry_wait_time, encryptor=encryptor, collection=collection)
+        repl = await self.create(repl_config)
+        await self.start(repl)
+        await self.wait_until_replicator_idle(repl)
+        return session, replicator_authenticator, repl
+
+    async def create_session_configure_replicate_collection(self, baseUrl, sg_admin_url, sg_db, username, sg_client, sg_blip_url, continuous=None, replication_type=None, auth=None, encryptor=None, collections=None, collection_configuration=None):
+        session, replicator_authenticator = await self._session_authenticator(baseUrl, sg_admin_url, sg_db, username, sg_client, auth)
+        repl = await self.configureCollection(target_url=sg_blip_url, replication_type=replication_type, collection=collections, collectionConfiguration=collection_configuration, continuous=continuous, replicator_authenticator=replicator_authenticator)
+        await self.start(repl)
+        await self.wait_until_replicator_idle(repl)
+        return session, replicator_authenticator, repl
@@ -6,14 +6,14 @@ class Authenticator(object):
     _client = None
     base_url = None
 
-    def __init__(self, base_url):
+    def __init__(self, base_url, client=None):
         self.base_url = base_url
 
         # If no base url was specified, raise an exception
         if self.base_url is None:
             raise Exception("No base_url specified")
 
-        self._client = Client(base_url)
+        self._client = client if client is not None else Client(base_url)
 
     def basicAuthenticator_create(self, username, password):
         args = Args()
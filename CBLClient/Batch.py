@@ -0,0 +1,121 @@
+from CBLClient.MemoryPointer import MemoryPointer
+
+
+class BatchReference(MemoryPointer):
+    """ Placeholder for the result of a call queued in a Batch.
+
+    Until the batch is executed the reference serializes as "$<index>",
+    which the TestServer resolves to the result of that earlier call.
+    Once executed, it behaves like the MemoryPointer it resolved to.
+    """
+
+    def __init__(self, batch, index):
+        super(BatchReference, self).__init__("${}".format(index))
+        self._batch = batch
+        self._index = index
+        self._resolved = False
+        self._result = None
+
+    def resolve(self, result):
+        self._resolved = True
+        self._result = result
+
+    def is_resolved(self):
+        return self._resolved
+
+    def result(self):
+        if not self._resolved:
+            raise Exception("Batch call {} has not been executed yet".format(self._index))
+        return self._result
+
+    def getAddress(self):
+        if not self._resolved:
+            return self._address
+        if isinstance(self._result, MemoryPointer):
+            return self._result.getAddress()
+        raise Exception("Batch call {} returned {!r}, not a memory pointer".format(self._index, self._result))
+
+
+def _contains_unresolved_reference(value):
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, BatchReference) and not value.is_resolved():
+            return True
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return False
+
+
+class Batch(object):
+    """ Queues CBLClient method invocations and sends them in a single request.
+
+    Batch exposes the same invokeMethod signature as Client. Each queued
+    call returns a BatchReference, which may be passed as a top level
+    memory pointer argument to later calls in the same batch. It can stand
+    in as the '_client' of a CBLClient wrapper only for methods that make a
+    single invokeMethod call and return its result untouched; helpers that
+    chain calls or inspect results need the real values and cannot be
+    batched this way.
+
+        batch = client.batch()
+        doc = batch.invokeMethod("document_create", args)
+        ...
+        results = batch.execute()
+
+    See Client.invokeMethods for the wire contract.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+        self._refs = []
+        self._executed = False
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None and not self._executed:
+            self.execute()
+        return False
+
+    def invokeMethod(self, method, args=None, ignore_deserialize=False):
+        if self._executed:
+            raise Exception("Batch has already been executed")
+        if ignore_deserialize:
+            raise Exception("ignore_deserialize is not supported for batched calls")
+
+        if args:
+            for name, val in args:
+                if isinstance(val, BatchReference):
+                    if val._batch is not self and not val.is_resolved():
+                        raise Exception("Cannot reference an unexecuted call from another batch")
+                elif _contains_unresolved_reference(val):
+                    # The server only substitutes "$<n>" for top level args
+                    raise Exception("Unexecuted batch references may only be passed as top level args, not inside '{}'".format(name))
+
+        ref = BatchReference(self, len(self._calls))
+        self._calls.append((method, args))
+        self._refs.append(ref)
+        return ref
+
+    def execute(self):
+        """ Send all queued calls and return their results in order """
+        if self._executed:
+            raise Exception("Batch has already been executed")
+        self._executed = True
+
+        if not self._calls:
+            return []
+
+        results = self._client.invokeMethods(self._calls, self._refs)
+        for ref, result in zip(self._refs, results):
+            if not ref.is_resolved():
+                ref.resolve(result)
+        return results
@@ -4,43 +4,57 @@ from requests import Session
 from requests import Response
 from CBLClient.ValueSerializer import ValueSerializer
 from CBLClient.Args import Args
+from CBLClient.Batch import Batch
+from CBLClient.HandleScope import HandleScope
 from keywords.utils import log_info
 
 
 class Client(object):
+    # base_url -> whether its TestServer implements "batch". Shared by every
+    # Client, since each CBLClient wrapper builds its own Client.
+    _batch_support = {}
 
     def __init__(self, base_url):
         self.base_url = base_url
         self.session = Session()
 
+    @staticmethod
+    def _serializeArgs(args):
+        body = {}
+        if args:
+            for k, v in args:
+                body[k] = ValueSerializer.serialize(v)
+        return body
+
+    @staticmethod
+    def _deserializeResponse(url, result, ignore_deserialize=False):
+        if ignore_deserialize:
+            return result
+        if isinstance(result, bytes):
+            result = result.decode('utf8', 'ignore')
+        if len(result) < 25:
+            # Only print short messages
+            log_info("For url: {} Got response: {}".format(url, result))
+        return ValueSerializer.deserialize(result)
+
     def invokeMethod(self, method, args=None, ignore_deserialize=False):
         resp = Response()
         try:
             # Create body from args.
-            body = {}
-
             url = self.base_url + "/" + method
-
-            if args:
-                for k, v in args:
-                    val = ValueSerializer.serialize(v)
-                    body[k] = val
+            body = self._serializeArgs(args)
             # Create connection to method endpoint.
             headers = {"Content-Type": "application/json"}
             self.session.headers = headers
-            resp = self.session.post(url, data=json.dumps(body))
+            data = json.dumps(body)
+            resp = self.session.post(url, data=data)
             resp.raise_for_status()
             responseCode = resp.status_code
             if responseCode == 200:
-                result = resp.content
-                if ignore_deserialize:
-                    return result
-                if isinstance(result, bytes):
-                    result = result.decode('utf8', 'ignore')
-                if len(result) < 25:
-                    # Only print short messages
-                    log_info("For url: {} Got response: {}".format(url, result))
-                return ValueSerializer.deserialize(result)
+                result = self._deserializeResponse(url, resp.content, ignore_deserialize)
+                if not ignore_deserialize:
+                    HandleScope.track(self.base_url, result, len(data) + len(resp.content))
+                return result
         except Exception as err:
             if resp.content:
                 cont = resp.content
@@ -50,7 +64,126 @@ class Client(object):
             else:
                 raise Exception(str(err))
 
+    def batch(self):
+        """ Returns a Batch that queues invocations for a single round trip """
+        return Batch(self)
+
+    def handle_scope(self, name=None, **kwargs):
+        """ Returns a HandleScope for this Client's TestServer, see HandleScope """
+        return HandleScope(self, name, **kwargs)
+
+    def invokeMethods(self, calls, refs=None):
+        """ Invoke a list of (method, args) tuples in one request.
+
+        Wire contract for the TestServer "batch" endpoint:
+
+        Request: POST <base_url>/batch with body
+            {"calls": [{"method": "<name>", "args": {"<arg>": "<serialized value>"}}, ...]}
+        where each args dict is exactly what invokeMethod would post for
+        that call. A top level arg whose serialized value is "$<n>" refers
+        to the handle returned by call n (n must be lower than the index of
+        the call that uses it); the server substitutes it before dispatch.
+
+        Success: 200 with a serialized list (ValueSerializer list format)
+        holding one result per call, in call order.
+
+        Failure: the server stops at the first failing call and answers 500
+        with {"index": <n>, "error": "<message>", "results": [<serialized
+        results of calls 0..n-1>]}.
+
+        A 404 means the server has no batch endpoint. That is remembered per
+        base_url (see batchSupported) and the calls are replayed one by one
+        with invokeMethod, resolving each placeholder before it is used.
+        Returns the deserialized results in call order. Either way a failing
+        call raises Client.BatchCallException, whose 'index' is the failed call.
+        """
+        if not calls:
+            return []
+        if Client.batchSupported(self.base_url):
+            url = self.base_url + "/batch"
+            headers = {"Content-Type": "application/json"}
+            self.session.headers = headers
+            data = json.dumps(self._batchBody(calls))
+            try:
+                resp = self.session.post(url, data=data)
+            except Exception as err:
+                raise Exception(str(err))
+            if resp.status_code != 404:
+                nbytes = (len(data) + len(resp.content)) // len(calls)
+                try:
+                    results = self._batchResults(url, resp.status_code, resp.content, calls, refs)
+                except Exception:
+                    # Calls completed before the failing one still created their handles
+                    if refs is not None:
+                        for ref in refs:
+                            if ref.is_resolved():
+                                HandleScope.track(self.base_url, ref.result(), nbytes)
+                    raise
+                for result in results:
+                    HandleScope.track(self.base_url, result, nbytes)
+                return results
+            Client.setBatchSupported(self.base_url, False)
+
+        results = []
+        for i, (method, args) in enumerate(calls):
+            try:
+                result = self.invokeMethod(method, args)
+            except Exception as err:
+                raise Client.BatchCallException(i, method, err)
+            if refs is not None:
+                refs[i].resolve(result)
+            results.append(result)
+        return results
+
+    @staticmethod
+    def batchSupported(base_url):
+        """ False once the TestServer at base_url has answered 404 to "batch" """
+        return Client._batch_support.get(base_url, True)
+
+    @staticmethod
+    def setBatchSupported(base_url, supported):
+        if not supported:
+            log_info("TestServer at {} does not support batch, falling back to sequential calls".format(base_url))
+        Client._batch_support[base_url] = supported
+
+    @staticmethod
+    def _batchBody(calls):
+        return {
+            "calls": [
+                {"method": method, "args": Client._serializeArgs(args)}
+                for method, args in calls
+            ]
+        }
+
+    @staticmethod
+    def _batchResults(url, status_code, content, calls, refs=None):
+        if isinstance(content, bytes):
+            content = content.decode('utf8', 'ignore')
+
+        if status_code >= 400:
+            try:
+                failure = json.loads(content)
+                index = failure["index"]
+                method = calls[index][0]
+                message = failure["error"]
+                done = [ValueSerializer.deserialize(r) for r in failure.get("results", [])]
+            except (ValueError, KeyError, IndexError, TypeError):
+                raise Exception("{} Error for url: {} {}".format(status_code, url, content))
+            # Completed calls still hold handles on the server, expose them for release
+            if refs is not None:
+                for ref, result in zip(refs, done):
+                    ref.resolve(result)
+            raise Client.BatchCallException(index, method, message)
+
+        results = ValueSerializer.deserialize(content)
+        if not isinstance(results, list) or len(results) != len(calls):
+            raise Exception("Expected {} batch results from {}, got: {}".format(len(calls), url, content))
+        return results
+
     def release(self, obj):
+        # Inside a HandleScope the release is queued and sent batched
+        if HandleScope.defer_release(self.base_url, obj):
+            return
         args = Args()
         args.setMemoryPointer("object", obj)
         self.invokeMethod("release", args)
@@ -69,3 +202,11 @@ class Client(object):
 
         def getResponseMessage(self):
             return self._responseMessage
+
+    class BatchCallException(Exception):
+        """ Call 'index' of a batch failed, the calls before it completed """
+
+        def __init__(self, index, method, message):
+            super(Client.BatchCallException, self).__init__("Batch call {} ({}) failed: {}".format(index, method, message))
+            self.index = index
+            self.method = method
@@ -5,6 +5,7 @@ from CBLClient.Collection import Collection
 from CBLClient.Args import Args
 from keywords.utils import log_info
 from keywords import types
+from keywords.document import batched
 from libraries.data import doc_generators
 from .Document import Document
 from keywords import attachment
@@ -14,15 +15,15 @@ class Database(object):
     _db = None
     _baseUrl = None
 
-    def __init__(self, base_url):
+    def __init__(self, base_url, client=None):
         self.base_url = base_url
 
         # If no base url was specified, raise an exception
         if not self.base_url:
             raise Exception("No base_url specified")
 
-        self._client = Client(base_url)
-        self._collection = Collection(base_url)
+        self._client = client if client is not None else Client(base_url)
+        self._collection = Collection(base_url, client=self._client)
 
     def configure(self, directory=None, conflictResolver=None, password=None):
         args = Args()
@@ -220,19 +221,22 @@ class Database(object):
             args.setString("concurrencyControlType", concurrencyControlType)
         return self._client.invokeMethod("database_deleteWithConcurrency", args)
 
-    def create_bulk_docs(self, number, id_prefix, db, channels=None, generator=None, attachments_generator=None, id_start_num=0, attachment_file_list=None, collection=None):
+    @staticmethod
+    def _iter_bulk_docs(number, id_prefix, channels=None, generator=None, attachments_generator=None, id_start_num=0, attachment_file_list=None):
         """
-        if id_prefix == None, generate a uuid for each doc
-
-        Add a 'number' of docs with a prefix 'id_prefix' using the provided generator from libraries.data.doc_generators.
-        ex. id_prefix=testdoc with a number of 3 would create 'testdoc_0', 'testdoc_1', and 'testdoc_2'
+        Lazily yields (doc_id, doc_body) for create_bulk_docs. Like keywords.document.iter_docs,
+        arguments are validated when this is called, not on the first next().
         """
-        added_docs = {}
         if channels is not None:
             types.verify_is_list(channels)
 
-        log_info("PUT {} docs to with prefix {}".format(number, id_prefix))
+        if attachments_generator and attachment_file_list is None:
+            types.verify_is_callable(attachments_generator)
+
+        return Database._generate_bulk_docs(number, id_prefix, channels, generator, attachments_generator, id_start_num, attachment_file_list)
 
+    @staticmethod
+    def _generate_bulk_docs(number, id_prefix, channels, generator, attachments_generator, id_start_num, attachment_file_list):
         for i in range(id_start_num, id_start_num + number):
 
             if generator == "four_k":
@@ -251,7 +255,6 @@ class Database(object):
                 if attachment_file_list is not None:
                     attachments = attachments_generator(attachment_file_list)
                 else:
-                    types.verify_is_callable(attachments_generator)
                     attachments = attachments_generator()
                 doc_body["_attachments"] = {att.name: {"data": att.data} for att in attachments}
 
@@ -261,12 +264,65 @@ class Database(object):
                 doc_id = "{}_{}".format(id_prefix, i)
 
             doc_body["id"] = doc_id
-            added_docs[doc_id] = doc_body
-        if collection:
-            self._collection.collectionSaveDocuments(db, added_docs, collection)
-        else:
-            self.saveDocuments(db, added_docs)
-        return list(added_docs.keys())
+            yield doc_id, doc_body
+
+    @staticmethod
+    def _increment_updates(doc_body, key="updates-cbl"):
+        if key not in doc_body:
+            doc_body[key] = 0
+        doc_body[key] = doc_body[key] + 1
+        return doc_body
+
+    @staticmethod
+    def _blob_image_source(liteserv_platform, db_path=None):
+        """ Returns (image path, whether blob.create takes it as 'content' rather than 'stream')
+
+        db_path (from getPath) is only needed for net-msft, where the image
+        lives relative to the app directory.
+        """
+        if liteserv_platform == "android":
+            return "/assets/golden_gate_large.jpg", False
+        elif liteserv_platform in ["xamarin-android", "java-macosx", "java-msft", "java-ubuntu", "java-centos",
+                                   "javaws-macosx", "javaws-msft", "javaws-ubuntu", "javaws-centos"]:
+            return "golden_gate_large.jpg", False
+        elif liteserv_platform == "ios":
+            return "Files/golden_gate_large.jpg", True
+        elif liteserv_platform == "net-msft":
+            app_dir = "\\".join(db_path.rstrip("\\").split("\\")[:-2])
+            return "{}\\Files\\golden_gate_large.jpg".format(app_dir), False
+        return "Files/golden_gate_large.jpg", False
+
+    def create_bulk_docs(self, number, id_prefix, db, channels=None, generator=None, attachments_generator=None, id_start_num=0, attachment_file_list=None, collection=None,
+                         batch_size=None):
+        """
+        if id_prefix == None, generate a uuid for each doc
+
+        Add a 'number' of docs with a prefix 'id_prefix' using the provided generator from libraries.data.doc_generators.
+        ex. id_prefix=testdoc with a number of 3 would create 'testdoc_0', 'testdoc_1', and 'testdoc_2'
+
+        If 'batch_size' is set, the docs are generated and saved 'batch_size' at a time
+        instead of building all of them before a single save
+        """
+        log_info("PUT {} docs to with prefix {}".format(number, id_prefix))
+        doc_ids = []
+        for added_docs in self._bulk_doc_batches(number, id_prefix, channels, generator, attachments_generator, id_start_num, attachment_file_list, batch_size):
+            if collection:
+                self._collection.collectionSaveDocuments(db, added_docs, collection)
+            else:
+                self.saveDocuments(db, added_docs)
+            doc_ids.extend(added_docs.keys())
+        return doc_ids
+
+    @staticmethod
+    def _bulk_doc_batches(number, id_prefix, channels, generator, attachments_generator, id_start_num, attachment_file_list, batch_size):
+        """
+        Returns an iterator of {doc_id: doc_body} dicts of at most 'batch_size' docs (all docs if
+        batch_size is None). Bad arguments raise here, before any doc is saved.
+        """
+        bulk_docs = Database._iter_bulk_docs(number, id_prefix, channels, generator, attachments_generator, id_start_num, attachment_file_list)
+        if batch_size is None:
+            return iter([dict(bulk_docs)])
+        return (dict(batch) for batch in batched(bulk_docs, batch_size))
 
     def delete_bulk_docs(self, database, doc_ids=[]):
         if not doc_ids:
@@ -288,27 +344,17 @@ class Database(object):
             raise Exception("cbl docs are empty , cannot update docs")
         for _ in range(number_of_updates):
             for doc in docs:
-                doc_body = docs[doc]
-                if key not in doc_body:
-                    doc_body[key] = 0
-                doc_body[key] = doc_body[key] + 1
-                updated_docs[doc] = doc_body
+                updated_docs[doc] = self._increment_updates(docs[doc], key)
             self.updateDocuments(database, updated_docs)
 
     def update_all_docs_individually(self, database, num_of_updates=1):
         doc_ids = self.getDocIds(database)
-        doc_obj = Document(self.base_url)
+        doc_obj = Document(self.base_url, client=self._client)
         for i in range(num_of_updates):
             for doc_id in doc_ids:
                 doc_mem = self.getDocument(database, doc_id)
                 doc_mut = doc_obj.toMutable(doc_mem)
-                doc_body = doc_obj.toMap(doc_mut)
-                try:
-                    doc_body["updates-cbl"]
-                except Exception:
-                    doc_body["updates-cbl"] = 0
-
-                doc_body["updates-cbl"] = doc_body["updates-cbl"] + 1
+                doc_body = self._increment_updates(doc_obj.toMap(doc_mut))
                 self.updateDocument(database, doc_body, doc_id)
 
     def deleteDBIfExists(self, db_name):
@@ -357,31 +403,16 @@ class Database(object):
         docs = self.getDocuments(database, doc_ids)
         if len(docs) < 1:
             raise Exception("cbl docs are empty , cannot update docs")
+        db_path = self.getPath(database) if liteserv_platform == "net-msft" else None
+        image_path, as_content = self._blob_image_source(liteserv_platform, db_path)
         for _ in range(number_of_updates):
             for doc in docs:
-                doc_body = docs[doc]
-                if "updates-cbl" not in doc_body:
-                    doc_body["updates-cbl"] = 0
-                doc_body["updates-cbl"] = doc_body["updates-cbl"] + 1
-
+                doc_body = self._increment_updates(docs[doc])
                 mutable_dictionary = dictionary.toMutableDictionary(doc_body)
-                if liteserv_platform == "android":
-                    image_content = blob.createImageContent("/assets/golden_gate_large.jpg")
-                    blob_value = blob.create("image/jpeg", stream=image_content)
-                elif liteserv_platform in ["xamarin-android", "java-macosx", "java-msft", "java-ubuntu", "java-centos",
-                                           "javaws-macosx", "javaws-msft", "javaws-ubuntu", "javaws-centos"]:
-                    image_content = blob.createImageContent("golden_gate_large.jpg")
-                    blob_value = blob.create("image/jpeg", stream=image_content)
-                elif liteserv_platform == "ios":
-                    image_content = blob.createImageContent("Files/golden_gate_large.jpg")
+                image_content = blob.createImageContent(image_path)
+                if as_content:
                     blob_value = blob.create("image/jpeg", content=image_content)
-                elif liteserv_platform == "net-msft":
-                    db_path = self.getPath(database).rstrip("\\")
-                    app_dir = "\\".join(db_path.split("\\")[:-2])
-                    image_content = blob.createImageContent("{}\\Files\\golden_gate_large.jpg".format(app_dir))
-                    blob_value = blob.create("image/jpeg", stream=image_content)
                 else:
-                    image_content = blob.createImageContent("Files/golden_gate_large.jpg")
                     blob_value = blob.create("image/jpeg", stream=image_content)
                 dictionary.setBlob(mutable_dictionary, "_attachments", blob_value)
                 updated_docs[doc] = doc_body
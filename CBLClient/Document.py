@@ -5,14 +5,14 @@ from CBLClient.Args import Args
 class Document(object):
     _client = None
 
-    def __init__(self, base_url):
+    def __init__(self, base_url, client=None):
         self.base_url = base_url
 
         # If no base url was specified, raise an exception
         if not self.base_url:
             raise Exception("No base_url specified")
 
-        self._client = Client(base_url)
+        self._client = client if client is not None else Client(base_url)
 
     def create(self, doc_id=None, dictionary=None,):
         args = Args()
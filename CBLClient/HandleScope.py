@@ -0,0 +1,208 @@
+import threading
+from collections import OrderedDict
+
+from CBLClient.Args import Args
+from CBLClient.MemoryPointer import MemoryPointer
+from keywords.utils import log_info
+
+
+def _memory_pointers(value):
+    """ Yields every MemoryPointer in a deserialized TestServer result """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, MemoryPointer):
+            yield value
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+class HandleScope(object):
+    """ Owns the TestServer handles created through Client while it is active.
+
+    Every MemoryPointer a Client against the scope's base_url receives is
+    tracked by the innermost active scope for that base_url. Client.release
+    (and so Utils.release) only queues the handle; queued releases are sent
+    as one batched RPC once 'max_pending' handles or 'max_pending_bytes'
+    are queued, and when the scope closes. Handles still live when the scope
+    closes were never released by the caller: they are counted in 'leaked'
+    and released along with the queue.
+
+        with client.handle_scope("test_foo") as scope:
+            ...
+        log_info("{} leaked {} handles".format(scope.name, scope.leaked))
+
+    Byte sizes are estimates: each handle is charged an even share of the
+    request and response sizes of the call that returned it.
+
+    Scopes are shared by every Client of a base_url, including Clients on
+    other threads. Utils.flushMemory drops every handle of the base_url,
+    tracked ones are counted as leaked without a release RPC.
+    """
+
+    # base_url -> stack of active scopes, innermost last
+    _active = {}
+    _lock = threading.RLock()
+
+    def __init__(self, client, name=None, max_pending=100, max_pending_bytes=1024 * 1024, batch_size=500):
+        self._client = client
+        self.base_url = client.base_url
+        self.name = name or "handle scope"
+        self.max_pending = max_pending
+        self.max_pending_bytes = max_pending_bytes
+        self.batch_size = batch_size
+        # address -> (MemoryPointer, estimated bytes)
+        self._live = OrderedDict()
+        self._pending = []
+        self._pending_bytes = 0
+        self._open = False
+        self.created = 0
+        self.released = 0
+        self.leaked = 0
+        self.release_rpcs = 0
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def live_count(self):
+        return len(self._live)
+
+    def live_bytes(self):
+        return sum(nbytes for _, nbytes in self._live.values())
+
+    def open(self):
+        with HandleScope._lock:
+            if self._open:
+                raise Exception("{} is already open".format(self.name))
+            self._open = True
+            HandleScope._active.setdefault(self.base_url, []).append(self)
+        return self
+
+    def close(self):
+        """ Releases the queued and leaked handles and returns the number leaked """
+        with HandleScope._lock:
+            if not self._open:
+                return self.leaked
+            self._open = False
+            scopes = HandleScope._active[self.base_url]
+            scopes.remove(self)
+            if not scopes:
+                del HandleScope._active[self.base_url]
+            leaked = [pointer for pointer, _ in self._live.values()]
+            leaked_bytes = self.live_bytes()
+            self.leaked += len(leaked)
+            self._live.clear()
+            pending = self._take_pending()
+
+        if leaked:
+            log_info("{}: releasing {} leaked TestServer handles (~{} bytes)".format(self.name, len(leaked), leaked_bytes))
+        self._send_releases(pending + leaked)
+        return self.leaked
+
+    def flush(self):
+        """ Sends the queued releases now """
+        with HandleScope._lock:
+            pending = self._take_pending()
+        self._send_releases(pending)
+
+    def _take_pending(self):
+        pending = self._pending
+        self._pending = []
+        self._pending_bytes = 0
+        return pending
+
+    def _queue_release(self, pointer, nbytes):
+        with HandleScope._lock:
+            self._pending.append(pointer)
+            self._pending_bytes += nbytes
+            self.released += 1
+            if len(self._pending) < self.max_pending and self._pending_bytes < self.max_pending_bytes:
+                return
+            pending = self._take_pending()
+        self._send_releases(pending)
+
+    def _send_releases(self, pointers):
+        """ Releases 'pointers' 'batch_size' at a time. Without the TestServer batch endpoint
+        invokeMethods sends every release on its own, and each one counts in 'release_rpcs'.
+        """
+        calls = []
+        for pointer in pointers:
+            args = Args()
+            args.setMemoryPointer("object", pointer)
+            calls.append(("release", args))
+
+        start = 0
+        while start < len(calls):
+            chunk = calls[start:start + self.batch_size]
+            batched = self._client.batchSupported(self.base_url)
+            try:
+                self._client.invokeMethods(chunk)
+                sent = len(chunk)
+            except self._client.BatchCallException as err:
+                # Stopped at a handle the server no longer has, carry on after it
+                log_info("{}: release failed ({})".format(self.name, err))
+                sent = err.index + 1
+            except Exception as err:
+                log_info("{}: releases failed ({})".format(self.name, err))
+                sent = len(chunk)
+
+            if self._client.batchSupported(self.base_url):
+                self.release_rpcs += 1
+            else:
+                # One RPC per release, after the batch request answered 404 if this found out
+                self.release_rpcs += sent + (1 if batched else 0)
+            start += sent
+
+    @staticmethod
+    def track(base_url, result, nbytes=0):
+        """ Called by Client with every deserialized result, and the bytes sent and received for it """
+        if not HandleScope._active:
+            return
+        pointers = list(_memory_pointers(result))
+        if not pointers:
+            return
+        with HandleScope._lock:
+            scopes = HandleScope._active.get(base_url)
+            if not scopes:
+                return
+            scope = scopes[-1]
+            share = nbytes // len(pointers)
+            for pointer in pointers:
+                address = pointer.getAddress()
+                if address not in scope._live:
+                    scope._live[address] = (pointer, share)
+                    scope.created += 1
+
+    @staticmethod
+    def defer_release(base_url, pointer):
+        """ Queues 'pointer' for release by the scope owning it, False if no scope is active for base_url """
+        if not HandleScope._active:
+            return False
+        with HandleScope._lock:
+            scopes = HandleScope._active.get(base_url)
+            if not scopes:
+                return False
+            address = pointer.getAddress()
+            owner, nbytes = scopes[-1], 0
+            for scope in reversed(scopes):
+                if address in scope._live:
+                    owner = scope
+                    nbytes = scope._live.pop(address)[1]
+                    break
+        owner._queue_release(pointer, nbytes)
+        return True
+
+    @staticmethod
+    def flushed(base_url):
+        """ The TestServer at base_url dropped all its handles """
+        with HandleScope._lock:
+            for scope in HandleScope._active.get(base_url, []):
+                scope.leaked += len(scope._live)
+                scope._live.clear()
+                scope._take_pending()
@@ -13,7 +13,7 @@ class Replication(object):
     classdocs
     '''
 
-    def __init__(self, base_url):
+    def __init__(self, base_url, client=None):
         '''
         Constructor
         '''
@@ -22,7 +22,7 @@ class Replication(object):
         # If no base url was specified, raise an exception
         if not self.base_url:
             raise Exception("No base_url specified")
-        self._client = Client(base_url)
+        self._client = client if client is not None else Client(base_url)
         self.config = None
 
     def configure(self, source_db, target_url=None, target_db=None,
@@ -305,14 +305,38 @@ class Replication(object):
         args.setMemoryPointer("changeListener", change_listener)
         return self._client.invokeMethod("replicator_changeListenerGetChanges", args)
 
+    @staticmethod
+    def _status_snapshot_calls(replicator, change_listener=None):
+        args = Args()
+        args.setMemoryPointer("replicator", replicator)
+        calls = [(method, args) for method in ReplicatorStatus.METHODS]
+        if change_listener is not None:
+            listener_args = Args()
+            listener_args.setMemoryPointer("changeListener", change_listener)
+            calls.append(("replicator_changeListenerChangesCount", listener_args))
+        return calls
+
+    def getStatusSnapshot(self, replicator):
+        """ Activity level, progress and error of the replicator in one batched round trip """
+        return ReplicatorStatus(*self._client.invokeMethods(self._status_snapshot_calls(replicator)))
+
+    def _poll_status(self, replicator, change_listener):
+        """ (status snapshot, change listener event count) in one batched round trip """
+        results = self._client.invokeMethods(self._status_snapshot_calls(replicator, change_listener))
+        return ReplicatorStatus(*results[:-1]), results[-1]
+
+    @staticmethod
+    def _replicate_target(target_db=None, target_url=None):
+        """ configure() kwargs for configure_and_replicate; target_db wins over target_url """
+        if target_db is None:
+            return {"target_url": target_url}
+        return {"target_db": target_db}
+
     def configure_and_replicate(self, source_db, replicator_authenticator=None, target_db=None, target_url=None, replication_type="push_pull", continuous=True,
                                 channels=None, err_check=True, wait_until_idle=True, heartbeat=None, auto_purge=None, encryptor=None):
-        if target_db is None:
-            repl_config = self.configure(source_db, target_url=target_url, continuous=continuous,
-                                         replication_type=replication_type, channels=channels, replicator_authenticator=replicator_authenticator, heartbeat=heartbeat, auto_purge=auto_purge, encryptor=encryptor)
-        else:
-            repl_config = self.configure(source_db, target_db=target_db, continuous=continuous,
-                                         replication_type=replication_type, channels=channels, replicator_authenticator=replicator_authenticator, heartbeat=heartbeat, auto_purge=auto_purge, encryptor=encryptor)
+        repl_config = self.configure(source_db, continuous=continuous, replication_type=replication_type, channels=channels,
+                                     replicator_authenticator=replicator_authenticator, heartbeat=heartbeat, auto_purge=auto_purge,
+                                     encryptor=encryptor, **self._replicate_target(target_db, target_url))
         repl = self.create(repl_config)
         self.start(repl)
         if wait_until_idle:
@@ -332,58 +356,40 @@ class Replication(object):
             else:
                 break
 
-    def wait_until_replicator_idle(self, repl, err_check=True, max_times=150, sleep_time=2, max_timeout=600):
-        count = 0
-        idle_count = 0
-        max_idle_count = 20
-
+    def wait_until_replicator_idle(self, repl, err_check=True, max_times=150, sleep_time=2, max_timeout=600, idle_checks=20):
+        """
+        Waits until the replicator is stopped, or idle with all changes completed for more
+        than 'idle_checks' consecutive checks, 'sleep_time' apart. A replicator change listener
+        records status changes between checks, so a busy spell shorter than 'sleep_time' still
+        restarts the idle count. Each check reads the status and the listener's event count in
+        one batched round trip (5 sequential calls on TestServers without a batch endpoint).
+        """
         # Load the current replicator config to decide retry strategy
         repl_config = self.getConfig(repl)
         isContinous = self.isContinuous(repl_config)
         log_info("The current replicator sets continuous to {}".format(isContinous))
+        state = ReplicatorIdleState(isContinous, max_times=max_times, max_timeout=max_timeout, max_idle_count=idle_checks)
+
+        change_listener = self.addChangeListener(repl)
+        try:
+            status, events = self._poll_status(repl, change_listener)
+            while state.polling():
+                state.log(status.activity_level, status.completed, status.total)
+                settling, done = state.on_activity(status.activity_level, status.completed, status.total)
+                if done:
+                    break
+                if err_check:
+                    state.check_error(status.error)
 
-        # Sleep until replicator completely processed
-        activity_level = self.getActivitylevel(repl)
-        begin_timestamp = time.time()
-        while count < max_times:
-            log_info("Activity level: {}".format(activity_level))
-            log_info("total vs completed = {} vs {} ".format(self.getCompleted(repl), self.getTotal(repl)))
-            log_info("count is  {}".format(count))
-            log_info("Activity level {}".format(activity_level))
-            time.sleep(sleep_time)
-            if activity_level == "offline" or activity_level == "connecting" or activity_level == "busy":
-                count += 1
-                idle_count = 0
-            else:
-                if activity_level == "idle":
-                    if (self.getCompleted(repl) < self.getTotal(repl)) and self.getTotal(repl) != 0:
-                        count += 1
-                    else:
-                        idle_count += 1
-                        time.sleep(sleep_time)
-                        if idle_count > max_idle_count:
-                            break
-            cur_timestamp = time.time()
-            if err_check:
-                err = self.getError(repl)
-                if err is not None and err != 'nil' and err != -1:
-                    if not isContinous:
-                        raise Exception("Error while replicating", err)
-                    if is_replicator_in_connection_retry(err) and (cur_timestamp - begin_timestamp) < max_timeout:
-                        log_info("Replicator connection is retrying, please wait ......")
-                    else:
-                        raise Exception("Error while replicating", err)
-
-            activity_level = self.getActivitylevel(repl)
-            total = self.getTotal(repl)
-            completed = self.getCompleted(repl)
-            if activity_level == "stopped":
-                if completed < total:
-                    raise Exception("replication progress is not completed")
-                else:
+                time.sleep(sleep_time)
+                status, latest_events = self._poll_status(repl, change_listener)
+                state.on_events(latest_events != events, settling)
+                events = latest_events
+
+                if state.on_progress(status.activity_level, status.completed, status.total):
                     break
-            if total < completed and total <= 0:
-                raise Exception("total is less than completed")
+        finally:
+            self.removeChangeListener(repl, change_listener)
 
     def addCollection(self, replicationConfiguration, collection, collection_configuration=None):
         args = Args()
@@ -397,7 +403,7 @@ class Replication(object):
                                            channels, sg_client, cbl_db, sg_blip_url, replication_type=None,
                                            continuous=True, max_retries=None, max_retry_wait_time=None, encryptor=None, auth=None, collection=None):
 
-        authenticator = Authenticator(baseUrl)
+        authenticator = Authenticator(baseUrl, client=self._client)
         cookie, session_id = sg_client.create_session(sg_admin_url, sg_db, username, auth=auth)
         session = cookie, session_id
         replicator_authenticator = authenticator.authentication(session_id, cookie, authentication_type="session")
@@ -454,7 +460,7 @@ class Replication(object):
         return self._client.invokeMethod("replicatorConfiguration_configureCollection", args)
 
     def create_session_configure_replicate_collection(self, baseUrl, sg_admin_url, sg_db, username, sg_client, sg_blip_url, continuous=None, replication_type=None, auth=None, encryptor=None, collections=None, collection_configuration=None):
-        authenticator = Authenticator(baseUrl)
+        authenticator = Authenticator(baseUrl, client=self._client)
         cookie, session_id = sg_client.create_session(sg_admin_url, sg_db, username, auth=auth)
         session = cookie, session_id
         replicator_authenticator = authenticator.authentication(session_id, cookie, authentication_type="session")
@@ -481,3 +487,82 @@ class Replication(object):
         if collection is not None:
             args.setMemoryPointer("collection", collection)
         return self._client.invokeMethod("replicatorConfiguration_collection", args)
+
+
+class ReplicatorStatus(object):
+    """ Snapshot of a replicator's status, see Replication.getStatusSnapshot """
+
+    METHODS = ("replicator_getActivityLevel", "replicator_getCompleted", "replicator_getTotal", "replicator_getError")
+
+    def __init__(self, activity_level, completed, total, error):
+        self.activity_level = activity_level
+        self.completed = completed
+        self.total = total
+        self.error = error
+
+    def __repr__(self):
+        return "ReplicatorStatus(activity_level={!r}, completed={!r}, total={!r}, error={!r})".format(
+            self.activity_level, self.completed, self.total, self.error)
+
+
+class ReplicatorIdleState(object):
+    """ Decisions behind wait_until_replicator_idle, independent of how the
+    replicator is polled, so blocking and asyncio callers share them.
+    """
+
+    def __init__(self, is_continuous, max_times=150, max_timeout=600, max_idle_count=20):
+        self.is_continuous = is_continuous
+        self.max_times = max_times
+        self.max_timeout = max_timeout
+        self.max_idle_count = max_idle_count
+        self.count = 0
+        self.idle_count = 0
+        self.begin_timestamp = time.time()
+
+    def polling(self):
+        return self.count < self.max_times
+
+    def log(self, activity_level, completed, total):
+        log_info("Activity level: {}".format(activity_level))
+        log_info("total vs completed = {} vs {} ".format(completed, total))
+        log_info("count is  {}".format(self.count))
+
+    def on_activity(self, activity_level, completed, total):
+        """ Returns (settling, done): settling asks the caller to sleep once more
+        before deciding, done means the replicator has stayed idle long enough.
+        """
+        if activity_level in ("offline", "connecting", "busy"):
+            self.count += 1
+            self.idle_count = 0
+        elif activity_level == "idle":
+            if completed < total and total != 0:
+                self.count += 1
+            else:
+                self.idle_count += 1
+                return True, self.idle_count > self.max_idle_count
+        return False, False
+
+    def on_events(self, changed, settling):
+        """ A status change while settling means the replicator was not done after all """
+        if changed and settling:
+            self.idle_count = 0
+
+    def check_error(self, err):
+        if err is None or err == 'nil' or err == -1:
+            return
+        if not self.is_continuous:
+            raise Exception("Error while replicating", err)
+        if is_replicator_in_connection_retry(err) and (time.time() - self.begin_timestamp) < self.max_timeout:
+            log_info("Replicator connection is retrying, please wait ......")
+        else:
+            raise Exception("Error while replicating", err)
+
+    def on_progress(self, activity_level, completed, total):
+        """ Returns True once a stopped replicator has completed """
+        if activity_level == "stopped":
+            if completed < total:
+                raise Exception("replication progress is not completed")
+            return True
+        if total < completed and total <= 0:
+            raise Exception("total is less than completed")
+        return False
@@ -1,5 +1,6 @@
 from CBLClient.Client import Client
 from CBLClient.Args import Args
+from CBLClient.HandleScope import HandleScope
 
 
 class Utils:
@@ -23,7 +24,9 @@ class Utils:
             self._client.release(obj)
 
     def flushMemory(self):
-        return self._client.invokeMethod("flushMemory")
+        result = self._client.invokeMethod("flushMemory")
+        HandleScope.flushed(self.base_url)
+        return result
 
     def copy_files(self, source_path, destination_path):
         args = Args()
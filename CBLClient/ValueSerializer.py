@@ -1,102 +1,230 @@
 import json
+
 from CBLClient.MemoryPointer import MemoryPointer
 
 
 class ValueSerializer(object):
+    """ Encodes values to / decodes values from the TestServer wire format.
+
+    Scalars are sent as type prefixed strings ("I12", "L123456789", "F1.5",
+    "\"text\"", "@12" for memory pointers). A dict or list is sent as the JSON
+    encoding of its members' serialized strings, so nested containers appear
+    as JSON strings inside their parent.
+
+    Both directions walk containers with an explicit stack instead of
+    recursing, dispatch common scalar types through a lookup table, and
+    do a single C-level JSON encode / decode per container.
+    """
+
     @staticmethod
-    def serialize(value):
+    def _serialize_scalar(value):
         if value is None or value == "None":
             return "null"
         elif isinstance(value, MemoryPointer):
             return value.getAddress()
         elif isinstance(value, str):
             if value.endswith(",LONGTYPE"):
-                value = value.split(',')
-                return "L" + value[0]
-            else:
-                string = str(value)
-            return "\"" + string + "\""
-        elif isinstance(value, str):
-            value = value.encode('utf-8')
+                return "L" + value.split(',')[0]
             return "\"" + value + "\""
         elif isinstance(value, bool):
             # bool has to be before int,
             # Python's Bool gets caught by int
-            bool_val = bool(value)
-            return "true" if bool_val else "false"
+            return "true" if value else "false"
         elif isinstance(value, int):
             if value < 1000000 and value > -1000000:
-                number = int(value)
-                return "I" + str(number)
+                return "I" + str(value)
             return "L" + str(value)
         elif isinstance(value, float):
-            number = float(value)
-            return "F" + str(number)
+            return "F" + str(value)
         # There is no double/number in python
-        elif isinstance(value, dict):
-            dict_map = value
-            string_map = {}
-            for map_param in dict_map:
-                if isinstance(dict_map[map_param], bytes):
-                    map_param_value = dict_map[map_param].decode()
-                else:
-                    map_param_value = dict_map[map_param]
-                val = ValueSerializer.serialize(map_param_value)
-                string_map[map_param] = val
+        raise RuntimeError("Invalid value type: {}: {}".format(value, type(value)))
 
-            return json.dumps(string_map)
-        elif isinstance(value, list):
-            string_list = []
+    @staticmethod
+    def serialize(value):
+        # Fast paths: scalars and flat containers never touch the stack
+        if not isinstance(value, (dict, list)):
+            return ValueSerializer._serialize_scalar(value)
+        encoded = _encode_flat(value)
+        if encoded is not None:
+            return encoded
 
-            for obj in value:
-                string = ValueSerializer.serialize(obj)
-                string_list.append(string)
-            return json.dumps(string_list)
+        encoders = _SCALAR_ENCODERS
+        serialize_scalar = ValueSerializer._serialize_scalar
 
-        raise RuntimeError("Invalid value type: {}: {}".format(value, type(value)))
+        # Each frame is [output dict or list, iterator, key of the child being encoded]
+        stack = [_serialize_frame(value)]
+        while stack:
+            frame = stack[-1]
+            out = frame[0]
+            pushed = None
+            if out.__class__ is dict:
+                for key, child in frame[1]:
+                    encoder = encoders.get(child.__class__)
+                    if encoder is not None:
+                        out[key] = encoder(child)
+                    elif isinstance(child, (dict, list)):
+                        encoded = _encode_flat(child)
+                        if encoded is not None:
+                            out[key] = encoded
+                            continue
+                        frame[2] = key
+                        pushed = child
+                        break
+                    elif isinstance(child, bytes):
+                        out[key] = serialize_scalar(child.decode())
+                    else:
+                        out[key] = serialize_scalar(child)
+            else:
+                for child in frame[1]:
+                    encoder = encoders.get(child.__class__)
+                    if encoder is not None:
+                        out.append(encoder(child))
+                    elif isinstance(child, (dict, list)):
+                        encoded = _encode_flat(child)
+                        if encoded is not None:
+                            out.append(encoded)
+                            continue
+                        pushed = child
+                        break
+                    else:
+                        out.append(serialize_scalar(child))
+            if pushed is not None:
+                stack.append(_serialize_frame(pushed))
+                continue
+
+            # One C-level JSON encode per container, over its members' strings
+            encoded = _encode(out)
+            stack.pop()
+            if not stack:
+                return encoded
+            parent = stack[-1]
+            if parent[0].__class__ is dict:
+                parent[0][parent[2]] = encoded
+            else:
+                parent[0].append(encoded)
 
     @staticmethod
-    def deserialize(value):
-        if not value or len(value) == 0 or value == "null":
+    def _deserialize_scalar(value):
+        if not value or value == "null":
             return None
-        elif value.startswith("PK"):
+        if not isinstance(value, str):
             return value
-        elif value.startswith("@") or value.startswith("\"@"):
+
+        first = value[0]
+        if first == "@":
             return MemoryPointer(value)
-        elif value.startswith("\"") and value.endswith("\""):
-            return value[1:-1]
-        elif value == "true":
-            return True
-        elif value == "false":
-            return False
-        elif value.startswith("I") or value.startswith("L"):
+        elif first == "\"":
+            if value.startswith("\"@"):
+                return MemoryPointer(value)
+            if value.endswith("\""):
+                return value[1:-1]
+        elif first == "I" or first == "L":
             return int(value[1:])
-        elif value.startswith("F") or value.startswith("D"):
+        elif first == "F" or first == "D":
             return float(value[1:])
-        elif value.startswith("#"):
+        elif first == "#":
             if "." in value:
                 return float(value[1:])
-            else:
-                return int(value[1:])
-        elif value.startswith("{"):
-            string_map = json.loads(value)
-            map = {}
+            return int(value[1:])
+        elif value.startswith("PK"):
+            return value
+        elif value == "true":
+            return True
+        elif value == "false":
+            return False
 
-            for entry in string_map:
-                key = str(entry)
-                obj = ValueSerializer.deserialize(string_map[key])
+        raise RuntimeError("Invalid value type: {}: {}".format(value, type(value)))
 
-                map[key] = obj
+    @staticmethod
+    def deserialize(value):
+        if not value or not isinstance(value, str) or value[0] not in "{[":
+            return ValueSerializer._deserialize_scalar(value)
 
-            return map
-        elif value.startswith("["):
-            string_list = json.loads(value)
-            res_list = []
+        deserialize_scalar = ValueSerializer._deserialize_scalar
+        result = _decode(value)
+        # Decode members in place, descending into nested containers as found
+        stack = [result]
+        while stack:
+            container = stack.pop()
+            items = list(container.items()) if container.__class__ is dict else list(enumerate(container))
+            for key, member in items:
+                if member.__class__ is str and member:
+                    first = member[0]
+                    if first == "\"" and member[-1] == "\"" and member[1:2] != "@" and len(member) > 1:
+                        container[key] = member[1:-1]
+                    elif first == "{" or first == "[":
+                        member = _decode(member)
+                        stack.append(member)
+                        container[key] = member
+                    else:
+                        container[key] = deserialize_scalar(member)
+                elif isinstance(member, (dict, list)):
+                    # Raw JSON container rather than an encoded string, decode its members too
+                    stack.append(member)
+                else:
+                    container[key] = deserialize_scalar(member)
+        return result
 
-            for string in string_list:
-                obj = ValueSerializer.deserialize(string)
-                res_list.append(obj)
 
-            return res_list
+def _serialize_frame(container):
+    if isinstance(container, dict):
+        return [{}, iter(container.items()), None]
+    return [[], iter(container), None]
 
-        raise RuntimeError("Invalid value type: {}: {}".format(value, type(value)))
+
+def _encode_flat(container):
+    """ Encodes a container holding only common scalars without a stack frame.
+    Most containers in generated docs are small leaves like this; returns
+    None as soon as a member needs the general path.
+    """
+    encoders = _SCALAR_ENCODERS
+    if isinstance(container, dict):
+        out = {}
+        for key, child in container.items():
+            encoder = encoders.get(child.__class__)
+            if encoder is None:
+                return None
+            out[key] = encoder(child)
+    else:
+        out = []
+        for child in container:
+            encoder = encoders.get(child.__class__)
+            if encoder is None:
+                return None
+            out.append(encoder(child))
+    return _encode(out)
+
+
+def _serialize_str(value):
+    if value == "None":
+        return "null"
+    if value.endswith(",LONGTYPE"):
+        return "L" + value.split(',')[0]
+    return "\"" + value + "\""
+
+
+def _serialize_int(value):
+    if value < 1000000 and value > -1000000:
+        return "I" + str(value)
+    return "L" + str(value)
+
+
+# Exact type -> encoder for the common scalars; subclasses (and
+# MemoryPointer) go through ValueSerializer._serialize_scalar
+_SCALAR_ENCODERS = {
+    str: _serialize_str,
+    int: _serialize_int,
+    bool: lambda value: "true" if value else "false",
+    float: lambda value: "F" + str(value),
+    type(None): lambda value: "null",
+}
+
+
+def _decode(text):
+    return _decoder.raw_decode(text)[0]
+
+
+# Same output as json.dumps / json.loads with default arguments, without
+# the per call keyword argument handling
+_encode = json.JSONEncoder().encode
+_decoder = json.JSONDecoder()
@@ -1,5 +1,6 @@
 import pytest
 from utilities.xml_parser import custom_rerun_xml_merge, merge_reports
+from keywords.waiter import wait_metrics
 
 
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
@@ -34,6 +35,15 @@ def pytest_sessionfinish(session, exitstatus):
             assert False, "When running with Junit results, the argument needs to be in the format pass/file/fail=[PATH_TO_RESULTS_XML]"
 
 
+def pytest_terminal_summary(terminalreporter):
+    """ Where the session spent its time waiting, see keywords.waiter """
+    metrics = wait_metrics()
+    if metrics:
+        terminalreporter.section("wait metrics")
+        for stats in metrics.values():
+            terminalreporter.write_line(repr(stats))
+
+
 def pytest_addoption(parser):
     parser.addoption("--merge", action="store",
                      help="Merge the report files path pattern, like results/**.xml. e.g.  -m '["
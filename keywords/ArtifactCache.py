@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import shutil
+
+from contextlib import contextmanager
+
+import requests
+
+from keywords.constants import ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES
+from keywords.exceptions import ArtifactCacheError
+from keywords.utils import log_info
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks on Windows, the cache then only works for one job at a time
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+META_SUFFIX = ".json"
+PART_SUFFIX = ".part"
+LOCK_SUFFIX = ".lock"
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Exclusive lock on 'path' (created if needed) shared by every process on the machine.
+    Yields False instead of waiting if 'blocking' is False and someone else holds it.
+    The holder may remove 'path', whoever was waiting on it then locks the new file.
+    """
+    while True:
+        with open(path, "a") as f:
+            if fcntl is None:
+                yield True
+                return
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                if not _same_file(f, path):
+                    continue
+                yield True
+                return
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _same_file(f, path):
+    """ Whether the open file 'f' is still the file at 'path' """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fstat = os.fstat(f.fileno())
+    return (fstat.st_dev, fstat.st_ino) == (stat.st_dev, stat.st_ino)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest
+
+
+class ArtifactCache:
+    """
+    Downloaded packages (LiteServ / TestServer apps, etc.) kept on disk and shared
+    by every job on the machine, keyed by product, version, build and platform:
+
+        <root>/<product>/<version>/<build or 'release'>/<platform or 'any'>/<file name>
+
+    Each artifact has a <file name>.json with its url, size and sha256, whose mtime
+    is the artifact's last use. Downloads are streamed to <file name>.part and resumed
+    from there if interrupted. Jobs lock an artifact while fetching or copying it, and
+    the least recently used artifacts (and abandoned downloads) are evicted once the
+    cache, .part files included, grows past 'max_bytes'.
+    """
+
+    def __init__(self, root=None, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.root = root or os.environ.get("ARTIFACT_CACHE_DIR", ARTIFACT_CACHE_DIR)
+        self.max_bytes = max_bytes
+
+    def path_for(self, product, version, build, platform, file_name):
+        return os.path.join(self.root, product, version, build or "release", platform or "any", file_name)
+
+    def get(self, url, product, version, build=None, platform=None, file_name=None, sha256=None,
+            checksum_url=None, verify=True, retries=3, dest_path=None):
+        """
+        Returns the local path of the artifact at 'url', downloading it unless it is cached.
+        The download is checked against 'sha256', or the checksum published at 'checksum_url'
+        (a '<sha256>  <file name>' file), when given. 'verify' is passed on to requests.
+
+        With 'dest_path', the artifact is copied there before its lock is released (so another
+        job cannot evict it half way) and 'dest_path' is returned instead.
+        """
+        file_name = file_name or url.split("/")[-1]
+        path = self.path_for(product, version, build, platform, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with file_lock(path + LOCK_SUFFIX):
+            meta = self._cached_meta(path, sha256)
+            if meta is not None:
+                log_info("Using cached {}".format(path))
+                os.utime(path + META_SUFFIX)
+                return self._copy(path, dest_path)
+
+            if sha256 is None and checksum_url is not None:
+                sha256 = self._fetch_checksum(checksum_url, verify)
+            self._download(url, path, sha256, verify, retries)
+            result = self._copy(path, dest_path)
+
+        self.evict(keep=path)
+        return result
+
+    @staticmethod
+    def _copy(path, dest_path):
+        if dest_path is None:
+            return path
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        shutil.copyfile(path, dest_path)
+        return dest_path
+
+    def _cached_meta(self, path, sha256):
+        """ The artifact's meta if it is complete (and has the expected 'sha256'), else None """
+        if not os.path.isfile(path) or not os.path.isfile(path + META_SUFFIX):
+            return None
+        with open(path + META_SUFFIX) as f:
+            meta = json.load(f)
+        if os.path.getsize(path) != meta["size"]:
+            log_info("Cached {} is truncated, downloading it again".format(path))
+            return None
+        if sha256 is not None and meta["sha256"] != sha256:
+            log_info("Cached {} does not have sha256 {}, downloading it again".format(path, sha256))
+            return None
+        return meta
+
+    @staticmethod
+    def _fetch_checksum(checksum_url, verify):
+        resp = requests.get(checksum_url, verify=verify, timeout=DOWNLOAD_TIMEOUT)
+        resp.raise_for_status()
+        return resp.text.split()[0].lower()
+
+    def _download(self, url, path, sha256, verify, retries):
+        part_path = path + PART_SUFFIX
+        for attempt in range(retries + 1):
+            try:
+                digest = self._stream_to_part(url, part_path, verify)
+                break
+            except requests.exceptions.RequestException as e:
+                if attempt == retries:
+                    raise ArtifactCacheError("Could not download {}: {}".format(url, e))
+                log_info("Download of {} interrupted ({}), resuming".format(url, e))
+
+        actual = digest.hexdigest()
+        if sha256 is not None and actual != sha256.lower():
+            os.remove(part_path)
+            raise ArtifactCacheError("Checksum mismatch for {}: expected {}, got {}".format(url, sha256, actual))
+
+        meta = {"url": url, "size": os.path.getsize(part_path), "sha256": actual}
+        os.replace(part_path, path)
+        with open(path + META_SUFFIX, "w") as f:
+            json.dump(meta, f)
+        log_info("Cached {} -> {} ({} bytes)".format(url, path, meta["size"]))
+
+    @staticmethod
+    def _stream_to_part(url, part_path, verify):
+        """ Streams 'url' to 'part_path' in chunks, resuming from what is already there. Returns the sha256 of the whole file """
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+        log_info("Downloading {} -> {}{}".format(url, part_path, " from byte {}".format(offset) if offset else ""))
+
+        with requests.get(url, headers=headers, stream=True, verify=verify, timeout=DOWNLOAD_TIMEOUT) as resp:
+            if offset and resp.status_code == 416:
+                # The part is already complete (or stale), start over
+                os.remove(part_path)
+                return ArtifactCache._stream_to_part(url, part_path, verify)
+            resp.raise_for_status()
+
+            if offset and resp.status_code == 206:
+                digest = _sha256(part_path)
+                mode = "ab"
+            else:
+                # The server ignored the range
+                digest = hashlib.sha256()
+                mode = "wb"
+
+            with open(part_path, mode) as f:
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+        return digest
+
+    def entries(self):
+        """ (path, size, last used) of every cached artifact """
+        entries = []
+        for root, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if not file_name.endswith(META_SUFFIX):
+                    continue
+                path = os.path.join(root, file_name[:-len(META_SUFFIX)])
+                if os.path.isfile(path):
+                    entries.append((path, os.path.getsize(path), os.path.getmtime(path + META_SUFFIX)))
+        return entries
+
+    def parts(self):
+        """ (path, size, last written) of every unfinished download's .part file """
+        parts = []
+        for root, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if file_name.endswith(PART_SUFFIX):
+                    path = os.path.join(root, file_name)
+                    parts.append((path, os.path.getsize(path), os.path.getmtime(path)))
+        return parts
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used artifacts and .part files (except 'keep' and the ones
+        in use) until the cache fits in max_bytes. Their lock files go with them.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with file_lock(os.path.join(self.root, LOCK_SUFFIX)):
+            entries = sorted(self.entries() + self.parts(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                is_part = path.endswith(PART_SUFFIX)
+                artifact_path = path[:-len(PART_SUFFIX)] if is_part else path
+                if artifact_path == keep:
+                    continue
+                with file_lock(artifact_path + LOCK_SUFFIX, blocking=False) as locked:
+                    if not locked:
+                        continue
+                    log_info("Evicting {} from the artifact cache ({} bytes)".format(path, size))
+                    if not is_part:
+                        os.remove(path + META_SUFFIX)
+                    os.remove(path)
+                    if fcntl is not None and not os.path.exists(artifact_path + PART_SUFFIX) \
+                            and not os.path.exists(artifact_path):
+                        os.remove(artifact_path + LOCK_SUFFIX)
+                total -= size
+
+
+def download_artifact(url, dest_path, product, version, build=None, platform=None, cache=None, **kwargs):
+    """
+    Copies the artifact at 'url' to 'dest_path' out of the shared ArtifactCache,
+    downloading it into the cache first if needed (kwargs go to ArtifactCache.get)
+    """
+    cache = cache or ArtifactCache()
+    return cache.get(url, product, version, build=build, platform=platform, dest_path=dest_path, **kwargs)
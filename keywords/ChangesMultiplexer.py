@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+
+import aiohttp
+from requests.auth import HTTPBasicAuth
+
+from keywords.exceptions import RestError
+from keywords.utils import log_info
+from keywords.waiter import Backoff
+
+try:
+    import resource
+except ImportError:
+    # Windows, there is no RLIMIT_NOFILE to raise
+    resource = None
+
+FEED_TYPES = ("normal", "longpoll", "continuous")
+
+# File descriptors left for the rest of the process when sizing the connection pool
+FD_HEADROOM = 256
+
+
+def raise_open_files_limit(wanted):
+    """
+    Raises the soft RLIMIT_NOFILE to 'wanted', or as close as the hard limit allows.
+    Returns the number of open files the process may now have.
+    """
+    if resource is None:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or soft >= wanted:
+        return wanted if soft == resource.RLIM_INFINITY else soft
+    new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+    log_info("Raised the open files limit (RLIMIT_NOFILE) from {} to {}".format(soft, new_soft))
+    return new_soft
+
+
+class ChangesFeed:
+    """
+    State of one _changes feed: the since it resumes from, the latest rev seen per
+    doc and whether the terminator doc has arrived
+    """
+
+    def __init__(self, name, auth, feed, filter_type=None, filter_channels=None, filter_doc_ids=None):
+        if feed not in FEED_TYPES:
+            raise RestError("Unsupported _changes feed: {}. Use one of {}".format(feed, FEED_TYPES))
+        if filter_type == "_doc_ids" and feed != "normal":
+            raise RestError("'_doc_ids' filter only works with feed=normal")
+        if filter_type not in (None, "sync_gateway/bychannel", "_doc_ids"):
+            raise RestError("Unsupported _changes filter_type: {}. Use 'sync_gateway/bychannel' or '_doc_ids'.".format(filter_type))
+
+        self.name = name
+        self.auth = auth
+        self.feed = feed
+        self.filter_type = filter_type
+        self.filter_channels = filter_channels
+        self.filter_doc_ids = filter_doc_ids
+
+        self.since = 0
+        self.latest_changes = {}
+        self.found_terminator = False
+        self.requests = 0
+
+    def request_body(self, limit=None, timeout=None, heartbeat=None):
+        body = {"feed": self.feed, "since": self.since}
+        if limit is not None:
+            body["limit"] = limit
+        if timeout is not None:
+            body["timeout"] = timeout
+        if heartbeat is not None:
+            body["heartbeat"] = heartbeat
+        if self.filter_type == "sync_gateway/bychannel":
+            body["filter"] = self.filter_type
+            body["channels"] = ",".join(self.filter_channels)
+        elif self.filter_type == "_doc_ids":
+            body["filter"] = self.filter_type
+            body["doc_ids"] = self.filter_doc_ids
+        return body
+
+    def process_change(self, change, terminator_doc_id):
+        """ Records one change. Returns True if it is the terminator doc """
+        if "seq" in change:
+            self.since = change["seq"]
+
+        if change["id"] == terminator_doc_id:
+            self.found_terminator = True
+            return True
+
+        # Add latest rev to to latest_changes map
+        if len(change["changes"]) >= 1:
+            self.latest_changes[change["id"]] = change["changes"][0]["rev"]
+        else:
+            self.latest_changes[change["id"]] = ""
+        return False
+
+
+class ChangesMultiplexer:
+    """
+    Runs many Sync Gateway _changes feeds ('normal' and 'longpoll' polling loops
+    and 'continuous' streams) as coroutines on one event loop, until each feed
+    has seen the terminator doc.
+
+        mux = ChangesMultiplexer(sg_url, sg_db, "terminator")
+        mux.add_feed("user_0", auth, "continuous")
+        results = mux.run()  # {"user_0": {"continuous": {doc_id: rev, ...}}}
+
+    All feeds share one aiohttp session, so every socket is opened by this process.
+    'max_connections' bounds the open connections; continuous feeds hold theirs for their
+    whole life, so it needs to be more than the number of continuous feeds. By default it
+    is one per feed, and run() raises the process's open files limit (RLIMIT_NOFILE, often
+    1024) to fit them plus FD_HEADROOM. If the hard limit is lower, the pool shrinks to
+    what fits, and run() raises RestError when that leaves no room for the polling feeds.
+    """
+
+    def __init__(self, url, db, terminator_doc_id, changes_delay=0, changes_limit=None, longpoll_timeout=60,
+                 heartbeat=30, max_connections=None):
+        self.url = url
+        self.db = db
+        self.terminator_doc_id = terminator_doc_id
+        self.changes_delay = changes_delay
+        self.changes_limit = changes_limit
+        self.longpoll_timeout = longpoll_timeout
+        self.heartbeat = heartbeat
+        self.max_connections = max_connections
+        self.feeds = []
+
+    def add_feed(self, name, auth, feed, filter_type=None, filter_channels=None, filter_doc_ids=None):
+        changes_feed = ChangesFeed(name, auth, feed, filter_type, filter_channels, filter_doc_ids)
+        self.feeds.append(changes_feed)
+        return changes_feed
+
+    @staticmethod
+    def _auth_kwargs(auth):
+        """ aiohttp kwargs for a SyncGatewaySession tuple, (user, password) tuple or HTTPBasicAuth """
+        if auth is None:
+            return {}
+        if isinstance(auth, HTTPBasicAuth):
+            return {"auth": aiohttp.BasicAuth(auth.username, auth.password)}
+        if auth[0] == "SyncGatewaySession":
+            return {"headers": {"Cookie": "SyncGatewaySession={}".format(auth[1])}}
+        return {"auth": aiohttp.BasicAuth(auth[0], auth[1])}
+
+    async def _post_changes(self, session, changes_feed, body):
+        changes_feed.requests += 1
+        return await session.post("{}/{}/_changes".format(self.url, self.db), data=json.dumps(body),
+                                  **self._auth_kwargs(changes_feed.auth))
+
+    async def _poll(self, session, changes_feed):
+        """ 'normal' / 'longpoll' loop: one request per batch of changes, resuming from last_seq """
+        timeout = self.longpoll_timeout * 1000 if changes_feed.feed == "longpoll" else None
+        while not changes_feed.found_terminator:
+            logging.debug("_changes ({}) for ({}) since: {}".format(changes_feed.feed, changes_feed.name, changes_feed.since))
+            body = changes_feed.request_body(limit=self.changes_limit, timeout=timeout)
+            async with await self._post_changes(session, changes_feed, body) as resp:
+                resp.raise_for_status()
+                changes = await resp.json(content_type=None)
+
+            for change in changes["results"]:
+                changes_feed.process_change(change, self.terminator_doc_id)
+            changes_feed.since = changes["last_seq"]
+
+            if not changes_feed.found_terminator:
+                await asyncio.sleep(self.changes_delay)
+
+    async def _stream(self, session, changes_feed):
+        """
+        'continuous' feed: parse lines as they arrive, reconnect from the last seq if the server
+        ends the feed, with a growing delay while reconnects bring no changes
+        """
+        reconnect_backoff = Backoff(initial=0.5, maximum=10)
+        progressed = True
+        while not changes_feed.found_terminator:
+            if not progressed:
+                await asyncio.sleep(reconnect_backoff.next_interval())
+            logging.debug("_changes (continuous) for ({}) since: {}".format(changes_feed.name, changes_feed.since))
+            body = changes_feed.request_body(heartbeat=self.heartbeat * 1000)
+            changes_seen = len(changes_feed.latest_changes)
+            since = changes_feed.since
+            async with await self._post_changes(session, changes_feed, body) as resp:
+                resp.raise_for_status()
+                async for line in resp.content:
+                    line = line.strip()
+                    if not line:
+                        # heartbeat
+                        continue
+                    entry = json.loads(line.decode("utf-8"))
+                    if "id" not in entry:
+                        if "last_seq" in entry:
+                            changes_feed.since = entry["last_seq"]
+                        break
+                    if changes_feed.process_change(entry, self.terminator_doc_id):
+                        break
+            progressed = changes_feed.since != since or len(changes_feed.latest_changes) != changes_seen
+            if progressed:
+                reconnect_backoff.reset()
+
+    async def _run_feed(self, session, changes_feed):
+        if changes_feed.feed == "continuous":
+            await self._stream(session, changes_feed)
+        else:
+            await self._poll(session, changes_feed)
+        log_info("Found terminator ({}, {})".format(changes_feed.name, changes_feed.feed))
+        return changes_feed
+
+    def _connection_limit(self):
+        if self.max_connections is not None:
+            return self.max_connections
+
+        continuous = sum(1 for changes_feed in self.feeds if changes_feed.feed == "continuous")
+        available = raise_open_files_limit(len(self.feeds) + FD_HEADROOM) - FD_HEADROOM
+        if available <= continuous:
+            raise RestError("{} continuous _changes feeds need more than the {} connections the open files limit "
+                            "(RLIMIT_NOFILE) leaves. Raise the hard limit (ulimit -Hn) or run fewer feeds.".format(continuous, available))
+        return min(len(self.feeds), available)
+
+    async def run_async(self):
+        """ Runs every feed to its terminator and returns {name: {feed: latest_changes}} """
+        # Reads on a continuous feed are only bounded by the heartbeat
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=max(self.longpoll_timeout, self.heartbeat) + 30)
+        connector = aiohttp.TCPConnector(limit=self._connection_limit())
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            log_info("Starting {} _changes feeds on {}/{}".format(len(self.feeds), self.url, self.db))
+            await asyncio.gather(*[self._run_feed(session, changes_feed) for changes_feed in self.feeds])
+
+        results = {}
+        for changes_feed in self.feeds:
+            results.setdefault(changes_feed.name, {})[changes_feed.feed] = changes_feed.latest_changes
+        return results
+
+    def run(self):
+        """ Blocking version of run_async """
+        return asyncio.run(self.run_async())
@@ -3,55 +3,134 @@ import time
 import logging
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
 from requests.exceptions import Timeout
+from urllib3.exceptions import ReadTimeoutError
 
 from keywords.MobileRestClient import get_auth_type
 from keywords.constants import AuthType
 from keywords.utils import log_r
 from keywords.utils import log_info
+from keywords.waiter import Backoff
 import keywords.exceptions
 
 
+def seq_number(seq):
+    """
+    Best effort integer for a changes feed sequence. Sync Gateway may return
+    ints, strings or compound sequences like "12:34" / "5::40" (the last part
+    is the sequence). Returns None if it cannot be parsed.
+    """
+    try:
+        return int(str(seq).split(":")[-1])
+    except ValueError:
+        return None
+
+
 class ChangesTracker:
 
-    def __init__(self, url, db, auth=None):
+    def __init__(self, url, db, auth=None, pool_maxsize=50):
         self.processed_changes = {}
+        self.url = url
         self.endpoint = "{}/{}".format(url, db)
         self.auth = auth
 
+        # doc_id -> set of revs seen, for O(1) duplicate checks
+        self._seen_revs = {}
+
+        # One pooled session shared by every loop (and thread) of this tracker
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers["Content-Type"] = "application/json"
+
+        self.last_seq = 0
+        self.changes_received = 0
+        self.revs_received = 0
+        self.reconnects = 0
+        self.started_at = None
+        self.last_change_at = None
+
         self.cancel = False
 
     def process_changes(self, results):
         """
-        Add each doc from longpoll changes results to the processed changes list in the following format:
+        Add each doc from changes results to the processed changes list in the following format:
         { "doc_id": [ {"rev": "rev1"}, {"rev", "rev2"}, ...] }
         """
 
         for doc in results:
-            if len(doc["changes"]) > 0:
-                if doc["id"] in self.processed_changes:
-                    # doc has already been seen in the changes feed,
-                    # append new changes to revs accociated with that id
-                    revs_list = self.processed_changes[doc["id"]]
-
-                    # If the document is already in 'processed_changes', make sure
-                    # that the revision doesn't already exist. If we see one, raise an exception
-                    # because we are seeing the same revision being sent twice
-                    # Checking against this scenario - https://github.com/couchbase/sync_gateway/issues/2186
-                    changes_revs = [change["rev"] for change in doc["changes"]]
-                    revs_list_revs = [rev["rev"] for rev in revs_list]
-                    for change in changes_revs:
-                        if change in revs_list_revs:
-                            raise keywords.exceptions.ChangesError("Duplicates in changes feed!")
-                    revs_list.extend(doc["changes"])
-                    self.processed_changes[doc["id"]] = revs_list
-                else:
-                    # Stored the doc with the list of rev changes
-                    self.processed_changes[doc["id"]] = doc["changes"]
-
-    def start(self, timeout=1000, heartbeat=None, request_timeout=None):
+            self._process_change(doc)
+
+    def _process_change(self, doc):
+        changes = doc["changes"]
+        if len(changes) == 0:
+            return
+
+        self.changes_received += 1
+        self.revs_received += len(changes)
+        self.last_change_at = time.time()
+
+        doc_id = doc["id"]
+        seen = self._seen_revs.get(doc_id)
+        if seen is None:
+            # Stored the doc with the list of rev changes
+            self._seen_revs[doc_id] = set(change["rev"] for change in changes)
+            self.processed_changes[doc_id] = list(changes)
+            return
+
+        # If the document is already in 'processed_changes', make sure
+        # that the revision doesn't already exist. If we see one, raise an exception
+        # because we are seeing the same revision being sent twice
+        # Checking against this scenario - https://github.com/couchbase/sync_gateway/issues/2186
+        for change in changes:
+            if change["rev"] in seen:
+                raise keywords.exceptions.ChangesError("Duplicates in changes feed!")
+        seen.update(change["rev"] for change in changes)
+        self.processed_changes[doc_id].extend(changes)
+
+    def process_line(self, line):
         """
-        Start a longpoll changes feed and and store the results in self.processed changes
+        Handle one line of a continuous changes feed. Returns False when the
+        line is the feed terminator ({"last_seq": ...}), True otherwise.
+        Empty lines are heartbeats.
+        """
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            return True
+
+        entry = json.loads(line)
+        if "last_seq" in entry and "id" not in entry:
+            self.last_seq = entry["last_seq"]
+            return False
+
+        if "seq" in entry:
+            self.last_seq = entry["seq"]
+        if "id" in entry:
+            self._process_change(entry)
+        return True
+
+    def _configure_auth(self):
+        auth_type, self.auth = get_auth_type(self.auth)
+        if auth_type == AuthType.session:
+            self._session.cookies.set("SyncGatewaySession", self.auth[1])
+        elif auth_type == AuthType.http_basic:
+            self._session.auth = self.auth
+
+    def start(self, timeout=1000, heartbeat=None, request_timeout=None, feed="longpoll"):
+        """
+        Start a changes feed and store the results in self.processed changes
+
+        feed="longpoll" issues one request per batch of changes.
+        feed="continuous" keeps a single streaming request open and parses
+        each change as it arrives, reconnecting from the last seq whenever
+        the server ends the feed, with a growing delay while reconnects bring
+        no changes.
+        Both reuse the tracker's pooled connection.
         """
 
         # convert to seconds for use with requests lib api
@@ -60,16 +139,22 @@ class ChangesTracker:
         else:
             request_timeout = 1000
 
-        auth_type, self.auth = get_auth_type(self.auth)
-        current_seq_num = 0
+        self._configure_auth()
 
         start = time.time()
+        if self.started_at is None:
+            self.started_at = start
         if timeout > 1000:
             loop_timeout = (timeout // 1000) * 10
         else:
             loop_timeout = 60
 
-        log_info("[Changes Tracker] Changes Tracker Starting for {} ...".format(loop_timeout))
+        if feed == "continuous" and heartbeat is None:
+            # Heartbeats let the stream wake up to check for cancel / timeout
+            heartbeat = 5000
+
+        log_info("[Changes Tracker] Changes Tracker Starting {} feed for {} ...".format(feed, loop_timeout))
+        reconnect_backoff = Backoff(initial=0.5, maximum=10)
 
         while not self.cancel:
             # This if condition will run this method until the timeout and break and come out of this method.
@@ -77,9 +162,9 @@ class ChangesTracker:
                 logging.info("[Changes Tracker] : TIMEOUT")
                 break
             data = {
-                "feed": "longpoll",
+                "feed": feed,
                 "style": "all_docs",
-                "since": current_seq_num
+                "since": self.last_seq
             }
 
             if timeout is not None:
@@ -88,47 +173,103 @@ class ChangesTracker:
             if heartbeat is not None:
                 data["heartbeat"] = heartbeat
 
-            if auth_type == AuthType.session:
-                try:
-                    resp = requests.post("{}/_changes".format(self.endpoint), data=json.dumps(
-                        data), cookies=dict(SyncGatewaySession=self.auth[1]), timeout=request_timeout)
-                except Timeout as to:
-                    log_info("Request timed out. Exiting longpoll loop ...")
-                    logging.debug(to)
-                    break
-            elif auth_type == AuthType.http_basic:
-                try:
-                    resp = requests.post("{}/_changes".format(self.endpoint), data=json.dumps(
-                        data), auth=self.auth, timeout=request_timeout)
-                except Timeout as to:
-                    log_info("Request timed out. Exiting longpoll loop ...")
-                    logging.debug(to)
-                    break
-            else:
-                try:
-                    resp = requests.post("{}/_changes".format(self.endpoint), data=json.dumps(data), timeout=request_timeout)
-                except Timeout as to:
-                    log_info("Request timed out. Exiting longpoll loop ...")
-                    logging.debug(to)
-                    break
+            try:
+                if feed == "continuous":
+                    changes_received = self.changes_received
+                    self._consume_continuous(data, request_timeout, start, loop_timeout)
+                    if self.cancel:
+                        break
+                    self.reconnects += 1
+                    if self.changes_received > changes_received:
+                        reconnect_backoff.reset()
+                    else:
+                        time.sleep(reconnect_backoff.next_interval())
+                    continue
+
+                resp = self._session.post("{}/_changes".format(self.endpoint), data=json.dumps(data), timeout=request_timeout)
+            except Timeout as to:
+                log_info("Request timed out. Exiting {} loop ...".format(feed))
+                logging.debug(to)
+                break
 
             log_r(resp)
             resp.raise_for_status()
             resp_obj = resp.json()
 
             self.process_changes(resp_obj["results"])
-            current_seq_num = resp_obj["last_seq"]
-            time.sleep(2)
+            self.last_seq = resp_obj["last_seq"]
+            if not resp_obj["results"]:
+                # Don't spin against servers that answer longpoll immediately
+                time.sleep(2)
 
-        log_info("[Changes Tracker] End of longpoll changes loop")
+        log_info("[Changes Tracker] End of {} changes loop".format(feed))
+
+    def _consume_continuous(self, data, request_timeout, start, loop_timeout):
+        resp = self._session.post("{}/_changes".format(self.endpoint), data=json.dumps(data),
+                                  timeout=request_timeout, stream=True)
+        try:
+            log_r(resp, body=False)
+            resp.raise_for_status()
+            for line in resp.iter_lines(chunk_size=1024):
+                if self.cancel or time.time() - start > loop_timeout:
+                    return
+                if not self.process_line(line):
+                    return
+        except ConnectionError as e:
+            # requests reports a read timeout on a streamed body as a ConnectionError
+            if e.args and isinstance(e.args[0], ReadTimeoutError):
+                raise Timeout(e)
+            raise
+        finally:
+            resp.close()
 
     def stop(self):
         """
-        Stop the longpoll changes feed
+        Stop the changes feed
         """
         log_info("[Changes Tracker] Closing _changes feed ...")
         self.cancel = True
 
+    def throughput(self):
+        """ Changes received per second since the tracker first started """
+        if self.started_at is None:
+            return 0.0
+        elapsed = time.time() - self.started_at
+        return self.changes_received / elapsed if elapsed > 0 else 0.0
+
+    def sequence_lag(self):
+        """
+        Number of sequences the tracker is behind the database's update_seq,
+        or None if either sequence cannot be parsed
+        """
+        resp = self._session.get("{}/".format(self.endpoint))
+        log_r(resp, info=False)
+        resp.raise_for_status()
+        update_seq = seq_number(resp.json().get("update_seq"))
+        last_seq = seq_number(self.last_seq)
+        if update_seq is None or last_seq is None:
+            return None
+        return max(update_seq - last_seq, 0)
+
+    def stats(self):
+        return {
+            "changes_received": self.changes_received,
+            "revs_received": self.revs_received,
+            "docs_tracked": len(self.processed_changes),
+            "reconnects": self.reconnects,
+            "last_seq": self.last_seq,
+            "changes_per_sec": self.throughput(),
+            "secs_since_last_change": None if self.last_change_at is None else time.time() - self.last_change_at,
+        }
+
+    def _has_rev(self, doc_id, rev, rev_prefix_gen):
+        seen = self._seen_revs.get(doc_id)
+        if seen is None:
+            return False
+        if not rev_prefix_gen:
+            return rev in seen
+        return any(seen_rev.startswith(rev) for seen_rev in seen)
+
     def wait_until(self, expected_docs, timeout=30, rev_prefix_gen=False):
         """
         Poll self.processed_changes to see if all expected docs have been recieved
@@ -141,31 +282,14 @@ class ChangesTracker:
             revision, but with scenario it can know what prefix in the revision it is expecting
         """
         start = time.time()
+        missing_docs = list(expected_docs)
         while True:
             if time.time() - start > timeout:
                 logging.error("[Changes Tracker] wait_until: TIMEOUT")
                 return False
 
-            # Check that the expected docs exist in the processed_changes
-            missing_docs = []
-            for doc in expected_docs:
-                if doc["id"] not in self.processed_changes:
-                    # doc_id not found in changes
-                    missing_docs.append(doc)
-                else:
-                    rev_found = False
-                    for rev in self.processed_changes[doc["id"]]:
-                        if rev_prefix_gen:
-                            if rev["rev"].startswith(doc["rev"]):
-                                # Found rev in changes feed, continue with the next doc
-                                rev_found = True
-                        else:
-                            if rev["rev"] == doc["rev"]:
-                                # Found rev in changes feed, continue with the next docs
-                                rev_found = True
-
-                    if not rev_found:
-                        missing_docs.append(doc)
+            # Only re-check the docs that were still missing last time
+            missing_docs = [doc for doc in missing_docs if not self._has_rev(doc["id"], doc["rev"], rev_prefix_gen)]
 
             if len(missing_docs) == 0:
                 log_info("[Changes Tracker] :) Saw all docs in the changes feed for ({})!".format(self.auth))
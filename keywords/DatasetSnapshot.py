@@ -0,0 +1,231 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from keywords.constants import DATASET_SNAPSHOTS_DIR
+from keywords.document import batched
+from keywords.exceptions import DatasetSnapshotError
+from keywords.utils import log_info
+
+MANIFEST_FILE = "manifest.json"
+DOCS_FILE = "docs.jsonl.gz"
+PRINCIPALS_FILE = "principals.json"
+FORMAT_VERSION = 1
+
+# Stored apart from the body (_id) or belonging to the doc's revision on Sync Gateway, not to its content
+_META_PROPERTIES = ("_id", "_rev", "_revisions", "_deleted", "_conflicts")
+
+
+def dataset_key(generator, num_docs, channels=None, **params):
+    """
+    Identifies a seeded dataset by the generator that produced it, its doc count and
+    channel layout (and any other generator parameters), ex. 'four_k_500000_1f0c3a9e12ab'
+    """
+    layout = json.dumps({"channels": channels, "params": params}, sort_keys=True)
+    return "{}_{}_{}".format(generator, num_docs, hashlib.sha1(layout.encode("utf-8")).hexdigest()[:12])
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetSnapshot:
+    """
+    On disk copy of a seeded dataset, so it is generated once and then bulk
+    loaded into a bucket or a Sync Gateway db for each run.
+
+        snapshot = DatasetSnapshot("four_k", 500000, channels=["ABC"])
+        if not snapshot.exists():
+            snapshot.save(seed_docs(), users=[...], roles=[...])
+        snapshot.restore_to_sync_gateway(client, sg_admin_url, sg_db)
+
+    <root>/<key>/ holds:
+        docs.jsonl.gz    one [doc_id, body] JSON array per line
+        principals.json  {"users": [...], "roles": [...]} Sync Gateway users / roles
+        manifest.json    key fields, doc count and the sha256 of both files
+    """
+
+    def __init__(self, generator, num_docs, channels=None, root=DATASET_SNAPSHOTS_DIR, **params):
+        self.generator = generator
+        self.num_docs = num_docs
+        self.channels = channels
+        self.params = params
+        self.key = dataset_key(generator, num_docs, channels, **params)
+        self.path = os.path.join(root, self.key)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self):
+        return os.path.isfile(self._file(MANIFEST_FILE))
+
+    def manifest(self):
+        with open(self._file(MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    def save(self, docs, users=None, roles=None):
+        """
+        Writes 'docs' (any iterable of doc bodies with '_id' or 'id') and the Sync Gateway
+        'users' ({"name", "password", "admin_channels", "admin_roles"}) and 'roles'
+        ({"name", "admin_channels"}). The snapshot only appears once it is complete.
+        """
+        tmp_path = "{}.tmp-{}".format(self.path, os.getpid())
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        num_docs = 0
+        with gzip.open(os.path.join(tmp_path, DOCS_FILE), "wt", compresslevel=3) as f:
+            for doc in docs:
+                doc_id = doc.get("_id", doc.get("id"))
+                if doc_id is None:
+                    raise DatasetSnapshotError("Doc without '_id' or 'id': {}".format(doc))
+                body = {k: v for k, v in doc.items() if k not in _META_PROPERTIES}
+                f.write(json.dumps([doc_id, body], separators=(",", ":")))
+                f.write("\n")
+                num_docs += 1
+
+        with open(os.path.join(tmp_path, PRINCIPALS_FILE), "w") as f:
+            json.dump({"users": users or [], "roles": roles or []}, f)
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "key": self.key,
+            "generator": self.generator,
+            "num_docs": self.num_docs,
+            "channels": self.channels,
+            "params": self.params,
+            "doc_count": num_docs,
+            "created": "{}".format(datetime.datetime.utcnow()),
+            "sha256": {name: _sha256(os.path.join(tmp_path, name)) for name in (DOCS_FILE, PRINCIPALS_FILE)},
+        }
+        with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.rename(tmp_path, self.path)
+        log_info("Saved dataset snapshot {} ({} docs, {} users, {} roles)".format(
+            self.path, num_docs, len(users or []), len(roles or [])))
+        return manifest
+
+    def verify(self):
+        """ Raises DatasetSnapshotError if the snapshot is missing or a file does not match its checksum """
+        if not self.exists():
+            raise DatasetSnapshotError("No dataset snapshot at {}".format(self.path))
+        manifest = self.manifest()
+        if manifest.get("format") != FORMAT_VERSION:
+            raise DatasetSnapshotError("Unsupported dataset snapshot format: {}".format(manifest.get("format")))
+        for name, expected in manifest["sha256"].items():
+            actual = _sha256(self._file(name))
+            if actual != expected:
+                raise DatasetSnapshotError("Checksum mismatch for {}: expected {}, got {}".format(self._file(name), expected, actual))
+        return manifest
+
+    def iter_docs(self):
+        """ Yields (doc_id, body) in the order they were saved """
+        with gzip.open(self._file(DOCS_FILE), "rt") as f:
+            for line in f:
+                doc_id, body = json.loads(line)
+                yield doc_id, body
+
+    def principals(self):
+        with open(self._file(PRINCIPALS_FILE)) as f:
+            return json.load(f)
+
+    def capture_from_sync_gateway(self, client, url, db, auth=None, passwords=None, default_password="password",
+                                  scope=None, collection=None):
+        """
+        Saves the docs, users and roles of a seeded Sync Gateway db. Passwords cannot be
+        read back from Sync Gateway, they come from 'passwords' ({name: password}) or
+        'default_password'. _all_docs only returns attachment stubs, so docs with
+        attachments cannot be captured this way; save() the seeded docs instead.
+        """
+        passwords = passwords or {}
+        all_docs = client.get_all_docs(url, db, auth=auth, include_docs=True, scope=scope, collection=collection)
+        docs = []
+        for row in all_docs["rows"]:
+            if "doc" not in row:
+                continue
+            if "_attachments" in row["doc"]:
+                raise DatasetSnapshotError("Cannot capture attachments of {} from _all_docs".format(row["id"]))
+            docs.append(row["doc"])
+
+        users = []
+        for name in client.get_users(url, db, auth=auth):
+            user = client.get_user(url, db, name, auth=auth)
+            users.append({
+                "name": name,
+                "password": passwords.get(name, default_password),
+                "admin_channels": user.get("admin_channels", []),
+                "admin_roles": user.get("admin_roles", []),
+            })
+
+        roles = []
+        for name in client.get_roles(url, db, auth=auth):
+            role = client.get_role(url, db, name, auth=auth)
+            roles.append({"name": name, "admin_channels": role.get("admin_channels", [])})
+
+        return self.save(docs, users=users, roles=roles)
+
+    def capture_from_bucket(self, sdk_client, doc_ids, batch_size=1000):
+        """
+        Saves the docs 'doc_ids' read from the bucket with SDK get_multi in batches
+        of 'batch_size', for datasets seeded directly on the bucket (ex. with
+        create_docs_via_sdk). Returns the saved manifest.
+        """
+        def docs():
+            for batch in batched(doc_ids, batch_size):
+                results = sdk_client.get_multi(batch)
+                missing = [doc_id for doc_id in batch if doc_id not in results]
+                if missing:
+                    raise DatasetSnapshotError("Docs missing from the bucket: {}".format(missing))
+                for doc_id in batch:
+                    yield dict(results[doc_id].value, _id=doc_id)
+
+        return self.save(docs())
+
+    def restore_to_sync_gateway(self, client, url, db, auth=None, batch_size=1000, max_in_flight=4,
+                                scope=None, collection=None):
+        """
+        Recreates the roles and users, then loads the docs with chunked, parallel
+        _bulk_docs requests. Returns the number of docs written.
+        """
+        manifest = self.verify()
+        principals = self.principals()
+        for role in principals["roles"]:
+            client.create_role(url, db, role["name"], channels=role["admin_channels"], auth=auth)
+        for user in principals["users"]:
+            client.create_user(url, db, user["name"], user["password"], channels=user["admin_channels"],
+                               roles=user["admin_roles"], auth=auth)
+
+        docs = (dict(body, _id=doc_id) for doc_id, body in self.iter_docs())
+        added_docs, _ = client.add_bulk_docs_chunked(url, db, docs, batch_size=batch_size, max_in_flight=max_in_flight,
+                                                     auth=auth, scope=scope, collection=collection)
+        if len(added_docs) != manifest["doc_count"]:
+            raise DatasetSnapshotError("Restored {} of {} docs".format(len(added_docs), manifest["doc_count"]))
+        log_info("Restored {} docs from dataset snapshot {} to {}/{}".format(len(added_docs), self.key, url, db))
+        return len(added_docs)
+
+    def restore_to_bucket(self, sdk_client, batch_size=1000):
+        """
+        Loads the docs with SDK upsert_multi in batches of 'batch_size' (for datasets
+        seeded directly on the bucket, Sync Gateway users and roles are not restored).
+        Returns the number of docs written.
+        """
+        manifest = self.verify()
+        count = 0
+        for batch in batched(self.iter_docs(), batch_size):
+            sdk_client.upsert_multi({doc_id: body for doc_id, body in batch})
+            count += len(batch)
+        if count != manifest["doc_count"]:
+            raise DatasetSnapshotError("Restored {} of {} docs".format(count, manifest["doc_count"]))
+        log_info("Restored {} docs from dataset snapshot {} to bucket".format(count, self.key))
+        return count
@@ -1,8 +1,7 @@
 import os
 import subprocess
 
-import requests
-
+from keywords.ArtifactCache import download_artifact
 from keywords.LiteServBase import LiteServBase
 from keywords.constants import LATEST_BUILDS
 from keywords.constants import BINARY_DIR
@@ -50,10 +49,8 @@ class LiteServAndroid(LiteServBase):
                 url = "{}/couchbase-lite-android/{}/{}/{}".format(LATEST_BUILDS, version, build, package_name)
 
         log_info("Downloading {} -> {}/{}".format(url, BINARY_DIR, package_name))
-        resp = requests.get(url, verify=False)  # Need to resolve the certificate verification issue for release branch
-        resp.raise_for_status()
-        with open("{}/{}".format(BINARY_DIR, package_name), "wb") as f:
-            f.write(resp.content)
+        # Need to resolve the certificate verification issue for release branch
+        download_artifact(url, expected_binary_path, "couchbase-lite-android", version, build, "liteserv-android", verify=False)
 
     def install(self):
         """Install the apk to running Android device or emulator"""
@@ -2,8 +2,7 @@ import os
 import subprocess
 from zipfile import ZipFile
 
-import requests
-
+from keywords.ArtifactCache import download_artifact
 from keywords.LiteServBase import LiteServBase
 from keywords.constants import LATEST_BUILDS
 from keywords.constants import RELEASED_BUILDS
@@ -50,10 +49,8 @@ class LiteServMacOSX(LiteServBase):
             package_url = "{}/couchbase-lite-ios/{}/ios/{}/{}".format(LATEST_BUILDS, version, build, package_name)
         # Download package to deps/binaries
         log_info("Downloading: {}".format(package_url))
-        resp = requests.get(package_url, verify=False)
-        resp.raise_for_status()
-        with open("{}/{}".format(BINARY_DIR, package_name), "wb") as f:
-            f.write(resp.content)
+        download_artifact(package_url, "{}/{}".format(BINARY_DIR, package_name), "couchbase-lite-macosx",
+                          version, build, "liteserv-macosx", verify=False)
 
         # Unzip package
         directory_name = package_name.replace(".zip", "")
@@ -4,8 +4,7 @@ import re
 import shutil
 from zipfile import ZipFile
 
-import requests
-
+from keywords.ArtifactCache import download_artifact
 from keywords.LiteServBase import LiteServBase
 from keywords.constants import LATEST_BUILDS
 from keywords.constants import BINARY_DIR
@@ -42,10 +41,8 @@ class LiteServNetMono(LiteServBase):
 
         downloaded_package_zip_name = "couchbase-lite-net-mono-{}-liteserv.zip".format(self.version_build)
         log_info("Downloading {} -> {}/{}".format(download_url, BINARY_DIR, downloaded_package_zip_name))
-        resp = requests.get(download_url)
-        resp.raise_for_status()
-        with open("{}/{}".format(BINARY_DIR, downloaded_package_zip_name), "wb") as f:
-            f.write(resp.content)
+        download_artifact(download_url, "{}/{}".format(BINARY_DIR, downloaded_package_zip_name),
+                          "couchbase-lite-net", version, build, "liteserv-net-mono")
 
         extracted_directory_name = downloaded_package_zip_name.replace(".zip", "")
         with ZipFile("{}/{}".format(BINARY_DIR, downloaded_package_zip_name)) as zip_f:
@@ -5,8 +5,8 @@ import re
 import time
 from zipfile import ZipFile
 from shutil import copyfile
-import requests
 
+from keywords.ArtifactCache import download_artifact
 from keywords.LiteServBase import LiteServBase
 from keywords.constants import BINARY_DIR
 from keywords.constants import LATEST_BUILDS
@@ -71,10 +71,8 @@ class LiteServiOS(LiteServBase):
             url = "{}/couchbase-lite-ios/{}/ios/{}/{}".format(LATEST_BUILDS, version, build, package_name)
 
         log_info("Downloading {} -> {}/{}".format(url, BINARY_DIR, package_name))
-        resp = requests.get(url, verify=False)  # Need to resolve the certificate verification issue for release branch
-        resp.raise_for_status()
-        with open("{}/{}".format(BINARY_DIR, package_name), "wb") as f:
-            f.write(resp.content)
+        # Need to resolve the certificate verification issue for release branch
+        download_artifact(url, downloaded_package_zip_name, "couchbase-lite-ios", version, build, "liteserv-ios", verify=False)
 
         extracted_directory_name = downloaded_package_zip_name.replace(".zip", "")
         with ZipFile("{}".format(downloaded_package_zip_name)) as zip_f:
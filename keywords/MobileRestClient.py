@@ -5,12 +5,16 @@ import uuid
 import re
 
 from requests import Session
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from requests.exceptions import RequestException
 
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 
 from keywords import attachment
+from keywords.document import batched
+from keywords import multipart
 from libraries.data import doc_generators
 from libraries.provision.ansible_runner import AnsibleRunner
 
@@ -40,30 +44,22 @@ def parse_multipart_response(response):
 
         {"_id":"test_ls_db2_0","_rev":"1-9a525c69cafb3d1cdf69545fa5ccfecc","date_time_added":"2016-04-29 13:34:26.346148"}
 
+    'response' may be a requests response (read incrementally with iter_content, using the
+    boundary from its Content-Type header) or the decoded body text (the boundary is taken
+    from its first delimiter line).
+
     Returns a a list of docs {"rows": [ {"_id":"test_ls_db2_0","_rev":"1-9a525c69cafb3d1cdf69545fa5ccfecc" ... } ] }
     """
-    rows = []
 
-    for part in response.split("--"):
+    if not isinstance(response, str):
+        return {"rows": list(multipart.iter_response_docs(response))}
 
-        part_lines = part.splitlines()
-        # part_lines follow the format
-        # [
-        #   '5570ab847be212079e2b05bbbfa023da25b07712bda36aec6481bca024f3',
-        #   Content-Type: application/json,
-        #   { doc }
-        # ]
-        # Only include part that has doc property
-        if part_lines and len(part_lines) > 2:
-            doc = part_lines[-1]
-            try:
-                doc_obj = json.loads(doc)
-                rows.append(doc_obj)
-            except Exception as e:
-                # A few lines from the response can't be parsed as docs
-                logging.error("Could not parse docs as JSON: {} error: {}".format(doc, e))
+    for line in response.splitlines():
+        if line.startswith("--"):
+            boundary = line[2:].strip().encode("utf-8")
+            return {"rows": list(multipart.iter_docs([response.encode("utf-8")], boundary))}
 
-    return {"rows": rows}
+    return {"rows": []}
 
 
 def get_auth_type(auth):
@@ -98,11 +94,39 @@ class MobileRestClient:
     via REST
     """
 
-    def __init__(self):
+    # Root endpoint (GET /) response per url, shared by every client instance.
+    # The server behind a url does not change type during a run, so it is probed once.
+    _server_info = {}
+
+    def __init__(self, pool_connections=10, pool_maxsize=32):
+        """
+        pool_connections: number of hosts to keep a connection pool for
+        pool_maxsize: keep-alive connections kept per host, should be at least the
+            number of threads sharing this client (ex. max_in_flight / max_workers)
+        """
         headers = {"Content-Type": "application/json"}
         self._session = Session()
         self._session.headers = headers
         self._session.verify = False
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def _auth_kwargs(self, auth_type, auth):
+        """ Returns the requests kwargs for an (auth_type, auth) pair from get_auth_type """
+        if auth_type == AuthType.session:
+            return {"cookies": dict(SyncGatewaySession=auth[1])}
+        elif auth_type == AuthType.http_basic:
+            return {"auth": auth}
+        return {}
+
+    def _request(self, method, url, auth_type=AuthType.none, auth=None, **kwargs):
+        """
+        Issues a request over the pooled session, adding the session cookie
+        or basic auth for an (auth_type, auth) pair returned by get_auth_type
+        """
+        kwargs.update(self._auth_kwargs(auth_type, auth))
+        return getattr(self._session, method)(url, **kwargs)
 
     def merge(self, *doc_lists):
         """
@@ -116,19 +140,45 @@ class MobileRestClient:
             merged_list.extend(doc_list)
         return merged_list
 
-    def get_server_type(self, url, auth=None):
-        """
-        Issues a get to the service running at the specified url.
-        It will return a server type of 'listener' or 'syncgateway'
-        """
+    def _get_server_info(self, url, auth=None):
+        """ Returns the (cached) GET / response of the service running at url """
+        key = url.rstrip("/")
+        server_info = MobileRestClient._server_info.get(key)
+        if server_info is not None:
+            return server_info
 
-        if auth:
+        if isinstance(auth, HTTPBasicAuth):
+            resp = self._session.get(url, auth=auth)
+        elif auth:
             resp = self._session.get(url, auth=HTTPBasicAuth(auth[0], auth[1]))
         else:
             resp = self._session.get(url)
         log_r(resp)
         resp.raise_for_status()
-        resp_obj = resp.json()
+        server_info = resp.json()
+
+        MobileRestClient._server_info[key] = server_info
+        return server_info
+
+    @staticmethod
+    def forget_server(url=None):
+        """
+        Drops the cached server type / platform for url (or every url), ex. after
+        a different service has been started on the same host and port
+        """
+        if url is None:
+            MobileRestClient._server_info.clear()
+        else:
+            MobileRestClient._server_info.pop(url.rstrip("/"), None)
+
+    def get_server_type(self, url, auth=None):
+        """
+        Issues a get to the service running at the specified url.
+        It will return a server type of 'listener' or 'syncgateway'
+        The response is cached per url, see forget_server.
+        """
+
+        resp_obj = self._get_server_info(url, auth)
 
         try:
             if resp_obj["vendor"]["name"] == "Couchbase Sync Gateway":
@@ -152,12 +202,10 @@ class MobileRestClient:
         Issues a get to the service running at the specified url.
         It will return a server type of 'macosx', 'android', or 'net' for listener
         of centos for sync_gateway
+        The response is cached per url, see forget_server.
         """
 
-        resp = self._session.get(url)
-        log_r(resp)
-        resp.raise_for_status()
-        resp_obj = resp.json()
+        resp_obj = self._get_server_info(url)
 
         try:
             if resp_obj["vendor"]["name"] == "Couchbase Sync Gateway":
@@ -598,19 +646,9 @@ class MobileRestClient:
         auth_type, auth = get_auth_type(auth)
 
         if attachment:
-            if auth_type == AuthType.session:
-                resp = self._session.get("{}/{}/{}/{}?meta=true".format(url, db, doc, attachment), cookies=dict(SyncGatewaySession=auth[1]))
-            elif auth_type == AuthType.http_basic:
-                resp = self._session.get("{}/{}/{}/{}?meta=true".format(url, db, doc, attachment), auth=auth)
-            else:
-                resp = self._session.get("{}/{}/{}/{}?meta=true".format(url, db, doc, attachment))
+            resp = self._request("get", "{}/{}/{}/{}?meta=true".format(url, db, doc, attachment), auth_type=auth_type, auth=auth)
         else:
-            if auth_type == AuthType.session:
-                resp = self._session.get("{}/{}/{}?meta=true".format(url, db, doc), cookies=dict(SyncGatewaySession=auth[1]))
-            elif auth_type == AuthType.http_basic:
-                resp = self._session.get("{}/{}/{}?meta=true".format(url, db, doc), auth=auth)
-            else:
-                resp = self._session.get("{}/{}/{}?meta=true".format(url, db, doc))
+            resp = self._request("get", "{}/{}/{}?meta=true".format(url, db, doc), auth_type=auth_type, auth=auth)
         log_r(resp)
         resp.raise_for_status()
         return resp.json()
@@ -799,12 +837,7 @@ class MobileRestClient:
 
         params = {"open_revs": "all"}
 
-        if auth_type == AuthType.session:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, auth=auth)
-        else:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params)
+        resp = self._request("get", "{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -825,12 +858,7 @@ class MobileRestClient:
 
         params = {"open_revs": "all"}
 
-        if auth_type == AuthType.session:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, auth=auth)
-        else:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params)
+        resp = self._request("get", "{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -854,12 +882,7 @@ class MobileRestClient:
 
         params = {"open_revs": "all"}
 
-        if auth_type == AuthType.session:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, auth=auth)
-        else:
-            resp = self._session.get("{}/{}/{}".format(url, db, doc_id), headers=headers, params=params)
+        resp = self._request("get", "{}/{}/{}".format(url, db, doc_id), headers=headers, params=params, auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -929,12 +952,7 @@ class MobileRestClient:
                 assert "When the scope is defined, the collection must be  defined  as well"
             url_string = "{}/{}/{}".format(url, db, doc_id)
 
-        if auth_type == AuthType.session:
-            resp = self._session.get(url_string, params=params, cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.get(url_string, params=params, auth=auth)
-        else:
-            resp = self._session.get(url_string, params=params)
+        resp = self._request("get", url_string, params=params, auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -1016,12 +1034,7 @@ class MobileRestClient:
 
         auth_type, auth = get_auth_type(auth)
 
-        if auth_type == AuthType.session:
-            resp = self._session.get("{}/{}/{}/{}".format(url, db, doc_id, attachment_name), headers=headers, cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.get("{}/{}/{}/{}".format(url, db, doc_id, attachment_name), headers=headers, auth=auth)
-        else:
-            resp = self._session.get("{}/{}/{}/{}".format(url, db, doc_id, attachment_name), headers=headers)
+        resp = self._request("get", "{}/{}/{}/{}".format(url, db, doc_id, attachment_name), headers=headers, auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -1101,12 +1114,7 @@ class MobileRestClient:
         doc["_revisions"]["ids"].extend(parent_revision_digests)
 
         params = {"new_edits": "false"}
-        if auth_type == AuthType.session:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc), cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc), auth=auth)
-        else:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc))
+        resp = self._request("put", "{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc), auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -1208,12 +1216,7 @@ class MobileRestClient:
                 raise TimeoutException("Verify Docs Deleted: TIMEOUT")
 
             for doc in docs:
-                if auth_type == AuthType.session:
-                    resp = self._session.get("{}/{}/{}".format(url, db, doc["id"]), cookies=dict(SyncGatewaySession=auth[1]))
-                elif auth_type == AuthType.http_basic:
-                    resp = self._session.get("{}/{}/{}".format(url, db, doc["id"]), auth=auth)
-                else:
-                    resp = self._session.get("{}/{}/{}".format(url, db, doc["id"]))
+                resp = self._request("get", "{}/{}/{}".format(url, db, doc["id"]), auth_type=auth_type, auth=auth)
                 log_r(resp)
                 resp_obj = resp.json()
 
@@ -1320,15 +1323,16 @@ class MobileRestClient:
 
         return purged_docs
 
-    def update_docs(self, url, db, docs, number_updates, delay=None, auth=None, channels=None, property_updater=None):
+    def update_docs(self, url, db, docs, number_updates, delay=None, auth=None, channels=None, property_updater=None, max_workers=2):
         """ Updates docs (using doc["id"]) a number of times. It will wait a number of seconds (delay)
         between each update. The 'property_updater' can specify a custom property to update on each
-        iteration.
+        iteration. Up to 'max_workers' docs are updated at once.
+        For large numbers of docs use update_docs_bulk, which needs no GET / PUT per doc.
         """
 
         updated_docs = []
 
-        with ThreadPoolExecutor(max_workers=2) as executor:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
 
             future_to_url = [
                 executor.submit(
@@ -1351,6 +1355,120 @@ class MobileRestClient:
         logging.debug("url: {} db: {} updated: {}".format(url, db, updated_docs))
         return updated_docs
 
+    def update_docs_bulk(self, url, db, docs, number_updates, batch_size=500, max_in_flight=4, delay=None, retries=3,
+                         auth=None, channels=None, property_updater=None, scope=None, collection=None):
+        """
+        Updates docs 'number_updates' times like update_docs, but each round of updates is written with
+        POST _bulk_docs in batches of 'batch_size', keeping up to 'max_in_flight' requests running.
+        It waits 'delay' seconds between rounds.
+
+        'docs' are the results of a previous write ({"id": .., "rev": ..}, ex. from add_bulk_docs) or
+        doc bodies with "_id" / "_rev". The bodies of docs given as id / rev are fetched once with
+        _bulk_get. After that the revs returned by each write are tracked locally, so only docs that
+        conflict (ex. updated by someone else meanwhile) are fetched again, up to 'retries' times.
+
+        Returns [{"id": .., "rev": ..}] of the last update of each doc, in the order of 'docs'
+        """
+
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size and max_in_flight must be positive")
+        if channels is not None:
+            types.verify_is_list(channels)
+        if property_updater is not None:
+            types.verify_is_callable(property_updater)
+
+        auth_type, request_auth = get_auth_type(auth)
+        server_type = self.get_server_type(url, auth)
+
+        keyspace = db
+        if scope is not None:
+            keyspace = db + "." + scope + "." + collection
+        endpoint = "{}/{}/_bulk_docs".format(url, keyspace)
+
+        def fetch_bodies(doc_ids):
+            bodies = {}
+            for batch in batched(doc_ids, batch_size):
+                fetched, _ = self.get_bulk_docs(url, db, batch, auth=auth, scope=scope, collection=collection)
+                bodies.update((doc["_id"], doc) for doc in fetched)
+            return bodies
+
+        # doc id -> body of its current revision (with "_rev")
+        bodies = {}
+        doc_ids = []
+        to_fetch = []
+        for doc in docs:
+            doc_id = doc.get("_id", doc.get("id"))
+            doc_ids.append(doc_id)
+            if "_id" in doc:
+                bodies[doc_id] = dict(doc)
+            else:
+                to_fetch.append(doc_id)
+        bodies.update(fetch_bodies(to_fetch))
+
+        def updated(body):
+            # Same changes as update_doc, "random" makes each revision unique
+            body = dict(body)
+            body["updates"] = (body.get("updates") or 0) + 1
+            body["random"] = str(uuid.uuid4())
+            if channels is not None:
+                body["channels"] = channels
+            if property_updater is not None:
+                body = property_updater(body)
+            return body
+
+        def write_batch(batch):
+            results = {}
+            pending = list(batch)
+            attempts = 0
+            while pending:
+                if attempts > retries:
+                    raise RestError("Error while updating bulk docs! {}".format([results.get(doc_id, doc_id) for doc_id in pending]))
+                if attempts > 0:
+                    time.sleep(min(2 ** attempts * 0.1, 5))
+                attempts += 1
+
+                new_bodies = [updated(bodies[doc_id]) for doc_id in pending]
+                request_body = {"docs": new_bodies}
+                if server_type == ServerType.listener:
+                    request_body["new_edits"] = True
+
+                try:
+                    resp = self._request("post", endpoint, data=json.dumps(request_body, cls=MyEncoder), auth_type=auth_type, auth=request_auth)
+                    log_r(resp, info=False)
+                    resp.raise_for_status()
+                except RequestException as e:
+                    log_info("_bulk_docs update failed (attempt {}): {}".format(attempts, e))
+                    continue
+
+                conflicts = []
+                for doc_id, body, doc_resp in zip(pending, new_bodies, resp.json()):
+                    results[doc_id] = doc_resp
+                    if "error" not in doc_resp:
+                        body["_rev"] = doc_resp["rev"]
+                        bodies[doc_id] = body
+                    elif doc_resp.get("status") == 409 or doc_resp["error"] == "conflict":
+                        conflicts.append(doc_id)
+                    else:
+                        raise RestError("Error while updating bulk docs! {}".format(doc_resp))
+
+                if conflicts:
+                    log_info("{} docs conflicted, fetching their current revisions".format(len(conflicts)))
+                    bodies.update(fetch_bodies(conflicts))
+                pending = conflicts
+            return results
+
+        log_info("Updating {} docs in {}: {} times".format(len(doc_ids), endpoint, number_updates))
+        last_results = {}
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for update_round in range(number_updates):
+                if update_round > 0 and delay is not None:
+                    logging.debug("Sleeping: {}s ...".format(delay))
+                    time.sleep(delay)
+                for results in executor.map(write_batch, batched(doc_ids, batch_size)):
+                    last_results.update(results)
+
+        return [{"id": doc_id, "rev": last_results[doc_id]["rev"]} for doc_id in doc_ids if doc_id in last_results]
+
     def put_doc(self, url, db, doc_id, doc_body, rev, auth=None):
         """
         Updates a doc with doc id, a given revision, and doc body
@@ -1362,12 +1480,7 @@ class MobileRestClient:
             "rev": rev
         }
 
-        if auth_type == AuthType.session:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc_body), cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc_body), auth=auth)
-        else:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc_body))
+        resp = self._request("put", "{}/{}/{}".format(url, db, doc_id), params=params, data=json.dumps(doc_body), auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -1428,12 +1541,7 @@ class MobileRestClient:
             if property_updater is not None:
                 types.verify_is_callable(property_updater)
                 doc = property_updater(doc)
-            if auth_type == AuthType.session:
-                resp = self._session.put("{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder), cookies=dict(SyncGatewaySession=auth[1]))
-            elif auth_type == AuthType.http_basic:
-                resp = self._session.put("{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder), auth=auth)
-            else:
-                resp = self._session.put("{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder))
+            resp = self._request("put", "{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder), auth_type=auth_type, auth=auth)
 
             log_r(resp, info=False)
             resp.raise_for_status()
@@ -1467,12 +1575,7 @@ class MobileRestClient:
             doc["channels"] = channels
         doc[key] = value
 
-        if auth_type == AuthType.session:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder), cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder), auth=auth)
-        else:
-            resp = self._session.put("{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder))
+        resp = self._request("put", "{}/{}/{}".format(url, db, doc_id), data=json.dumps(doc, cls=MyEncoder), auth_type=auth_type, auth=auth)
 
         log_r(resp, info=False)
         resp.raise_for_status()
@@ -1481,20 +1584,59 @@ class MobileRestClient:
 
         return resp_obj
 
-    def add_docs(self, url, db, number, id_prefix, auth=None, channels=None, generator=None, attachments_generator=None, expiry=None, scope=None, collection=None):
+    def add_docs(self, url, db, number, id_prefix, auth=None, channels=None, generator=None, attachments_generator=None, expiry=None, scope=None, collection=None,
+                 batch_size=None, max_in_flight=4):
         """
         if id_prefix == None, generate a uuid for each doc
 
         Add a 'number' of docs with a prefix 'id_prefix' using the provided generator from libraries.data.doc_generators.
         ex. id_prefix=testdoc with a number of 3 would create 'testdoc_0', 'testdoc_1', and 'testdoc_2'
+
+        If 'batch_size' is set the docs are written with add_bulk_docs_chunked instead of one PUT per doc
         """
         added_docs = []
 
         if channels is not None:
             types.verify_is_list(channels)
 
+        if attachments_generator:
+            types.verify_is_callable(attachments_generator)
+
         log_info("PUT {} docs to {}/{}/ with prefix {}".format(number, url, db, id_prefix))
 
+        doc_bodies = self._iter_doc_bodies(number, id_prefix, channels, generator, attachments_generator, expiry)
+
+        if batch_size is not None:
+            attachment_names = {}
+
+            def remember_attachments(doc_bodies):
+                for doc_body in doc_bodies:
+                    if attachments_generator:
+                        attachment_names[doc_body["_id"]] = list(doc_body["_attachments"].keys())
+                    yield doc_body
+
+            added_docs, _ = self.add_bulk_docs_chunked(url, db, remember_attachments(doc_bodies), batch_size=batch_size, max_in_flight=max_in_flight,
+                                                       auth=auth, scope=scope, collection=collection)
+            if attachments_generator:
+                for doc_obj in added_docs:
+                    doc_obj["attachments"] = attachment_names[doc_obj["id"]]
+        else:
+            for doc_body in doc_bodies:
+                doc_obj = self.add_doc(url, db, doc_body, auth=auth, use_post=False, scope=scope, collection=collection)
+                if attachments_generator:
+                    doc_obj["attachments"] = list(doc_body["_attachments"].keys())
+                added_docs.append(doc_obj)
+
+        # check that the docs returned in the responses equals the expected number
+        if len(added_docs) != number:
+            raise AssertionError("Client was not able to add all docs to: {}".format(url))
+
+        log_info("Added: {} docs".format(len(added_docs)))
+
+        return added_docs
+
+    def _iter_doc_bodies(self, number, id_prefix, channels, generator, attachments_generator, expiry):
+        """ Lazily builds the doc bodies for add_docs """
         for i in range(number):
 
             if generator == "four_k":
@@ -1508,7 +1650,6 @@ class MobileRestClient:
                 doc_body["channels"] = channels
 
             if attachments_generator:
-                types.verify_is_callable(attachments_generator)
                 attachments = attachments_generator()
                 doc_body["_attachments"] = {att.name: {"data": att.data} for att in attachments}
             if expiry is not None:
@@ -1520,19 +1661,7 @@ class MobileRestClient:
                 doc_id = "{}_{}".format(id_prefix, i)
 
             doc_body["_id"] = doc_id
-
-            doc_obj = self.add_doc(url, db, doc_body, auth=auth, use_post=False, scope=scope, collection=collection)
-            if attachments_generator:
-                doc_obj["attachments"] = list(doc_body["_attachments"].keys())
-            added_docs.append(doc_obj)
-
-        # check that the docs returned in the responses equals the expected number
-        if len(added_docs) != number:
-            raise AssertionError("Client was not able to add all docs to: {}".format(url))
-
-        log_info("Added: {} docs".format(len(added_docs)))
-
-        return added_docs
+            yield doc_body
 
     def add_bulk_docs(self, url, db, docs, auth=None, scope=None, collection=None):
         """
@@ -1551,14 +1680,7 @@ class MobileRestClient:
         keyspace = db
         if scope is not None:
             keyspace = db + "." + scope + "." + collection
-        if auth_type == AuthType.session:
-            resp = self._session.post("{}/{}/_bulk_docs".format(url, keyspace),
-                                      data=json.dumps(request_body, cls=MyEncoder),
-                                      cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.post("{}/{}/_bulk_docs".format(url, keyspace), data=json.dumps(request_body), auth=auth)
-        else:
-            resp = self._session.post("{}/{}/_bulk_docs".format(url, keyspace), data=json.dumps(request_body))
+        resp = self._request("post", "{}/{}/_bulk_docs".format(url, keyspace), data=json.dumps(request_body, cls=MyEncoder), auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -1570,6 +1692,147 @@ class MobileRestClient:
 
         return resp_obj
 
+    def add_bulk_docs_chunked(self, url, db, docs, batch_size=500, max_in_flight=4, retries=3, auth=None, scope=None, collection=None):
+        """
+        Writes 'docs' (any iterable, ex. a generator) with POST _bulk_docs in batches of 'batch_size',
+        keeping up to 'max_in_flight' requests running over the client's pooled session.
+        The iterable is consumed lazily, so only the in flight batches are held in memory.
+
+        Transient failures, a request error, a 5xx response or a doc that comes back with a 5xx
+        status, are retried up to 'retries' times without resending the docs that were written.
+        Other errors (ex. 403, 409) raise RestError without retrying. A 409 for a doc whose earlier
+        attempt went unanswered counts as written if the server has that doc as its next revision,
+        since the earlier request may have been committed before it failed.
+
+        Returns (doc results in write order, per batch stats)
+        ex. ([{"id": "doc_0", "rev": "1-..."}, ...], [{"batch": 0, "docs": 500, "attempts": 1, "latency": 0.21}, ...])
+        """
+
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size and max_in_flight must be positive")
+
+        auth_type, auth = get_auth_type(auth)
+        server_type = self.get_server_type(url, auth)
+
+        keyspace = db
+        if scope is not None:
+            keyspace = db + "." + scope + "." + collection
+        endpoint = "{}/{}/_bulk_docs".format(url, keyspace)
+
+        def write_batch(batch_index, batch):
+            results = [None] * len(batch)
+            pending = list(range(len(batch)))
+            # Docs sent in a request whose outcome was not seen, they may have been written
+            unanswered = set()
+            failed = []
+            attempts = 0
+            start = time.time()
+            while pending:
+                if attempts > retries:
+                    failed.extend(results[i] or {"id": batch[i].get("_id"), "error": "request failed"} for i in pending)
+                    break
+                if attempts > 0:
+                    time.sleep(min(2 ** attempts * 0.1, 5))
+                attempts += 1
+
+                request_body = {"docs": [batch[i] for i in pending]}
+                if server_type == ServerType.listener:
+                    request_body["new_edits"] = True
+
+                try:
+                    resp = self._request("post", endpoint, data=json.dumps(request_body, cls=MyEncoder), auth_type=auth_type, auth=auth)
+                    log_r(resp, info=False)
+                    resp.raise_for_status()
+                except RequestException as e:
+                    if e.response is not None and e.response.status_code < 500:
+                        raise RestError("Error while adding bulk docs! batch {}: {}".format(batch_index, e))
+                    log_info("_bulk_docs batch {} failed (attempt {}): {}".format(batch_index, attempts, e))
+                    unanswered.update(pending)
+                    continue
+
+                still_pending = []
+                for i, doc_resp in zip(pending, resp.json()):
+                    results[i] = doc_resp
+                    if "error" not in doc_resp:
+                        continue
+                    status = doc_resp.get("status", 0)
+                    if status >= 500:
+                        still_pending.append(i)
+                        continue
+                    if status == 409 and i in unanswered:
+                        landed = self._bulk_doc_written(url, keyspace, batch[i], auth_type, auth)
+                        if landed is not None:
+                            results[i] = landed
+                            continue
+                    failed.append(doc_resp)
+                pending = still_pending
+
+            if failed:
+                raise RestError("Error while adding bulk docs! batch {}: {}".format(batch_index, failed))
+
+            return results, {"batch": batch_index, "docs": len(batch), "attempts": attempts, "latency": time.time() - start}
+
+        written = {}
+        batch_stats = []
+        in_flight = set()
+        batch = []
+        batch_index = 0
+
+        def collect(done):
+            for future in done:
+                results, stats = future.result()
+                written[stats["batch"]] = results
+                batch_stats.append(stats)
+
+        end = object()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            doc_iter = iter(docs)
+            while True:
+                doc = next(doc_iter, end)
+                if doc is not end:
+                    batch.append(doc)
+                if batch and (len(batch) == batch_size or doc is end):
+                    if len(in_flight) >= max_in_flight:
+                        done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(executor.submit(write_batch, batch_index, batch))
+                    batch = []
+                    batch_index += 1
+                if doc is end:
+                    break
+            collect(concurrent.futures.as_completed(in_flight))
+
+        batch_stats.sort(key=lambda stats: stats["batch"])
+        latencies = [stats["latency"] for stats in batch_stats]
+        if latencies:
+            log_info("_bulk_docs wrote {} batches to {}: min {:.3f}s / avg {:.3f}s / max {:.3f}s per batch".format(
+                len(latencies), endpoint, min(latencies), sum(latencies) / len(latencies), max(latencies)))
+
+        added_docs = [doc_resp for i in range(batch_index) for doc_resp in written[i]]
+        return added_docs, batch_stats
+
+    def _bulk_doc_written(self, url, keyspace, doc, auth_type, auth):
+        """
+        Returns {"id": ..., "rev": ...} if the server's current revision of 'doc' is the one
+        writing 'doc' would have created, else None
+        """
+        doc_id = doc.get("_id")
+        if doc_id is None:
+            return None
+        resp = self._request("get", "{}/{}/{}".format(url, keyspace, doc_id), auth_type=auth_type, auth=auth)
+        log_r(resp, info=False)
+        if resp.status_code != 200:
+            return None
+
+        current = resp.json()
+        generation = int(doc["_rev"].split("-")[0]) + 1 if doc.get("_rev") else 1
+        if int(current["_rev"].split("-")[0]) != generation:
+            return None
+        sent = json.loads(json.dumps(doc, cls=MyEncoder))
+        if {k: v for k, v in current.items() if not k.startswith("_")} != {k: v for k, v in sent.items() if not k.startswith("_")}:
+            return None
+        return {"id": doc_id, "rev": current["_rev"]}
+
     def delete_bulk_docs(self, url, db, docs, auth=None):
         """
         Issues a bulk delete by setting the _deleted flag to true.
@@ -1587,14 +1850,7 @@ class MobileRestClient:
         else:
             request_body = {"docs": docs}
 
-        if auth_type == AuthType.session:
-            resp = self._session.post("{}/{}/_bulk_docs".format(url, db),
-                                      data=json.dumps(request_body),
-                                      cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.post("{}/{}/_bulk_docs".format(url, db), data=json.dumps(request_body), auth=auth)
-        else:
-            resp = self._session.post("{}/{}/_bulk_docs".format(url, db), data=json.dumps(request_body))
+        resp = self._request("post", "{}/{}/_bulk_docs".format(url, db), data=json.dumps(request_body), auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -1620,12 +1876,7 @@ class MobileRestClient:
                 assert "If a scope is defined, there shiuld also be a collection"
             all_docs_url = "{}/{}.{}.{}/_all_docs".format(url, db, scope, collection)
 
-        if auth_type == AuthType.session:
-            resp = self._session.get(all_docs_url, params=params, cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.get(all_docs_url, params=params, auth=auth)
-        else:
-            resp = self._session.get(all_docs_url, params=params)
+        resp = self._request("get", all_docs_url, params=params, auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -1655,26 +1906,20 @@ class MobileRestClient:
         if scope is not None:
             keyspace = db + "." + scope + "." + collection
 
-        if auth_type == AuthType.session:
-            resp = self._session.post("{}/{}/_bulk_get?revs={}".format(url, keyspace, rev_history), data=json.dumps(request_body), cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.post("{}/{}/_bulk_get?revs={}".format(url, keyspace, rev_history), data=json.dumps(request_body), auth=auth)
-        else:
-            resp = self._session.post("{}/{}/_bulk_get?revs={}".format(url, keyspace, rev_history), data=json.dumps(request_body))
+        resp = self._request("post", "{}/{}/_bulk_get?revs={}".format(url, keyspace, rev_history), data=json.dumps(request_body), auth_type=auth_type, auth=auth, stream=True)
 
-        log_r(resp)
+        log_r(resp, body=False)
         resp.raise_for_status()
 
-        resp_obj = parse_multipart_response(resp.text)
-        logging.debug(resp_obj)
-
         docs = []
         errors = []
-        for row in resp_obj["rows"]:
-            if "error" in row:
-                errors.append(row)
-            else:
-                docs.append(row)
+        with resp:
+            for row in multipart.iter_response_docs(resp):
+                if "error" in row:
+                    errors.append(row)
+                else:
+                    docs.append(row)
+        logging.debug(docs)
 
         if len(errors) > 0 and validate:
             raise RestError("_bulk_get recieved errors in the response!{}".format(str(errors)))
@@ -1929,13 +2174,17 @@ class MobileRestClient:
 
         return resp.json()
 
-    def verify_docs_present(self, url, db, expected_docs, auth=None, timeout=CLIENT_REQUEST_TIMEOUT, attachments=False):
+    def verify_docs_present(self, url, db, expected_docs, auth=None, timeout=CLIENT_REQUEST_TIMEOUT, attachments=False,
+                            chunk_size=1000, max_workers=8):
         """
         Verifies the expected docs are present in the database using a polling loop with
         POST _all_docs with Listener and a POST _bulk_get for sync_gateway
 
         expected_docs should be a dict {id: {rev: ""}} or
         a list of {id: {rev: ""}}. If the expected docs are a list, they will be converted to a single map.
+
+        Docs that have been verified are dropped from the polling set, so each retry only requests
+        the docs still outstanding, in chunks of 'chunk_size' ids fetched by up to 'max_workers' threads.
         """
 
         auth_type, auth = get_auth_type(auth)
@@ -1943,6 +2192,7 @@ class MobileRestClient:
 
         logging.debug(expected_docs)
 
+        expected_attachment_map = None
         if isinstance(expected_docs, list):
             # Create single dictionary for comparison, will also blow up for duplicate docs with the same id
             expected_doc_map = {expected_doc["id"]: expected_doc["rev"] for expected_doc in expected_docs}
@@ -1960,104 +2210,101 @@ class MobileRestClient:
 
         log_info("Verify {}/{} has {} docs".format(url, db, len(expected_doc_map)), is_verify=True)
 
+        outstanding = set(expected_doc_map)
         start = time.time()
         while True:
 
             if time.time() - start > timeout:
-                raise TimeoutException("Verify Docs Present: TIMEOUT")
+                raise TimeoutException("Verify Docs Present: TIMEOUT ({} docs missing)".format(len(outstanding)))
+
+            doc_ids = list(outstanding)
+            chunks = [doc_ids[i:i + chunk_size] for i in range(0, len(doc_ids), chunk_size)]
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+                futures = [
+                    executor.submit(
+                        self._verify_docs_chunk,
+                        url,
+                        db,
+                        chunk,
+                        expected_doc_map,
+                        expected_attachment_map,
+                        server_type,
+                        auth_type,
+                        auth
+                    ) for chunk in chunks
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    outstanding.difference_update(future.result())
+
+            log_info("Num found docs: {}".format(len(expected_doc_map) - len(outstanding)))
+            log_info("Num missing docs: {}".format(len(outstanding)))
+
+            if not outstanding:
+                break
 
-            if server_type == ServerType.listener:
+            # Issue the request again for the remaining docs, they may still be replicating
+            logging.debug("Missing Docs = {}".format(sorted(outstanding)))
+            logging.info("Retrying to verify all docs are present ...")
+            time.sleep(1)
 
-                data = {"keys": list(expected_doc_map.keys())}
-                resp = self._session.post("{}/{}/_all_docs".format(url, db), data=json.dumps(data))
-                log_r(resp)
-                resp.raise_for_status()
-                resp_obj = resp.json()
+    def _verify_docs_chunk(self, url, db, doc_ids, expected_doc_map, expected_attachment_map, server_type, auth_type, auth):
+        """
+        Requests one chunk of doc ids and returns the ids that are present with the expected rev
+        (and attachments, if 'expected_attachment_map' is given)
+        """
 
-            elif server_type == ServerType.syncgateway:
+        if server_type == ServerType.listener:
+
+            data = {"keys": doc_ids}
+            resp = self._session.post("{}/{}/_all_docs".format(url, db), data=json.dumps(data))
+            log_r(resp)
+            resp.raise_for_status()
+            resp_obj = resp.json()
 
-                # Constuct _bulk_get body
-                bulk_get_body_id_list = []
-                for key in list(expected_doc_map.keys()):
-                    bulk_get_body_id_list.append({"id": key})
-                bulk_get_body = {"docs": bulk_get_body_id_list}
+        elif server_type == ServerType.syncgateway:
 
-                if auth_type == AuthType.session:
-                    resp = self._session.post("{}/{}/_bulk_get".format(url, db), data=json.dumps(bulk_get_body), cookies=dict(SyncGatewaySession=auth[1]))
-                elif auth_type == AuthType.http_basic:
-                    resp = self._session.post("{}/{}/_bulk_get".format(url, db), data=json.dumps(bulk_get_body), auth=auth)
-                else:
-                    resp = self._session.post("{}/{}/_bulk_get".format(url, db), data=json.dumps(bulk_get_body))
+            # Constuct _bulk_get body
+            bulk_get_body = {"docs": [{"id": doc_id} for doc_id in doc_ids]}
 
-                log_r(resp)
-                resp.raise_for_status()
+            resp = self._request("post", "{}/{}/_bulk_get".format(url, db), data=json.dumps(bulk_get_body), auth_type=auth_type, auth=auth, stream=True)
 
-                resp_obj = parse_multipart_response(resp.text)
+            log_r(resp, body=False)
+            resp.raise_for_status()
 
-            # See any docs were not retured
-            # Mac OSX - {"key":"test_ls_db2_5","error":"not_found"}
-            # Android - {"doc":null,"id":"test_ls_db2_5","key":"test_ls_db2_5","value":{}}
+            # Docs are checked as they are parsed off the stream
+            resp_obj = {"rows": multipart.iter_response_docs(resp)}
 
-            all_docs_returned = True
-            all_attachments_returned = True
-            missing_docs = []
-            missing_attachment_docs = []
+        # See any docs were not retured
+        # Mac OSX - {"key":"test_ls_db2_5","error":"not_found"}
+        # Android - {"doc":null,"id":"test_ls_db2_5","key":"test_ls_db2_5","value":{}}
+        verified = []
+        with resp:
             for resp_doc in resp_obj["rows"]:
                 if "error" in resp_doc or ("value" in resp_doc and len(resp_doc["value"]) == 0):
                     # Doc not found
-                    missing_docs.append(resp_doc)
-                    all_docs_returned = False
-                elif server_type == ServerType.listener and resp_doc["value"]["rev"] != expected_doc_map[resp_doc["id"]]:
-                    # Found the doc but unexpected rev on LiteServ
-                    missing_docs.append(resp_doc)
-                    all_docs_returned = False
-                elif server_type == ServerType.syncgateway and resp_doc["_rev"] != expected_doc_map[resp_doc["_id"]]:
-                    # Found the doc but unexpected rev on LiteServ
-                    missing_docs.append(resp_doc)
-                    all_docs_returned = False
-
-                if attachments and server_type == ServerType.listener:
-                    # Check for an attachment
-                    doc_id = resp_doc["key"]
-                    doc_data = self._session.get("{}/{}/{}".format(url, db, doc_id))
-                    doc_json = doc_data.json()
+                    continue
 
-                    if "_attachments" not in doc_json and "id" in resp_doc and expected_attachment_map[resp_doc["id"]] != list(doc_json["_attachments"].keys()):
-                        all_attachments_returned = False
-                        missing_attachment_docs.append(doc_id)
+                if server_type == ServerType.listener:
+                    doc_id, rev = resp_doc["id"], resp_doc["value"]["rev"]
+                else:
+                    doc_id, rev = resp_doc["_id"], resp_doc["_rev"]
 
-            logging.debug("Missing Docs = {}".format(missing_docs))
-            log_info("Num found docs: {}".format(len(resp_obj["rows"]) - len(missing_docs)))
-            log_info("Num missing docs: {}".format(len(missing_docs)))
+                if doc_id not in expected_doc_map:
+                    raise AssertionError("Unable to verify docs present. Unexpected doc returned: {}".format(doc_id))
 
-            # Issue the request again, docs my still be replicating
-            if not all_docs_returned:
-                logging.info("Retrying to verify all docs are present ...")
-                time.sleep(1)
-                continue
-
-            # Issue the request again, docs my still be replicating
-            if attachments:
-                log_info("Num missing attachment Docs = {}".format(len(missing_attachment_docs)))
-                if not all_attachments_returned:
-                    logging.info("Retrying to verify all attachments are present ...")
-                    time.sleep(1)
+                if rev != expected_doc_map[doc_id]:
+                    # Found the doc but unexpected rev, it may still be replicating
                     continue
 
-            resp_docs = {}
-            for resp_doc in resp_obj["rows"]:
-                if server_type == ServerType.listener:
-                    resp_docs[resp_doc["id"]] = resp_doc["value"]["rev"]
-                elif server_type == ServerType.syncgateway:
-                    resp_docs[resp_doc["_id"]] = resp_doc["_rev"]
-
-            logging.debug("Expected: {}".format(expected_doc_map))
-            logging.debug("Actual: {}".format(resp_docs))
+                if expected_attachment_map is not None and server_type == ServerType.listener:
+                    # Check for an attachment
+                    doc_json = self._session.get("{}/{}/{}".format(url, db, doc_id)).json()
+                    if "_attachments" not in doc_json or expected_attachment_map[doc_id] != list(doc_json["_attachments"].keys()):
+                        continue
 
-            if expected_doc_map != resp_docs:
-                raise AssertionError("Unable to verify docs present. Dictionaries are not equal")
+                verified.append(doc_id)
 
-            break
+        return verified
 
     def stream_continuous_changes(self, url, db, since, auth, filter_type=None, filter_channels=None):
         """
@@ -2084,12 +2331,7 @@ class MobileRestClient:
                     filter_type
                 ))
 
-        if auth_type == AuthType.session:
-            resp = self._session.post("{}/{}/_changes".format(url, db), data=json.dumps(body), cookies=dict(SyncGatewaySession=auth[1]), stream=True)
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.post("{}/{}/_changes".format(url, db), data=json.dumps(body), auth=auth, stream=True)
-        else:
-            resp = self._session.post("{}/{}/_changes".format(url, db), data=json.dumps(body), stream=True)
+        resp = self._request("post", "{}/{}/_changes".format(url, db), data=json.dumps(body), auth_type=auth_type, auth=auth, stream=True)
 
         return resp
 
@@ -2114,12 +2356,7 @@ class MobileRestClient:
             if limit is not None:
                 request_url += "&limit={}".format(limit)
 
-            if auth_type == AuthType.session:
-                resp = self._session.get(request_url, cookies=dict(SyncGatewaySession=auth[1]))
-            elif auth_type == AuthType.http_basic:
-                resp = self._session.get(request_url, auth=auth)
-            else:
-                resp = self._session.get(request_url)
+            resp = self._request("get", request_url, auth_type=auth_type, auth=auth)
 
         elif server_type == ServerType.syncgateway:
 
@@ -2161,12 +2398,7 @@ class MobileRestClient:
 
             log_info("Using POST data: {}".format(body))
 
-            if auth_type == AuthType.session:
-                resp = self._session.post("{}/{}/_changes".format(url, db), data=json.dumps(body), cookies=dict(SyncGatewaySession=auth[1]))
-            elif auth_type == AuthType.http_basic:
-                resp = self._session.post("{}/{}/_changes".format(url, db), data=json.dumps(body), auth=auth)
-            else:
-                resp = self._session.post("{}/{}/_changes".format(url, db), data=json.dumps(body))
+            resp = self._request("post", "{}/{}/_changes".format(url, db), data=json.dumps(body), auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -2381,21 +2613,10 @@ class MobileRestClient:
                 raise RestError("Could not get view after retries!")
 
             try:
-                if auth_type == AuthType.session:
-                    resp = self._session.get(url, params=params, cookies=dict(SyncGatewaySession=auth[1]))
-                    log_r(resp)
-                    resp.raise_for_status()
-                    break
-                elif auth_type == AuthType.http_basic:
-                    resp = self._session.get(url, params=params, auth=auth)
-                    log_r(resp)
-                    resp.raise_for_status()
-                    break
-                else:
-                    resp = self._session.get(url, params=params)
-                    log_r(resp)
-                    resp.raise_for_status()
-                    break
+                resp = self._request("get", url, params=params, auth_type=auth_type, auth=auth)
+                log_r(resp)
+                resp.raise_for_status()
+                break
             except HTTPError as he:
                 # It is possible that the view is not inialized.
                 # The server will return 500 in this case, handle this with a few retries.
@@ -2537,12 +2758,7 @@ class MobileRestClient:
             params["include_docs"] = "true"
             params["style"] = "all_docs"
 
-        if auth_type == AuthType.session:
-            resp = self._session.get("{}/{}/_changes".format(url, db), params=params, cookies=dict(SyncGatewaySession=auth[1]))
-        elif auth_type == AuthType.http_basic:
-            resp = self._session.get("{}/{}/_changes".format(url, db), params=params, auth=auth)
-        else:
-            resp = self._session.get("{}/{}/_changes".format(url, db), params=params)
+        resp = self._request("get", "{}/{}/_changes".format(url, db), params=params, auth_type=auth_type, auth=auth)
 
         log_r(resp)
         resp.raise_for_status()
@@ -13,6 +13,7 @@ from keywords.utils import log_r
 from keywords.utils import version_and_build
 from keywords.utils import hostname_for_url, ip_from_url
 from keywords.utils import log_info
+from keywords.waiter import wait_until
 from utilities.cluster_config_utils import get_revs_limit, is_x509_auth, generate_x509_certs, get_cbs_primary_nodes_str
 from keywords.exceptions import ProvisioningError, Error
 from libraries.provision.ansible_runner import AnsibleRunner
@@ -1383,17 +1384,12 @@ def update_replication_in_sgw_config(sg_conf_name, sg_mode, repl_remote, repl_re
 
 
 def wait_until_docs_imported_from_server(sg_admin_url, sg_client, sg_db, expected_docs, prev_import_count, auth=None, timeout=5):
-    sg_expvars = sg_client.get_expvars(sg_admin_url, auth=auth)
-    sg_import_count = sg_expvars["syncgateway"]["per_db"][sg_db]["shared_bucket_import"]["import_count"]
-    count = 0
-    while True:
+    def docs_imported():
         sg_expvars = sg_client.get_expvars(sg_admin_url, auth=auth)
         sg_import_count = sg_expvars["syncgateway"]["per_db"][sg_db]["shared_bucket_import"]["import_count"]
-        import_count = sg_import_count - prev_import_count
-        if count > timeout or import_count >= expected_docs:
-            break
-        time.sleep(1)
-        count += 1
+        return sg_import_count - prev_import_count >= expected_docs
+
+    wait_until(docs_imported, timeout, name="wait_until_docs_imported_from_server", raise_on_timeout=False)
 
 
 def replace_xattrs_sync_func_in_config(sg_config, channel, enable_xattrs_key=True):
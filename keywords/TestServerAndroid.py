@@ -1,7 +1,7 @@
 import os
 import subprocess
 
-import requests
+from keywords.ArtifactCache import download_artifact
 from keywords.TestServerBase import TestServerBase
 from keywords.constants import LATEST_BUILDS, RELEASED_BUILDS
 from keywords.constants import BINARY_DIR
@@ -90,10 +90,7 @@ class TestServerAndroid(TestServerBase):
             url = "{}/{}/{}/{}/{}".format(LATEST_BUILDS, self.download_source, version, build, self.package_name)
 
         log_info("Downloading {} -> {}/{}".format(url, BINARY_DIR, self.package_name))
-        resp = requests.get(url, verify=False)
-        resp.raise_for_status()
-        with open("{}/{}".format(BINARY_DIR, self.package_name), "wb") as f:
-            f.write(resp.content)
+        download_artifact(url, expected_binary_path, self.download_source, version, build, self.platform, verify=False)
 
     def install(self):
         """Install the apk to running Android device or emulator"""
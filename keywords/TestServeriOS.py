@@ -4,8 +4,8 @@ import re
 import time
 from zipfile import ZipFile
 from shutil import copyfile
-import requests
 
+from keywords.ArtifactCache import download_artifact
 from keywords.TestServerBase import TestServerBase
 from keywords.constants import BINARY_DIR
 from keywords.constants import RELEASED_BUILDS
@@ -105,6 +105,7 @@ class TestServeriOS(TestServerBase):
         # Package not downloaded, proceed to download from latest builds
         downloaded_package_zip_name = "{}/{}".format(BINARY_DIR, self.package_name)
         if self.platform == "ios":
+            download_source = "couchbase-lite-ios"
             if self.build is None:
                 if self.version < "2.0.2":
                     url = "{}/couchbase-lite/ios/{}/{}".format(RELEASED_BUILDS, self.version, self.package_name)
@@ -113,21 +114,20 @@ class TestServeriOS(TestServerBase):
             else:
                 url = "{}/couchbase-lite-ios/{}/{}/{}".format(LATEST_BUILDS, self.version, self.build, self.package_name)
         elif self.platform == "c-ios":
+            download_source = "couchbase-lite-c"
             if self.build is None:
                 url = "{}/couchbase-lite-c/{}/{}".format(RELEASED_BUILDS, self.version, self.package_name)
             else:
                 url = "{}/couchbase-lite-c/{}/{}/{}".format(LATEST_BUILDS, self.version, self.build, self.package_name)
         else:
+            download_source = "couchbase-lite-net"
             if self.build is None:
                 url = "{}/couchbase-lite-net/{}/{}".format(RELEASED_BUILDS, self.version, self.package_name)
             else:
                 url = "{}/couchbase-lite-net/{}/{}/{}".format(LATEST_BUILDS, self.version, self.build, self.package_name)
 
         log_info("Downloading {} -> {}/{}".format(url, BINARY_DIR, self.package_name))
-        resp = requests.get(url, verify=False)
-        resp.raise_for_status()
-        with open("{}/{}".format(BINARY_DIR, self.package_name), "wb") as f:
-            f.write(resp.content)
+        download_artifact(url, downloaded_package_zip_name, download_source, self.version, self.build, self.platform, verify=False)
         extracted_directory_name = downloaded_package_zip_name.replace(".zip", "")
         with ZipFile("{}".format(downloaded_package_zip_name)) as zip_f:
             zip_f.extractall("{}".format(extracted_directory_name))
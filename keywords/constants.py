@@ -12,6 +12,10 @@ BUCKET_LIST = "resources/database_configs/buckets_config_list.json"
 SGW_DB_CONFIGS = "resources/database_configs"
 SYNC_GATEWAY_CERT = "resources/sync_gateway_cert"
 DATA_DIR = "resources/data"
+DATASET_SNAPSHOTS_DIR = "resources/dataset_snapshots"
+# Downloaded packages shared by the jobs on a machine, ARTIFACT_CACHE_DIR in the environment overrides it
+ARTIFACT_CACHE_DIR = "deps/artifact_cache"
+ARTIFACT_CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024
 ENVIRONMENT_FILE = "resources/data/environment_file.txt"
 
 MAX_RETRIES = 10
@@ -19,6 +23,7 @@ MAX_RETRIES = 10
 CLIENT_REQUEST_TIMEOUT = 180
 REBALANCE_TIMEOUT_SECS = 3600
 REMOTE_EXECUTOR_TIMEOUT = 180
+REMOTE_EXECUTOR_KEEPALIVE = 30
 SDK_TIMEOUT = 3600
 
 SERVER_IP = "172.23.104.129"
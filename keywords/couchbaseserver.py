@@ -10,6 +10,7 @@ from couchbase.exceptions import CouchbaseException, DocumentNotFoundException,
 from couchbase.cluster import QueryIndexManager, PasswordAuthenticator, ClusterTimeoutOptions, ClusterOptions, Cluster
 import keywords.constants
 from keywords.remoteexecutor import RemoteExecutor
+from keywords.waiter import Backoff, wait_until
 from keywords.exceptions import CBServerError, ProvisioningError, TimeoutError, RBACUserCreationError
 from libraries.provision.ansible_runner import AnsibleRunner
 from keywords.utils import log_r, log_info, log_debug, log_error, hostname_for_url, host_for_url
@@ -94,10 +95,8 @@ class CouchbaseServer:
         if self.cbs_ssl:
             self._session.verify = False
 
-    def get_bucket_names(self):
-        """ Returns list of the bucket names for a given Couchbase Server."""
-
-        bucket_names = []
+    def get_buckets(self):
+        """ Returns the bucket details (name, quota, storageBackend, nodes, ...) for a given Couchbase Server."""
 
         error_count = 0
         # Retry to avoid intermittent Connection issues when getting buckets
@@ -114,10 +113,12 @@ class CouchbaseServer:
                 error_count += 1
                 time.sleep(1)
 
-        obj = json.loads(resp.text)
+        return json.loads(resp.text)
 
-        for entry in obj:
-            bucket_names.append(entry["name"])
+    def get_bucket_names(self):
+        """ Returns list of the bucket names for a given Couchbase Server."""
+
+        bucket_names = [entry["name"] for entry in self.get_buckets()]
 
         log_info("Found buckets: {}".format(bucket_names))
         return bucket_names
@@ -189,6 +190,10 @@ class CouchbaseServer:
         if len(bucket_names) != 0:
             raise CBServerError("Failed to delete all of the server buckets!")
 
+        self._delete_indexes_and_prepareds()
+
+    def _delete_indexes_and_prepareds(self):
+        """ Deletes the indexes and prepared statements left behind by the previous test """
         # verify all indexes are deleted
         count = 0
         index_url = self.url.replace("8091", "9102")
@@ -239,38 +244,25 @@ class CouchbaseServer:
         Verify all server node is in are in a "healthy" state to avoid sync_gateway startup failures
         Work around for this - https://github.com/couchbase/sync_gateway/issues/1745
         """
-        start = time.time()
-        while True:
-
-            elapsed = time.time()
-            if elapsed - start > keywords.constants.CLIENT_REQUEST_TIMEOUT:
-                raise Exception("Timeout: Server not in ready state! {}s".format(elapsed))
-
+        def all_nodes_healthy():
             # Verfy the server is in a "healthy", not "warmup" state
-            try:
-                resp = self._session.get("{}/pools/nodes".format(self.url))
-                log_r(resp)
-            except ConnectionError:
-                # If bringing a server online, there may be some connnection issues. Continue and try again.
-                time.sleep(1)
-                continue
-
+            resp = self._session.get("{}/pools/nodes".format(self.url))
+            log_r(resp)
             resp_obj = resp.json()
 
-            all_nodes_healthy = True
             for node in resp_obj["nodes"]:
                 if node["status"] != "healthy":
-                    all_nodes_healthy = False
                     log_info("Node is still not healthy. Status: {} Retrying ...".format(node["status"]))
-                    time.sleep(1)
+                    return None
+            return resp_obj
 
-            if not all_nodes_healthy:
-                continue
+        # If bringing a server online, there may be some connnection issues. Try again.
+        resp_obj = wait_until(all_nodes_healthy, keywords.constants.CLIENT_REQUEST_TIMEOUT,
+                              name="CouchbaseServer.wait_for_ready_state", retry_on=ConnectionError,
+                              timeout_message="Timeout: Server not in ready state!")
 
-            log_info("All nodes are healthy")
-            log_debug(resp_obj)
-            # All nodes are heathy if it made it to here
-            break
+        log_info("All nodes are healthy")
+        log_debug(resp_obj)
 
     def _create_internal_rbac_user_request(self, data):
         # make api request to create internal rbac user
@@ -405,8 +397,9 @@ class CouchbaseServer:
             resp_json = resp.json()
             log_info("resp_json of get_total_ram mb : ", resp_json)
             mem_total_lowest = self._get_mem_total_lowest(resp_json)
-            time.sleep(5)
             count += 1
+            if mem_total_lowest is None:
+                time.sleep(5)
         if mem_total_lowest is None:
             raise ProvisioningError("All nodes reported 0MB of RAM available")
 
@@ -463,12 +456,13 @@ class CouchbaseServer:
         for bucket_name in buckets_to_create:
             self.create_bucket(cluster_config, bucket_name, per_bucket_ram_mb, ipv6)
 
-    def create_bucket(self, cluster_config, name, ram_quota_mb=1024, ipv6=False):
+    def create_bucket(self, cluster_config, name, ram_quota_mb=1024, ipv6=False, wait_until_ready=True):
         """
         1. Create CBS bucket via REST
         2. Create client connection and poll until bucket is available
            Catch all connection exception and break when KeyNotFound error is thrown
-        3. Verify all server nodes are in a 'healthy' state before proceeding
+        3. Verify all server nodes are in a 'healthy' state before proceeding,
+           unless 'wait_until_ready' is False (see wait_for_buckets_ready)
 
         Followed the docs below that suggested this approach.
         http://docs.couchbase.com/admin/admin/REST/rest-bucket-create.html
@@ -485,11 +479,7 @@ class CouchbaseServer:
             "bucketType": "couchbase",
             "flushEnabled": "1"
         }
-        if is_magma_enabled(cluster_config):
-            magma_data = {"storageBackend": "magma"}
-            data.update(magma_data)
-        else:
-            data["storageBackend"] = "couchstore"
+        data["storageBackend"] = self._storage_backend(cluster_config)
         if server_major_version <= 4:
             # Create a bucket with password for server_major_version < 5
             # proxyPort should not be passed for 5.0.0 onwards for bucket creation
@@ -526,9 +516,117 @@ class CouchbaseServer:
         except CouchbaseException as e:
             log_info("Error from server: {} ...".format(e))
 
-        self.wait_for_ready_state()
+        if wait_until_ready:
+            self.wait_for_ready_state()
         return name
 
+    @staticmethod
+    def _storage_backend(cluster_config):
+        return "magma" if is_magma_enabled(cluster_config) else "couchstore"
+
+    @staticmethod
+    def _bucket_is_reusable(bucket, ram_quota_mb, storage_backend):
+        """ True if 'bucket' (from get_buckets) has the settings create_bucket would give it """
+        return all([
+            bucket.get("bucketType") in ("membase", "couchbase"),
+            bucket["quota"]["rawRAM"] // (1024 * 1024) == ram_quota_mb,
+            bucket.get("storageBackend", "couchstore") == storage_backend,
+            "flush" in bucket.get("controllers", {}),
+        ])
+
+    def flush_bucket(self, name):
+        """ Deletes every doc of bucket 'name' (the bucket must be created with flush enabled) """
+        log_info("Flushing bucket {}".format(name))
+
+        def flushed():
+            resp = self._session.post("{}/pools/default/buckets/{}/controller/doFlush".format(self.url, name))
+            log_r(resp)
+            resp.raise_for_status()
+            return True
+
+        # Flush is refused while the bucket is still warming up
+        wait_until(flushed, keywords.constants.CLIENT_REQUEST_TIMEOUT, name="CouchbaseServer.flush_bucket",
+                   retry_on=HTTPError, timeout_message="Could not flush bucket {}".format(name))
+
+    def _drop_custom_scopes(self, name):
+        """ Drops the scopes and collections a previous test added to bucket 'name' """
+        resp = self._session.get("{}/pools/default/buckets/{}/scopes".format(self.url, name))
+        if resp.status_code == 404:
+            # Server without collections
+            return
+        log_r(resp)
+        resp.raise_for_status()
+
+        for scope in resp.json()["scopes"]:
+            if scope["name"] == "_system":
+                continue
+            if scope["name"] != "_default":
+                resp = self._session.delete("{}/pools/default/buckets/{}/scopes/{}".format(self.url, name, scope["name"]))
+                log_r(resp)
+                resp.raise_for_status()
+                continue
+            for collection in scope["collections"]:
+                if collection["name"] == "_default":
+                    continue
+                resp = self._session.delete("{}/pools/default/buckets/{}/scopes/_default/collections/{}".format(self.url, name, collection["name"]))
+                log_r(resp)
+                resp.raise_for_status()
+
+    def wait_for_buckets_ready(self, bucket_names, timeout=keywords.constants.CLIENT_REQUEST_TIMEOUT):
+        """
+        Waits until every bucket in 'bucket_names' is healthy on all of its nodes.
+        Reads the readiness of all buckets from one bucket listing per check, so
+        buckets that are already warm return on the first check.
+        """
+        def buckets_ready():
+            buckets = {bucket["name"]: bucket for bucket in self.get_buckets()}
+            for bucket_name in bucket_names:
+                bucket = buckets.get(bucket_name)
+                if bucket is None or not bucket.get("nodes"):
+                    return False
+                unhealthy = [node["hostname"] for node in bucket["nodes"] if node["status"] != "healthy"]
+                if unhealthy:
+                    log_info("Bucket {} is not ready on {}".format(bucket_name, unhealthy))
+                    return False
+            return True
+
+        wait_until(buckets_ready, timeout, name="CouchbaseServer.wait_for_buckets_ready", retry_on=ConnectionError,
+                   timeout_message="Buckets {} not ready!".format(bucket_names))
+
+    def recycle_buckets(self, bucket_names, cluster_config, ipv6=False):
+        """
+        Alternative to delete_buckets + create_buckets that avoids bucket warmup.
+        Buckets in 'bucket_names' that already have the RAM quota and settings
+        create_buckets would give them are flushed and stripped of custom scopes and
+        collections. Other buckets are deleted, missing ones are created.
+        Returns the names of the buckets that were reused.
+        """
+        types.verify_is_list(bucket_names)
+
+        buckets = {bucket["name"]: bucket for bucket in self.get_buckets()}
+        ram_quota_mb = self.get_ram_per_bucket(len(bucket_names))
+        storage_backend = self._storage_backend(cluster_config)
+
+        reusable = [name for name in bucket_names
+                    if name in buckets and self._bucket_is_reusable(buckets[name], ram_quota_mb, storage_backend)]
+        stale = [name for name in buckets if name not in reusable]
+        log_info("Reusing buckets: {}, deleting buckets: {}".format(reusable, stale))
+
+        for name in stale:
+            self.delete_bucket(name)
+        self._delete_indexes_and_prepareds()
+
+        for name in reusable:
+            self.flush_bucket(name)
+            self._drop_custom_scopes(name)
+
+        for name in bucket_names:
+            if name not in reusable:
+                self.create_bucket(cluster_config, name, ram_quota_mb, ipv6, wait_until_ready=False)
+
+        self.wait_for_buckets_ready(bucket_names)
+        return reusable
+
     def delete_couchbase_server_cached_rev_bodies(self, bucket, ipv6=False):
         """
         Deletes docs that follow the below format
@@ -613,43 +711,33 @@ class CouchbaseServer:
         ]
         """
 
-        # Check that rebalance is in the tasks before polling for its completion
-        start = time.time()
-        found_rebalance = False
-        while not found_rebalance:
-
-            if time.time() - start > keywords.constants.CLIENT_REQUEST_TIMEOUT:
-                raise TimeoutError("Did not find rebalance task!")
-
-            tasks = self._get_tasks()
-            for task in tasks:
+        def rebalance_found():
+            for task in self._get_tasks():
                 if task["type"] == "rebalance":
                     log_info("Rebalance found in tasks!")
-                    found_rebalance = True
+                    return True
+            log_info("Did not find rebalance task. Retrying.")
+            return False
 
-            if not found_rebalance:
-                log_info("Did not find rebalance task. Retrying.")
-                time.sleep(1)
-
-        start = time.time()
-        while True:
-            if time.time() - start > keywords.constants.REBALANCE_TIMEOUT_SECS:
-                raise Exception("wait_for_rebalance_complete: TIMEOUT")
-
-            tasks = self._get_tasks()
-            done_rebalacing = True
-            for task in tasks:
+        def done_rebalancing():
+            done = True
+            for task in self._get_tasks():
                 # loop through each task and see if any rebalance tasks are running
                 task_type = task["type"]
                 task_status = task["status"]
                 log_info("{} is {}".format(task_type, task_status))
                 if task_type == "rebalance" and task_status == "running":
-                    done_rebalacing = False
+                    done = False
+            return done
 
-            if done_rebalacing:
-                break
+        # Check that rebalance is in the tasks before polling for its completion
+        wait_until(rebalance_found, keywords.constants.CLIENT_REQUEST_TIMEOUT,
+                   name="CouchbaseServer._wait_for_rebalance_complete.found",
+                   timeout_message="Did not find rebalance task!")
 
-            time.sleep(5)
+        wait_until(done_rebalancing, keywords.constants.REBALANCE_TIMEOUT_SECS,
+                   name="CouchbaseServer._wait_for_rebalance_complete", backoff=Backoff(initial=1, maximum=10),
+                   timeout_message="wait_for_rebalance_complete: TIMEOUT")
 
     def add_node(self, server_to_add, services="kv"):
         """
@@ -136,6 +136,17 @@ def create_docs(doc_id_prefix, number, content=None, attachments_generator=None,
     ]
     """
 
+    return list(iter_docs(doc_id_prefix, number, content=content, attachments_generator=attachments_generator, expiry=expiry,
+                          channels=channels, prop_generator=prop_generator, non_sgw=non_sgw))
+
+
+def iter_docs(doc_id_prefix, number, content=None, attachments_generator=None, expiry=None, channels=None, prop_generator=None, non_sgw=False):
+    """
+    Lazy version of create_docs. Yields the same document bodies one at a time,
+    so large datasets (and their attachment data) are never all held in memory.
+    Arguments are validated when this is called, not on the first next().
+    """
+
     if channels is None:
         channels = []
 
@@ -144,8 +155,10 @@ def create_docs(doc_id_prefix, number, content=None, attachments_generator=None,
     if attachments_generator is not None:
         types.verify_is_callable(attachments_generator)
 
-    docs = []
+    return _iter_docs(doc_id_prefix, number, content, attachments_generator, expiry, channels, prop_generator, non_sgw)
+
 
+def _iter_docs(doc_id_prefix, number, content, attachments_generator, expiry, channels, prop_generator, non_sgw):
     for i in range(number):
 
         if doc_id_prefix is None:
@@ -158,7 +171,28 @@ def create_docs(doc_id_prefix, number, content=None, attachments_generator=None,
         if attachments_generator is not None:
             attachments = attachments_generator()
 
-        doc = create_doc(doc_id=doc_id, content=content, attachments=attachments, expiry=expiry, channels=channels, prop_generator=prop_generator, non_sgw=non_sgw)
-        docs.append(doc)
+        yield create_doc(doc_id=doc_id, content=content, attachments=attachments, expiry=expiry, channels=channels, prop_generator=prop_generator, non_sgw=non_sgw)
+
+
+def batched(docs, batch_size):
+    """
+    Groups any iterable of docs into lists of at most 'batch_size' docs, consuming it lazily
+    ex. batched(iter_docs("doc", 5), 2) -> [doc_0, doc_1], [doc_2, doc_3], [doc_4]
+    """
+
+    if batch_size < 1:
+        raise ValueError("'batch_size' must be positive")
+
+    return _batched(docs, batch_size)
+
+
+def _batched(docs, batch_size):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
 
-    return docs
+    if batch:
+        yield batch
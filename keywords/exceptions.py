@@ -72,3 +72,11 @@ class ConnectionError(Error):
 
 class ChunkedEncodingError(Error):
     pass
+
+
+class DatasetSnapshotError(Error):
+    pass
+
+
+class ArtifactCacheError(Error):
+    pass
@@ -0,0 +1,157 @@
+import base64
+import json
+import logging
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_FILENAME_RE = re.compile(r'filename="?([^";]+)"?', re.IGNORECASE)
+
+
+def get_boundary(content_type):
+    """
+    Returns the boundary (as bytes) from a multipart Content-Type header
+    ex. 'multipart/mixed; boundary="abc"' -> b'abc'
+    """
+    match = _BOUNDARY_RE.search(content_type or "")
+    if match is None:
+        raise ValueError("No multipart boundary in Content-Type: {}".format(content_type))
+    return match.group(1).strip().encode("utf-8")
+
+
+def _split_part(part):
+    """ Splits a raw MIME part into (headers, body). Header names are lower cased. """
+    if part.startswith(b"\r\n") or part.startswith(b"\n"):
+        # Part without headers
+        return {}, part.split(b"\n", 1)[1]
+
+    crlf = part.find(b"\r\n\r\n")
+    lf = part.find(b"\n\n")
+    if crlf >= 0 and (lf < 0 or crlf < lf):
+        raw_headers, body = part[:crlf], part[crlf + 4:]
+    elif lf >= 0:
+        raw_headers, body = part[:lf], part[lf + 2:]
+    else:
+        raw_headers, body = part, b""
+
+    headers = {}
+    for line in raw_headers.decode("utf-8").splitlines():
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return headers, body
+
+
+def iter_parts(chunks, boundary):
+    """
+    Incrementally parses a multipart body delivered as an iterable of byte chunks
+    (ex. resp.iter_content()) and yields (headers, body) for each part as soon as
+    its closing boundary has arrived. Only the current part is held in memory.
+    """
+    delimiter = b"\n--" + boundary
+    # Leading newline lets the first boundary match the same delimiter as the rest
+    buf = bytearray(b"\n")
+    scan_from = 0
+    in_part = False
+    closed = False
+
+    for chunk in chunks:
+        if closed or not chunk:
+            # Keep reading past the closing boundary so a streamed connection is released to the pool
+            continue
+        buf += chunk
+        while True:
+            index = buf.find(delimiter, scan_from)
+            if index < 0:
+                # The delimiter may straddle this chunk and the next one
+                scan_from = max(0, len(buf) - len(delimiter))
+                break
+
+            after = index + len(delimiter)
+            if len(buf) < after + 2:
+                scan_from = index
+                break
+
+            closing = buf[after:after + 2] == b"--"
+            eol = -1 if closing else buf.find(b"\n", after)
+            if not closing and eol < 0:
+                scan_from = index
+                break
+
+            if in_part:
+                part = bytes(buf[:index])
+                if part.endswith(b"\r"):
+                    part = part[:-1]
+                yield _split_part(part)
+
+            if closing:
+                closed = True
+                del buf[:]
+                break
+
+            del buf[:eol + 1]
+            scan_from = 0
+            in_part = True
+
+    # Tolerate a body that ends without the closing boundary
+    if not closed and in_part and bytes(buf).strip():
+        yield _split_part(bytes(buf).rstrip(b"\r\n"))
+
+
+def _parse_json(body):
+    try:
+        return json.loads(body.decode("utf-8"))
+    except ValueError as e:
+        # A few parts from the response can't be parsed as docs
+        logging.error("Could not parse docs as JSON: {} error: {}".format(body, e))
+        return None
+
+
+def _related_doc(headers, body):
+    """
+    Builds a doc from a multipart/related part (a doc with attachments that 'follow').
+    Attachment bodies are stored base64 encoded in _attachments[name]["data"], the same
+    shape Sync Gateway returns for inline attachments.
+    """
+    doc = None
+    for part_headers, part_body in iter_parts([body], get_boundary(headers["content-type"])):
+        if doc is None and part_headers.get("content-type", "").startswith("application/json"):
+            doc = _parse_json(part_body)
+            continue
+
+        match = _FILENAME_RE.search(part_headers.get("content-disposition", ""))
+        if doc is None or match is None:
+            continue
+        attachment = doc.setdefault("_attachments", {}).setdefault(match.group(1), {})
+        attachment.pop("follows", None)
+        attachment["data"] = base64.b64encode(part_body).decode("ascii")
+    return doc
+
+
+def iter_docs(chunks, boundary):
+    """
+    Yields the JSON docs of a _bulk_get style multipart body as they arrive.
+    Error rows (ex. {"error": "not_found", "id": ...}) are yielded like any other doc.
+    """
+    for headers, body in iter_parts(chunks, boundary):
+        content_type = headers.get("content-type", "application/json")
+        if content_type.startswith("multipart/"):
+            doc = _related_doc(headers, body)
+        elif content_type.startswith("application/json"):
+            doc = _parse_json(body)
+        else:
+            logging.debug("Skipping multipart part with Content-Type: {}".format(content_type))
+            continue
+
+        if doc is not None:
+            yield doc
+
+
+def iter_response_docs(resp, chunk_size=CHUNK_SIZE):
+    """
+    Yields the docs of a multipart requests.Response, reading it with iter_content.
+    Issue the request with stream=True so the body is not buffered up front.
+    """
+    boundary = get_boundary(resp.headers.get("Content-Type"))
+    return iter_docs(resp.iter_content(chunk_size=chunk_size), boundary)
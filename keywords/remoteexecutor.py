@@ -1,18 +1,33 @@
+import atexit
+import collections
+import threading
+
 import paramiko
 import ansible.constants
 
 from keywords.exceptions import RemoteCommandError
 from keywords.utils import log_info
-from keywords.constants import REMOTE_EXECUTOR_TIMEOUT
+from keywords.constants import REMOTE_EXECUTOR_KEEPALIVE, REMOTE_EXECUTOR_TIMEOUT
 from utilities.cluster_config_utils import load_cluster_config_json
 
+# Lines of stdout / stderr kept per command (the most recent ones). Use on_stdout / on_stderr to see all of it
+MAX_OUTPUT_LINES = 100000
+
 
-def stream_output(stdio_file_stream):
-    lines = []
+def stream_output(stdio_file_stream, on_line=None, max_lines=MAX_OUTPUT_LINES, echo=True):
+    """
+    Reads a command's output line by line as it arrives. Each line is printed (if 'echo'),
+    passed to 'on_line' and kept in a ring buffer of the last 'max_lines' lines
+    (None keeps everything), which is returned as a list.
+    """
+    lines = collections.deque(maxlen=max_lines)
     for line in stdio_file_stream:
-        print(line)
+        if echo:
+            print(line)
+        if on_line is not None:
+            on_line(line)
         lines.append(line)
-    return lines
+    return list(lines)
 
 
 class RemoteExecutor:
@@ -21,12 +36,17 @@ class RemoteExecutor:
     has passwordless ssh access to the host you are communicating with.
     This username is set as the 'remote_user' in your ansible.cfg file,
     located in the root of the repository
+
+    SSH connections are pooled per (host, username) and stay open between commands
+    (and RemoteExecutor instances) until close_all() or interpreter exit. They send
+    keepalives so that idle pooled connections are not dropped along the way.
     """
 
+    _connections = {}
+    _connect_locks = {}
+    _connections_lock = threading.Lock()
+
     def __init__(self, host, sg_platform="debian", username=None, password=None, cluster_config=None):
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.client = client
         self.host = host
         self.sg_platform = sg_platform
         if "[" in self.host:
@@ -38,57 +58,119 @@ class RemoteExecutor:
                 username = json_cluster["sync_gateways:vars"]["ansible_user"]
                 password = json_cluster["sync_gateways:vars"]["ansible_password"]
         self.username = ansible.constants.DEFAULT_REMOTE_USER
+        self.password = None
         if username is not None:
             self.username = username
             self.password = password
 
-    def execute(self, command):
-        """Executes a shell command on a remote host.
-        It will stream the stdout and stderr and return an error code
-        """
+    def _uses_password(self):
+        return self.sg_platform == "windows" or self.sg_platform.startswith("c-") or "macos" in self.sg_platform
 
-        log_info("Connecting to {}".format(self.host))
-        log_info("Running '{}' on host {}".format(command, self.host))
+    def _connect(self):
+        """ Returns an open SSH connection to the host, reusing the pooled one when it is still alive """
+        key = (self.host, self.username)
+        with RemoteExecutor._connections_lock:
+            connect_lock = RemoteExecutor._connect_locks.setdefault(key, threading.Lock())
+
+        # Only connects to the same host wait for each other, handshakes with other hosts go ahead
+        with connect_lock:
+            with RemoteExecutor._connections_lock:
+                client = RemoteExecutor._connections.get(key)
+            transport = client.get_transport() if client is not None else None
+            if transport is not None and transport.is_active():
+                return client
+
+            log_info("Connecting to {}".format(self.host))
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            if self._uses_password():
+                client.connect(self.host, username=self.username, password=self.password, banner_timeout=REMOTE_EXECUTOR_TIMEOUT)
+            else:
+                client.connect(self.host, username=self.username, banner_timeout=REMOTE_EXECUTOR_TIMEOUT)
+            client.get_transport().set_keepalive(REMOTE_EXECUTOR_KEEPALIVE)
+            with RemoteExecutor._connections_lock:
+                RemoteExecutor._connections[key] = client
+            return client
+
+    def _discard(self, client):
+        """ Closes 'client' and drops it from the pool, unless another thread has already replaced it """
+        key = (self.host, self.username)
+        with RemoteExecutor._connections_lock:
+            if RemoteExecutor._connections.get(key) is client:
+                del RemoteExecutor._connections[key]
+        client.close()
+
+    def _exec_command(self, client, command):
         if self.sg_platform == "windows":
-            self.client.connect(self.host, username=self.username, password=self.password, banner_timeout=REMOTE_EXECUTOR_TIMEOUT)
             command = "cmd /c " + command
-            stdin, stdout, stderr = self.client.exec_command(command, timeout=60)
+            return client.exec_command(command, timeout=60)
         elif self.sg_platform.startswith("c-"):
-            self.client.connect(self.host, username=self.username, password=self.password,
-                                banner_timeout=REMOTE_EXECUTOR_TIMEOUT)
-            stdin, stdout, stderr = self.client.exec_command(command, timeout=60)
+            return client.exec_command(command, timeout=60)
         else:
-            if "macos" in self.sg_platform:
-                self.client.connect(self.host, username=self.username, password=self.password, banner_timeout=REMOTE_EXECUTOR_TIMEOUT)
-            else:
-                self.client.connect(self.host, username=self.username, banner_timeout=REMOTE_EXECUTOR_TIMEOUT)
             # get_pty=True is required for sudo commands
-            stdin, stdout, stderr = self.client.exec_command(command, get_pty=True)
+            return client.exec_command(command, get_pty=True)
+
+    @staticmethod
+    def close_all():
+        """ Closes every pooled SSH connection """
+        with RemoteExecutor._connections_lock:
+            for client in RemoteExecutor._connections.values():
+                client.close()
+            RemoteExecutor._connections.clear()
+
+    def close(self):
+        """ Closes the pooled SSH connection to this host """
+        with RemoteExecutor._connections_lock:
+            client = RemoteExecutor._connections.pop((self.host, self.username), None)
+        if client is not None:
+            log_info("Closing connection to {}".format(self.host))
+            client.close()
+
+    def execute(self, command, on_stdout=None, on_stderr=None, max_lines=MAX_OUTPUT_LINES, echo=True):
+        """Executes a shell command on a remote host.
+        It will stream the stdout and stderr and return an error code
+
+        Output is handed to 'on_stdout' / 'on_stderr' line by line as it arrives and
+        only the last 'max_lines' lines of each are returned (None returns all of them).
+        """
+
+        log_info("Running '{}' on host {}".format(command, self.host))
+        client = self._connect()
+        try:
+            stdin, stdout, stderr = self._exec_command(client, command)
+        except paramiko.SSHException as e:
+            # The pooled connection went bad before the command started, so it is safe to run it again
+            log_info("Reconnecting to {} after: {}".format(self.host, e))
+            self._discard(client)
+            stdin, stdout, stderr = self._exec_command(self._connect(), command)
 
         # We should not be sending / recieving data on the stdin channel so close it
         stdin.close()
 
-        # Stream output to console, and capture all of the output.
-        # TODO: this is not memory efficient and if there is a ton of output, this will blow up
-        stdout_p = stream_output(stdout)
-        stderr_p = stream_output(stderr)
+        # Read stderr alongside stdout so a command that fills one of them can't stall on the other
+        stderr_p = []
+        stderr_reader = threading.Thread(target=lambda: stderr_p.extend(stream_output(stderr, on_stderr, max_lines, echo)))
+        stderr_reader.daemon = True
+        stderr_reader.start()
+        stdout_p = stream_output(stdout, on_stdout, max_lines, echo)
+        stderr_reader.join()
 
         # this will block until the command has completed and will return the error code from
         # the command. If the command does not return an exit status, then -1 is returned
         status = stdout.channel.recv_exit_status()
 
-        log_info("Closing connection to {}".format(self.host))
-        self.client.close()
-
         return status, stdout_p, stderr_p
 
-    def must_execute(self, command):
+    def must_execute(self, command, **kwargs):
         """This wraps self.execute(command) and throws
         an exception if the status returned is non-zero
         """
 
-        status, stdout_p, stderr_p = self.execute(command)
+        status, stdout_p, stderr_p = self.execute(command, **kwargs)
         if status != 0:
             log_info("{}: {}".format(stdout_p, stderr_p))
             raise RemoteCommandError("command: {} failed on host: {}".format(command, self.host))
         return stdout_p, stderr_p
+
+
+atexit.register(RemoteExecutor.close_all)
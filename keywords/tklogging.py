@@ -7,6 +7,7 @@ import time
 from keywords.utils import log_info
 from keywords.exceptions import CollectionError
 from keywords.constants import RESULTS_DIR
+from utilities.scan_logs import build_log_index
 
 
 def fetch_sync_gateway_logs(cluster_config, prefix):
@@ -55,5 +56,13 @@ class Logging:
             prefix=test_name
         )
 
-        # TODO: https://github.com/couchbaselabs/mobile-testkit/issues/707
-        log_info("TODO: Running Analysis: {}".format(zip_file_path))
+        if zip_file_path is None:
+            return None
+
+        # Scans the zip in place and saves a LogIndex next to it (<zip>.scanindex.json)
+        # that can be queried for the error counts / timestamp offsets of each log
+        log_info("Running Analysis: {}".format(zip_file_path))
+        log_index = build_log_index(zip_file_path)
+        for name, counts in sorted(log_index.error_counts().items()):
+            log_info("Errors in {}: {}".format(name, counts))
+        return log_index
@@ -48,7 +48,7 @@ def log_warn(message):
     logging.warning(message)
 
 
-def log_r(request, info=True):
+def log_r(request, info=True, body=True):
     request_summary = "{0} {1} {2}".format(
         request.request.method,
         request.request.url,
@@ -64,6 +64,10 @@ def log_r(request, info=True):
         request.request.headers,
         request.request.body))
 
+    if not body:
+        # Reading .text would buffer a streamed (stream=True) response
+        return
+
     try:
         logging.debug("{}".format(request.text.encode("utf-8")))
     except Exception as err:
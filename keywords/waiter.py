@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+
+from keywords.exceptions import TimeoutError
+from keywords.utils import log_info
+
+
+class Backoff:
+    """
+    Jittered exponential backoff: intervals grow from 'initial' by 'multiplier' up
+    to 'maximum' seconds, each randomized by +/- 'jitter' (a fraction) so many
+    waiters polling the same server do not line up.
+    """
+
+    def __init__(self, initial=0.1, maximum=5, multiplier=2, jitter=0.2):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self._interval = initial
+
+    def next_interval(self):
+        interval = self._interval
+        self._interval = min(self._interval * self.multiplier, self.maximum)
+        if self.jitter:
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return interval
+
+    def reset(self):
+        """ Start again from 'initial', ex. when the waited on thing made progress """
+        self._interval = self.initial
+
+
+class WaitStats:
+    """ Time spent by one wait call site """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.polls = 0
+        self.timeouts = 0
+        self.total_secs = 0.0
+        self.max_secs = 0.0
+
+    def add(self, polls, secs, timed_out):
+        self.calls += 1
+        self.polls += polls
+        self.total_secs += secs
+        self.max_secs = max(self.max_secs, secs)
+        if timed_out:
+            self.timeouts += 1
+
+    def __repr__(self):
+        return "{}: {} calls, {} polls, {} timeouts, {:.1f}s total, {:.1f}s max".format(
+            self.name, self.calls, self.polls, self.timeouts, self.total_secs, self.max_secs)
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record_wait(name, polls, secs, timed_out=False):
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = WaitStats(name)
+        stats.add(polls, secs, timed_out)
+
+
+def wait_metrics():
+    """ {call site name: WaitStats}, slowest call sites first """
+    with _stats_lock:
+        return dict(sorted(_stats.items(), key=lambda item: item[1].total_secs, reverse=True))
+
+
+def reset_wait_metrics():
+    with _stats_lock:
+        _stats.clear()
+
+
+def log_wait_metrics():
+    for stats in wait_metrics().values():
+        log_info("[wait] {}".format(stats))
+
+
+def wait_until(condition, timeout, name=None, backoff=None, retry_on=(), timeout_message=None,
+               raise_on_timeout=True):
+    """
+    Calls 'condition' until it returns a truthy value and returns that value.
+    Between calls it sleeps with 'backoff' (a Backoff, default Backoff()), never
+    past the 'timeout' seconds deadline. Exceptions in 'retry_on' count as a
+    falsy result. The time spent is recorded under 'name', see wait_metrics.
+
+    On timeout raises TimeoutError('timeout_message'), or returns the last
+    result if raise_on_timeout is False.
+    """
+    name = name or getattr(condition, "__qualname__", repr(condition))
+    backoff = backoff or Backoff()
+    start = time.monotonic()
+    deadline = start + timeout
+    polls = 0
+    result = None
+
+    while True:
+        polls += 1
+        try:
+            result = condition()
+        except retry_on as e:
+            log_info("[wait] {}: retrying after {}".format(name, e))
+            result = None
+        if result:
+            record_wait(name, polls, time.monotonic() - start)
+            return result
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(backoff.next_interval(), remaining))
+
+    elapsed = time.monotonic() - start
+    record_wait(name, polls, elapsed, timed_out=True)
+    if raise_on_timeout:
+        raise TimeoutError(timeout_message or "{}: condition not met after {:.1f}s".format(name, elapsed))
+    return result
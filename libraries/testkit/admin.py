@@ -12,6 +12,7 @@ from libraries.testkit.debug import log_response
 from keywords import cbgtconfig
 from utilities.cluster_config_utils import sg_ssl_enabled
 from keywords.utils import log_info, log_r
+from keywords.waiter import Backoff, wait_until
 from keywords.constants import RBAC_FULL_ADMIN
 from requests.auth import HTTPBasicAuth
 from utilities.cluster_config_utils import is_admin_auth_disabled
@@ -410,95 +411,71 @@ class Admin:
             time.sleep(1)
         return active_resp_data
 
+    def _get_replication_status(self, db, repl_id):
+        if self.auth:
+            r = requests.get("{}/{}/_replicationStatus/{}".format(self.admin_url, db, repl_id), verify=False, auth=self.auth)
+        else:
+            r = requests.get("{}/{}/_replicationStatus/{}".format(self.admin_url, db, repl_id), verify=False)
+        r.raise_for_status()
+        return r.json()
+
     def replication_status_poll(self, db, repl_id, timeout):
         # TODO merge and simplify replication wait functions
         if not is_admin_auth_disabled(self.cluster_config):
             self.auth = HTTPBasicAuth(RBAC_FULL_ADMIN['user'], RBAC_FULL_ADMIN['pwd'])
-        start = time.perf_counter()
-        while (time.perf_counter() - start) < timeout:
-            if self.auth:
-                r = requests.get("{}/{}/_replicationStatus/{}".format(self.admin_url, db, repl_id), verify=False, auth=self.auth)
-            else:
-                r = requests.get("{}/{}/_replicationStatus/{}".format(self.admin_url, db, repl_id), verify=False)
-            r.raise_for_status()
-            resp_obj = r.json()
-            status = resp_obj["status"]
+
+        def replication_stopped():
+            status = self._get_replication_status(db, repl_id)["status"]
             if status == "error":
                 raise ReplicationException("There was a problem during the replication, please look at the logs for more details")
-            if status != "stopped":
-                time.sleep(1)
-            else:
-                log_info(f"Replication {repl_id} reports status 'stopped'")
-                break
-        elapsed = (time.perf_counter() - start)
-        if elapsed >= timeout:
+            return status == "stopped"
+
+        start = time.perf_counter()
+        if wait_until(replication_stopped, timeout, name="Admin.replication_status_poll", raise_on_timeout=False):
+            log_info(f"Replication {repl_id} reports status 'stopped'")
+        else:
+            elapsed = (time.perf_counter() - start)
             log_info(f"Replication {repl_id} did not report stopped after {elapsed} seconds")
 
-    def wait_until_sgw_replication_done(self, db, repl_id, read_flag=False, write_flag=False, max_times=180):
+    def wait_until_sgw_replication_done(self, db, repl_id, read_flag=False, write_flag=False, max_times=180, stall_timeout=120):
+        """
+        Waits up to 'max_times' seconds for the replication to stop, or, while it is running,
+        until the expected docs_read / docs_written counts stop growing for 'stall_timeout' seconds
+        """
         if not is_admin_auth_disabled(self.cluster_config):
             self.auth = HTTPBasicAuth(RBAC_FULL_ADMIN['user'], RBAC_FULL_ADMIN['pwd'])
-        # read_flag = True
-        # write_flag = True
-        read_timeout = False
-        write_timeout = False
-        if read_flag is False:
-            read_timeout = True  # To avoid waiting for read doc count as there is not expectation of read docs
-        if write_flag is False:
-            write_timeout = True  # To avoid waiting for write doc count as there is not expectation of write docs
-        retry_max_count = 120
-        count = 0
-        prev_read_count = 0
-        prev_write_count = 0
-        read_retry_count = 0
-        write_retry_count = 0
-        while count < max_times:
-            if self.auth:
-                r = requests.get("{}/{}/_replicationStatus/{}".format(self.admin_url, db, repl_id), verify=False, auth=self.auth)
-            else:
-                r = requests.get("{}/{}/_replicationStatus/{}".format(self.admin_url, db, repl_id), verify=False)
-            r.raise_for_status()
-            resp_obj = r.json()
+        backoff = Backoff(initial=0.2, maximum=2)
+        # Doc counts that are not expected are not waited for
+        progress = {}
+        if read_flag:
+            progress["docs_read"] = {"count": 0, "at": time.monotonic()}
+        if write_flag:
+            progress["docs_written"] = {"count": 0, "at": time.monotonic()}
+
+        def replication_done():
+            resp_obj = self._get_replication_status(db, repl_id)
             status = resp_obj["status"]
             if status == "starting" or status == "started":
-                count += 1
-            elif status == "running":
-                if read_flag:
-                    if read_retry_count < retry_max_count:
-                        try:
-                            docs_read_count = resp_obj["docs_read"]
-                            if docs_read_count > prev_read_count:
-                                prev_read_count = docs_read_count
-                                read_retry_count = 0
-                            else:
-                                read_retry_count += 1
-                        except KeyError:
-                            read_retry_count += 1
-                    else:
-                        read_timeout = True
-
-                if write_flag:
-                    if write_retry_count < retry_max_count:
-                        try:
-                            docs_write_count = resp_obj["docs_written"]
-                            if docs_write_count > prev_write_count:
-                                prev_write_count = docs_write_count
-                                write_retry_count = 0
-                            else:
-                                write_retry_count += 1
-                        except KeyError:
-                            write_retry_count += 1
-                    else:
-                        write_timeout = True
-            else:
+                return False
+            if status != "running":
                 log_info("looks like replication is stopped")
-                break
-            count += 1
-            time.sleep(1)
-            if read_timeout and write_timeout:
+                return True
+
+            now = time.monotonic()
+            for key in list(progress):
+                count = resp_obj.get(key, 0)
+                if count > progress[key]["count"]:
+                    progress[key] = {"count": count, "at": now}
+                    backoff.reset()
+                elif now - progress[key]["at"] > stall_timeout:
+                    del progress[key]
+            if not progress:
                 log_info("read or write timeout happened")
-                break
-        if count == max_times:
-            raise Exception("timeout while waiting for replication to complete on sgw replication")
+                return True
+            return False
+
+        wait_until(replication_done, max_times, name="Admin.wait_until_sgw_replication_done", backoff=backoff,
+                   timeout_message="timeout while waiting for replication to complete on sgw replication")
 
     def get_replications_count(self, db, expected_count=1):
         if not is_admin_auth_disabled(self.cluster_config):
@@ -12,6 +12,7 @@ from keywords.utils import version_and_build
 from libraries.provision.ansible_runner import AnsibleRunner
 from libraries.testkit.admin import Admin
 from libraries.testkit.config import Config, seperate_sgw_and_db_config
+from libraries.testkit.pipeline import StepTimings, run_concurrently
 from libraries.testkit.sgaccel import SgAccel
 # from libraries.testkit.syncgateway import SyncGateway, send_dbconfig_as_restCall, create_logging_config
 from libraries.testkit.syncgateway import SyncGateway, send_dbconfig_as_restCall
@@ -21,6 +22,7 @@ from utilities.cluster_config_utils import get_load_balancer_ip, no_conflicts_en
 from utilities.cluster_config_utils import generate_x509_certs, is_x509_auth, get_cbs_primary_nodes_str, is_hide_prod_version_enabled
 from keywords.constants import SYNC_GATEWAY_CERT
 from utilities.cluster_config_utils import get_sg_replicas, get_sg_use_views, get_sg_version
+from utilities.cluster_config_utils import is_bucket_recycling_enabled
 from utilities.cluster_config_utils import is_centralized_persistent_config_disabled, is_server_tls_skip_verify_enabled, is_admin_auth_disabled, is_tls_server_disabled
 
 
@@ -116,6 +118,13 @@ class Cluster:
         self.sync_gateway_config = None  # will be set to Config object when reset() called
 
     def reset(self, sg_config_path, bucket_list=[], use_config=False, sgdb_creation=True):
+        timings = StepTimings("Cluster reset")
+        try:
+            return self._reset(timings, sg_config_path, bucket_list=bucket_list, use_config=use_config, sgdb_creation=sgdb_creation)
+        finally:
+            timings.log_report()
+
+    def _reset(self, timings, sg_config_path, bucket_list=[], use_config=False, sgdb_creation=True):
 
         ansible_runner = AnsibleRunner(self._cluster_config)
         sg_platform = get_sg_platform(self._cluster_config)
@@ -129,29 +138,48 @@ class Cluster:
         log_info(">>> CBS SSL enabled: {}".format(self.cbs_ssl))
         log_info(">>> Using xattrs: {}".format(self.xattrs))
 
-        # Stop sync_gateways
-        log_info(">>> Stopping sync_gateway")
-        status = ansible_runner.run_ansible_playbook("stop-sync-gateway.yml", extra_vars=extra_vars)
-        assert status == 0, "Failed to stop sync gateway"
+        def stop_sync_gateways():
+            log_info(">>> Stopping sync_gateway")
+            with timings.step("stop sync_gateway"):
+                status = ansible_runner.run_ansible_playbook("stop-sync-gateway.yml", extra_vars=extra_vars)
+            assert status == 0, "Failed to stop sync gateway"
+
+            if not self.sg_accels:
+                log_info(">>> No sg_accels in cluster config, skipping sg_accel reset")
+                return
+            log_info(">>> Stopping sg_accel")
+            with timings.step("stop sg_accel"):
+                status = ansible_runner.run_ansible_playbook("stop-sg-accel.yml", extra_vars=extra_vars)
+            assert status == 0, "Failed to stop sg_accel"
+
+        def delete_artifacts():
+            log_info(">>> Deleting sync_gateway artifacts")
+            with timings.step("delete sync_gateway artifacts"):
+                status = ansible_runner.run_ansible_playbook("delete-sync-gateway-artifacts.yml", extra_vars=extra_vars)
+            assert status == 0, "Failed to delete sync_gateway artifacts"
+
+            if not self.sg_accels:
+                return
+            log_info(">>> Deleting sg_accel artifacts")
+            with timings.step("delete sg_accel artifacts"):
+                status = ansible_runner.run_ansible_playbook("delete-sg-accel-artifacts.yml", extra_vars=extra_vars)
+            assert status == 0, "Failed to delete sg_accel artifacts"
+
+        def delete_buckets():
+            log_info(">>> Deleting buckets on: {}".format(self.servers[0].url))
+            with timings.step("delete buckets"):
+                self.servers[0].delete_buckets()
+
+        # Buckets are only deleted (or recycled) once nothing is running against them
+        stop_sync_gateways()
+        if is_bucket_recycling_enabled(self._cluster_config):
+            # Buckets are flushed and reused later on
+            delete_artifacts()
+        else:
+            # Ansible playbooks are not thread safe, they run one after the other
+            # while the buckets are torn down on Couchbase Server
+            run_concurrently(delete_artifacts, delete_buckets)
 
-        # Stop sync_gateway accels
-        log_info(">>> Stopping sg_accel")
-        status = ansible_runner.run_ansible_playbook("stop-sg-accel.yml")
-        assert status == 0, "Failed to stop sg_accel"
-
-        # Deleting sync_gateway artifacts
-        log_info(">>> Deleting sync_gateway artifacts")
-        status = ansible_runner.run_ansible_playbook("delete-sync-gateway-artifacts.yml")
-        assert status == 0, "Failed to delete sync_gateway artifacts"
-
-        # Deleting sg_accel artifacts
-        log_info(">>> Deleting sg_accel artifacts")
-        status = ansible_runner.run_ansible_playbook("delete-sg-accel-artifacts.yml")
-        assert status == 0, "Failed to delete sg_accel artifacts"
-
-        # Delete buckets
-        log_info(">>> Deleting buckets on: {}".format(self.servers[0].url))
-        self.servers[0].delete_buckets()
         # Parse config and grab bucket names
         config_path_full = os.path.abspath(sg_config_path)
         config = Config(config_path_full, self._cluster_config, bucket_list=bucket_list)
@@ -159,7 +187,8 @@ class Cluster:
         mode = config.get_mode()
 
         if get_sg_version(self._cluster_config) >= "3.0.0" and not is_centralized_persistent_config_disabled(self._cluster_config):
-            playbook_vars, db_config_json, sgw_config_data = self.setup_server_and_sgw(sg_config_path=sg_config_path, bucket_list=bucket_list, use_config=use_config)
+            with timings.step("create buckets, sync_gateway config"):
+                playbook_vars, db_config_json, sgw_config_data = self.setup_server_and_sgw(sg_config_path=sg_config_path, bucket_list=bucket_list, use_config=use_config)
         else:
             bucket_name_set = config.get_bucket_name_set()
             sg_cert_path = os.path.abspath(SYNC_GATEWAY_CERT)
@@ -172,14 +201,22 @@ class Cluster:
 
             log_info(">>> Creating buckets on: {}".format(self.servers[0].url))
             log_info(">>> Creating buckets {}".format(bucket_name_set))
-            self.servers[0].create_buckets(bucket_names=bucket_name_set,
-                                           cluster_config=self._cluster_config,
-                                           ipv6=self.ipv6)
+            if is_bucket_recycling_enabled(self._cluster_config):
+                with timings.step("recycle buckets"):
+                    self.servers[0].recycle_buckets(bucket_names=bucket_name_set,
+                                                    cluster_config=self._cluster_config,
+                                                    ipv6=self.ipv6)
+            else:
+                with timings.step("create buckets"):
+                    self.servers[0].create_buckets(bucket_names=bucket_name_set,
+                                                   cluster_config=self._cluster_config,
+                                                   ipv6=self.ipv6)
 
-            # Wait for server to be in a warmup state to work around
-            # https://github.com/couchbase/sync_gateway/issues/1745
-            log_info(">>> Waiting for Server: {} to be in a healthy state".format(self.servers[0].url))
-            self.servers[0].wait_for_ready_state()
+                # Wait for server to be in a warmup state to work around
+                # https://github.com/couchbase/sync_gateway/issues/1745
+                log_info(">>> Waiting for Server: {} to be in a healthy state".format(self.servers[0].url))
+                with timings.step("wait for server ready state"):
+                    self.servers[0].wait_for_ready_state()
 
             log_info(">>> Starting sync_gateway with configuration: {}".format(config_path_full))
 
@@ -338,39 +375,44 @@ class Cluster:
                 playbook_vars["disable_admin_auth"] = '"admin_interface_authentication": false,    \n"metrics_interface_authentication": false,'
 
             # Sleep for a few seconds for the indexes to teardown
-            time.sleep(5)
+            with timings.step("wait for index teardown"):
+                time.sleep(5)
             # time.sleep(30)
 
-        status = ansible_runner.run_ansible_playbook(
-            "start-sync-gateway.yml",
-            extra_vars=playbook_vars
-        )
+        with timings.step("start sync_gateway"):
+            status = ansible_runner.run_ansible_playbook(
+                "start-sync-gateway.yml",
+                extra_vars=playbook_vars
+            )
         assert status == 0, "Failed to start to Sync Gateway"
 
         # HACK - only enable sg_accel for distributed index tests
         # revise this with https://github.com/couchbaselabs/sync-gateway-testcluster/issues/222
         if mode == "di":
             # Start sg-accel
-            status = ansible_runner.run_ansible_playbook(
-                "start-sg-accel.yml",
-                extra_vars=playbook_vars
-            )
+            with timings.step("start sg_accel"):
+                status = ansible_runner.run_ansible_playbook(
+                    "start-sg-accel.yml",
+                    extra_vars=playbook_vars
+                )
             assert status == 0, "Failed to start sg_accel"
 
         # Validate CBGT
         if mode == "di":
-            if not self.validate_cbgt_pindex_distribution_retry(len(self.sg_accels)):
-                self.save_cbgt_diagnostics()
-                raise Exception("Failed to validate CBGT Pindex distribution")
+            with timings.step("validate CBGT pindex distribution"):
+                if not self.validate_cbgt_pindex_distribution_retry(len(self.sg_accels)):
+                    self.save_cbgt_diagnostics()
+                    raise Exception("Failed to validate CBGT Pindex distribution")
             log_info(">>> Detected valid CBGT Pindex distribution")
         else:
             log_info(">>> Running in channel cache")
 
         if status == 0 and sgdb_creation:
-            time.sleep(5)  # give a time afer restart to create db config, change to 60 if it fails
-            if get_sg_version(self._cluster_config) >= "3.0.0" and not is_centralized_persistent_config_disabled(self._cluster_config):
-                # Now create rest API for all database configs
-                send_dbconfig_as_restCall(self._cluster_config, db_config_json, self.sync_gateways, sgw_config_data)
+            with timings.step("create sync_gateway databases"):
+                time.sleep(5)  # give a time afer restart to create db config, change to 60 if it fails
+                if get_sg_version(self._cluster_config) >= "3.0.0" and not is_centralized_persistent_config_disabled(self._cluster_config):
+                    # Now create rest API for all database configs
+                    send_dbconfig_as_restCall(self._cluster_config, db_config_json, self.sync_gateways, sgw_config_data)
 
         return mode
 
@@ -408,7 +450,10 @@ class Cluster:
         common_bucket_user = "bucket-admin"
         self.sync_gateway_config = config
 
-        if bucket_creation:
+        if bucket_creation and is_bucket_recycling_enabled(self._cluster_config):
+            log_info(">>> Recycling buckets {} on: {}".format(bucket_name_set, self.servers[0].url))
+            self.servers[0].recycle_buckets(bucket_names=list(bucket_name_set), cluster_config=self._cluster_config, ipv6=self.ipv6)
+        elif bucket_creation:
             log_info(">>> Creating buckets on: {}".format(self.servers[0].url))
             log_info(">>> Creating buckets {}".format(bucket_name_set))
             self.servers[0].create_buckets(bucket_names=bucket_name_set, cluster_config=self._cluster_config, ipv6=self.ipv6)
@@ -0,0 +1,636 @@
+import base64
+import bisect
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from keywords.utils import log_info
+
+SESSION_COOKIE = "SyncGatewaySession"
+
+# Same defaults as Sync Gateway
+DEFAULT_CHANGES_TIMEOUT_MS = 300000
+MAX_CHANGES_TIMEOUT_MS = 900000
+
+
+class MockHttpError(Exception):
+
+    def __init__(self, status, error, reason):
+        super(MockHttpError, self).__init__(reason)
+        self.status = status
+        self.body = {"error": error, "reason": reason}
+
+
+def _new_rev(generation, body):
+    digest = hashlib.md5(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+    return "{}-{}".format(generation, digest)
+
+
+def _generation(rev):
+    return int(rev.split("-")[0]) if rev else 0
+
+
+class MockCollection:
+    """ Docs and changes feed of one keyspace (db or db.scope.collection) """
+
+    def __init__(self):
+        # doc id -> {"body": doc with _id / _rev, "seq": last seq, "channels": [...], "deleted": bool}
+        self.docs = {}
+        self.update_seq = 0
+        # (seq, doc id) in seq order, a row is only current while it is the doc's latest seq
+        self.sequences = []
+
+    def put(self, doc_id, body, rev=None):
+        """ Writes a new revision on top of 'rev' (or body["_rev"]). Raises a 409 MockHttpError for a stale rev. """
+        current = self.docs.get(doc_id)
+        rev = rev or body.get("_rev")
+        if current is not None and not (current["deleted"] and rev is None) and rev != current["body"]["_rev"]:
+            raise MockHttpError(409, "conflict", "Document revision conflict")
+        if current is None and rev is not None:
+            raise MockHttpError(409, "conflict", "Document revision conflict")
+
+        deleted = bool(body.get("_deleted"))
+        generation = _generation(current["body"]["_rev"]) + 1 if current is not None else 1
+        body = {k: v for k, v in body.items() if k not in ("_id", "_rev", "_revisions", "_deleted")}
+        new_rev = _new_rev(generation, body)
+        body["_id"] = doc_id
+        body["_rev"] = new_rev
+        if deleted:
+            body["_deleted"] = True
+
+        self.update_seq += 1
+        channels = body.get("channels", [])
+        self.docs[doc_id] = {
+            "body": body,
+            "seq": self.update_seq,
+            "channels": [channels] if isinstance(channels, str) else list(channels),
+            "deleted": deleted,
+        }
+        self.sequences.append((self.update_seq, doc_id))
+        return new_rev
+
+    def get(self, doc_id):
+        entry = self.docs.get(doc_id)
+        if entry is None or entry["deleted"]:
+            raise MockHttpError(404, "not_found", "missing" if entry is None else "deleted")
+        return entry
+
+    def changes(self, since, channels=None, doc_ids=None, limit=None, include_docs=False):
+        """ Current change rows after 'since', filtered by channels / doc ids """
+        rows = []
+        start = bisect.bisect_right(self.sequences, (since, chr(0x10ffff)))
+        for seq, doc_id in self.sequences[start:]:
+            entry = self.docs[doc_id]
+            if entry["seq"] != seq:
+                continue
+            if doc_ids is not None and doc_id not in doc_ids:
+                continue
+            if channels is not None and "*" not in channels and not channels.intersection(entry["channels"]):
+                continue
+            row = {"seq": seq, "id": doc_id, "changes": [{"rev": entry["body"]["_rev"]}]}
+            if entry["deleted"]:
+                row["deleted"] = True
+            if include_docs:
+                row["doc"] = entry["body"]
+            rows.append(row)
+            if limit is not None and len(rows) >= limit:
+                break
+        return rows
+
+
+class MockDatabase:
+    """ A database with its users, sessions and keyspaces """
+
+    def __init__(self, name):
+        self.name = name
+        self.users = {}
+        self.sessions = {}
+        self.keyspaces = {name: MockCollection()}
+
+    def keyspace(self, keyspace):
+        if keyspace not in self.keyspaces:
+            # Scopes and collections exist as soon as they are used
+            self.keyspaces[keyspace] = MockCollection()
+        return self.keyspaces[keyspace]
+
+
+class MockSyncGatewayHandler(BaseHTTPRequestHandler):
+    """
+    Serves the public and admin REST surface of Sync Gateway the testkit clients use,
+    on top of the MockSyncGateway store. Requests without credentials are admin requests.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, Nagle + delayed acks would add ~40ms to every request
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method):
+        gateway = self.server.gateway
+        split = urlsplit(self.path)
+        segments = [unquote(segment) for segment in split.path.split("/") if segment]
+        self.query = {k: v[-1] for k, v in parse_qs(split.query).items()}
+        length = int(self.headers.get("Content-Length", 0))
+        self.body = self.rfile.read(length) if length else b""
+
+        endpoint = self._endpoint_name(segments)
+        gateway.record_request(method, endpoint)
+        try:
+            latency = gateway.latency_for(endpoint)
+            if latency:
+                time.sleep(latency)
+
+            try:
+                result = self._route(method, segments)
+            except MockHttpError as e:
+                result = (e.status, e.body)
+            if result is not None:
+                self._send_json(*result)
+        finally:
+            gateway.finish_request(method, endpoint)
+
+    @staticmethod
+    def _endpoint_name(segments):
+        if not segments:
+            return "/"
+        if len(segments) == 1:
+            return segments[0] if segments[0].startswith("_") else "db"
+        if segments[1].startswith("_") and segments[1] != "_local":
+            return segments[1]
+        return "doc"
+
+    def _json_body(self):
+        if not self.body:
+            return {}
+        try:
+            return json.loads(self.body.decode("utf-8"))
+        except ValueError:
+            raise MockHttpError(400, "Bad Request", "Invalid JSON")
+
+    def _send_json(self, status, obj, headers=None):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, method, segments):
+        gateway = self.server.gateway
+        if not segments:
+            return 200, gateway.server_info()
+        if segments == ["_all_dbs"]:
+            return 200, sorted(gateway.databases)
+
+        keyspace = segments[0]
+        if len(segments) == 1:
+            return self._database(method, keyspace)
+
+        db = gateway.database(keyspace)
+        user = self._authenticate(db)
+        action = segments[1]
+        with gateway.lock:
+            collection = db.keyspace(keyspace)
+
+        if action == "_bulk_docs" and method == "POST":
+            return self._bulk_docs(collection)
+        if action == "_bulk_get" and method == "POST":
+            return self._bulk_get(collection)
+        if action == "_all_docs" and method in ("GET", "POST"):
+            return self._all_docs(collection, user)
+        if action == "_changes" and method in ("GET", "POST"):
+            return self._changes(method, collection, user)
+        if action == "_session":
+            return self._session(method, db, user, segments[2:])
+        if action == "_user":
+            return self._user(method, db, segments[2:])
+        if action == "_local" and len(segments) == 3:
+            # Local docs do not show up in the changes feed
+            return self._doc(method, db.keyspace("{}/_local".format(keyspace)), "_local/" + segments[2])
+        if not action.startswith("_") and len(segments) == 2:
+            return self._doc(method, collection, action)
+        raise MockHttpError(404, "not_found", "unknown URL")
+
+    def _authenticate(self, db):
+        """ The user of a public request, None for an admin (no credentials) request. Raises a 401 otherwise. """
+        authorization = self.headers.get("Authorization")
+        if authorization and authorization.startswith("Basic "):
+            name, _, password = base64.b64decode(authorization[6:]).decode("utf-8").partition(":")
+            user = db.users.get(name)
+            if user is None or user.get("password") != password:
+                raise MockHttpError(401, "Unauthorized", "Invalid login")
+            return user
+
+        cookie = self.headers.get("Cookie", "")
+        for part in cookie.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE:
+                session = db.sessions.get(value)
+                if session is None or session["expires"] < time.time():
+                    raise MockHttpError(401, "Unauthorized", "Session Invalid")
+                return db.users[session["name"]]
+        return None
+
+    def _database(self, method, name):
+        gateway = self.server.gateway
+        if method == "PUT":
+            gateway.create_database(name)
+            return 201, {}
+        if method == "DELETE":
+            gateway.database(name)
+            with gateway.lock:
+                del gateway.databases[name]
+            return 200, {}
+        if method == "POST":
+            # POST /{db}/ creates a doc with a generated id
+            db = gateway.database(name)
+            self._authenticate(db)
+            doc_id = uuid.uuid4().hex
+            with gateway.changed:
+                rev = db.keyspace(name).put(doc_id, self._json_body())
+                gateway.changed.notify_all()
+            return 200, {"id": doc_id, "rev": rev, "ok": True}
+
+        db = gateway.database(name.split(".")[0])
+        with gateway.lock:
+            update_seq = db.keyspace(name).update_seq
+        return 200, {"db_name": db.name, "update_seq": update_seq, "committed_update_seq": update_seq, "state": "Online"}
+
+    def _doc(self, method, collection, doc_id):
+        gateway = self.server.gateway
+        if method == "GET":
+            with gateway.lock:
+                entry = collection.get(doc_id)
+                body = dict(entry["body"])
+            rev = body["_rev"]
+            if self.query.get("revs") == "true":
+                body["_revisions"] = {"start": _generation(rev), "ids": [rev.split("-", 1)[1]]}
+            return 200, body
+
+        if method == "PUT":
+            with gateway.changed:
+                rev = collection.put(doc_id, self._json_body(), rev=self.query.get("rev"))
+                gateway.changed.notify_all()
+            return 201, {"id": doc_id, "rev": rev, "ok": True}
+
+        if method == "DELETE":
+            with gateway.changed:
+                collection.get(doc_id)
+                rev = collection.put(doc_id, {"_deleted": True}, rev=self.query.get("rev"))
+                gateway.changed.notify_all()
+            return 200, {"id": doc_id, "rev": rev, "ok": True}
+        raise MockHttpError(405, "method_not_allowed", method)
+
+    def _bulk_docs(self, collection):
+        gateway = self.server.gateway
+        results = []
+        with gateway.changed:
+            for doc in self._json_body().get("docs", []):
+                doc_id = doc.get("_id") or uuid.uuid4().hex
+                try:
+                    results.append({"id": doc_id, "rev": collection.put(doc_id, doc)})
+                except MockHttpError as e:
+                    results.append(dict(e.body, id=doc_id, status=e.status))
+            gateway.changed.notify_all()
+        return 201, results
+
+    def _bulk_get(self, collection):
+        gateway = self.server.gateway
+        boundary = uuid.uuid4().hex
+        parts = []
+        with gateway.lock:
+            for requested in self._json_body().get("docs", []):
+                try:
+                    doc = collection.get(requested["id"])["body"]
+                except MockHttpError as e:
+                    doc = dict(e.body, id=requested["id"], status=e.status)
+                parts.append("--{}\r\nContent-Type: application/json\r\n\r\n{}\r\n".format(boundary, json.dumps(doc)))
+        data = "{}--{}--\r\n".format("".join(parts), boundary).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", 'multipart/mixed; boundary="{}"'.format(boundary))
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _all_docs(self, collection, user):
+        gateway = self.server.gateway
+        options = dict(self.query)
+        if self.body:
+            options.update(self._json_body())
+        include_docs = options.get("include_docs") in (True, "true")
+        keys = options.get("keys")
+        if isinstance(keys, str):
+            keys = json.loads(keys)
+
+        rows = []
+        with gateway.lock:
+            doc_ids = keys if keys is not None else sorted(collection.docs)
+            for doc_id in doc_ids:
+                entry = collection.docs.get(doc_id)
+                if entry is None or entry["deleted"]:
+                    if keys is not None:
+                        rows.append({"key": doc_id, "error": "not_found"})
+                    continue
+                if user is not None and not self._can_see(user, entry):
+                    continue
+                row = {"key": doc_id, "id": doc_id, "value": {"rev": entry["body"]["_rev"]}}
+                if include_docs:
+                    row["doc"] = entry["body"]
+                rows.append(row)
+            update_seq = collection.update_seq
+        return 200, {"rows": rows, "total_rows": len(rows), "update_seq": update_seq}
+
+    @staticmethod
+    def _can_see(user, entry):
+        channels = set(user.get("admin_channels", []))
+        return "*" in channels or bool(channels.intersection(entry["channels"]))
+
+    def _changes_options(self, method, user):
+        options = dict(self.query) if method == "GET" else self._json_body()
+        since = int(str(options.get("since", 0) or 0).split(":")[-1])
+        limit = int(options["limit"]) if options.get("limit") is not None else None
+        timeout = min(int(options.get("timeout", DEFAULT_CHANGES_TIMEOUT_MS)), MAX_CHANGES_TIMEOUT_MS) / 1000.0
+        heartbeat = int(options["heartbeat"]) / 1000.0 if options.get("heartbeat") else None
+
+        channels = None
+        if user is not None:
+            channels = set(user.get("admin_channels", []))
+        if options.get("filter") == "sync_gateway/bychannel":
+            requested = set(options.get("channels", "").split(","))
+            channels = requested if channels is None or "*" in channels else channels.intersection(requested)
+
+        doc_ids = None
+        if options.get("filter") == "_doc_ids":
+            doc_ids = options.get("doc_ids")
+            doc_ids = set(json.loads(doc_ids) if isinstance(doc_ids, str) else doc_ids)
+
+        filters = {"channels": channels, "doc_ids": doc_ids, "limit": limit,
+                   "include_docs": options.get("include_docs") in (True, "true")}
+        return options.get("feed", "normal"), since, timeout, heartbeat, filters
+
+    def _changes(self, method, collection, user):
+        gateway = self.server.gateway
+        feed, since, timeout, heartbeat, filters = self._changes_options(method, user)
+
+        if feed == "continuous":
+            return self._continuous_changes(collection, since, timeout, heartbeat, filters)
+
+        deadline = time.time() + timeout
+        with gateway.changed:
+            rows = collection.changes(since, **filters)
+            while feed == "longpoll" and not rows and not gateway.stopping:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                gateway.changed.wait(remaining)
+                rows = collection.changes(since, **filters)
+        last_seq = rows[-1]["seq"] if rows else since
+        return 200, {"results": rows, "last_seq": last_seq}
+
+    def _continuous_changes(self, collection, since, timeout, heartbeat, filters):
+        """
+        Streams one change per line as they happen. The feed ends with a {"last_seq": ...} line
+        once it has been idle for 'timeout', unless 'heartbeat' is set, then it runs until
+        the client goes away (or the limit is reached) with a newline every 'heartbeat'.
+        """
+        gateway = self.server.gateway
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        # Chunked like Sync Gateway, so clients get each line as soon as it is written
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        limit = filters.pop("limit")
+        sent = 0
+        try:
+            while not gateway.stopping:
+                deadline = time.time() + (heartbeat or timeout)
+                with gateway.changed:
+                    rows = collection.changes(since, **filters)
+                    while not rows and not gateway.stopping and time.time() < deadline:
+                        gateway.changed.wait(deadline - time.time())
+                        rows = collection.changes(since, **filters)
+                if rows:
+                    rows = rows[:None if limit is None else limit - sent]
+                    self._write_chunk("".join("{}\n".format(json.dumps(row)) for row in rows).encode("utf-8"))
+                    since = rows[-1]["seq"]
+                    sent += len(rows)
+                    if limit is not None and sent >= limit:
+                        break
+                elif heartbeat:
+                    self._write_chunk(b"\n")
+                else:
+                    break
+            self._write_chunk("{}\n".format(json.dumps({"last_seq": since})).encode("utf-8"))
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the feed
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _session(self, method, db, user, rest):
+        gateway = self.server.gateway
+        if method == "POST" and not rest:
+            body = self._json_body()
+            ttl = int(body.get("ttl", 86400))
+            name = body.get("name") if user is None else user["name"]
+            with gateway.lock:
+                if name not in db.users:
+                    raise MockHttpError(404, "not_found", "No such user")
+                if user is None and "password" in body and db.users[name].get("password") != body["password"]:
+                    raise MockHttpError(401, "Unauthorized", "Invalid login")
+                session_id = uuid.uuid4().hex
+                db.sessions[session_id] = {"name": name, "expires": time.time() + ttl}
+            if user is None and "name" in body:
+                # Admin port, the session is returned in the body
+                return 200, {"session_id": session_id, "expires": "", "cookie_name": SESSION_COOKIE}
+            cookie = "{}={}; Path=/{}; Max-Age={}".format(SESSION_COOKIE, session_id, db.name, ttl)
+            return 200, {"authentication_handlers": ["default", "cookie"], "ok": True,
+                         "userCtx": {"channels": {}, "name": name}}, {"Set-Cookie": cookie}
+
+        if method == "GET" and len(rest) == 1:
+            with gateway.lock:
+                session = db.sessions.get(rest[0])
+            if session is None:
+                raise MockHttpError(404, "not_found", "missing")
+            return 200, {"ok": True, "userCtx": {"channels": {}, "name": session["name"]},
+                         "authentication_handlers": ["default", "cookie"]}
+
+        if method == "DELETE" and len(rest) == 1:
+            with gateway.lock:
+                if db.sessions.pop(rest[0], None) is None:
+                    raise MockHttpError(404, "not_found", "missing")
+            return 200, {}
+        raise MockHttpError(405, "method_not_allowed", method)
+
+    def _user(self, method, db, rest):
+        gateway = self.server.gateway
+        if method == "GET" and not rest:
+            with gateway.lock:
+                return 200, sorted(db.users)
+
+        if method in ("PUT", "POST") and len(rest) <= 1:
+            body = self._json_body()
+            name = rest[0] if rest else body.get("name")
+            if not name:
+                raise MockHttpError(400, "Bad Request", "Missing name")
+            with gateway.lock:
+                existing = db.users.get(name)
+                if method == "POST" and existing is not None:
+                    raise MockHttpError(409, "conflict", "User already exists")
+                user = dict(existing or {}, name=name)
+                user.update(body)
+                db.users[name] = user
+                if existing is not None and "password" in body:
+                    # Changing the password ends the user's sessions
+                    for session_id in [key for key, session in db.sessions.items() if session["name"] == name]:
+                        del db.sessions[session_id]
+            return (200 if existing is not None else 201), {}
+
+        if not rest:
+            raise MockHttpError(405, "method_not_allowed", method)
+        with gateway.lock:
+            if rest[0] not in db.users:
+                raise MockHttpError(404, "not_found", "missing")
+            if method == "GET" and len(rest) == 1:
+                user = {k: v for k, v in db.users[rest[0]].items() if k != "password"}
+                user["all_channels"] = user.get("admin_channels", [])
+                return 200, user
+            if method == "DELETE" and len(rest) == 1:
+                del db.users[rest[0]]
+                for session_id in [key for key, session in db.sessions.items() if session["name"] == rest[0]]:
+                    del db.sessions[session_id]
+                return 200, {}
+            if method == "DELETE" and len(rest) == 3 and rest[1] == "_session":
+                db.sessions.pop(rest[2], None)
+                return 200, {}
+        raise MockHttpError(405, "method_not_allowed", method)
+
+
+class MockSyncGateway:
+    """
+    In-process stand-in for a Sync Gateway, serving both the public and admin REST API on
+    one localhost port from an in-memory store, so the testkit clients (MobileRestClient,
+    User, Admin, ChangesTracker) can be exercised and benchmarked without a cluster.
+
+    'latency' (seconds) is added to every request, 'endpoint_latency' overrides it per
+    endpoint ex. {"_bulk_docs": 0.05, "doc": 0.01}. Requests are counted per endpoint in
+    'requests' ex. requests["POST _bulk_get"], and the most requests to an endpoint that
+    were being served at the same time in 'max_in_flight'.
+
+        with MockSyncGateway(dbs=["db"], latency=0.005) as sg:
+            client.add_bulk_docs_chunked(sg.url, "db", docs)
+    """
+
+    def __init__(self, dbs=("db",), latency=0.0, endpoint_latency=None, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.endpoint_latency = dict(endpoint_latency or {})
+        self.requests = Counter()
+        self.in_flight = Counter()
+        self.max_in_flight = Counter()
+        self.databases = {}
+        self.lock = threading.RLock()
+        # Notified on every write, wakes up longpoll and continuous changes feeds
+        self.changed = threading.Condition(self.lock)
+        self.stopping = False
+        for db in dbs:
+            self.create_database(db)
+
+        self.server = ThreadingHTTPServer((host, port), MockSyncGatewayHandler)
+        self.server.gateway = self
+        self.url = "http://{}:{}".format(host, self.server.server_port)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        log_info("Starting mock Sync Gateway on {} ...".format(self.url))
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self.changed:
+            self.stopping = True
+            self.changed.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    @staticmethod
+    def server_info():
+        return {"couchdb": "Welcome", "vendor": {"name": "Couchbase Sync Gateway", "version": "3.1"},
+                "version": "Couchbase Sync Gateway/3.1.0(mock)"}
+
+    def create_database(self, name):
+        with self.lock:
+            if name in self.databases:
+                raise MockHttpError(412, "Precondition Failed", "Duplicate database name")
+            self.databases[name] = MockDatabase(name)
+
+    def database(self, keyspace):
+        with self.lock:
+            db = self.databases.get(keyspace.split(".")[0])
+        if db is None:
+            raise MockHttpError(404, "not_found", "no such database")
+        return db
+
+    def latency_for(self, endpoint):
+        return self.endpoint_latency.get(endpoint, self.latency)
+
+    def record_request(self, method, endpoint):
+        key = "{} {}".format(method, endpoint)
+        with self.lock:
+            self.requests[key] += 1
+            self.in_flight[key] += 1
+            self.max_in_flight[key] = max(self.max_in_flight[key], self.in_flight[key])
+
+    def finish_request(self, method, endpoint):
+        with self.lock:
+            self.in_flight["{} {}".format(method, endpoint)] -= 1
+
+    def reset_requests(self):
+        with self.lock:
+            self.requests.clear()
+            self.max_in_flight.clear()
+
+    def doc_count(self, keyspace):
+        with self.lock:
+            collection = self.database(keyspace).keyspace(keyspace)
+            return sum(1 for entry in collection.docs.values() if not entry["deleted"])
+
+    def add_user(self, db, name, password, channels=("*",)):
+        """ Creates a user straight in the store, ex. to set up a benchmark """
+        with self.lock:
+            self.database(db).users[name] = {"name": name, "password": password, "admin_channels": list(channels)}
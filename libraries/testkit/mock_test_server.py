@@ -0,0 +1,565 @@
+import copy
+import json
+import threading
+import time
+import uuid
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from CBLClient.MemoryPointer import MemoryPointer
+from CBLClient.ValueSerializer import ValueSerializer
+from keywords.utils import log_info
+
+
+class MockTestServerError(Exception):
+    pass
+
+
+class MockDocument:
+
+    def __init__(self, doc_id=None, body=None):
+        self.id = doc_id or str(uuid.uuid4())
+        self.body = dict(body or {})
+
+
+class MockDatabase:
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.listeners = []
+
+    def write(self, doc_id, body):
+        self.docs[doc_id] = body
+        for listener in self.listeners:
+            listener.events.append(doc_id)
+
+    def remove(self, doc_id):
+        self.docs.pop(doc_id, None)
+        for listener in self.listeners:
+            listener.events.append(doc_id)
+
+
+class MockChangeListener:
+
+    def __init__(self):
+        self.events = []
+
+
+class MockReplicator:
+
+    def __init__(self, config):
+        self.config = config
+        self.activity_level = "stopped"
+        self.completed = 0
+        self.total = 0
+        self.listeners = []
+
+    def sync(self):
+        """ Copies the docs each way the configuration replicates, like a replication that completed """
+        source = self.config["source_db"]
+        target = self.config.get("target_db")
+        changed = 0
+        if target is not None:
+            replication_type = self.config.get("replication_type") or "push_pull"
+            if replication_type in ("push", "push_pull"):
+                changed += _copy_docs(source, target)
+            if replication_type in ("pull", "push_pull"):
+                changed += _copy_docs(target, source)
+        self.completed += changed
+        self.total += changed
+        return changed
+
+    def set_activity(self, activity_level):
+        if activity_level != self.activity_level:
+            self.activity_level = activity_level
+            for listener in self.listeners:
+                listener.events.append(activity_level)
+
+
+def _copy_docs(source, target):
+    changed = 0
+    for doc_id, body in source.docs.items():
+        if target.docs.get(doc_id) != body:
+            target.write(doc_id, copy.deepcopy(body))
+            changed += 1
+    return changed
+
+
+class MockTestServer:
+    """
+    In-process stand-in for a CBL TestServer app: it speaks the CBLClient protocol
+    (POST <url>/<method> with ValueSerializer encoded args) and keeps the handle table
+    of MemoryPointer objects ("@<n>") like the apps do, so the CBLClient wrappers
+    (Database, Document, Dictionary, Replication, Query, Batch) run without a device.
+
+    Databases are in memory, replicators copy docs between two local databases
+    ('target_db') and report a completed replication, a 'target_url' replicates nothing.
+    'latency' (seconds) is added to every request to mimic the round trip to a device.
+    With batch=False the batch endpoint answers 404, like TestServers that lack it.
+    'calls' counts calls per method and 'round_trips' HTTP requests, handle_count() /
+    peak_handles / handles_created track the handle table.
+
+        with MockTestServer() as test_server:
+            db = Database(test_server.url).create("db")
+    """
+
+    def __init__(self, latency=0.0, batch=True, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.batch = batch
+        self.lock = threading.RLock()
+        self.calls = Counter()
+        self.round_trips = 0
+        self.handles = {}
+        self.handles_created = 0
+        self.peak_handles = 0
+        self.databases = {}
+        self._next_handle = 0
+
+        self.server = ThreadingHTTPServer((host, port), MockTestServerHandler)
+        self.server.test_server = self
+        self.url = "http://{}:{}".format(host, self.server.server_port)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        log_info("Starting mock TestServer on {} ...".format(self.url))
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def handle_count(self):
+        with self.lock:
+            return len(self.handles)
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+            self.round_trips = 0
+            self.handles_created = 0
+            self.peak_handles = len(self.handles)
+
+    # Handle table
+
+    def _new_handle(self, obj):
+        self._next_handle += 1
+        address = "@{}".format(self._next_handle)
+        self.handles[address] = obj
+        self.handles_created += 1
+        self.peak_handles = max(self.peak_handles, len(self.handles))
+        return MemoryPointer(address)
+
+    def _resolve(self, value, expected=None):
+        if not isinstance(value, MemoryPointer):
+            return value
+        obj = self.handles.get(value.getAddress())
+        if obj is None:
+            raise MockTestServerError("No object for handle {}".format(value.getAddress()))
+        if expected is not None and not isinstance(obj, expected):
+            raise MockTestServerError("Handle {} is a {}, not a {}".format(value.getAddress(), type(obj).__name__, expected.__name__))
+        return obj
+
+    # Calls
+
+    def invoke(self, method, body):
+        """ Runs one call on its serialized args, returns the serialized result """
+        args = {name: ValueSerializer.deserialize(value) for name, value in body.items()}
+        with self.lock:
+            self.calls[method] += 1
+            try:
+                return ValueSerializer.serialize(self._dispatch(method, args))
+            except (KeyError, TypeError, ValueError, RuntimeError) as e:
+                raise MockTestServerError("{} failed: {!r}".format(method, e))
+
+    def invoke_batch(self, calls):
+        """ (status, body) of a "batch" request, see Client.invokeMethods for the contract """
+        results = []
+        for index, call in enumerate(calls):
+            args = {}
+            for name, value in call["args"].items():
+                if isinstance(value, str) and value.startswith("$"):
+                    value = results[int(value[1:])]
+                args[name] = value
+            try:
+                results.append(self.invoke(call["method"], args))
+            except MockTestServerError as e:
+                return 500, json.dumps({"index": index, "error": str(e), "results": results})
+        return 200, json.dumps(results)
+
+    def _dispatch(self, method, args):
+        handler = _METHODS.get(method)
+        if handler is not None:
+            return handler(self, args)
+        if method.startswith("document_get"):
+            return self._resolve(args["document"], MockDocument).body.get(args["key"])
+        if method.startswith("document_set"):
+            self._resolve(args["document"], MockDocument).body[args["key"]] = self._resolve(args.get("value"))
+            return None
+        raise MockTestServerError("Unsupported method {}".format(method))
+
+
+_METHODS = {}
+
+
+def _method(name):
+    def register(function):
+        _METHODS[name] = function
+        return function
+    return register
+
+
+@_method("release")
+def _release(test_server, args):
+    address = args["object"].getAddress()
+    if test_server.handles.pop(address, None) is None:
+        raise MockTestServerError("No object for handle {}".format(address))
+
+
+@_method("flushMemory")
+def _flush_memory(test_server, args):
+    test_server.handles.clear()
+
+
+# Database
+
+@_method("databaseConfiguration_configure")
+def _database_configure(test_server, args):
+    return test_server._new_handle({"directory": args.get("directory"), "password": args.get("password")})
+
+
+@_method("database_create")
+def _database_create(test_server, args):
+    name = args["name"]
+    db = test_server.databases.get(name)
+    if db is None:
+        db = test_server.databases[name] = MockDatabase(name)
+    return test_server._new_handle(db)
+
+
+@_method("database_exists")
+def _database_exists(test_server, args):
+    return args["name"] in test_server.databases
+
+
+@_method("database_deleteDBbyName")
+def _database_delete_by_name(test_server, args):
+    test_server.databases.pop(args["name"], None)
+
+
+@_method("database_deleteDB")
+def _database_delete_db(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    test_server.databases.pop(db.name, None)
+
+
+@_method("database_close")
+@_method("database_compact")
+def _database_noop(test_server, args):
+    test_server._resolve(args["database"], MockDatabase)
+
+
+@_method("database_getName")
+def _database_get_name(test_server, args):
+    return test_server._resolve(args["database"], MockDatabase).name
+
+
+@_method("database_getPath")
+def _database_get_path(test_server, args):
+    return "/mock/{}.cblite2/".format(test_server._resolve(args["database"], MockDatabase).name)
+
+
+@_method("database_getCount")
+def _database_get_count(test_server, args):
+    return len(test_server._resolve(args["database"], MockDatabase).docs)
+
+
+@_method("database_getDocIds")
+def _database_get_doc_ids(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    offset = args.get("offset") or 0
+    limit = args.get("limit") or len(db.docs)
+    return sorted(db.docs)[offset:offset + limit]
+
+
+@_method("database_getDocument")
+def _database_get_document(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    body = db.docs.get(args.get("id"))
+    if body is None:
+        return None
+    return test_server._new_handle(MockDocument(args["id"], copy.deepcopy(body)))
+
+
+@_method("database_getDocuments")
+def _database_get_documents(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    return {doc_id: copy.deepcopy(db.docs[doc_id]) for doc_id in args["ids"] or [] if doc_id in db.docs}
+
+
+@_method("database_save")
+def _database_save(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    doc = test_server._resolve(args["document"], MockDocument)
+    db.write(doc.id, copy.deepcopy(doc.body))
+
+
+@_method("database_saveDocuments")
+@_method("database_updateDocuments")
+def _database_save_documents(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    for doc_id, body in args["documents"].items():
+        db.write(doc_id, body)
+
+
+@_method("database_updateDocument")
+def _database_update_document(test_server, args):
+    test_server._resolve(args["database"], MockDatabase).write(args["id"], args["data"])
+
+
+@_method("database_delete")
+@_method("database_purge")
+@_method("document_delete")
+def _database_delete(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    db.remove(test_server._resolve(args["document"], MockDocument).id)
+
+
+@_method("database_deleteBulkDocs")
+def _database_delete_bulk_docs(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    for doc_id in args["doc_ids"] or []:
+        db.remove(doc_id)
+
+
+@_method("database_addChangeListener")
+def _database_add_change_listener(test_server, args):
+    listener = MockChangeListener()
+    test_server._resolve(args["database"], MockDatabase).listeners.append(listener)
+    return test_server._new_handle(listener)
+
+
+@_method("database_removeChangeListener")
+def _database_remove_change_listener(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    db.listeners.remove(test_server._resolve(args["changeListener"], MockChangeListener))
+
+
+@_method("database_databaseChangeListenerChangesCount")
+@_method("replicator_changeListenerChangesCount")
+def _change_listener_changes_count(test_server, args):
+    return len(test_server._resolve(args["changeListener"], MockChangeListener).events)
+
+
+# Document / Dictionary
+
+@_method("dictionary_create")
+def _dictionary_create(test_server, args):
+    content = test_server._resolve(args.get("content_dict")) or {}
+    return test_server._new_handle(dict(content))
+
+
+@_method("dictionary_toMap")
+def _dictionary_to_map(test_server, args):
+    return test_server._resolve(args["dictionary"], dict)
+
+
+@_method("document_create")
+def _document_create(test_server, args):
+    dictionary = test_server._resolve(args.get("dictionary"))
+    return test_server._new_handle(MockDocument(args.get("id"), dictionary))
+
+
+@_method("document_getId")
+def _document_get_id(test_server, args):
+    return test_server._resolve(args["document"], MockDocument).id
+
+
+@_method("document_toMap")
+def _document_to_map(test_server, args):
+    return test_server._resolve(args["document"], MockDocument).body
+
+
+@_method("document_toMutable")
+def _document_to_mutable(test_server, args):
+    doc = test_server._resolve(args["document"], MockDocument)
+    return test_server._new_handle(MockDocument(doc.id, copy.deepcopy(doc.body)))
+
+
+@_method("document_setData")
+def _document_set_data(test_server, args):
+    test_server._resolve(args["document"], MockDocument).body = dict(args["data"])
+
+
+@_method("document_count")
+def _document_count(test_server, args):
+    return len(test_server._resolve(args["document"], MockDocument).body)
+
+
+@_method("document_contains")
+def _document_contains(test_server, args):
+    return args["key"] in test_server._resolve(args["document"], MockDocument).body
+
+
+@_method("document_getKeys")
+def _document_get_keys(test_server, args):
+    return list(test_server._resolve(args["document"], MockDocument).body)
+
+
+@_method("document_remove")
+def _document_remove(test_server, args):
+    test_server._resolve(args["document"], MockDocument).body.pop(args["key"], None)
+
+
+# Replicator
+
+@_method("replicatorConfiguration_configure")
+def _replicator_configuration_configure(test_server, args):
+    config = {
+        "source_db": test_server._resolve(args["source_db"], MockDatabase),
+        "target_db": test_server._resolve(args.get("target_db")),
+        "target_url": args.get("target_url"),
+        "replication_type": args.get("replication_type"),
+        "continuous": bool(args.get("continuous")),
+    }
+    return test_server._new_handle(config)
+
+
+@_method("replicatorConfiguration_isContinuous")
+def _replicator_configuration_is_continuous(test_server, args):
+    return test_server._resolve(args["configuration"], dict)["continuous"]
+
+
+@_method("replicator_create")
+def _replicator_create(test_server, args):
+    return test_server._new_handle(MockReplicator(test_server._resolve(args["config"], dict)))
+
+
+@_method("replicator_config")
+def _replicator_config(test_server, args):
+    return test_server._new_handle(test_server._resolve(args["replicator"], MockReplicator).config)
+
+
+@_method("replicator_start")
+def _replicator_start(test_server, args):
+    replicator = test_server._resolve(args["replicator"], MockReplicator)
+    replicator.set_activity("busy")
+    replicator.sync()
+    replicator.set_activity("idle" if replicator.config["continuous"] else "stopped")
+
+
+@_method("replicator_stop")
+def _replicator_stop(test_server, args):
+    test_server._resolve(args["replicator"], MockReplicator).set_activity("stopped")
+
+
+@_method("replicator_resetCheckpoint")
+def _replicator_reset_checkpoint(test_server, args):
+    replicator = test_server._resolve(args["replicator"], MockReplicator)
+    replicator.completed = replicator.total = 0
+
+
+def _replicator_status(name):
+    def status(test_server, args):
+        replicator = test_server._resolve(args["replicator"], MockReplicator)
+        if replicator.activity_level == "idle":
+            # A running continuous replicator picks up what was written since the last look
+            replicator.sync()
+        return getattr(replicator, name)
+    return status
+
+
+_method("replicator_getActivityLevel")(_replicator_status("activity_level"))
+_method("replicator_getCompleted")(_replicator_status("completed"))
+_method("replicator_getTotal")(_replicator_status("total"))
+
+
+@_method("replicator_getError")
+def _replicator_get_error(test_server, args):
+    test_server._resolve(args["replicator"], MockReplicator)
+
+
+@_method("replicator_addChangeListener")
+def _replicator_add_change_listener(test_server, args):
+    listener = MockChangeListener()
+    test_server._resolve(args["replicator"], MockReplicator).listeners.append(listener)
+    return test_server._new_handle(listener)
+
+
+@_method("replicator_removeChangeListener")
+def _replicator_remove_change_listener(test_server, args):
+    replicator = test_server._resolve(args["replicator"], MockReplicator)
+    replicator.listeners.remove(test_server._resolve(args["changeListener"], MockChangeListener))
+
+
+# Query
+
+def _rows(db, doc_ids):
+    return [{db.name: copy.deepcopy(db.docs[doc_id])} for doc_id in doc_ids]
+
+
+@_method("query_selectAll")
+def _query_select_all(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    return _rows(db, sorted(db.docs))
+
+
+@_method("query_docsLimitOffset")
+def _query_docs_limit_offset(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    offset = args.get("offset") or 0
+    return _rows(db, sorted(db.docs)[offset:offset + args["limit"]])
+
+
+@_method("query_getDoc")
+def _query_get_doc(test_server, args):
+    db = test_server._resolve(args["database"], MockDatabase)
+    return _rows(db, [args["doc_id"]] if args["doc_id"] in db.docs else [])
+
+
+class MockTestServerHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, Nagle + delayed acks would add ~40ms to every call
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        test_server = self.server.test_server
+        method = self.path.strip("/")
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length).decode("utf-8")) if length else {}
+        if test_server.latency:
+            time.sleep(test_server.latency)
+        with test_server.lock:
+            test_server.round_trips += 1
+
+        if method == "batch" and not test_server.batch:
+            status, text = 404, "Unsupported method batch"
+        elif method == "batch":
+            status, text = test_server.invoke_batch(body["calls"])
+        else:
+            try:
+                status, text = 200, test_server.invoke(method, body)
+            except MockTestServerError as e:
+                status, text = (404 if str(e).startswith("Unsupported method") else 400), str(e)
+
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
@@ -0,0 +1,54 @@
+import concurrent.futures
+import threading
+import time
+
+from contextlib import contextmanager
+
+from keywords.utils import log_info
+
+
+class StepTimings:
+    """
+    Wall clock time of the named steps of a setup / teardown pipeline.
+    Steps may run on several threads at once, see run_concurrently.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = []
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.steps.append((name, start - self.started_at, time.monotonic() - start))
+
+    def total(self):
+        return time.monotonic() - self.started_at
+
+    def report(self):
+        """ One line per step: offset from the start of the pipeline and duration """
+        lines = ["{} took {:.1f}s".format(self.name, self.total())]
+        for name, offset, secs in sorted(self.steps, key=lambda step: step[1]):
+            lines.append("  +{:6.1f}s {:6.1f}s  {}".format(offset, secs, name))
+        return "\n".join(lines)
+
+    def log_report(self):
+        log_info(self.report())
+
+
+def run_concurrently(*lanes):
+    """
+    Runs each lane (a callable running its own steps in order) on its own thread
+    and waits for all of them. Raises the first lane's exception, in argument
+    order, once every lane has finished. Returns the lanes' results.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(lanes)) as executor:
+        futures = [executor.submit(lane) for lane in lanes]
+        concurrent.futures.wait(futures)
+    return [future.result() for future in futures]
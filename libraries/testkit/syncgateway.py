@@ -21,6 +21,7 @@ from keywords.utils import add_cbs_to_sg_config_server_field, log_info, random_s
 from keywords.constants import SYNC_GATEWAY_CERT, SGW_DB_CONFIGS, SYNC_GATEWAY_CONFIGS, SYNC_GATEWAY_CONFIGS_CPC
 from keywords.exceptions import ProvisioningError
 from keywords.remoteexecutor import RemoteExecutor
+from keywords.waiter import wait_until
 from utilities.cluster_config_utils import is_server_tls_skip_verify_enabled, is_admin_auth_disabled, is_tls_server_disabled
 from keywords.constants import RBAC_FULL_ADMIN
 from requests.auth import HTTPBasicAuth
@@ -1036,46 +1037,23 @@ def get_buckets_from_sync_gateway_config(sync_gateway_config_path, cluster_confi
 
 def wait_until_doc_in_changes_feed(sg, db, doc_id):
 
-    max_tries = 10
-    sleep_retry_seconds = 1
+    def doc_in_changes_feed():
+        return any(changes_result["id"] == doc_id for changes_result in sg.admin.get_global_changes(db))
 
-    for attempt in range(max_tries):
-        changes_results = sg.admin.get_global_changes(db)
-        for changes_result in changes_results:
-            if changes_result["id"] == doc_id:
-                return
-
-        time.sleep(sleep_retry_seconds)
-
-    raise Exception("Tried to wait until doc {} showed up on changes feed, gave up".format(doc_id))
+    wait_until(doc_in_changes_feed, 10, name="wait_until_doc_in_changes_feed",
+               timeout_message="Tried to wait until doc {} showed up on changes feed, gave up".format(doc_id))
 
 
 def wait_until_active_tasks_empty(sg):
 
-    max_tries = 10
-    sleep_retry_seconds = 1
-
-    for attempt in range(max_tries):
-        active_tasks = sg.admin.get_active_tasks()
-        if len(active_tasks) == 0:
-            return
-        time.sleep(sleep_retry_seconds)
-
-    raise Exception("Tried to wait until _active_tasks were empty, but they were never empty")
+    wait_until(lambda: len(sg.admin.get_active_tasks()) == 0, 10, name="wait_until_active_tasks_empty",
+               timeout_message="Tried to wait until _active_tasks were empty, but they were never empty")
 
 
 def wait_until_active_tasks_non_empty(sg):
 
-    max_tries = 10
-    sleep_retry_seconds = 1
-
-    for attempt in range(max_tries):
-        active_tasks = sg.admin.get_active_tasks()
-        if len(active_tasks) > 0:
-            return
-        time.sleep(sleep_retry_seconds)
-
-    raise Exception("Tried to wait until _active_tasks were non-empty, but they were never non-empty")
+    wait_until(lambda: len(sg.admin.get_active_tasks()) > 0, 10, name="wait_until_active_tasks_non_empty",
+               timeout_message="Tried to wait until _active_tasks were non-empty, but they were never non-empty")
 
 
 def wait_until_docs_sync(sg_user, doc_ids):
@@ -1084,18 +1062,14 @@ def wait_until_docs_sync(sg_user, doc_ids):
 
 
 def wait_until_doc_sync(sg_user, doc_id):
-    max_tries_per_doc = 100
-    sleep_retry_per_doc_seconds = 1
-
-    for attempt in range(max_tries_per_doc):
-        try:
-            sg_user.get_doc(doc_id)
-            # if we got a doc, and no exception was thrown, we're done
-            return
-        except HTTPError:
-            time.sleep(sleep_retry_per_doc_seconds)
-
-    raise Exception("Waited for doc {} to sync, but it never did".format(doc_id))
+
+    def doc_synced():
+        # if we got a doc, and no exception was thrown, we're done
+        sg_user.get_doc(doc_id)
+        return True
+
+    wait_until(doc_synced, 100, name="wait_until_doc_sync", retry_on=HTTPError,
+               timeout_message="Waited for doc {} to sync, but it never did".format(doc_id))
 
 
 def assert_does_not_have_doc(sg_user, doc_id):
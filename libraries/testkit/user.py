@@ -8,6 +8,7 @@ import time
 
 from requests.exceptions import HTTPError
 
+from keywords.multipart import iter_response_docs
 from libraries.testkit.debug import log_request
 from libraries.testkit.debug import log_response
 from libraries.testkit import settings
@@ -52,18 +53,13 @@ class User:
         docs_array = [{"id": doc_id} for doc_id in doc_ids]
         body = {"docs": docs_array}
 
-        resp = self._session.post("{0}/{1}/_bulk_get".format(self.target.url, self.db), data=json.dumps(body))
+        resp = self._session.post("{0}/{1}/_bulk_get".format(self.target.url, self.db), data=json.dumps(body), stream=True)
         log.debug("POST {}".format(resp.url))
         resp.raise_for_status()
 
         # Parse Mime and build python obj of docs returned
-        # May need to fix this if we start including attachments
-        docs = []
-        for part in resp.text.splitlines():
-            if part.startswith("{"):
-                docs.append(json.loads(part))
-
-        return docs
+        with resp:
+            return list(iter_response_docs(resp))
 
     # GET /{db}/_all_docs
     def get_all_docs(self):
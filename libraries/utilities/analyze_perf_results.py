@@ -1,12 +1,17 @@
 import json
-import datetime
 import os
 import sys
 import matplotlib
 import matplotlib.pyplot as plt
+import numpy as np
 
 from optparse import OptionParser
 from collections import OrderedDict
+from libraries.utilities.expvar_collector import read_expvar_samples
+from libraries.utilities.perf_results_store import compare_runs
+from libraries.utilities.perf_results_store import concat_series
+from libraries.utilities.perf_results_store import load_expvar_series
+from libraries.utilities.perf_results_store import to_datetime64
 from libraries.utilities.provisioning_config_parser import hosts_for_tag
 
 matplotlib.rcParams.update({'font.size': 6})
@@ -20,69 +25,88 @@ def keys_present(keys, dictionary):
     return True
 
 
-def plot_gateload_expvars(figure, json_file_name):
+def load_expvars(file_name):
+    """
+    Loads {timestamp: {"endpoint": .., "expvars": ..}} from either an ExpvarCollector
+    .jsonl file or a legacy .json dump
+    """
+    if file_name.endswith(".jsonl"):
+        return read_expvar_samples(file_name)
 
-    print("Plotting gateload expvars ...")
+    with open(file_name, "r") as f:
+        return json.loads(f.read(), object_pairs_hook=OrderedDict)
+
+
+def expvars_file(results_folder, group):
+    """ Prefer the ExpvarCollector output, fall back to results from older runs """
+    file_name = "{}/{}_expvars.jsonl".format(results_folder, group)
+    if os.path.isfile(file_name):
+        return file_name
+    return "{}/{}_expvars.json".format(results_folder, group)
 
-    with open(json_file_name, "r") as f:
-        obj = json.loads(f.read(), object_pairs_hook=OrderedDict)
 
-    datetimes = []
-    p95s = []
-    p99s = []
-    docs_pushed = []
-    docs_pulled = []
-    docs_failed_to_push = []
-    docs_failed_to_pull = []
+P95 = "gateload/ops/PushToSubscriberInteractive/p95"
+P99 = "gateload/ops/PushToSubscriberInteractive/p99"
+DOCS_PUSHED = "gateload/total_doc_pushed"
+DOCS_PULLED = "gateload/total_doc_pulled"
+DOCS_FAILED_TO_PUSH = "gateload/total_doc_failed_to_push"
+DOCS_FAILED_TO_PULL = "gateload/total_doc_failed_to_pull"
+MEMSTATS_ALLOC = "memstats/Alloc"
+MEMSTATS_SYS = "memstats/Sys"
 
-    number_ns_per_sec = 1000000000.0
+GATELOAD_PATHS = [P95, P99, DOCS_PUSHED, DOCS_PULLED, DOCS_FAILED_TO_PUSH, DOCS_FAILED_TO_PULL]
+SYNC_GATEWAY_PATHS = [MEMSTATS_ALLOC, MEMSTATS_SYS]
 
-    for timestamp in obj:
+# Cumulative counters, compared by their rate
+COUNTERS = [DOCS_PUSHED, DOCS_PULLED]
 
-        # only plot if p95 and p99 exist in expvars
-        if "PushToSubscriberInteractive" in obj[timestamp]["expvars"]["gateload"]["ops"]:
-            datetimes.append(datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f"))
+number_ns_per_sec = 1000000000.0
 
-            p95 = obj[timestamp]["expvars"]["gateload"]["ops"]["PushToSubscriberInteractive"]["p95"] / number_ns_per_sec
-            p95s.append(p95)
 
-            p99 = obj[timestamp]["expvars"]["gateload"]["ops"]["PushToSubscriberInteractive"]["p99"] / number_ns_per_sec
-            p99s.append(p99)
+def plot_gateload_expvars(figure, json_file_name):
+
+    print("Plotting gateload expvars ...")
 
-            docs_pushed.append(obj[timestamp]["expvars"]["gateload"]["total_doc_pushed"])
-            docs_pulled.append(obj[timestamp]["expvars"]["gateload"]["total_doc_pulled"])
+    series = load_expvar_series(json_file_name, paths=GATELOAD_PATHS)
 
-            if "total_doc_failed_to_push" in obj[timestamp]["expvars"]["gateload"]:
-                docs_failed = obj[timestamp]["expvars"]["gateload"]["total_doc_failed_to_push"]
-                docs_failed_to_push.append(docs_failed)
-                print(("!!! ERROR: docs failed to push: {} !!!".format(docs_failed_to_push)))
+    # only plot the samples where p95 and p99 exist in expvars
+    datetimes, p95s = concat_series(series, P95)
+    has_latency = ~np.isnan(p95s)
+    datetimes = datetimes[has_latency]
+    p95s = p95s[has_latency] / number_ns_per_sec
+    p99s = concat_series(series, P99)[1][has_latency] / number_ns_per_sec
+    docs_pushed = concat_series(series, DOCS_PUSHED)[1][has_latency]
+    docs_pulled = concat_series(series, DOCS_PULLED)[1][has_latency]
 
-            if "total_doc_failed_to_pull" in obj[timestamp]["expvars"]["gateload"]:
-                docs_failed = obj[timestamp]["expvars"]["gateload"]["total_doc_failed_to_pull"]
-                docs_failed_to_pull.append(docs_failed)
-                print(("!!! ERROR: docs failed to pull: {} !!!".format(docs_failed_to_pull)))
+    docs_failed_to_push = concat_series(series, DOCS_FAILED_TO_PUSH)[1][has_latency]
+    docs_failed_to_push = docs_failed_to_push[~np.isnan(docs_failed_to_push)]
+    if len(docs_failed_to_push) > 0:
+        print(("!!! ERROR: docs failed to push: {} !!!".format(docs_failed_to_push.max())))
+
+    docs_failed_to_pull = concat_series(series, DOCS_FAILED_TO_PULL)[1][has_latency]
+    docs_failed_to_pull = docs_failed_to_pull[~np.isnan(docs_failed_to_pull)]
+    if len(docs_failed_to_pull) > 0:
+        print(("!!! ERROR: docs failed to pull: {} !!!".format(docs_failed_to_pull.max())))
 
     # Plot p95 / p99
     ax1 = figure.add_subplot(211)
     ax1.set_title("PushToSubscriberInteractive (seconds): p95 (cyan) / p99 (magenta)")
     ax1.plot(datetimes, p95s, "cs", datetimes, p99s, "m^")
-    # for i, j in zip(datetimes, p95):
-    #     ax1.annotate(str(j), xy=(i, j))
 
     # Plot docs pushed / docs pulled
     ax2 = figure.add_subplot(212)
     ax2.set_title("total_doc_pushed (red) / total_doc_pulled (yellow)")
     ax2.plot(datetimes, docs_pushed, "rs", datetimes, docs_pulled, "y^")
 
-    push_failed_label_pos = (min(datetimes), 0.75 * max(docs_pulled))
-    pull_failed_label_pos = (min(datetimes), 0.25 * max(docs_pulled))
+    push_failed_label_pos = (datetimes.min(), 0.75 * np.nanmax(docs_pulled))
+    pull_failed_label_pos = (datetimes.min(), 0.25 * np.nanmax(docs_pulled))
 
     # Plot doc push / pull failures
     if len(docs_failed_to_push) > 0:
         ax2.text(
             push_failed_label_pos[0],
             push_failed_label_pos[1],
-            "ERROR - DOCS FAILED TO PUSH: {}".format(max(docs_failed_to_push)),
+            "ERROR - DOCS FAILED TO PUSH: {}".format(docs_failed_to_push.max()),
             color="red",
             fontsize=20
         )
@@ -91,7 +115,7 @@ def plot_gateload_expvars(figure, json_file_name):
         ax2.text(
             pull_failed_label_pos[0],
             pull_failed_label_pos[1],
-            "ERROR - DOCS FAILED TO PULL: {}".format(max(docs_failed_to_pull)),
+            "ERROR - DOCS FAILED TO PULL: {}".format(docs_failed_to_pull.max()),
             color="red",
             fontsize=20
         )
@@ -112,30 +136,15 @@ def plot_sync_gateway_expvars(cluster_config, figure, json_file_name):
     sg_writers = hosts_for_tag(cluster_config, "sg_accels")
     sg_writer_hostnames = [sg_writer["ansible_host"] for sg_writer in sg_writers]
 
-    with open(json_file_name, "r") as f:
-        obj = json.loads(f.read(), object_pairs_hook=OrderedDict)
+    series = load_expvar_series(json_file_name, paths=SYNC_GATEWAY_PATHS)
+    writers = [endpoint_series for endpoint_series in series
+               if endpoint_series.endpoint.split(":")[0] in sg_writer_hostnames]
+    readers = [endpoint_series for endpoint_series in series if endpoint_series not in writers]
 
-    datetimes = []
-    memstats_alloc = []
-    memstats_sys = []
-
-    writer_datetimes = []
-    writer_memstats_alloc = []
-    writer_memstats_sys = []
-
-    for timestamp in obj:
-
-        endpoint = obj[timestamp]["endpoint"]
-        hostname = endpoint.split(":")[0]
-
-        if hostname in sg_writer_hostnames:
-            writer_datetimes.append(datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f"))
-            writer_memstats_alloc.append(obj[timestamp]["expvars"]["memstats"]["Alloc"])
-            writer_memstats_sys.append(obj[timestamp]["expvars"]["memstats"]["Sys"])
-        else:
-            datetimes.append(datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f"))
-            memstats_alloc.append(obj[timestamp]["expvars"]["memstats"]["Alloc"])
-            memstats_sys.append(obj[timestamp]["expvars"]["memstats"]["Sys"])
+    datetimes, memstats_alloc = concat_series(readers, MEMSTATS_ALLOC)
+    memstats_sys = concat_series(readers, MEMSTATS_SYS)[1]
+    writer_datetimes, writer_memstats_alloc = concat_series(writers, MEMSTATS_ALLOC)
+    writer_memstats_sys = concat_series(writers, MEMSTATS_SYS)[1]
 
     # Plot Alloc / Sys
     ax1 = figure.add_subplot(111)
@@ -175,13 +184,9 @@ def plot_machine_stats(cluster_config, figure, folder_path):
     for machine in machine_stats:
         entity = machine_stats[machine]
 
-        datetimes = []
-        cpu_percents = []
-
-        # create a list of timestamps with the corresponding CPU percent
-        for timestamp in list(entity.keys()):
-            datetimes.append(datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f"))
-            cpu_percents.append(entity[timestamp]["cpu_percent"])
+        # timestamps with the corresponding CPU percent
+        datetimes = to_datetime64(list(entity.keys()))
+        cpu_percents = np.array([sample["cpu_percent"] for sample in entity.values()], dtype=np.float64)
 
         # Plot blue if writer, green if reader
         if machine in sg_writer_hostnames:
@@ -199,7 +204,8 @@ def analze_perf_results(cluster_config, test_id):
     # Generate plot of gateload expvars
     fig1 = plt.figure()
     fig1.text(0.5, 0.04, 'Gateload Expvars', ha='center', va='center')
-    valid_results = plot_gateload_expvars(fig1, "testsuites/syncgateway/performance/results/{}/gateload_expvars.json".format(test_id))
+    results_folder = "testsuites/syncgateway/performance/results/{}".format(test_id)
+    valid_results = plot_gateload_expvars(fig1, expvars_file(results_folder, "gateload"))
     plt.savefig("testsuites/syncgateway/performance/results/{}/gateload_expvars.png".format(test_id), dpi=300)
     if not valid_results:
         print("FAILURE STATE. Some docs failed to push and/or pull. Exiting...")
@@ -208,7 +214,7 @@ def analze_perf_results(cluster_config, test_id):
     # Generate plot of sync_gateway expvars
     fig2 = plt.figure()
     fig2.text(0.5, 0.04, 'sync_gateway expvars', ha='center', va='center')
-    plot_sync_gateway_expvars(cluster_config, fig2, "testsuites/syncgateway/performance/results/{}/sync_gateway_expvars.json".format(test_id))
+    plot_sync_gateway_expvars(cluster_config, fig2, expvars_file(results_folder, "sync_gateway"))
     plt.savefig("testsuites/syncgateway/performance/results/{}/sync_gateway_expvars.png".format(test_id), dpi=300)
 
     # Generate plot of machine stats
@@ -218,9 +224,22 @@ def analze_perf_results(cluster_config, test_id):
     plt.savefig("testsuites/syncgateway/performance/results/{}/sync_gateway_machine_stats.png".format(test_id), dpi=300)
 
 
+def compare_perf_results(base_test_id, test_id):
+    """ Prints how the gateload latencies / doc rates and sync_gateway memory of 'test_id' moved against 'base_test_id' """
+
+    print(("Comparing {} against {}".format(test_id, base_test_id)))
+    for group, paths in (("gateload", GATELOAD_PATHS), ("sync_gateway", SYNC_GATEWAY_PATHS)):
+        base_series = load_expvar_series(expvars_file("testsuites/syncgateway/performance/results/{}".format(base_test_id), group), paths=paths)
+        series = load_expvar_series(expvars_file("testsuites/syncgateway/performance/results/{}".format(test_id), group), paths=paths)
+        for path, stats in compare_runs(base_series, series, paths, counters=COUNTERS).items():
+            for stat, (base, other, change) in stats.items():
+                print(("{:<50} {:<18} {:>16.2f} {:>16.2f} {:>+8.1%}".format(path, stat, base, other, change)))
+
+
 if __name__ == "__main__":
     usage = """usage: analyze_perf_results.py
     --test-id=<test-id>
+    [--compare-to=<baseline-test-id>]
     """
 
     parser = OptionParser(usage=usage)
@@ -229,6 +248,10 @@ if __name__ == "__main__":
                       action="store", type="string", dest="test_id", default=None,
                       help="Test id to generate graphs for")
 
+    parser.add_option("", "--compare-to",
+                      action="store", type="string", dest="compare_to", default=None,
+                      help="Test id of a baseline run to compare the results of --test-id against")
+
     arg_parameters = sys.argv[1:]
 
     (opts, args) = parser.parse_args(arg_parameters)
@@ -244,3 +267,6 @@ if __name__ == "__main__":
         sys.exit(1)
 
     analze_perf_results(cluster_conf, opts.test_id)
+
+    if opts.compare_to is not None:
+        compare_perf_results(opts.compare_to, opts.test_id)
@@ -0,0 +1,69 @@
+import sys
+import time
+
+from optparse import OptionParser
+
+from CBLClient.ValueSerializer import ValueSerializer
+from libraries.data import doc_generators
+
+GENERATORS = {
+    "four_k": doc_generators.four_k,
+    "complex_doc": doc_generators.complex_doc,
+}
+
+
+def time_call(func, arg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations
+
+
+def benchmark(generator, num_docs, iterations):
+    """ Times ValueSerializer on a 'saveDocuments' style payload of num_docs docs """
+    docs = {"doc_{}".format(i): GENERATORS[generator]() for i in range(num_docs)}
+    encoded = ValueSerializer.serialize(docs)
+
+    serialize_secs = time_call(ValueSerializer.serialize, docs, iterations)
+    deserialize_secs = time_call(ValueSerializer.deserialize, encoded, iterations)
+    return {
+        "generator": generator,
+        "docs": num_docs,
+        "payload_bytes": len(encoded),
+        "serialize_ms": serialize_secs * 1000,
+        "deserialize_ms": deserialize_secs * 1000,
+        "serialize_docs_per_sec": num_docs / serialize_secs,
+        "deserialize_docs_per_sec": num_docs / deserialize_secs,
+    }
+
+
+if __name__ == "__main__":
+    usage = """usage: benchmark_value_serializer.py
+    --num-docs=<docs per payload>
+    --iterations=<timed runs per payload>
+    --generator=<four_k|complex_doc> (may be repeated, default: both)
+    """
+
+    parser = OptionParser(usage=usage)
+
+    parser.add_option("", "--num-docs",
+                      action="store", type="int", dest="num_docs", default=1000,
+                      help="Number of docs in each serialized payload")
+
+    parser.add_option("", "--iterations",
+                      action="store", type="int", dest="iterations", default=5,
+                      help="Number of timed serialize / deserialize runs per payload")
+
+    parser.add_option("", "--generator",
+                      action="append", type="choice", choices=list(GENERATORS), dest="generators", default=None,
+                      help="Document generator from libraries.data.doc_generators")
+
+    arg_parameters = sys.argv[1:]
+
+    (opts, args) = parser.parse_args(arg_parameters)
+
+    for generator in opts.generators or list(GENERATORS):
+        result = benchmark(generator, opts.num_docs, opts.iterations)
+        print("{generator:>12}: {docs} docs, {payload_bytes} bytes | "
+              "serialize {serialize_ms:.1f} ms ({serialize_docs_per_sec:.0f} docs/s) | "
+              "deserialize {deserialize_ms:.1f} ms ({deserialize_docs_per_sec:.0f} docs/s)".format(**result))
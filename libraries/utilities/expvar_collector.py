@@ -0,0 +1,224 @@
+import datetime
+import json
+
+import requests
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from keywords.utils import log_info
+from libraries.testkit import settings
+
+# Separator for flattened expvar paths, ex. "gateload/ops/PushToSubscriberInteractive/p95"
+PATH_SEPARATOR = "/"
+
+
+def flatten_numeric(expvars, prefix=""):
+    """
+    Flattens an expvar JSON object into {path: number}, keeping only numeric leaves.
+    List items are addressed by index, ex. "memstats/BySize/3/Mallocs"
+    """
+    flat = {}
+    stack = [(prefix, expvars)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = enumerate(value)
+        else:
+            # bool is an int subclass but is not a counter
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                flat[path] = value
+            continue
+        for key, child in items:
+            stack.append(("{}{}{}".format(path, PATH_SEPARATOR, key) if path else str(key), child))
+    return flat
+
+
+def unflatten(flat):
+    """ Rebuilds the nested expvar object for the paths in 'flat' (list items become dicts keyed by index) """
+    nested = {}
+    for path, value in flat.items():
+        node = nested
+        keys = path.split(PATH_SEPARATOR)
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return nested
+
+
+class ExpvarCollector:
+    """
+    Polls groups of expvar endpoints in parallel and appends numeric samples
+    to one JSON lines file per group, ex. {"gateload": [...], "sync_gateway": [...]}
+    is written to <folder>/gateload_expvars.jsonl and <folder>/sync_gateway_expvars.jsonl
+
+    Each line is one sample of one endpoint:
+        {"t": "2026-01-01 00:00:00.000000", "endpoint": "host:4985/_expvar", "key": true, "values": {path: number}}
+    Key frames ("key": true) hold every numeric counter. Other lines only hold the
+    counters that changed since the previous sample of that endpoint, so only the
+    last sample per endpoint is kept in memory and the files can be read back at any
+    point, even if the run crashes. See read_expvar_samples.
+    """
+
+    def __init__(self, endpoints_by_group, folder, key_frame_every=60, timeout=settings.HTTP_REQ_TIMEOUT):
+        self.endpoints_by_group = endpoints_by_group
+        self.folder = folder
+        self.key_frame_every = key_frame_every
+        self.timeout = timeout
+
+        endpoints = [endpoint for group in endpoints_by_group.values() for endpoint in group]
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(endpoints)), pool_maxsize=1)
+        self._session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(endpoints)))
+
+        self._last_values = {}
+        self._samples = {}
+        self._files = {}
+
+    def filename(self, group):
+        return "{}/{}_expvars.jsonl".format(self.folder, group)
+
+    def _file(self, group):
+        if group not in self._files:
+            log_info("Writing {} expvars to: {}".format(group, self.filename(group)))
+            self._files[group] = open(self.filename(group), "a")
+        return self._files[group]
+
+    def _fetch(self, endpoint):
+        resp = self._session.get("http://{}".format(endpoint), timeout=self.timeout)
+        resp.raise_for_status()
+        return "{}".format(datetime.datetime.utcnow()), resp.json()
+
+    def record(self, group, endpoint, timestamp, expvars):
+        """ Appends one sample for endpoint, as a key frame or a delta against its previous sample """
+        values = flatten_numeric(expvars)
+        count = self._samples.get(endpoint, 0)
+        last = self._last_values.get(endpoint)
+
+        key_frame = last is None or count % self.key_frame_every == 0
+        if not key_frame:
+            changed = {path: value for path, value in values.items() if last.get(path) != value}
+            # Counters that disappeared are recorded as null
+            changed.update((path, None) for path in last if path not in values)
+            values_to_write = changed
+        else:
+            values_to_write = values
+
+        line = {"t": timestamp, "endpoint": endpoint, "key": key_frame, "values": values_to_write}
+        self._file(group).write(json.dumps(line, separators=(",", ":")) + "\n")
+
+        self._last_values[endpoint] = values
+        self._samples[endpoint] = count + 1
+
+    def poll(self):
+        """
+        Fetches every endpoint concurrently and records the results.
+        Returns {group: [endpoints that could not be reached]}
+        """
+        futures = {}
+        for group, endpoints in self.endpoints_by_group.items():
+            for endpoint in endpoints:
+                futures[(group, endpoint)] = self._executor.submit(self._fetch, endpoint)
+
+        unreachable = {group: [] for group in self.endpoints_by_group}
+        for (group, endpoint), future in futures.items():
+            try:
+                timestamp, expvars = future.result()
+            except RequestException as re:
+                log_info("Error: {}. {} expvars {} not reachable".format(re, group, endpoint))
+                unreachable[group].append(endpoint)
+                continue
+            self.record(group, endpoint, timestamp, expvars)
+
+        self.flush()
+        return unreachable
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+def iter_expvar_samples(filename):
+    """
+    Replays a collector file and yields (timestamp, endpoint, {path: number}) with
+    the full set of counters for every sample
+    """
+    current = {}
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sample = json.loads(line)
+            except ValueError:
+                # Partially written last line of a crashed run
+                break
+
+            endpoint = sample["endpoint"]
+            if sample["key"]:
+                values = dict(sample["values"])
+            else:
+                values = dict(current.get(endpoint, {}))
+                for path, value in sample["values"].items():
+                    if value is None:
+                        values.pop(path, None)
+                    else:
+                        values[path] = value
+            current[endpoint] = values
+            yield sample["t"], endpoint, values
+
+
+def read_expvar_samples(filename):
+    """
+    Reads a collector file into the layout log_expvars used to dump:
+    OrderedDict {timestamp: {"endpoint": endpoint, "expvars": nested numeric expvars}}
+    """
+    results = OrderedDict()
+    for timestamp, endpoint, values in iter_expvar_samples(filename):
+        results[timestamp] = {"endpoint": endpoint, "expvars": unflatten(values)}
+    return results
+
+
+def read_expvar_columns(filename, paths=None):
+    """
+    Reads a collector file into columns per endpoint:
+    {endpoint: {"t": [timestamps], path: [values, None where missing], ...}}
+    Only 'paths' are kept if given.
+    """
+    columns = {}
+    for timestamp, endpoint, values in iter_expvar_samples(filename):
+        endpoint_columns = columns.setdefault(endpoint, {"t": []})
+        row = len(endpoint_columns["t"])
+        endpoint_columns["t"].append(timestamp)
+        for path, value in values.items():
+            if paths is not None and path not in paths:
+                continue
+            column = endpoint_columns.get(path)
+            if column is None:
+                column = endpoint_columns[path] = [None] * row
+            column.append(value)
+        for column in endpoint_columns.values():
+            if len(column) == row:
+                column.append(None)
+    return columns
@@ -1,47 +1,21 @@
 import time
-import datetime
 import requests
-import json
 import os
 import sys
 from keywords.utils import log_info
 from libraries.testkit import settings
 
-from collections import OrderedDict
-
-from requests.exceptions import RequestException
-
+from .expvar_collector import ExpvarCollector
 from .provisioning_config_parser import hosts_for_tag
 
 
-def dump_results(test_folder, gateload_results, sync_gateway_results):
-    filename = "testsuites/syncgateway/performance/results/{}/gateload_expvars.json".format(test_folder)
-    log_info("Writing gateload_expvars to: {}".format(filename))
-    with open(filename, "w") as f:
-        f.write(json.dumps(gateload_results))
-
-    filename = "testsuites/syncgateway/performance/results/{}/sync_gateway_expvars.json".format(test_folder)
-    log_info("Writing sync_gateway_expvars to: {}".format(filename))
-    with open(filename, "w") as f:
-        f.write(json.dumps(sync_gateway_results))
-
-
-def write_expvars(results_obj, endpoint):
-
-    resp = requests.get("http://{}".format(endpoint), timeout=settings.HTTP_REQ_TIMEOUT)
-    resp.raise_for_status()
-    expvars = resp.json()
-
-    now = "{}".format(datetime.datetime.utcnow())
-    results_obj[now] = {
-        "endpoint": endpoint,
-        "expvars": expvars
-    }
-
-
-def log_expvars(cluster_config, folder_name, sleep_time=30):
+def log_expvars(cluster_config, folder_name, sleep_time=0.5):
     """
     usage: log_expvars.py"
+
+    Polls the gateload and sync_gateway expvar endpoints in parallel every 'sleep_time' seconds.
+    Samples are appended to testsuites/syncgateway/performance/results/<folder_name>/gateload_expvars.jsonl
+    and sync_gateway_expvars.jsonl as they are collected (see ExpvarCollector for the format)
     """
 
     finished_successfully = True
@@ -67,43 +41,30 @@ def log_expvars(cluster_config, folder_name, sleep_time=30):
         wait_for_endpoints_alive_or_raise(lgs_expvar_endpoints)
 
         start_time = time.time()
-        gateload_results = OrderedDict()
-        sync_gateway_results = OrderedDict()
-
-        gateload_is_running = True
-        sg_is_running = True
-        while gateload_is_running and sg_is_running:
-
-            # Capture expvars for gateloads
-            for endpoint in lgs_expvar_endpoints:
-                try:
-                    log_info("Collecting gateload expvars {}".format(endpoint))
-                    write_expvars(gateload_results, endpoint)
-                    dump_results(folder_name, gateload_results, sync_gateway_results)
-                except RequestException as re:
-                    # connection to gateload expvars has been closed
-                    log_info(re)
-                    log_info("Error: {}.  Gateload {} no longer reachable. Writing expvars to {}".format(re, endpoint, folder_name))
-                    dump_results(folder_name, gateload_results, sync_gateway_results)
-                    gateload_is_running = False
-
-            # Capture expvars for sync_gateways
-            for endpoint in sgs_expvar_endpoints:
-                try:
-                    log_info("Collecting sg expvars {}".format(endpoint))
-                    write_expvars(sync_gateway_results, endpoint)
-                    dump_results(folder_name, gateload_results, sync_gateway_results)
-                except RequestException as re:
+        last_progress_log = start_time
+        endpoints = {"gateload": lgs_expvar_endpoints, "sync_gateway": sgs_expvar_endpoints}
+        folder = "testsuites/syncgateway/performance/results/{}".format(folder_name)
+
+        with ExpvarCollector(endpoints, folder) as collector:
+            while True:
+                poll_start = time.time()
+                unreachable = collector.poll()
+
+                if unreachable["sync_gateway"]:
                     # Should not happen unless sg crashes
+                    log_info("ERROR: sync_gateways not reachable: {}. Results are in {}".format(unreachable["sync_gateway"], folder))
                     finished_successfully = False
-                    log_info(re)
-                    log_info("ERROR {}: sync_gateway not reachable. Dumping results to {}".format(re, folder_name))
-                    dump_results(folder_name, gateload_results, sync_gateway_results)
-                    sg_is_running = False
-
-            dump_results(folder_name, gateload_results, sync_gateway_results)
-            log_info("Elapsed: {} minutes".format((time.time() - start_time) / 60.0))
-            time.sleep(sleep_time)
+                    break
+
+                if unreachable["gateload"]:
+                    # connection to gateload expvars has been closed
+                    log_info("Gateloads {} no longer reachable. Results are in {}".format(unreachable["gateload"], folder))
+                    break
+
+                if time.time() - last_progress_log > 60:
+                    log_info("Elapsed: {} minutes".format((time.time() - start_time) / 60.0))
+                    last_progress_log = time.time()
+                time.sleep(max(0, sleep_time - (time.time() - poll_start)))
 
     except RuntimeError as e:
         log_info("Exception trying to log expvars: {}".format(e))
@@ -0,0 +1,233 @@
+import json
+import os
+
+from collections import OrderedDict
+
+import numpy as np
+
+from libraries.utilities.expvar_collector import flatten_numeric
+from libraries.utilities.expvar_collector import read_expvar_columns
+
+# Bump when the layout of the .npz cache changes, older caches are then rebuilt
+CACHE_FORMAT = 1
+
+
+class ExpvarSeries:
+    """
+    Samples of one expvar endpoint as NumPy arrays:
+    'times' (datetime64[us]) and 'columns' {path: float64 array, nan where missing}
+    """
+
+    def __init__(self, endpoint, times, columns):
+        self.endpoint = endpoint
+        self.times = times
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.times)
+
+    def column(self, path):
+        """ Values of 'path', all nan if the endpoint never reported it """
+        if path in self.columns:
+            return self.columns[path]
+        return np.full(len(self.times), np.nan)
+
+    def seconds(self):
+        """ Seconds since the first sample """
+        if len(self.times) == 0:
+            return np.array([], dtype=np.float64)
+        return (self.times - self.times[0]) / np.timedelta64(1, "s")
+
+
+def to_datetime64(timestamps):
+    """ Parses "%Y-%m-%d %H:%M:%S.%f" timestamps in one go """
+    return np.array([timestamp.replace(" ", "T") for timestamp in timestamps], dtype="datetime64[us]")
+
+
+def _to_float_array(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _legacy_columns(file_name):
+    """ Columns per endpoint of a log_expvars .json dump, see read_expvar_columns """
+    with open(file_name) as f:
+        obj = json.loads(f.read(), object_pairs_hook=OrderedDict)
+
+    columns = {}
+    for timestamp, sample in obj.items():
+        endpoint_columns = columns.setdefault(sample["endpoint"], {"t": []})
+        row = len(endpoint_columns["t"])
+        endpoint_columns["t"].append(timestamp)
+        for path, value in flatten_numeric(sample["expvars"]).items():
+            column = endpoint_columns.get(path)
+            if column is None:
+                column = endpoint_columns[path] = [None] * row
+            column.append(value)
+        for column in endpoint_columns.values():
+            if len(column) == row:
+                column.append(None)
+    return columns
+
+
+def _convert(file_name):
+    if file_name.endswith(".jsonl"):
+        columns = read_expvar_columns(file_name)
+    else:
+        columns = _legacy_columns(file_name)
+
+    series = []
+    for endpoint, endpoint_columns in columns.items():
+        times = to_datetime64(endpoint_columns.pop("t"))
+        series.append(ExpvarSeries(endpoint, times, {path: _to_float_array(values)
+                                                     for path, values in endpoint_columns.items()}))
+    return series
+
+
+def cache_file_name(file_name):
+    return "{}.npz".format(file_name)
+
+
+def _source_stamp(file_name):
+    stat = os.stat(file_name)
+    return [CACHE_FORMAT, stat.st_size, stat.st_mtime]
+
+
+def _save_cache(file_name, series):
+    arrays = {}
+    meta = {"stamp": _source_stamp(file_name), "endpoints": []}
+    for i, endpoint_series in enumerate(series):
+        paths = sorted(endpoint_series.columns)
+        meta["endpoints"].append({"endpoint": endpoint_series.endpoint, "paths": paths})
+        arrays["t{}".format(i)] = endpoint_series.times.astype(np.int64)
+        values = np.empty((len(endpoint_series), len(paths)), dtype=np.float64)
+        for j, path in enumerate(paths):
+            values[:, j] = endpoint_series.columns[path]
+        arrays["v{}".format(i)] = values
+    arrays["meta"] = np.array(json.dumps(meta))
+    # Write to a temporary name first so a crash can't leave a truncated cache behind
+    tmp_name = "{}.tmp.npz".format(file_name)
+    np.savez_compressed(tmp_name, **arrays)
+    os.replace(tmp_name, cache_file_name(file_name))
+
+
+def _load_cache(file_name, paths=None):
+    """ Series from the .npz cache, None if there is none for the current source file """
+    if not os.path.isfile(cache_file_name(file_name)):
+        return None
+    with np.load(cache_file_name(file_name), allow_pickle=False) as npz:
+        meta = json.loads(str(npz["meta"]))
+        if meta["stamp"] != _source_stamp(file_name):
+            return None
+        series = []
+        for i, endpoint_meta in enumerate(meta["endpoints"]):
+            times = npz["t{}".format(i)].astype("datetime64[us]")
+            values = npz["v{}".format(i)]
+            columns = {path: values[:, j] for j, path in enumerate(endpoint_meta["paths"])
+                       if paths is None or path in paths}
+            series.append(ExpvarSeries(endpoint_meta["endpoint"], times, columns))
+    return series
+
+
+def load_expvar_series(file_name, paths=None, use_cache=True):
+    """
+    Loads an ExpvarCollector .jsonl file or a legacy log_expvars .json dump as a list
+    of ExpvarSeries, one per endpoint. The first load converts the file to a columnar
+    <file_name>.npz next to it, later loads read that instead while the source is unchanged.
+    Only 'paths' are kept if given.
+    """
+    if use_cache:
+        series = _load_cache(file_name, paths)
+        if series is not None:
+            return series
+
+    series = _convert(file_name)
+    if use_cache:
+        _save_cache(file_name, series)
+    if paths is not None:
+        for endpoint_series in series:
+            endpoint_series.columns = {path: values for path, values in endpoint_series.columns.items() if path in paths}
+    return series
+
+
+def concat_series(series, path):
+    """ (times, values) of 'path' across all the endpoints, sorted by time """
+    if not series:
+        return np.array([], dtype="datetime64[us]"), np.array([], dtype=np.float64)
+    times = np.concatenate([endpoint_series.times for endpoint_series in series])
+    values = np.concatenate([endpoint_series.column(path) for endpoint_series in series])
+    order = np.argsort(times, kind="stable")
+    return times[order], values[order]
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    """ {q: percentile} of the non nan values, nan for all of them if there are none """
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {q: float("nan") for q in qs}
+    return dict(zip(qs, np.percentile(values, qs).tolist()))
+
+
+def rates(times, counter):
+    """ Per second increase of a cumulative counter between consecutive samples (nan samples skipped) """
+    mask = ~np.isnan(counter)
+    times, counter = times[mask], counter[mask]
+    if len(counter) < 2:
+        return np.array([], dtype=np.float64)
+    seconds = np.diff(times) / np.timedelta64(1, "s")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(seconds > 0, np.diff(counter) / seconds, np.nan)
+
+
+def linear_trend(times, values):
+    """ Least squares slope of 'values' per second, ex. memory growth of a leaking process """
+    mask = ~np.isnan(values)
+    times, values = times[mask], values[mask]
+    if len(values) < 2:
+        return float("nan")
+    seconds = (times - times[0]) / np.timedelta64(1, "s")
+    if np.all(seconds == seconds[0]):
+        return float("nan")
+    slope, _ = np.polyfit(seconds, values, 1)
+    return float(slope)
+
+
+def summarize(series, path, counter=False):
+    """
+    Summary of 'path' across every endpoint: sample count, min / max / mean,
+    p50 / p95 / p99, the trend per second and, for a 'counter', its rate per second
+    """
+    times, values = concat_series(series, path)
+    present = values[~np.isnan(values)]
+    summary = {"samples": int(len(present))}
+    if len(present) == 0:
+        return summary
+    summary.update({"min": float(present.min()), "max": float(present.max()), "mean": float(present.mean())})
+    summary.update({"p{}".format(q): value for q, value in percentiles(present).items()})
+    summary["trend_per_sec"] = linear_trend(times, values)
+    if counter:
+        # Counters are per endpoint, so rates are too
+        endpoint_rates = [rates(endpoint_series.times, endpoint_series.column(path)) for endpoint_series in series]
+        endpoint_rates = np.concatenate(endpoint_rates) if endpoint_rates else np.array([])
+        endpoint_rates = endpoint_rates[~np.isnan(endpoint_rates)]
+        if len(endpoint_rates):
+            summary["mean_rate_per_sec"] = float(endpoint_rates.mean())
+    return summary
+
+
+def compare_runs(base_series, other_series, paths, counters=()):
+    """
+    {path: {stat: (base, other, relative change)}} for the stats summarize gives both runs,
+    the relative change is nan when the base value is 0
+    """
+    comparison = {}
+    for path in paths:
+        base = summarize(base_series, path, counter=path in counters)
+        other = summarize(other_series, path, counter=path in counters)
+        stats = {}
+        for stat in base:
+            if stat not in other:
+                continue
+            change = (other[stat] - base[stat]) / abs(base[stat]) if base[stat] else float("nan")
+            stats[stat] = (base[stat], other[stat], change)
+        comparison[path] = stats
+    return comparison
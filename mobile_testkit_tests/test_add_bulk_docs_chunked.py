@@ -0,0 +1,188 @@
+import json
+import threading
+
+import pytest
+from requests.exceptions import HTTPError
+from requests.exceptions import Timeout
+
+from keywords.MobileRestClient import MobileRestClient
+from keywords.exceptions import RestError
+
+
+class FakeRequest(object):
+    method = "POST"
+    url = ""
+    headers = {}
+    body = ""
+
+
+class FakeResponse(object):
+    def __init__(self, obj, status_code=200):
+        self.text = json.dumps(obj)
+        self.status_code = status_code
+        self.request = FakeRequest()
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError("HTTP {}".format(self.status_code))
+
+
+class FakeSyncGateway(object):
+    """
+    _bulk_docs endpoint that fails each doc in 'flaky' with a 503 on its first write, every
+    doc in 'always_fail' with a 503 and every doc in 'forbidden' with a 403. With 'lost_responses'
+    the first n requests are committed but time out.
+    """
+
+    def __init__(self, flaky=(), always_fail=(), forbidden=(), lost_responses=0):
+        self.flaky = set(flaky)
+        self.always_fail = set(always_fail)
+        self.forbidden = set(forbidden)
+        self.lost_responses = lost_responses
+        self.docs = {}
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        doc_id = url.rsplit("/", 1)[-1]
+        if doc_id in self.docs:
+            return FakeResponse(self.docs[doc_id])
+        if "/" in url.split("//", 1)[-1]:
+            return FakeResponse({"error": "not_found"}, status_code=404)
+        return FakeResponse({"vendor": {"name": "Couchbase Sync Gateway"}})
+
+    def post(self, url, data=None, **kwargs):
+        docs = json.loads(data)["docs"]
+        results = []
+        with self.lock:
+            self.batches.append([doc["_id"] for doc in docs])
+            for doc in docs:
+                if doc["_id"] in self.flaky or doc["_id"] in self.always_fail:
+                    self.flaky.discard(doc["_id"])
+                    results.append({"id": doc["_id"], "error": "Service Unavailable", "status": 503})
+                elif doc["_id"] in self.forbidden:
+                    results.append({"id": doc["_id"], "error": "forbidden", "status": 403})
+                elif doc["_id"] in self.docs:
+                    results.append({"id": doc["_id"], "error": "conflict", "status": 409})
+                else:
+                    self.docs[doc["_id"]] = dict(doc, _rev="1-abc")
+                    results.append({"id": doc["_id"], "rev": "1-abc"})
+            if self.lost_responses:
+                self.lost_responses -= 1
+                raise Timeout("Read timed out")
+        return FakeResponse(results)
+
+
+def create_client(session, monkeypatch):
+    monkeypatch.setattr("keywords.MobileRestClient.time.sleep", lambda secs: None)
+    MobileRestClient.forget_server()
+    client = MobileRestClient()
+    client._session = session
+    return client
+
+
+def test_add_bulk_docs_chunked_batches_lazily(monkeypatch):
+    sg = FakeSyncGateway()
+    client = create_client(sg, monkeypatch)
+
+    docs = ({"_id": "doc_{}".format(i)} for i in range(25))
+    added, stats = client.add_bulk_docs_chunked("http://sg:4984", "db", docs, batch_size=10, max_in_flight=2)
+
+    assert [doc["id"] for doc in added] == ["doc_{}".format(i) for i in range(25)]
+    assert sorted(len(batch) for batch in sg.batches) == [5, 10, 10]
+    assert [(s["batch"], s["docs"], s["attempts"]) for s in stats] == [(0, 10, 1), (1, 10, 1), (2, 5, 1)]
+
+
+def test_add_bulk_docs_chunked_retries_only_failed_docs(monkeypatch):
+    sg = FakeSyncGateway(flaky=["doc_3", "doc_7"])
+    client = create_client(sg, monkeypatch)
+
+    docs = [{"_id": "doc_{}".format(i)} for i in range(10)]
+    added, stats = client.add_bulk_docs_chunked("http://sg:4984", "db", docs, batch_size=10)
+
+    assert sg.batches[1] == ["doc_3", "doc_7"]
+    assert all("error" not in doc for doc in added)
+    assert stats[0]["attempts"] == 2
+
+
+def test_add_bulk_docs_chunked_gives_up(monkeypatch):
+    sg = FakeSyncGateway(always_fail=["doc_1"])
+    client = create_client(sg, monkeypatch)
+
+    with pytest.raises(RestError):
+        client.add_bulk_docs_chunked("http://sg:4984", "db", [{"_id": "doc_0"}, {"_id": "doc_1"}], retries=2)
+    assert sg.batches[1:] == [["doc_1"], ["doc_1"]]
+
+
+def test_add_bulk_docs_chunked_does_not_retry_rejected_docs(monkeypatch):
+    sg = FakeSyncGateway(forbidden=["doc_1"])
+    client = create_client(sg, monkeypatch)
+
+    with pytest.raises(RestError) as e:
+        client.add_bulk_docs_chunked("http://sg:4984", "db", [{"_id": "doc_0"}, {"_id": "doc_1"}], retries=2)
+    assert "forbidden" in str(e.value)
+    assert sg.batches == [["doc_0", "doc_1"]]
+
+    # Without a rev, writing an existing doc is a conflict, not something to retry
+    with pytest.raises(RestError) as e:
+        client.add_bulk_docs_chunked("http://sg:4984", "db", [{"_id": "doc_0"}], retries=2)
+    assert "conflict" in str(e.value)
+    assert len(sg.batches) == 2
+
+
+def test_add_bulk_docs_chunked_committed_batch_that_timed_out(monkeypatch):
+    sg = FakeSyncGateway(lost_responses=1)
+    client = create_client(sg, monkeypatch)
+
+    docs = [{"_id": "doc_{}".format(i), "index": i} for i in range(3)]
+    added, stats = client.add_bulk_docs_chunked("http://sg:4984", "db", docs)
+
+    # The retry conflicts with the first, committed, attempt
+    assert sg.batches == [["doc_0", "doc_1", "doc_2"]] * 2
+    assert added == [{"id": "doc_{}".format(i), "rev": "1-abc"} for i in range(3)]
+    assert stats[0]["attempts"] == 2
+
+
+def test_add_bulk_docs_chunked_keeps_going_past_none(monkeypatch):
+    sg = FakeSyncGateway()
+    client = create_client(sg, monkeypatch)
+    posted = []
+
+    def post(url, data=None, **kwargs):
+        docs = json.loads(data)["docs"]
+        posted.append(docs)
+        return FakeResponse([{"id": "doc", "rev": "1-a"}] * len(docs))
+    monkeypatch.setattr(sg, "post", post)
+
+    added, _ = client.add_bulk_docs_chunked("http://sg:4984", "db", [{"_id": "doc_0"}, None, {"_id": "doc_2"}], batch_size=2)
+    assert posted == [[{"_id": "doc_0"}, None], [{"_id": "doc_2"}]]
+    assert len(added) == 3
+
+
+def test_add_docs_bulk_mode(monkeypatch):
+    sg = FakeSyncGateway()
+    client = create_client(sg, monkeypatch)
+
+    added = client.add_docs("http://sg:4984", "db", 7, "bulk", channels=["ABC"], batch_size=3)
+    assert [doc["id"] for doc in added] == ["bulk_{}".format(i) for i in range(7)]
+    assert len(sg.batches) == 3
+
+
+def test_server_type_probed_once_per_url(monkeypatch):
+    sg = FakeSyncGateway()
+    gets = []
+    real_get = sg.get
+    monkeypatch.setattr(sg, "get", lambda url, **kwargs: gets.append(url) or real_get(url, **kwargs))
+    client = create_client(sg, monkeypatch)
+
+    for i in range(3):
+        client.add_bulk_docs("http://sg:4984", "db", [{"_id": "doc_{}".format(i)}], auth=("SyncGatewaySession", "abc"))
+    assert gets == ["http://sg:4984"]
+    assert sg.batches == [["doc_0"], ["doc_1"], ["doc_2"]]
+
+    MobileRestClient.forget_server("http://sg:4984/")
+    client.add_bulk_docs("http://sg:4984", "db", [{"_id": "doc_3"}])
+    assert len(gets) == 2
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import keywords.ArtifactCache
+from keywords.ArtifactCache import ArtifactCache, download_artifact
+from keywords.exceptions import ArtifactCacheError
+
+PACKAGE = os.urandom(3 * 1024 * 1024 + 17)
+
+
+class PackageHandler(BaseHTTPRequestHandler):
+    """ Serves PACKAGE with Range support. The first 'cut_after' GET drops the connection half way """
+
+    requests = []
+    cut_after = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        PackageHandler.requests.append(self.headers.get("Range"))
+        if self.path.endswith(".sha256"):
+            body = "{}  package.zip\n".format(hashlib.sha256(PACKAGE).hexdigest()).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        body = PACKAGE[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if PackageHandler.cut_after:
+            PackageHandler.cut_after = 0
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    PackageHandler.requests = []
+    PackageHandler.cut_after = 0
+    httpd = HTTPServer(("127.0.0.1", 0), PackageHandler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:{}".format(httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_get_downloads_once_and_reuses(server, tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"))
+    url = "{}/builds/package.zip".format(server)
+
+    path = cache.get(url, "couchbase-lite-android", "3.1.0", "12", "android", checksum_url=url + ".sha256")
+    assert path == cache.path_for("couchbase-lite-android", "3.1.0", "12", "android", "package.zip")
+    with open(path, "rb") as f:
+        assert f.read() == PACKAGE
+
+    assert cache.get(url, "couchbase-lite-android", "3.1.0", "12", "android") == path
+    # The checksum and the package, nothing for the second get
+    assert len(PackageHandler.requests) == 2
+
+    dest = str(tmp_path / "binaries" / "package.zip")
+    download_artifact(url, dest, "couchbase-lite-android", "3.1.0", "12", "android", cache=cache)
+    with open(dest, "rb") as f:
+        assert f.read() == PACKAGE
+    assert len(PackageHandler.requests) == 2
+
+
+def test_interrupted_download_resumes(server, tmp_path):
+    cache = ArtifactCache(root=str(tmp_path))
+    PackageHandler.cut_after = 1
+
+    path = cache.get("{}/package.zip".format(server), "couchbase-lite-net", "3.1.0", None, None,
+                     sha256=hashlib.sha256(PACKAGE).hexdigest())
+
+    with open(path, "rb") as f:
+        assert f.read() == PACKAGE
+    assert PackageHandler.requests[0] is None
+    # Resumed from the whole chunks written before the connection dropped
+    resumed_from = int(PackageHandler.requests[1].split("=")[1].rstrip("-"))
+    assert 0 < resumed_from <= len(PACKAGE) // 2
+    assert not os.path.exists(path + ".part")
+
+
+def test_checksum_mismatch(server, tmp_path):
+    cache = ArtifactCache(root=str(tmp_path))
+    url = "{}/package.zip".format(server)
+
+    with pytest.raises(ArtifactCacheError) as e:
+        cache.get(url, "couchbase-lite-net", "3.1.0", "1", None, sha256="0" * 64)
+    assert str(e.value).startswith("Checksum mismatch")
+    assert cache.entries() == []
+
+
+def test_evicts_least_recently_used(server, tmp_path):
+    cache = ArtifactCache(root=str(tmp_path), max_bytes=2 * len(PACKAGE))
+    url = "{}/package.zip".format(server)
+
+    first = cache.get(url, "product", "1.0.0", "1", None)
+    second = cache.get(url, "product", "1.0.0", "2", None)
+    os.utime(first + ".json", (1, 1))
+    os.utime(second + ".json", (2, 2))
+    # Using the first makes the second the least recently used
+    cache.get(url, "product", "1.0.0", "1", None)
+
+    third = cache.get(url, "product", "1.0.0", "3", None)
+
+    assert sorted(path for path, _, _ in cache.entries()) == sorted([first, third])
+    assert not os.path.exists(second)
+    assert not os.path.exists(second + ".lock")
+
+
+def test_copies_to_dest_path_before_releasing_the_lock(server, tmp_path, monkeypatch):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=0)
+    url = "{}/package.zip".format(server)
+    cache.get(url, "product", "1.0.0", "1", None)
+    copyfile = shutil.copyfile
+
+    def copy_while_another_job_evicts(src, dst):
+        # Another job evicting everything it can while the copy is running
+        ArtifactCache(root=cache.root, max_bytes=0).evict()
+        return copyfile(src, dst)
+
+    monkeypatch.setattr(keywords.ArtifactCache.shutil, "copyfile", copy_while_another_job_evicts)
+    dest = str(tmp_path / "binaries" / "package.zip")
+    assert download_artifact(url, dest, "product", "1.0.0", "1", None, cache=cache) == dest
+    with open(dest, "rb") as f:
+        assert f.read() == PACKAGE
+    assert len(PackageHandler.requests) == 1
+
+
+def test_abandoned_downloads_count_towards_max_bytes(server, tmp_path):
+    cache = ArtifactCache(root=str(tmp_path), max_bytes=len(PACKAGE) + 10)
+    abandoned = cache.path_for("product", "1.0.0", "1", None, "package.zip")
+    os.makedirs(os.path.dirname(abandoned))
+    with open(abandoned + ".part", "wb") as f:
+        f.write(PACKAGE[:100])
+    with open(abandoned + ".lock", "w"):
+        pass
+    assert cache.parts() == [(abandoned + ".part", 100, os.path.getmtime(abandoned + ".part"))]
+
+    path = cache.get("{}/package.zip".format(server), "product", "1.0.0", "2", None)
+
+    assert [entry[0] for entry in cache.entries()] == [path]
+    assert cache.parts() == []
+    assert not os.path.exists(abandoned + ".lock")
@@ -0,0 +1,106 @@
+import pytest
+
+import keywords.couchbaseserver
+from keywords.couchbaseserver import CouchbaseServer
+
+MB = 1024 * 1024
+
+
+def bucket(name, ram_mb=1024, backend="couchstore", flush=True, status="healthy"):
+    return {
+        "name": name,
+        "bucketType": "membase",
+        "quota": {"rawRAM": ram_mb * MB},
+        "storageBackend": backend,
+        "controllers": {"flush": "/pools/default/buckets/{}/controller/doFlush".format(name)} if flush else {},
+        "nodes": [{"hostname": "cbs1:8091", "status": status}],
+    }
+
+
+class FakeResponse(object):
+    def __init__(self, status_code=200, obj=None):
+        self.status_code = status_code
+        self._obj = obj
+
+    def json(self):
+        return self._obj
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+    def __init__(self, scopes):
+        self.scopes = scopes
+        self.calls = []
+
+    def get(self, url):
+        self.calls.append(("GET", url))
+        return FakeResponse(obj={"scopes": self.scopes})
+
+    def post(self, url, data=None):
+        self.calls.append(("POST", url))
+        return FakeResponse()
+
+    def delete(self, url, data=None):
+        self.calls.append(("DELETE", url))
+        return FakeResponse()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(keywords.couchbaseserver, "is_magma_enabled", lambda cluster_config: False)
+    monkeypatch.setattr(keywords.couchbaseserver, "log_r", lambda resp: None)
+    server = CouchbaseServer("http://cbs1:8091")
+    server._session = FakeSession([
+        {"name": "_default", "collections": [{"name": "_default"}, {"name": "test_collection"}]},
+        {"name": "test_scope", "collections": [{"name": "c1"}]},
+    ])
+    server.deleted = []
+    server.created = []
+    server.buckets = [bucket("data-bucket"), bucket("index-bucket", ram_mb=512), bucket("leftover")]
+    server.get_buckets = lambda: server.buckets
+    server.get_ram_per_bucket = lambda num_buckets: 1024
+    server.delete_bucket = server.deleted.append
+    server._delete_indexes_and_prepareds = lambda: None
+
+    def create_bucket(cluster_config, name, ram_quota_mb=1024, ipv6=False, wait_until_ready=True):
+        assert not wait_until_ready
+        server.created.append((name, ram_quota_mb))
+        server.buckets.append(bucket(name, ram_quota_mb))
+
+    server.create_bucket = create_bucket
+    return server
+
+
+def test_recycle_buckets_reuses_matching_buckets(server):
+    reused = server.recycle_buckets(["data-bucket", "index-bucket", "new-bucket"], cluster_config="cluster")
+
+    assert reused == ["data-bucket"]
+    # Wrong RAM quota or not wanted
+    assert server.deleted == ["index-bucket", "leftover"]
+    assert server.created == [("index-bucket", 1024), ("new-bucket", 1024)]
+
+    calls = server._session.calls
+    assert ("POST", "http://cbs1:8091/pools/default/buckets/data-bucket/controller/doFlush") in calls
+    assert ("DELETE", "http://cbs1:8091/pools/default/buckets/data-bucket/scopes/test_scope") in calls
+    assert ("DELETE", "http://cbs1:8091/pools/default/buckets/data-bucket/scopes/_default/collections/test_collection") in calls
+    assert not any(url.endswith("/_default") for method, url in calls if method == "DELETE")
+
+
+def test_bucket_is_reusable():
+    assert CouchbaseServer._bucket_is_reusable(bucket("b"), 1024, "couchstore")
+    assert not CouchbaseServer._bucket_is_reusable(bucket("b"), 1024, "magma")
+    assert not CouchbaseServer._bucket_is_reusable(bucket("b", flush=False), 1024, "couchstore")
+    assert not CouchbaseServer._bucket_is_reusable(bucket("b", ram_mb=2048), 1024, "couchstore")
+
+
+def test_wait_for_buckets_ready(server):
+    listings = iter([[bucket("a", status="warmup")], [bucket("a")]])
+    server.get_buckets = lambda: next(listings)
+    server.wait_for_buckets_ready(["a"], timeout=5)
+
+    server.get_buckets = lambda: []
+    with pytest.raises(Exception) as e:
+        server.wait_for_buckets_ready(["a"], timeout=0.2)
+    assert "not ready" in str(e.value)
@@ -0,0 +1,131 @@
+import ast
+import asyncio
+import inspect
+import json
+import textwrap
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import unused_port
+
+from CBLClient.Args import Args
+from CBLClient.AsyncClient import AsyncClient
+from CBLClient.AsyncDatabase import AsyncDatabase
+from CBLClient.AsyncDocument import AsyncDocument
+from CBLClient.AsyncReplication import AsyncReplication
+from CBLClient.Database import Database
+from CBLClient.Document import Document
+from CBLClient.MemoryPointer import MemoryPointer
+from CBLClient.Replication import Replication
+
+
+async def start_fake_testserver():
+    """ Minimal TestServer answering a couple of database_* methods """
+    handles = {"next": 0}
+
+    async def handle(request):
+        method = request.match_info["method"]
+        body = json.loads(await request.text())
+        if method == "database_create":
+            handles["next"] += 1
+            return web.Response(text="@{}".format(handles["next"]))
+        if method == "database_getName":
+            return web.Response(text="\"{}-{}\"".format(request.host, body["database"].lstrip("@")))
+        if method == "database_exists":
+            return web.Response(text="false")
+        return web.Response(status=404)
+
+    app = web.Application()
+    app.router.add_post("/{method}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = unused_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, "http://127.0.0.1:{}".format(port)
+
+
+def test_async_client_invoke_method():
+    async def run():
+        runner, base_url = await start_fake_testserver()
+        try:
+            async with AsyncClient(base_url) as client:
+                args = Args()
+                args.setString("name", "db")
+                db = await client.invokeMethod("database_create", args)
+                assert isinstance(db, MemoryPointer)
+                assert db.getAddress() == "@1"
+            assert client.session is None
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_async_database_fan_out_shares_one_session():
+    async def run():
+        servers = [await start_fake_testserver() for _ in range(3)]
+        try:
+            async with aiohttp.ClientSession() as session:
+                dbs = [AsyncDatabase(base_url, session=session) for _, base_url in servers for _ in range(4)]
+                handles = await asyncio.gather(*[db.deleteDBIfExistsCreateNew("db") for db in dbs])
+                names = await asyncio.gather(*[db.getName(h) for db, h in zip(dbs, handles)])
+                assert len(set(names)) == len(dbs)
+                assert all(db._client.session is session for db in dbs)
+                for db in dbs:
+                    await db.close()
+                assert not session.closed
+        finally:
+            for runner, _ in servers:
+                await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_async_clients_share_default_session():
+    async def run():
+        runner, base_url = await start_fake_testserver()
+        try:
+            async with AsyncDatabase(base_url) as db_one, AsyncDatabase(base_url) as db_two:
+                await asyncio.gather(db_one.exists("db"), db_two.exists("db"))
+                shared = db_one._client.session
+                assert shared is db_two._client.session
+            assert shared.closed
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def _chains_calls(function):
+    """ True if function makes a call on self whose result it does not return
+    untouched. Such helpers cannot be inherited by an async wrapper, where
+    every call returns a coroutine.
+    """
+    node = ast.parse(textwrap.dedent(inspect.getsource(function))).body[0]
+    returned = {id(n.value) for n in ast.walk(node) if isinstance(n, ast.Return) and n.value is not None}
+    self_calls = []
+    for n in ast.walk(node):
+        if isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute):
+            root = n.func.value
+            while isinstance(root, ast.Attribute):
+                root = root.value
+            if isinstance(root, ast.Name) and root.id == "self":
+                self_calls.append(n)
+    return any(id(c) not in returned for c in self_calls)
+
+
+@pytest.mark.parametrize("sync_cls, async_cls", [
+    (Database, AsyncDatabase),
+    (Document, AsyncDocument),
+    (Replication, AsyncReplication),
+])
+def test_async_wrappers_override_chained_helpers(sync_cls, async_cls):
+    for name, member in vars(sync_cls).items():
+        if name.startswith("__") or not inspect.isfunction(member):
+            continue
+        if not _chains_calls(member):
+            continue
+        override = getattr(async_cls, name)
+        assert override is not member and inspect.iscoroutinefunction(override), \
+            "{}.{} chains RPCs and needs a coroutine override in {}".format(sync_cls.__name__, name, async_cls.__name__)
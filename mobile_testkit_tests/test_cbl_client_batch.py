@@ -0,0 +1,145 @@
+import json
+
+import pytest
+
+from CBLClient.Args import Args
+from CBLClient.Client import Client
+from CBLClient.MemoryPointer import MemoryPointer
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content.encode("utf-8")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception("HTTP {}".format(self.status_code))
+
+
+class FakeSession(object):
+    """ Records posted bodies and answers with canned TestServer responses """
+
+    def __init__(self, batch_supported=True, fail_method=None):
+        self.headers = {}
+        self.posts = []
+        self.batch_supported = batch_supported
+        self.fail_method = fail_method
+        self.next_handle = 0
+
+    def post(self, url, data=None):
+        method = url.rsplit("/", 1)[-1]
+        body = json.loads(data)
+        self.posts.append((method, body))
+        if method == "batch":
+            if not self.batch_supported:
+                return FakeResponse(404, "")
+            results = []
+            for index, call in enumerate(body["calls"]):
+                if call["method"] == self.fail_method:
+                    failure = {"index": index, "error": "boom", "results": results}
+                    return FakeResponse(500, json.dumps(failure))
+                results.append(self._answer(call["method"], call["args"]))
+            return FakeResponse(200, json.dumps(results))
+        if method == self.fail_method:
+            return FakeResponse(500, "boom")
+        return FakeResponse(200, self._answer(method, body))
+
+    def _answer(self, method, args):
+        if method.endswith("_create"):
+            self.next_handle += 1
+            return "@{}".format(self.next_handle)
+        return "\"{}\"".format(args.get("value", "").strip("\""))
+
+
+def create_client(base_url, batch_supported=True, fail_method=None):
+    Client._batch_support.pop(base_url, None)
+    client = Client(base_url)
+    client.session = FakeSession(batch_supported, fail_method)
+    return client
+
+
+def queue_create_and_set(batch):
+    doc = batch.invokeMethod("document_create", Args())
+    args = Args()
+    args.setMemoryPointer("document", doc)
+    args.setString("key", "foo")
+    args.setString("value", "bar")
+    batch.invokeMethod("document_setString", args)
+    return doc
+
+
+def test_batch_single_round_trip():
+    client = create_client("http://batch-ok:8080")
+    batch = client.batch()
+    doc = queue_create_and_set(batch)
+    results = batch.execute()
+
+    assert len(client.session.posts) == 1
+    method, body = client.session.posts[0]
+    assert method == "batch"
+    assert body["calls"][1]["args"]["document"] == "$0"
+    assert isinstance(results[0], MemoryPointer)
+    assert results[1] == "bar"
+    assert doc.getAddress() == "@1"
+
+
+def test_batch_falls_back_to_sequential_calls():
+    base_url = "http://batch-unsupported:8080"
+    client = create_client(base_url, batch_supported=False)
+
+    with client.batch() as batch:
+        queue_create_and_set(batch)
+
+    methods = [method for method, _ in client.session.posts]
+    assert methods == ["batch", "document_create", "document_setString"]
+    assert client.session.posts[2][1]["document"] == "@1"
+    assert not Client.batchSupported(base_url)
+
+    # Capability is remembered per base_url, not per Client instance
+    other = Client(base_url)
+    other.session = FakeSession(batch_supported=False)
+    with other.batch() as batch:
+        queue_create_and_set(batch)
+    assert "batch" not in [method for method, _ in other.session.posts]
+
+
+def test_batch_reports_failing_call():
+    client = create_client("http://batch-fail:8080", fail_method="document_setString")
+    batch = client.batch()
+    doc = queue_create_and_set(batch)
+
+    with pytest.raises(Exception) as err:
+        batch.execute()
+    assert str(err.value) == "Batch call 1 (document_setString) failed: boom"
+    # The completed call's handle is still available for release
+    assert doc.getAddress() == "@1"
+
+
+def test_sequential_fallback_reports_failing_call():
+    client = create_client("http://batch-unsupported-fail:8080", batch_supported=False, fail_method="document_setString")
+
+    calls = [("document_create", Args()), ("document_setString", Args()), ("document_create", Args())]
+    with pytest.raises(Client.BatchCallException) as err:
+        client.invokeMethods(calls)
+    assert err.value.index == 1
+    assert err.value.method == "document_setString"
+    # Stopped at the failing call
+    assert [method for method, _ in client.session.posts] == ["batch", "document_create", "document_setString"]
+
+
+def test_batch_rejects_nested_reference():
+    client = create_client("http://batch-nested:8080")
+    batch = client.batch()
+    doc = batch.invokeMethod("document_create", Args())
+
+    args = Args()
+    args.setArray("documents", [doc])
+    with pytest.raises(Exception):
+        batch.invokeMethod("database_saveDocuments", args)
+
+
+def test_invoke_methods_without_calls():
+    client = create_client("http://batch-empty:8080")
+    assert client.invokeMethods([]) == []
+    assert client.session.posts == []
@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import unused_port
+
+import keywords.ChangesMultiplexer
+from keywords.ChangesMultiplexer import ChangesMultiplexer
+from keywords.ChangesMultiplexer import FD_HEADROOM
+from keywords.exceptions import RestError
+from keywords.waiter import Backoff
+
+CHANGES = [
+    {"seq": 1, "id": "doc_0", "changes": [{"rev": "1-a"}]},
+    {"seq": 2, "id": "doc_1", "changes": [{"rev": "1-b"}]},
+    {"seq": 3, "id": "doc_0", "changes": [{"rev": "2-a"}]},
+    {"seq": 4, "id": "terminator", "changes": [{"rev": "1-t"}]},
+]
+
+
+async def start_fake_sync_gateway(requests):
+    """ _changes endpoint serving CHANGES, two results per polling request """
+
+    async def changes(request):
+        body = json.loads(await request.text())
+        requests.append((request.headers.get("Cookie"), body))
+        since = int(body["since"])
+        pending = [change for change in CHANGES if change["seq"] > since]
+
+        if body["feed"] == "continuous":
+            resp = web.StreamResponse()
+            await resp.prepare(request)
+            # End the first stream early so the feed has to reconnect from its last seq
+            for change in pending[:2] if since == 0 else pending:
+                await resp.write(json.dumps(change).encode("utf-8") + b"\n\n")
+            if since == 0:
+                await resp.write(json.dumps({"last_seq": pending[1]["seq"]}).encode("utf-8") + b"\n")
+            await resp.write_eof()
+            return resp
+
+        results = pending[:2]
+        return web.json_response({"results": results, "last_seq": results[-1]["seq"] if results else since})
+
+    app = web.Application()
+    app.router.add_post("/db/_changes", changes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = unused_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, "http://127.0.0.1:{}".format(port)
+
+
+def test_changes_multiplexer_runs_all_feed_types():
+    requests = []
+
+    async def run():
+        runner, url = await start_fake_sync_gateway(requests)
+        try:
+            mux = ChangesMultiplexer(url, "db", "terminator")
+            for i in range(20):
+                auth = ("SyncGatewaySession", "session_{}".format(i))
+                for feed in ("normal", "longpoll", "continuous"):
+                    mux.add_feed("user_{}".format(i), auth, feed, "sync_gateway/bychannel", ["even", "terminator"])
+            return mux, await mux.run_async()
+        finally:
+            await runner.cleanup()
+
+    mux, results = asyncio.run(run())
+
+    assert len(results) == 20
+    for by_feed in results.values():
+        assert by_feed == {feed: {"doc_0": "2-a", "doc_1": "1-b"} for feed in ("normal", "longpoll", "continuous")}
+    assert all(feed.found_terminator and feed.requests == 2 for feed in mux.feeds)
+
+    cookie, body = requests[0]
+    assert cookie.startswith("SyncGatewaySession=session_")
+    assert body["filter"] == "sync_gateway/bychannel" and body["channels"] == "even,terminator"
+    assert {body["since"] for _, body in requests if body["feed"] == "continuous"} == {0, 2}
+
+
+def test_continuous_feed_backs_off_empty_reconnects(monkeypatch):
+    intervals = []
+
+    class RecordingBackoff(Backoff):
+        def next_interval(self):
+            intervals.append(self._interval)
+            super(RecordingBackoff, self).next_interval()
+            return 0.001
+
+    monkeypatch.setattr(keywords.ChangesMultiplexer, "Backoff", RecordingBackoff)
+    posts = []
+
+    async def run():
+        async def changes(request):
+            posts.append(1)
+            resp = web.StreamResponse()
+            await resp.prepare(request)
+            # Three streams that end without changes, then the terminator
+            if len(posts) > 3:
+                await resp.write(json.dumps(CHANGES[-1]).encode("utf-8") + b"\n")
+            await resp.write(json.dumps({"last_seq": 0}).encode("utf-8") + b"\n")
+            await resp.write_eof()
+            return resp
+
+        app = web.Application()
+        app.router.add_post("/db/_changes", changes)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        port = unused_port()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        try:
+            mux = ChangesMultiplexer("http://127.0.0.1:{}".format(port), "db", "terminator")
+            mux.add_feed("user_0", None, "continuous")
+            await mux.run_async()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+    assert len(posts) == 4
+    assert intervals == [0.5, 1.0, 2.0]
+
+
+def test_connection_limit_fits_open_files_limit(monkeypatch):
+    mux = ChangesMultiplexer("http://sg:4984", "db", "terminator")
+    for i in range(3):
+        for feed in ("normal", "longpoll", "continuous"):
+            mux.add_feed("user_{}".format(i), None, feed)
+
+    monkeypatch.setattr(keywords.ChangesMultiplexer, "raise_open_files_limit", lambda wanted: wanted)
+    assert mux._connection_limit() == 9
+
+    # A hard limit too low for one connection per feed shrinks the pool
+    monkeypatch.setattr(keywords.ChangesMultiplexer, "raise_open_files_limit", lambda wanted: FD_HEADROOM + 5)
+    assert mux._connection_limit() == 5
+
+    # ... as long as the polling feeds still get a connection
+    monkeypatch.setattr(keywords.ChangesMultiplexer, "raise_open_files_limit", lambda wanted: FD_HEADROOM + 3)
+    with pytest.raises(RestError):
+        mux._connection_limit()
+
+    mux.max_connections = 2
+    assert mux._connection_limit() == 2
+
+
+def test_raise_open_files_limit_keeps_a_higher_limit():
+    resource = pytest.importorskip("resource")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    assert keywords.ChangesMultiplexer.raise_open_files_limit(16) == (16 if soft == resource.RLIM_INFINITY else soft)
+    assert resource.getrlimit(resource.RLIMIT_NOFILE) == (soft, hard)
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from requests.exceptions import ConnectionError
+
+import keywords.ChangesTracker
+from keywords.ChangesTracker import ChangesTracker
+from keywords.ChangesTracker import seq_number
+from keywords.exceptions import ChangesError
+
+
+def change(seq, doc_id, *revs):
+    return {"seq": seq, "id": doc_id, "changes": [{"rev": rev} for rev in revs]}
+
+
+def test_process_changes_indexes_revs():
+    ct = ChangesTracker("http://localhost:4984", "db")
+    ct.process_changes([change(1, "doc_1", "1-a"), change(2, "doc_2", "1-b")])
+    ct.process_changes([change(3, "doc_1", "2-a"), change(4, "doc_3")])
+
+    assert ct.processed_changes == {
+        "doc_1": [{"rev": "1-a"}, {"rev": "2-a"}],
+        "doc_2": [{"rev": "1-b"}],
+    }
+    assert ct.changes_received == 3
+    assert ct.revs_received == 3
+
+    with pytest.raises(ChangesError):
+        ct.process_changes([change(5, "doc_1", "1-a")])
+
+
+def test_process_line_continuous_feed():
+    ct = ChangesTracker("http://localhost:4984", "db")
+    lines = [json.dumps(change(1, "doc_1", "1-a")).encode("utf-8"), b"", json.dumps(change("2", "doc_2", "1-b"))]
+
+    assert all(ct.process_line(line) for line in lines)
+    assert ct.last_seq == "2"
+    assert not ct.process_line(json.dumps({"last_seq": "7"}))
+    assert ct.last_seq == "7"
+    assert sorted(ct.processed_changes) == ["doc_1", "doc_2"]
+
+
+def test_wait_until_rev_prefix():
+    ct = ChangesTracker("http://localhost:4984", "db")
+    ct.process_changes([change(1, "doc_1", "1-a", "2-b")])
+
+    assert ct.wait_until([{"id": "doc_1", "rev": "2-"}], rev_prefix_gen=True)
+    assert ct.wait_until([{"id": "doc_1", "rev": "2-b"}])
+    assert not ct.wait_until([{"id": "doc_1", "rev": "3-c"}], timeout=0)
+
+
+def test_seq_number():
+    assert seq_number(12) == 12
+    assert seq_number("5::40") == 40
+    assert seq_number("3:12") == 12
+    assert seq_number("abc") is None
+
+
+class FeedResponse(object):
+    """ A continuous feed the server ends after 'lines' """
+
+    status_code = 200
+    request = type("Request", (), {"method": "POST", "url": "http://localhost:4984/db/_changes", "headers": {}, "body": ""})
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, chunk_size=None):
+        return iter(self.lines)
+
+    def close(self):
+        pass
+
+
+class FeedSession(object):
+    def __init__(self, tracker, feeds):
+        self.tracker = tracker
+        self.feeds = feeds
+        self.posts = 0
+
+    def post(self, url, data=None, timeout=None, stream=False):
+        self.posts += 1
+        if self.posts == len(self.feeds):
+            self.tracker.stop()
+        return FeedResponse(self.feeds[self.posts - 1])
+
+
+def test_continuous_feed_reconnects_with_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(keywords.ChangesTracker.time, "sleep", sleeps.append)
+    ct = ChangesTracker("http://localhost:4984", "db")
+    end = json.dumps({"last_seq": "1"})
+    ct._session = FeedSession(ct, [
+        [end],
+        [end],
+        [json.dumps(change(2, "doc_1", "1-a")), json.dumps({"last_seq": "2"})],
+        [end],
+        [end],
+    ])
+
+    ct.start(feed="continuous")
+
+    assert ct.reconnects == 4
+    assert ct.changes_received == 1
+    # Empty reconnects back off, a reconnect that brought changes starts over
+    assert len(sleeps) == 3
+    assert sleeps[1] > sleeps[0]
+    assert sleeps[2] < sleeps[1]
+
+
+def test_continuous_feed_connection_errors_propagate():
+    # Nothing listens on port 1
+    ct = ChangesTracker("http://127.0.0.1:1", "db")
+    with pytest.raises(ConnectionError):
+        ct.start(feed="continuous", request_timeout=1000)
@@ -0,0 +1,146 @@
+import gzip
+
+import pytest
+
+from keywords.DatasetSnapshot import DatasetSnapshot, dataset_key
+from keywords.document import iter_docs
+from keywords.exceptions import DatasetSnapshotError
+
+
+class FakeSdkClient(object):
+    def __init__(self):
+        self.docs = {}
+        self.calls = 0
+
+    def upsert_multi(self, docs):
+        self.calls += 1
+        self.docs.update(docs)
+
+    def get_multi(self, doc_ids):
+        self.calls += 1
+        return {doc_id: FakeResult(self.docs[doc_id]) for doc_id in doc_ids if doc_id in self.docs}
+
+
+class FakeResult(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeSyncGatewayClient(object):
+    """ Answers the MobileRestClient calls used to capture and restore a dataset """
+
+    def __init__(self, docs=None, users=None, roles=None):
+        self.docs = docs or {}
+        self.users = users or {}
+        self.roles = roles or {}
+
+    def get_all_docs(self, url, db, auth=None, include_docs=False, scope=None, collection=None):
+        rows = [{"id": doc_id, "doc": dict(doc, _id=doc_id, _rev="1-abc")} for doc_id, doc in self.docs.items()]
+        return {"rows": rows}
+
+    def get_users(self, url, db, auth=None):
+        return list(self.users)
+
+    def get_user(self, url, db, name, auth=None):
+        return self.users[name]
+
+    def get_roles(self, url, db, auth=None):
+        return list(self.roles)
+
+    def get_role(self, url, db, name, auth=None):
+        return self.roles[name]
+
+    def create_role(self, url, db, name, channels=None, auth=None):
+        self.roles[name] = {"name": name, "admin_channels": channels}
+
+    def create_user(self, url, db, name, password, channels=None, roles=[], auth=None):
+        self.users[name] = {"name": name, "password": password, "admin_channels": channels, "admin_roles": roles}
+
+    def add_bulk_docs_chunked(self, url, db, docs, batch_size=500, max_in_flight=4, auth=None, scope=None, collection=None):
+        added = []
+        for doc in docs:
+            assert "_rev" not in doc
+            self.docs[doc["_id"]] = {k: v for k, v in doc.items() if k != "_id"}
+            added.append({"id": doc["_id"], "rev": "1-def"})
+        return added, []
+
+
+def test_dataset_key_depends_on_generator_count_and_channels():
+    key = dataset_key("four_k", 100, ["ABC"])
+    assert key.startswith("four_k_100_")
+    assert key == dataset_key("four_k", 100, ["ABC"])
+    assert key != dataset_key("four_k", 100, ["NBC"])
+    assert key != dataset_key("four_k", 101, ["ABC"])
+    assert key != dataset_key("four_k", 100, ["ABC"], expiry=10)
+
+
+def test_save_and_restore_to_bucket(tmp_path):
+    snapshot = DatasetSnapshot("create_docs", 25, channels=["ABC"], root=str(tmp_path))
+    assert not snapshot.exists()
+
+    manifest = snapshot.save(iter_docs("sdk", 25, channels=["ABC"], non_sgw=True))
+    assert snapshot.exists()
+    assert manifest["doc_count"] == 25
+
+    sdk_client = FakeSdkClient()
+    assert snapshot.restore_to_bucket(sdk_client, batch_size=10) == 25
+    assert sdk_client.calls == 3
+    assert sdk_client.docs["sdk_3"] == {"id": "sdk_3", "channels": ["ABC"]}
+
+
+def test_capture_from_bucket(tmp_path):
+    sdk_client = FakeSdkClient()
+    sdk_client.upsert_multi({doc["id"]: doc for doc in iter_docs("sdk", 25, channels=["ABC"], non_sgw=True)})
+    sdk_client.calls = 0
+    doc_ids = ["sdk_{}".format(i) for i in range(25)]
+
+    snapshot = DatasetSnapshot("create_docs", 25, channels=["ABC"], root=str(tmp_path))
+    manifest = snapshot.capture_from_bucket(sdk_client, doc_ids, batch_size=10)
+    assert manifest["doc_count"] == 25
+    assert sdk_client.calls == 3
+    assert dict(snapshot.iter_docs())["sdk_3"] == {"id": "sdk_3", "channels": ["ABC"]}
+    assert snapshot.principals() == {"users": [], "roles": []}
+
+    with pytest.raises(DatasetSnapshotError):
+        snapshot.capture_from_bucket(sdk_client, doc_ids + ["missing"])
+    # The failed capture leaves the saved snapshot alone
+    assert snapshot.verify()["doc_count"] == 25
+
+
+def test_capture_and_restore_sync_gateway_state(tmp_path):
+    source = FakeSyncGatewayClient(
+        docs={"doc_{}".format(i): {"channels": ["ABC"], "i": i} for i in range(5)},
+        users={"alice": {"admin_channels": ["ABC"], "admin_roles": ["reader"]}},
+        roles={"reader": {"admin_channels": ["ABC"]}},
+    )
+    snapshot = DatasetSnapshot("sg_docs", 5, channels=["ABC"], root=str(tmp_path))
+    snapshot.capture_from_sync_gateway(source, "http://sg:4985", "db", passwords={"alice": "secret"})
+
+    target = FakeSyncGatewayClient()
+    assert snapshot.restore_to_sync_gateway(target, "http://sg:4985", "db") == 5
+    assert target.docs == source.docs
+    assert target.roles == {"reader": {"name": "reader", "admin_channels": ["ABC"]}}
+    assert target.users["alice"]["password"] == "secret"
+    assert target.users["alice"]["admin_roles"] == ["reader"]
+
+
+def test_verify_detects_corruption(tmp_path):
+    snapshot = DatasetSnapshot("create_docs", 3, root=str(tmp_path))
+    snapshot.save(iter_docs("doc", 3))
+    snapshot.verify()
+
+    with gzip.open(snapshot._file("docs.jsonl.gz"), "at") as f:
+        f.write('["extra", {}]\n')
+    with pytest.raises(DatasetSnapshotError):
+        snapshot.restore_to_bucket(FakeSdkClient())
+
+    with pytest.raises(DatasetSnapshotError):
+        DatasetSnapshot("missing", 1, root=str(tmp_path)).verify()
+
+
+def test_save_replaces_previous_snapshot(tmp_path):
+    snapshot = DatasetSnapshot("create_docs", 2, root=str(tmp_path))
+    snapshot.save(iter_docs("old", 2))
+    snapshot.save(iter_docs("new", 2))
+    assert [doc_id for doc_id, _ in snapshot.iter_docs()] == ["new_0", "new_1"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [snapshot.key]
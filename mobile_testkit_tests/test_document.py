@@ -51,3 +51,37 @@ def test_document_attachment_not_list():
 def test_document_channels_not_list():
     with pytest.raises(TypeError):
         document.create_doc(None, None, None, None, "B")
+
+
+def test_iter_docs_is_lazy():
+    calls = []
+
+    def attachments_generator():
+        calls.append(1)
+        return attachment.generate_png_1_1()
+
+    docs = document.iter_docs("lazy", 3, attachments_generator=attachments_generator, channels=["A"])
+    assert calls == []
+
+    first = next(docs)
+    assert first["_id"] == "lazy_0"
+    assert len(calls) == 1
+    assert [doc["_id"] for doc in docs] == ["lazy_1", "lazy_2"]
+
+
+def test_iter_docs_validates_eagerly():
+    with pytest.raises(TypeError):
+        document.iter_docs("lazy", 3, channels="A")
+    with pytest.raises(ValueError):
+        document.batched(document.iter_docs("lazy", 3), 0)
+
+
+def test_create_docs_matches_iter_docs():
+    assert document.create_docs("doc", 3, expiry=5) == list(document.iter_docs("doc", 3, expiry=5))
+
+
+def test_batched():
+    batches = list(document.batched(document.iter_docs("doc", 5), 2))
+    assert [[doc["_id"] for doc in batch] for batch in batches] == [["doc_0", "doc_1"], ["doc_2", "doc_3"], ["doc_4"]]
+    with pytest.raises(ValueError):
+        list(document.batched([], 0))
@@ -0,0 +1,61 @@
+import json
+
+from libraries.utilities.expvar_collector import ExpvarCollector
+from libraries.utilities.expvar_collector import flatten_numeric
+from libraries.utilities.expvar_collector import read_expvar_columns
+from libraries.utilities.expvar_collector import read_expvar_samples
+
+SG = "sg1:4985/_expvar"
+
+
+def expvars(pushed, alloc, p95=None):
+    obj = {"cmdline": ["sync_gateway"], "memstats": {"Alloc": alloc, "Sys": 100, "EnableGC": True},
+           "gateload": {"total_doc_pushed": pushed, "ops": {}}}
+    if p95 is not None:
+        obj["gateload"]["ops"]["PushToSubscriberInteractive"] = {"p95": p95}
+    return obj
+
+
+def test_flatten_numeric():
+    assert flatten_numeric(expvars(1, 2, p95=3)) == {
+        "memstats/Alloc": 2,
+        "memstats/Sys": 100,
+        "gateload/total_doc_pushed": 1,
+        "gateload/ops/PushToSubscriberInteractive/p95": 3,
+    }
+    assert flatten_numeric({"BySize": [{"Size": 8}]}) == {"BySize/0/Size": 8}
+
+
+def test_collector_writes_deltas_and_replays(tmp_path):
+    samples = [expvars(1, 10), expvars(2, 10, p95=5), expvars(2, 10), expvars(3, 11)]
+    with ExpvarCollector({"sync_gateway": [SG]}, str(tmp_path), key_frame_every=3) as collector:
+        for i, sample in enumerate(samples):
+            collector.record("sync_gateway", SG, "2026-01-01 00:00:0{}.000000".format(i), sample)
+
+    lines = [json.loads(line) for line in open(collector.filename("sync_gateway"))]
+    assert [line["key"] for line in lines] == [True, False, False, True]
+    assert lines[1]["values"] == {"gateload/total_doc_pushed": 2, "gateload/ops/PushToSubscriberInteractive/p95": 5}
+    assert lines[2]["values"] == {"gateload/ops/PushToSubscriberInteractive/p95": None}
+
+    replayed = read_expvar_samples(collector.filename("sync_gateway"))
+    for (timestamp, entry), sample in zip(replayed.items(), samples):
+        assert entry["endpoint"] == SG
+        expected = dict(sample)
+        del expected["cmdline"]
+        del expected["memstats"]["EnableGC"]
+        if not expected["gateload"]["ops"]:
+            del expected["gateload"]["ops"]
+        assert entry["expvars"] == expected
+
+    columns = read_expvar_columns(collector.filename("sync_gateway"), paths=["memstats/Alloc", "gateload/ops/PushToSubscriberInteractive/p95"])
+    assert columns[SG]["memstats/Alloc"] == [10, 10, 10, 11]
+    assert columns[SG]["gateload/ops/PushToSubscriberInteractive/p95"] == [None, 5, None, None]
+
+
+def test_replay_ignores_truncated_last_line(tmp_path):
+    with ExpvarCollector({"gateload": ["lg1:9876/debug/vars"]}, str(tmp_path)) as collector:
+        collector.record("gateload", "lg1:9876/debug/vars", "2026-01-01 00:00:00.000000", expvars(1, 1))
+    with open(collector.filename("gateload"), "a") as f:
+        f.write('{"t": "2026-01-01 00:00:01')
+
+    assert len(read_expvar_samples(collector.filename("gateload"))) == 1
@@ -0,0 +1,165 @@
+import pytest
+
+from CBLClient.Client import Client
+from CBLClient.Database import Database
+from CBLClient.Dictionary import Dictionary
+from CBLClient.Document import Document
+from CBLClient.HandleScope import HandleScope
+from CBLClient.Utils import Utils
+from libraries.testkit.mock_test_server import MockTestServer
+from utilities.cbl_client_benchmark import run_benchmark
+
+
+@pytest.fixture
+def test_server():
+    with MockTestServer() as mock_test_server:
+        Client._batch_support.pop(mock_test_server.url, None)
+        yield mock_test_server
+    assert HandleScope._active == {}
+
+
+def create_docs(test_server, count):
+    document = Document(test_server.url)
+    return [document.create("doc_{}".format(i)) for i in range(count)]
+
+
+def test_releases_leaked_handles_in_one_rpc(test_server):
+    db = Database(test_server.url).create("db")
+
+    with Client(test_server.url).handle_scope("test_leaks") as scope:
+        docs = create_docs(test_server, 30)
+        dictionary = Dictionary(test_server.url).create({"a": 1})
+        assert scope.live_count() == 31
+        assert scope.live_bytes() > 0
+
+    assert scope.created == 31
+    assert scope.leaked == 31
+    assert scope.release_rpcs == 1
+    assert test_server.calls["release"] == 31
+    # Only the handle created before the scope is left
+    assert test_server.handle_count() == 1
+    assert Database(test_server.url).getName(db) == "db"
+    with pytest.raises(Exception):
+        Document(test_server.url).getId(docs[0])
+    with pytest.raises(Exception):
+        Dictionary(test_server.url).toMap(dictionary)
+
+
+def test_explicit_releases_are_batched_on_thresholds(test_server):
+    utils = Utils(test_server.url)
+
+    with Client(test_server.url).handle_scope(max_pending=10) as scope:
+        docs = create_docs(test_server, 25)
+        for doc in docs[:9]:
+            utils.release(doc)
+        assert test_server.calls["release"] == 0
+        utils.release(docs[9:15])
+        # The 10th queued release sent the first batch, 5 more are queued again
+        assert test_server.calls["release"] == 10
+        assert scope.release_rpcs == 1
+        assert test_server.handle_count() == 15
+
+    assert scope.released == 15
+    assert scope.leaked == 10
+    assert scope.release_rpcs == 2
+    assert test_server.handle_count() == 0
+
+    with Client(test_server.url).handle_scope(max_pending_bytes=1) as scope:
+        utils.release(create_docs(test_server, 1))
+        assert test_server.handle_count() == 0
+    assert scope.leaked == 0
+
+
+def test_nested_scopes(test_server):
+    client = Client(test_server.url)
+    with client.handle_scope("outer") as outer:
+        kept = create_docs(test_server, 2)
+        with client.handle_scope("inner") as inner:
+            create_docs(test_server, 3)
+            # Releasing an outer handle inside the inner scope is the outer scope's business
+            Utils(test_server.url).release(kept[0])
+        assert inner.leaked == 3
+        # kept[0] stays queued on the outer scope
+        assert test_server.handle_count() == 2
+        assert Document(test_server.url).getId(kept[1]) == "doc_1"
+
+    assert outer.created == 2
+    assert outer.released == 1
+    assert outer.leaked == 1
+    assert test_server.handle_count() == 0
+
+
+def test_flush_memory_drops_tracked_handles(test_server):
+    with Client(test_server.url).handle_scope() as scope:
+        create_docs(test_server, 5)
+        Utils(test_server.url).flushMemory()
+        create_docs(test_server, 2)
+
+    assert scope.leaked == 7
+    assert test_server.calls["release"] == 2
+
+
+def test_falls_back_to_single_releases(test_server):
+    client = Client(test_server.url)
+    with client.handle_scope() as scope:
+        docs = create_docs(test_server, 4)
+        # Released behind the scope's back, so the batched release stops at it
+        test_server.handles.pop(docs[1].getAddress())
+
+    assert scope.leaked == 4
+    assert test_server.handle_count() == 0
+    # The batch that stopped at docs[1], then one for the handles after it
+    assert scope.release_rpcs == 2
+    assert test_server.calls["release"] == 2 + 2
+
+
+def test_counts_one_rpc_per_release_without_batch_endpoint():
+    with MockTestServer(batch=False) as test_server:
+        Client._batch_support.pop(test_server.url, None)
+        client = Client(test_server.url)
+        with client.handle_scope() as scope:
+            docs = create_docs(test_server, 4)
+            test_server.handles.pop(docs[1].getAddress())
+
+        assert test_server.handle_count() == 0
+        # The batch request answered 404, then one RPC per release up to the failed one and after it
+        assert scope.release_rpcs == 1 + 4
+        assert test_server.round_trips - 4 == scope.release_rpcs
+
+        with client.handle_scope() as scope:
+            create_docs(test_server, 3)
+        assert scope.release_rpcs == 3
+        assert test_server.handle_count() == 0
+    assert HandleScope._active == {}
+
+
+def test_tracks_batched_calls_and_releases_without_scope(test_server):
+    client = Client(test_server.url)
+    with client.handle_scope() as scope:
+        with client.batch() as batch:
+            batch.invokeMethod("dictionary_create")
+            batch.invokeMethod("dictionary_create")
+        assert scope.live_count() == 2
+
+        # Calls completed before a failing one still hold handles
+        failing = client.batch()
+        failing.invokeMethod("dictionary_create")
+        failing.invokeMethod("no_such_method")
+        with pytest.raises(Exception):
+            failing.execute()
+        assert scope.live_count() == 3
+    assert scope.leaked == 3
+    assert test_server.handle_count() == 0
+
+    doc = create_docs(test_server, 1)[0]
+    client.release(doc)
+    assert test_server.calls["release"] == 4
+    assert test_server.handle_count() == 0
+
+
+@pytest.mark.benchmark
+def test_benchmark_handle_growth_with_scope(test_server):
+    report = run_benchmark(test_server.url, "documents", 20, test_server, handle_scope=True)
+    assert report["handles_created"] == report["leaked_handles"] == 1 + 20 + 20
+    assert report["handle_growth"] == 0
+    assert report["release_rpcs"] == 1
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+
+from contextlib import contextmanager
+
+import pytest
+import requests
+from requests.exceptions import HTTPError
+
+from keywords.ChangesTracker import ChangesTracker
+from keywords.MobileRestClient import MobileRestClient
+from keywords.document import create_docs
+from keywords.utils import log_info
+from keywords.waiter import wait_until
+from libraries.testkit.admin import Admin
+from libraries.testkit.mock_sync_gateway import MockSyncGateway
+
+# Benchmarks of the testkit clients against MockSyncGateway. Besides the timings (logged),
+# they pin the number of requests each client code path makes, so client side regressions
+# (extra round trips, lost concurrency, ...) fail here without a cluster.
+# Run only these with: pytest -m benchmark mobile_testkit_tests
+
+
+@contextmanager
+def timed(name, ops):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    log_info("[benchmark] {}: {} ops in {:.3f}s ({:.0f} ops/s)".format(name, ops, elapsed, ops / elapsed if elapsed else 0))
+
+
+@pytest.fixture
+def sg():
+    with MockSyncGateway(dbs=["db"]) as mock_sg:
+        MobileRestClient.forget_server(mock_sg.url)
+        yield mock_sg
+    MobileRestClient.forget_server(mock_sg.url)
+
+
+@pytest.mark.benchmark
+def test_mobile_rest_client_bulk_round_trip(sg):
+    client = MobileRestClient()
+    client.create_user(sg.url, "db", "seth", "pass", channels=["ABC"])
+    session = client.create_session(sg.url, "db", "seth")
+    client.get_server_type(sg.url)
+    docs = create_docs("doc", 1000, channels=["ABC"])
+
+    sg.reset_requests()
+    with timed("add_bulk_docs_chunked", len(docs)):
+        added, _ = client.add_bulk_docs_chunked(sg.url, "db", docs, batch_size=100, auth=session)
+    with timed("get_all_docs", len(docs)):
+        all_docs = client.get_all_docs(sg.url, "db", auth=session, include_docs=True)
+    with timed("get_bulk_docs", len(docs)):
+        fetched, errors = client.get_bulk_docs(sg.url, "db", [doc["id"] for doc in added], auth=session)
+    with timed("update_docs_bulk", 2 * len(docs)):
+        updated = client.update_docs_bulk(sg.url, "db", added, number_updates=2, batch_size=100, auth=session)
+
+    assert len(all_docs["rows"]) == 1000
+    assert len(fetched) == 1000 and errors == []
+    assert all(doc["rev"].startswith("3-") for doc in updated)
+    assert sg.doc_count("db") == 1000
+    assert sg.requests == {
+        "POST _bulk_docs": 10 + 2 * 10,
+        "GET _all_docs": 1,
+        # get_bulk_docs and the one time body fetch of update_docs_bulk
+        "POST _bulk_get": 1 + 10,
+    }
+
+
+@pytest.mark.benchmark
+def test_add_bulk_docs_chunked_overlaps_request_latency(sg):
+    sg.endpoint_latency["_bulk_docs"] = 0.05
+    client = MobileRestClient()
+    client.get_server_type(sg.url)
+
+    with timed("add_bulk_docs_chunked max_in_flight=4", 800):
+        client.add_bulk_docs_chunked(sg.url, "db", create_docs("doc", 800), batch_size=100, max_in_flight=4)
+
+    assert sg.requests["POST _bulk_docs"] == 8
+    # The batches were written concurrently, but never more than max_in_flight at a time
+    assert 1 < sg.max_in_flight["POST _bulk_docs"] <= 4
+
+    sg.reset_requests()
+    client.add_bulk_docs_chunked(sg.url, "db", create_docs("serial", 300), batch_size=100, max_in_flight=1)
+    assert sg.max_in_flight["POST _bulk_docs"] == 1
+
+
+@pytest.mark.benchmark
+def test_mobile_rest_client_changes_feeds(sg):
+    client = MobileRestClient()
+    client.create_user(sg.url, "db", "seth", "pass", channels=["ABC"])
+    session = client.create_session(sg.url, "db", "seth")
+    client.add_bulk_docs(sg.url, "db", create_docs("abc", 50, channels=["ABC"]))
+    client.add_bulk_docs(sg.url, "db", create_docs("nbc", 50, channels=["NBC"]))
+
+    with timed("get_changes normal", 50):
+        changes = client.get_changes(sg.url, "db", since=0, auth=session, feed="normal")
+    assert [row["id"] for row in changes["results"]] == ["abc_{}".format(i) for i in range(50)]
+
+    filtered = client.get_changes(sg.url, "db", since=0, auth=None, feed="normal", filter_type="_doc_ids", filter_doc_ids=["nbc_3"])
+    assert [row["id"] for row in filtered["results"]] == ["nbc_3"]
+
+    # A longpoll wakes up as soon as a doc in the user's channels is written
+    writer = threading.Timer(0.2, client.add_doc, args=(sg.url, "db", {"_id": "abc_late", "channels": ["ABC"]}), kwargs={"use_post": False})
+    writer.start()
+    with timed("get_changes longpoll", 1):
+        late = client.get_changes(sg.url, "db", since=changes["last_seq"], auth=session, timeout=10)
+    writer.join()
+    assert [row["id"] for row in late["results"]] == ["abc_late"]
+
+    empty = client.get_changes(sg.url, "db", since=late["last_seq"], auth=session, timeout=0.1)
+    assert empty == {"results": [], "last_seq": late["last_seq"]}
+
+
+@pytest.mark.benchmark
+def test_changes_tracker_continuous_feed(sg):
+    sg.add_user("db", "seth", "pass", channels=["ABC"])
+    tracker = ChangesTracker(sg.url, "db", auth=("seth", "pass"))
+    thread = threading.Thread(target=tracker.start, kwargs={"feed": "continuous", "heartbeat": 100})
+    thread.start()
+    try:
+        client = MobileRestClient()
+        with timed("continuous changes", 500):
+            added, _ = client.add_bulk_docs_chunked(sg.url, "db", create_docs("doc", 500, channels=["ABC"]), batch_size=50)
+            wait_until(lambda: all(tracker._has_rev(doc["id"], doc["rev"], False) for doc in added), timeout=30)
+    finally:
+        tracker.stop()
+        thread.join()
+
+    assert tracker.changes_received == 500
+    assert tracker.sequence_lag() == 0
+    # One streaming request for the whole feed
+    assert sg.requests["POST _changes"] == 1
+
+
+@pytest.mark.benchmark
+def test_admin_and_user(sg, tmp_path, monkeypatch):
+    cluster_config = tmp_path / "mock_cluster.json"
+    cluster_config.write_text(json.dumps({"environment": {"disable_admin_auth": True, "sync_gateway_ssl": False}}))
+    monkeypatch.setenv("CLUSTER_CONFIG", str(cluster_config))
+
+    target = type("Target", (), {"ip": "127.0.0.1", "url": sg.url})()
+    admin = Admin(target)
+    admin.admin_url = sg.url
+
+    with timed("register_bulk_users", 20):
+        users = admin.register_bulk_users(target, "db", "user", 20, "pass", channels=["ABC"], num_of_workers=4)
+    assert len(admin.get_users_info("db")) == 20
+
+    user = users[0]
+    with timed("User.add_docs", 200):
+        errors = user.add_docs(200, name_prefix="user_doc_")
+    assert errors == []
+    with timed("User.update_docs", 200):
+        errors = user.update_docs(num_revs_per_doc=2)
+    assert errors == []
+
+    docs = user.get_docs(list(user.cache))
+    assert {doc["_id"]: doc["_rev"] for doc in docs} == user.cache
+    assert all(doc["updates"] == 2 for doc in docs)
+    assert len(user.get_all_docs()["rows"]) == 200
+    changes = user.get_changes(feed="normal", since=0)
+    assert len(changes["results"]) == 200
+
+
+def test_rejects_stale_revs_and_bad_credentials(sg):
+    sg.add_user("db", "seth", "pass")
+    resp = requests.put("{}/db/doc_1".format(sg.url), data=json.dumps({"a": 1}))
+    assert resp.status_code == 201
+    rev = resp.json()["rev"]
+
+    stale = requests.post("{}/db/_bulk_docs".format(sg.url), data=json.dumps({"docs": [{"_id": "doc_1", "a": 2}]}))
+    assert stale.json()[0]["status"] == 409
+
+    with pytest.raises(HTTPError):
+        requests.get("{}/db/doc_1".format(sg.url), auth=("seth", "wrong")).raise_for_status()
+
+    deleted = requests.delete("{}/db/doc_1?rev={}".format(sg.url, rev))
+    assert deleted.status_code == 200
+    assert requests.get("{}/db/doc_1".format(sg.url)).status_code == 404
+    assert requests.get("{}/db/_changes".format(sg.url)).json()["results"][0]["deleted"] is True
@@ -0,0 +1,183 @@
+import json
+
+import pytest
+
+from CBLClient.Args import Args
+from CBLClient.Client import Client
+from CBLClient.Database import Database
+from CBLClient.Dictionary import Dictionary
+from CBLClient.Document import Document
+from CBLClient.MemoryPointer import MemoryPointer
+from CBLClient.Query import Query
+from CBLClient.Replication import Replication
+from CBLClient.Utils import Utils
+from libraries.testkit.mock_test_server import MockTestServer
+from utilities.cbl_client_benchmark import run_benchmark
+
+
+@pytest.fixture
+def test_server():
+    with MockTestServer() as mock_test_server:
+        Client._batch_support.pop(mock_test_server.url, None)
+        yield mock_test_server
+
+
+def test_database_and_document_handles(test_server):
+    database = Database(test_server.url)
+    document = Document(test_server.url)
+    dictionary = Dictionary(test_server.url)
+
+    db = database.create("db")
+    assert isinstance(db, MemoryPointer)
+    assert database.getName(db) == "db"
+
+    doc = document.create("doc_1", dictionary.create({"a": 1}))
+    document.setString(doc, "name", "first")
+    document.setInt(doc, "count", 12)
+    database.saveDocument(db, doc)
+    assert document.getString(doc, "name") == "first"
+    assert document.count(doc) == 3
+
+    database.saveDocuments(db, {"doc_2": {"nested": {"list": [1, "two", None]}}})
+    assert database.getCount(db) == 2
+    assert database.getDocIds(db) == ["doc_1", "doc_2"]
+    assert database.getDocuments(db, ["doc_2"]) == {"doc_2": {"nested": {"list": [1, "two", None]}}}
+
+    saved = database.getDocument(db, "doc_1")
+    assert document.toMap(saved) == {"a": 1, "name": "first", "count": 12}
+    assert database.getDocument(db, "missing") is None
+
+    # db, dictionary, doc and the doc read back
+    assert test_server.handle_count() == 4
+    Utils(test_server.url).release([doc, saved])
+    assert test_server.handle_count() == 2
+    with pytest.raises(Exception) as e:
+        document.getId(doc)
+    assert "No object for handle" in str(e.value)
+
+    Utils(test_server.url).flushMemory()
+    assert test_server.handle_count() == 0
+
+
+def test_batch_resolves_placeholders(test_server):
+    client = Client(test_server.url)
+    db = Database(test_server.url, client=client).create("db")
+
+    with client.batch() as batch:
+        args = Args()
+        args.setString("id", "doc_1")
+        doc = batch.invokeMethod("document_create", args)
+        args = Args()
+        args.setMemoryPointer("document", doc)
+        args.setString("key", "k")
+        args.setString("value", "v")
+        batch.invokeMethod("document_setString", args)
+        args = Args()
+        args.setMemoryPointer("database", db)
+        args.setMemoryPointer("document", doc)
+        batch.invokeMethod("database_save", args)
+
+    assert isinstance(doc.result(), MemoryPointer)
+    assert test_server.databases["db"].docs == {"doc_1": {"k": "v"}}
+
+    failing = client.batch()
+    failing.invokeMethod("document_create", Args())
+    failing.invokeMethod("no_such_method", Args())
+    with pytest.raises(Exception) as e:
+        failing.execute()
+    assert "Batch call 1 (no_such_method) failed" in str(e.value)
+
+
+def test_replication_between_local_databases(test_server, tmp_path, monkeypatch):
+    cluster_config = tmp_path / "mock_cluster.json"
+    cluster_config.write_text(json.dumps({"environment": {"sync_gateway_ssl": False}}))
+    monkeypatch.setenv("CLUSTER_CONFIG", str(cluster_config))
+
+    database = Database(test_server.url)
+    replication = Replication(test_server.url)
+    source = database.create("source")
+    target = database.create("target")
+    database.create_bulk_docs(20, "doc", source)
+
+    repl = replication.configure_and_replicate(source, target_db=target, replication_type="push", continuous=False,
+                                               wait_until_idle=False)
+    replication.wait_until_replicator_idle(repl, sleep_time=0.01)
+    assert replication.getActivitylevel(repl) == "stopped"
+    assert replication.getCompleted(repl) == replication.getTotal(repl) == 20
+    assert database.getCount(target) == 20
+
+    # A continuous replicator keeps up with later writes
+    repl = replication.configure_and_replicate(source, target_db=target, continuous=True, wait_until_idle=False)
+    database.create_bulk_docs(5, "later", source)
+    replication.wait_until_replicator_idle(repl, sleep_time=0.01, idle_checks=1)
+    assert database.getCount(target) == 25
+    replication.stop(repl)
+
+
+@pytest.mark.parametrize("batch", [True, False])
+def test_wait_until_replicator_idle_round_trips(tmp_path, monkeypatch, batch):
+    cluster_config = tmp_path / "mock_cluster.json"
+    cluster_config.write_text(json.dumps({"environment": {"sync_gateway_ssl": False}}))
+    monkeypatch.setenv("CLUSTER_CONFIG", str(cluster_config))
+
+    with MockTestServer(batch=batch) as test_server:
+        Client._batch_support.pop(test_server.url, None)
+        database = Database(test_server.url)
+        replication = Replication(test_server.url)
+        source = database.create("source")
+        target = database.create("target")
+        database.create_bulk_docs(10, "doc", source)
+        repl = replication.configure_and_replicate(source, target_db=target, continuous=True, wait_until_idle=False)
+
+        test_server.reset_stats()
+        replication.wait_until_replicator_idle(repl, sleep_time=0.01, idle_checks=3)
+
+        # idle_checks + 1 status polls of 5 calls each, between reading the config and
+        # adding and removing the change listener
+        polls = 3 + 1
+        assert test_server.calls["replicator_getActivityLevel"] == polls
+        assert test_server.calls["replicator_changeListenerChangesCount"] == polls
+        assert sum(test_server.calls.values()) == 2 + 2 + 5 * polls
+        # One round trip per poll with the batch endpoint, without it 5 (and one 404)
+        expected = 2 + 2 + (polls if batch else 1 + 5 * polls)
+        assert test_server.round_trips == expected
+
+
+def test_create_bulk_docs_validates_before_saving(test_server):
+    database = Database(test_server.url)
+    db = database.create("db")
+
+    with pytest.raises(TypeError):
+        database.create_bulk_docs(10, "doc", db, channels="ABC", batch_size=5)
+    with pytest.raises(ValueError):
+        database.create_bulk_docs(10, "doc", db, batch_size=0)
+    assert test_server.calls["database_saveDocuments"] == 0
+
+
+def test_query(test_server):
+    database = Database(test_server.url)
+    query = Query(test_server.url)
+    db = database.create("db")
+    database.create_bulk_docs(15, "doc", db)
+
+    assert len(query.query_selectAll(db)) == 15
+    page = query.query_get_docs_limit_offset(db, 10, 10)
+    assert [row["db"]["id"] for row in page] == sorted("doc_{}".format(i) for i in range(15))[10:]
+    assert query.query_get_doc(db, "doc_3")[0]["db"]["id"] == "doc_3"
+    assert query.query_get_doc(db, "missing") == []
+
+
+@pytest.mark.benchmark
+def test_benchmark_reports(test_server):
+    report = run_benchmark(test_server.url, "documents", 20, test_server)
+    # create + 2 setString + setInt + save per doc, getDocument + toMap per read, and the db
+    assert report["calls"] == report["round_trips"] == 20 * 5 + 20 * 2 + 1
+    assert report["calls_per_sec"] > 0
+    assert report["serialize_secs"] > 0 and report["deserialize_secs"] > 0
+    # Nothing is released: the db, every doc and every doc read back stay in the handle table
+    assert report["handle_growth"] == report["handles_created"] == 1 + 20 + 20
+
+    batched = run_benchmark(test_server.url, "batched_documents", 20, test_server)
+    assert batched["calls"] == 20 * 4 + 1
+    assert batched["round_trips"] == 20 + 1
+    assert test_server.calls["document_create"] == 20
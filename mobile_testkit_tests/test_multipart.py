@@ -0,0 +1,64 @@
+import base64
+import json
+
+import pytest
+
+from keywords.MobileRestClient import parse_multipart_response
+from keywords.multipart import get_boundary
+from keywords.multipart import iter_docs
+
+BOUNDARY = "5570ab847be212079e2b05bbbfa023da25b07712bda36aec6481bca024f3"
+
+
+def multipart_body(parts, boundary=BOUNDARY):
+    sections = ["--{}\r\n{}".format(boundary, part) for part in parts]
+    return "\r\n".join(sections) + "\r\n--{}--\r\n".format(boundary)
+
+
+def json_part(doc):
+    return "Content-Type: application/json\r\n\r\n{}".format(json.dumps(doc))
+
+
+def chunked(body, size):
+    body = body.encode("utf-8")
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+DOCS = [
+    {"_id": "doc_0", "_rev": "1-abc", "text": "has -- dashes and\r\n--fake boundary lines"},
+    {"error": "not_found", "id": "doc_1", "status": 404},
+    {"_id": "doc_2", "_rev": "2-def"},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 100000])
+def test_iter_docs_any_chunking(chunk_size):
+    body = multipart_body([json_part(doc) for doc in DOCS])
+    docs = list(iter_docs(chunked(body, chunk_size), BOUNDARY.encode("utf-8")))
+    assert docs == DOCS
+
+
+def test_iter_docs_doc_with_attachment():
+    inner = "related-boundary"
+    related = "Content-Type: multipart/related; boundary=\"{}\"\r\n\r\n{}".format(inner, multipart_body([
+        json_part({"_id": "doc_0", "_rev": "1-abc", "_attachments": {"att.png": {"follows": True, "length": 4}}}),
+        "Content-Disposition: attachment; filename=\"att.png\"\r\n\r\n\x01--\x02",
+    ], boundary=inner))
+    body = multipart_body([related, json_part(DOCS[2])])
+
+    docs = list(iter_docs(chunked(body, 5), BOUNDARY.encode("utf-8")))
+    assert docs[0]["_attachments"]["att.png"] == {"length": 4, "data": base64.b64encode(b"\x01--\x02").decode("ascii")}
+    assert docs[1] == DOCS[2]
+
+
+def test_get_boundary():
+    assert get_boundary("multipart/mixed; boundary=\"abc\"") == b"abc"
+    assert get_boundary("multipart/mixed;boundary=abc; charset=utf-8") == b"abc"
+    with pytest.raises(ValueError):
+        get_boundary("application/json")
+
+
+def test_parse_multipart_response_text():
+    body = multipart_body([json_part(doc) for doc in DOCS])
+    assert parse_multipart_response(body) == {"rows": DOCS}
+    assert parse_multipart_response("") == {"rows": []}
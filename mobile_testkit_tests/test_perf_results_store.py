@@ -0,0 +1,98 @@
+import json
+import math
+import os
+
+import numpy as np
+import pytest
+
+from libraries.utilities.expvar_collector import ExpvarCollector
+from libraries.utilities.perf_results_store import cache_file_name
+from libraries.utilities.perf_results_store import compare_runs
+from libraries.utilities.perf_results_store import concat_series
+from libraries.utilities.perf_results_store import linear_trend
+from libraries.utilities.perf_results_store import load_expvar_series
+from libraries.utilities.perf_results_store import percentiles
+from libraries.utilities.perf_results_store import rates
+from libraries.utilities.perf_results_store import to_datetime64
+
+LG1 = "lg1:9876/debug/vars"
+LG2 = "lg2:9876/debug/vars"
+PUSHED = "gateload/total_doc_pushed"
+P95 = "gateload/ops/PushToSubscriberInteractive/p95"
+
+
+def gateload_expvars(pushed, p95=None):
+    obj = {"gateload": {"total_doc_pushed": pushed, "ops": {}}}
+    if p95 is not None:
+        obj["gateload"]["ops"]["PushToSubscriberInteractive"] = {"p95": p95}
+    return obj
+
+
+def write_run(folder, pushed_per_sec):
+    """ 10 one second samples from two load generators, p95 only reported from the second sample on """
+    with ExpvarCollector({"gateload": [LG1, LG2]}, str(folder), key_frame_every=4) as collector:
+        for i in range(10):
+            for endpoint in (LG1, LG2):
+                collector.record("gateload", endpoint, "2026-01-01 00:00:{:02d}.000000".format(i),
+                                 gateload_expvars(i * pushed_per_sec, p95=i * 10 if i else None))
+    return collector.filename("gateload")
+
+
+def test_load_expvar_series_builds_and_reuses_the_columnar_cache(tmp_path):
+    file_name = write_run(tmp_path, 5)
+
+    series = load_expvar_series(file_name)
+    assert [endpoint_series.endpoint for endpoint_series in series] == [LG1, LG2]
+    assert os.path.isfile(cache_file_name(file_name))
+    assert series[0].times[1] - series[0].times[0] == np.timedelta64(1, "s")
+    assert series[0].column(PUSHED).tolist() == [i * 5.0 for i in range(10)]
+    assert math.isnan(series[0].column(P95)[0])
+    assert np.isnan(series[0].column("missing/path")).all()
+
+    cached = load_expvar_series(file_name, paths=[PUSHED])
+    assert list(cached[1].columns) == [PUSHED]
+    assert cached[1].column(PUSHED).tolist() == series[1].column(PUSHED).tolist()
+    assert (cached[1].times == series[1].times).all()
+    assert cached[1].seconds().tolist() == list(range(10))
+
+
+def test_load_legacy_json_dump(tmp_path):
+    file_name = str(tmp_path / "gateload_expvars.json")
+    with open(file_name, "w") as f:
+        json.dump({
+            "2026-01-01 00:00:00.000000": {"endpoint": LG1, "expvars": gateload_expvars(1)},
+            "2026-01-01 00:00:01.000000": {"endpoint": LG1, "expvars": gateload_expvars(3, p95=7)},
+        }, f)
+
+    series = load_expvar_series(file_name, use_cache=False)
+    assert series[0].column(PUSHED).tolist() == [1, 3]
+    assert math.isnan(series[0].column(P95)[0])
+    assert series[0].column(P95)[1] == 7
+    assert not os.path.isfile(cache_file_name(file_name))
+
+
+def test_vectorized_stats():
+    times = to_datetime64(["2026-01-01 00:00:00.000000", "2026-01-01 00:00:02.000000", "2026-01-01 00:00:04"])
+    counter = np.array([0, 10, 30], dtype=np.float64)
+
+    assert rates(times, counter).tolist() == [5, 10]
+    assert linear_trend(times, counter) == pytest.approx(7.5)
+    assert percentiles(np.array([1, 2, 3, np.nan]), (50,)) == {50: 2}
+    assert math.isnan(percentiles(np.array([np.nan]), (50,))[50])
+
+
+def test_concat_and_compare_runs(tmp_path):
+    (tmp_path / "base").mkdir()
+    (tmp_path / "other").mkdir()
+    base = load_expvar_series(write_run(tmp_path / "base", 5))
+    other = load_expvar_series(write_run(tmp_path / "other", 10))
+
+    times, values = concat_series(base, PUSHED)
+    assert len(times) == 20
+    assert (np.diff(times) >= np.timedelta64(0, "s")).all()
+
+    comparison = compare_runs(base, other, [PUSHED, P95], counters=[PUSHED])
+    assert comparison[PUSHED]["mean_rate_per_sec"] == (5, 10, 1)
+    assert comparison[PUSHED]["max"] == (45, 90, 1)
+    assert comparison[P95]["samples"] == (18, 18, 0)
+    assert "mean_rate_per_sec" not in comparison[P95]
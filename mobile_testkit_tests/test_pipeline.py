@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from libraries.testkit.pipeline import StepTimings, run_concurrently
+
+
+def test_run_concurrently_overlaps_lanes_and_times_steps():
+    timings = StepTimings("reset")
+    barrier = threading.Barrier(2, timeout=5)
+
+    def lane(name):
+        def run():
+            with timings.step(name):
+                # Both lanes must be running at the same time to get past the barrier
+                barrier.wait()
+                time.sleep(0.05)
+            return name
+        return run
+
+    assert run_concurrently(lane("ansible"), lane("buckets")) == ["ansible", "buckets"]
+
+    assert sorted(name for name, _, _ in timings.steps) == ["ansible", "buckets"]
+    assert all(secs >= 0.05 for _, _, secs in timings.steps)
+    report = timings.report().splitlines()
+    assert report[0].startswith("reset took")
+    assert len(report) == 3
+
+
+def test_run_concurrently_waits_for_all_lanes_before_raising():
+    finished = []
+
+    def failing():
+        raise ValueError("stop failed")
+
+    def slow():
+        time.sleep(0.1)
+        finished.append(True)
+
+    with pytest.raises(ValueError):
+        run_concurrently(failing, slow)
+    assert finished == [True]
+
+
+def test_failed_step_is_still_timed():
+    timings = StepTimings("reset")
+    with pytest.raises(AssertionError):
+        with timings.step("start sync_gateway"):
+            assert False
+    assert timings.steps[0][0] == "start sync_gateway"
@@ -0,0 +1,132 @@
+import threading
+
+import paramiko
+import pytest
+
+import keywords.remoteexecutor
+from keywords.constants import REMOTE_EXECUTOR_KEEPALIVE
+from keywords.remoteexecutor import RemoteExecutor, stream_output
+
+
+class FakeChannel(object):
+    def __init__(self, status):
+        self.status = status
+
+    def recv_exit_status(self):
+        return self.status
+
+
+class FakeStream(list):
+    def __init__(self, lines, status=0):
+        super(FakeStream, self).__init__(lines)
+        self.channel = FakeChannel(status)
+
+    def close(self):
+        pass
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = True
+        self.keepalive = 0
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+
+class FakeSSHClient(object):
+    connects = []
+    # Hosts whose handshake waits for the other connects, and hosts whose next exec_command fails
+    handshake_barrier = None
+    broken = set()
+
+    def __init__(self):
+        self.transport = FakeTransport()
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, host, **kwargs):
+        FakeSSHClient.connects.append(host)
+        self.host = host
+        if FakeSSHClient.handshake_barrier is not None:
+            FakeSSHClient.handshake_barrier.wait()
+
+    def get_transport(self):
+        return self.transport
+
+    def exec_command(self, command, **kwargs):
+        if self.host in FakeSSHClient.broken:
+            FakeSSHClient.broken.discard(self.host)
+            raise paramiko.SSHException("SSH session not active")
+        status = 1 if "fail" in command else 0
+        stdout = FakeStream(["{} line {}".format(self.host, i) for i in range(5)], status)
+        return FakeStream([]), stdout, FakeStream(["warning"])
+
+    def close(self):
+        self.transport.active = False
+
+
+@pytest.fixture(autouse=True)
+def fake_ssh(monkeypatch):
+    monkeypatch.setattr(keywords.remoteexecutor.paramiko, "SSHClient", FakeSSHClient)
+    FakeSSHClient.connects = []
+    FakeSSHClient.handshake_barrier = None
+    FakeSSHClient.broken = set()
+    RemoteExecutor.close_all()
+    yield
+    RemoteExecutor.close_all()
+
+
+def test_stream_output_keeps_last_lines_and_calls_back():
+    seen = []
+    assert stream_output(iter(range(10)), on_line=seen.append, max_lines=3, echo=False) == [7, 8, 9]
+    assert seen == list(range(10))
+    assert stream_output(iter(range(10)), max_lines=None, echo=False) == list(range(10))
+
+
+def test_connections_are_reused_per_host():
+    RemoteExecutor("host1").execute("ls", echo=False)
+    status, stdout, stderr = RemoteExecutor("host1").execute("ls", max_lines=2, echo=False)
+
+    assert FakeSSHClient.connects == ["host1"]
+    assert status == 0
+    assert stdout == ["host1 line 3", "host1 line 4"]
+    assert stderr == ["warning"]
+
+    # A dropped connection is replaced
+    RemoteExecutor._connections[("host1", RemoteExecutor("host1").username)].transport.active = False
+    RemoteExecutor("host1").execute("ls", echo=False)
+    assert FakeSSHClient.connects == ["host1", "host1"]
+
+
+def test_connects_to_different_hosts_concurrently():
+    # Both handshakes have to be in flight at the same time to get past the barrier
+    FakeSSHClient.handshake_barrier = threading.Barrier(2, timeout=10)
+    results = []
+    threads = [threading.Thread(target=lambda host=host: results.append(RemoteExecutor(host).execute("ls", echo=False)))
+               for host in ("host1", "host2")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(FakeSSHClient.connects) == ["host1", "host2"]
+    assert [result[0] for result in results] == [0, 0]
+    for client in RemoteExecutor._connections.values():
+        assert client.transport.keepalive == REMOTE_EXECUTOR_KEEPALIVE
+
+
+def test_reconnects_once_after_ssh_exception():
+    RemoteExecutor("host1").execute("ls", echo=False)
+    pooled = RemoteExecutor._connections[("host1", RemoteExecutor("host1").username)]
+
+    FakeSSHClient.broken = {"host1"}
+    status, stdout, stderr = RemoteExecutor("host1").execute("ls", echo=False)
+    assert status == 0
+    assert FakeSSHClient.connects == ["host1", "host1"]
+    assert not pooled.transport.is_active()
+    assert RemoteExecutor._connections[("host1", RemoteExecutor("host1").username)] is not pooled
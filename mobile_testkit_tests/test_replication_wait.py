@@ -0,0 +1,100 @@
+import asyncio
+
+from CBLClient.AsyncReplication import AsyncReplication
+from CBLClient.Replication import Replication, ReplicatorIdleState, ReplicatorStatus
+
+
+class FakeReplicatorClient(object):
+    """
+    Answers the replicator_* RPCs wait_until_replicator_idle makes. 'statuses' are
+    (activity_level, completed, total) returned by successive status polls (the last one
+    repeats); each new status bumps the change listener's event count.
+    """
+
+    def __init__(self, statuses, continuous=True):
+        self.statuses = list(statuses)
+        self.continuous = continuous
+        self.snapshots = 0
+        self.events = 0
+        self.calls = []
+
+    def invokeMethod(self, method, args=None):
+        self.calls.append(method)
+        if method == "replicator_config":
+            return "@config"
+        if method == "replicatorConfiguration_isContinuous":
+            return self.continuous
+        if method == "replicator_addChangeListener":
+            return "@listener"
+        if method == "replicator_changeListenerChangesCount":
+            return self.events
+        return None
+
+    def invokeMethods(self, calls, refs=None):
+        self.calls.append("batch")
+        assert [method for method, _ in calls] == list(ReplicatorStatus.METHODS) + ["replicator_changeListenerChangesCount"]
+        index = min(self.snapshots, len(self.statuses) - 1)
+        if self.snapshots < len(self.statuses):
+            self.events += 1
+        self.snapshots += 1
+        activity_level, completed, total = self.statuses[index]
+        return [activity_level, completed, total, None, self.events]
+
+
+class FakeAsyncReplicatorClient(FakeReplicatorClient):
+
+    async def invokeMethod(self, method, args=None):
+        return FakeReplicatorClient.invokeMethod(self, method, args)
+
+    async def invokeMethods(self, calls, refs=None):
+        return FakeReplicatorClient.invokeMethods(self, calls, refs)
+
+
+STATUSES = [("busy", 0, 10), ("busy", 5, 10), ("idle", 10, 10)]
+
+
+def test_wait_until_replicator_idle_uses_snapshots_and_events():
+    client = FakeReplicatorClient(STATUSES)
+    replicator = Replication("http://fake:8080", client=client)
+
+    replicator.wait_until_replicator_idle("@repl", sleep_time=0.01, idle_checks=2)
+
+    # Two busy polls, then idle_checks + 1 idle ones, each one batched round trip
+    assert client.snapshots == 5
+    assert client.calls.count("batch") == 5
+    for method in ReplicatorStatus.METHODS + ("replicator_changeListenerChangesCount",):
+        assert method not in client.calls
+    assert client.calls[-1] == "replicator_removeChangeListener"
+
+
+def test_wait_until_replicator_idle_removes_listener_on_error():
+    client = FakeReplicatorClient(STATUSES)
+    client.invokeMethods = lambda calls, refs=None: ["idle", 0, 0, "connection refused", 0]
+    replicator = Replication("http://fake:8080", client=client)
+    client.continuous = False
+
+    try:
+        replicator.wait_until_replicator_idle("@repl", sleep_time=0.1)
+        assert False, "Expected the replicator error to be raised"
+    except Exception as e:
+        assert "connection refused" in str(e)
+    assert client.calls[-1] == "replicator_removeChangeListener"
+
+
+def test_async_wait_until_replicator_idle():
+    client = FakeAsyncReplicatorClient(STATUSES)
+    replicator = AsyncReplication("http://fake:8080", client=client)
+
+    asyncio.run(replicator.wait_until_replicator_idle("@repl", sleep_time=0.01, idle_checks=2))
+
+    assert client.snapshots == 5
+    assert client.calls[-1] == "replicator_removeChangeListener"
+
+
+def test_idle_state_resets_when_an_event_arrives_while_settling():
+    state = ReplicatorIdleState(True, max_idle_count=1)
+    assert state.on_activity("idle", 5, 5) == (True, False)
+    state.on_events(True, True)
+    assert state.on_activity("idle", 5, 5) == (True, False)
+    state.on_events(False, True)
+    assert state.on_activity("idle", 5, 5) == (True, True)
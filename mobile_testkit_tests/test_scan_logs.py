@@ -1,3 +1,4 @@
+import zipfile
 import pytest
 from keywords.exceptions import LogScanningError
 
@@ -103,3 +104,56 @@ def test_data_race_log():
 
     error_message = str(e.value)
     assert error_message.startswith("DATA RACE found!!")
+
+
+def write_bundle(tmpdir):
+    """ A log dir with a plain .log and a .zip holding two more, one with a panic """
+    log_dir = tmpdir.mkdir("logs")
+    log_dir.join("sg_info.log").write(
+        "2016-01-26T19:02:51.595-08:00 Started\n2016-01-26T19:03:00.000-08:00 WARNING: slow\n")
+    with zipfile.ZipFile(str(log_dir.join("sgcollect.zip")), "w") as zf:
+        zf.writestr("sgcollect/sg_error.log",
+                    "2016-01-26T19:04:00.000-08:00 Panic: boom\n2016-01-26T19:05:00.000-08:00 panic again, DATA RACE\n")
+        zf.writestr("sgcollect/sg_debug.log", "2016-01-26T19:06:00.000-08:00 all good\n")
+        zf.writestr("sgcollect/notes.txt", "panic but not a log\n")
+    return log_dir
+
+
+def test_scan_logs_reads_zips_without_extracting(tmpdir):
+    log_dir = write_bundle(tmpdir)
+
+    with pytest.raises(LogScanningError):
+        scan_logs.scan_logs(str(log_dir), processes=1)
+
+    assert sorted(path.basename for path in log_dir.listdir()) == ["sg_info.log", "sgcollect.zip"]
+
+
+def test_build_log_index(tmpdir):
+    log_dir = write_bundle(tmpdir)
+    zip_path = str(log_dir.join("sgcollect.zip"))
+    error_log = "{}!sgcollect/sg_error.log".format(zip_path)
+
+    index = scan_logs.build_log_index(str(log_dir), ["panic", "data race", "warning"], processes=2)
+
+    assert index.total_counts() == {"panic": 2, "data race": 1, "warning": 1}
+    assert index.error_counts()[error_log] == {"panic": 2, "data race": 1}
+    assert index.sources_with("panic") == [error_log]
+    assert index.files[error_log]["first_matches"]["panic"] == [1, "2016-01-26T19:04:00.000-08:00 Panic: boom"]
+    assert index.time_range(error_log) == ("2016-01-26T19:04:00", "2016-01-26T19:05:00")
+    assert index.offset_for(error_log, "2016-01-26T19:04:30") == 0
+    assert len(index.files) == 3
+
+    # Persisted next to the logs and reused while the logs are unchanged
+    index_path = scan_logs.LogIndex.path_for(str(log_dir))
+    loaded = scan_logs.LogIndex.load(index_path)
+    assert loaded.error_counts() == index.error_counts()
+
+    log_dir.join("sg_info.log").write("2016-01-26T19:07:00.000-08:00 panic\n")
+    rescanned = scan_logs.build_log_index(str(log_dir), ["panic", "data race", "warning"], processes=1)
+    assert rescanned.total_counts() == {"panic": 3, "data race": 1}
+
+
+def test_clean_bundle_passes(tmpdir):
+    log_dir = tmpdir.mkdir("logs")
+    log_dir.join("sg_info.log").write("nothing to see\n")
+    assert scan_logs.scan_logs(str(log_dir)).error_counts() == {}
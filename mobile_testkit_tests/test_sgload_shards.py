@@ -0,0 +1,68 @@
+from testsuites.syncgateway.performance.sgload_shards import assign_hosts, max_shards, shard_sgload_args, split_count
+
+SGLOAD_ARGS = [
+    'gateload',
+    '--createreaders',
+    '--createwriters',
+    '--numreaders', '10',
+    '--numwriters', '7',
+    '--numupdaters', '0',
+    '--numrevsperdoc', '5',
+    '--numdocs', '1000',
+    '--numchannels', '3',
+    '--batchsize', '10',
+    '--testsessionid', 'run1',
+]
+
+
+def test_split_count():
+    assert split_count(10, 3) == [4, 3, 3]
+    assert split_count(2, 2) == [1, 1]
+    assert split_count(0, 2) == [0, 0]
+
+
+def test_shards_add_up_to_the_requested_load():
+    shards = shard_sgload_args(SGLOAD_ARGS, 3)
+
+    assert len(shards) == 3
+    for option in ('--numreaders', '--numwriters', '--numupdaters', '--numdocs', '--numchannels'):
+        index = SGLOAD_ARGS.index(option) + 1
+        assert sum(int(shard[index]) for shard in shards) == int(SGLOAD_ARGS[index])
+
+    # Not split
+    for shard in shards:
+        assert shard[SGLOAD_ARGS.index('--numrevsperdoc') + 1] == '5'
+        assert shard[SGLOAD_ARGS.index('--batchsize') + 1] == '10'
+        assert shard[:3] == ['gateload', '--createreaders', '--createwriters']
+
+    session_index = SGLOAD_ARGS.index('--testsessionid') + 1
+    assert [shard[session_index] for shard in shards] == ['run1-0', 'run1-1', 'run1-2']
+
+    # The original arg list is left alone
+    assert SGLOAD_ARGS[SGLOAD_ARGS.index('--numreaders') + 1] == '10'
+
+
+def test_single_shard_is_unchanged():
+    assert shard_sgload_args(SGLOAD_ARGS, 1) == [SGLOAD_ARGS]
+
+
+def test_max_shards_is_bounded_by_the_smallest_count():
+    assert max_shards(SGLOAD_ARGS, 2) == 2
+    # 7 writers, the 3 channels do not limit it
+    assert max_shards(SGLOAD_ARGS, 8) == 7
+    assert max_shards(['gateload'], 4) == 4
+
+    one_channel = SGLOAD_ARGS[:]
+    one_channel[one_channel.index('--numchannels') + 1] = '1'
+    assert max_shards(one_channel, 4) == 4
+
+
+def test_channels_are_only_split_between_enough_shards():
+    channels_index = SGLOAD_ARGS.index('--numchannels') + 1
+    assert [shard[channels_index] for shard in shard_sgload_args(SGLOAD_ARGS, 3)] == ['1', '1', '1']
+    # Fewer channels than shards: every shard uses all of them
+    assert [shard[channels_index] for shard in shard_sgload_args(SGLOAD_ARGS, 4)] == ['3', '3', '3', '3']
+
+
+def test_assign_hosts_round_robins_sync_gateways():
+    assert assign_hosts(['lg1', 'lg2', 'lg3'], ['sg1', 'sg2'], 3) == [('lg1', 'sg1'), ('lg2', 'sg2'), ('lg3', 'sg1')]
@@ -0,0 +1,98 @@
+import pytest
+
+from keywords.MobileRestClient import MobileRestClient
+from keywords.exceptions import RestError
+from libraries.testkit.mock_sync_gateway import MockSyncGateway
+
+
+@pytest.fixture
+def sg(monkeypatch):
+    monkeypatch.setattr("keywords.MobileRestClient.time.sleep", lambda secs: None)
+    with MockSyncGateway(dbs=["db"]) as mock_sg:
+        MobileRestClient.forget_server(mock_sg.url)
+        yield mock_sg
+    MobileRestClient.forget_server(mock_sg.url)
+
+
+def create_docs(sg, num_docs):
+    """ Writes doc_0 .. doc_<num_docs - 1> straight in the store, returns their current bodies """
+    collection = sg.database("db").keyspace("db")
+    with sg.lock:
+        for i in range(num_docs):
+            collection.put("doc_{}".format(i), {"content": i})
+        return [dict(collection.get("doc_{}".format(i))["body"]) for i in range(num_docs)]
+
+
+def bump(sg, doc_id):
+    """ Someone else updates the doc """
+    collection = sg.database("db").keyspace("db")
+    with sg.lock:
+        body = collection.get(doc_id)["body"]
+        collection.put(doc_id, dict(body, other="update"))
+
+
+def create_client(sg, monkeypatch, on_fetch=None):
+    """ MobileRestClient whose get_bulk_docs records the doc ids it fetches in client.fetched """
+    client = MobileRestClient()
+    client.fetched = []
+
+    def get_bulk_docs(url, db, doc_ids, **kwargs):
+        client.fetched.append(list(doc_ids))
+        fetched = MobileRestClient.get_bulk_docs(client, url, db, doc_ids, **kwargs)
+        if on_fetch is not None:
+            on_fetch(doc_ids)
+        return fetched
+
+    monkeypatch.setattr(client, "get_bulk_docs", get_bulk_docs)
+    client.get_server_type(sg.url)
+    return client
+
+
+def test_update_docs_bulk_fetches_bodies_once_and_tracks_revs(sg, monkeypatch):
+    bodies = create_docs(sg, 10)
+    client = create_client(sg, monkeypatch)
+
+    docs = [{"id": body["_id"], "rev": body["_rev"]} for body in bodies]
+    updated = client.update_docs_bulk(sg.url, "db", docs, number_updates=3, batch_size=4, max_in_flight=2)
+
+    assert [doc["id"] for doc in updated] == [doc["id"] for doc in docs]
+    assert all(doc["rev"].startswith("4-") for doc in updated)
+    # One _bulk_get per batch up front, then 3 rounds of 3 batches and nothing else
+    assert sorted(len(doc_ids) for doc_ids in client.fetched) == [2, 4, 4]
+    assert sg.requests["POST _bulk_get"] == 3
+    assert sg.requests["POST _bulk_docs"] == 9
+    collection = sg.database("db").keyspace("db")
+    for i in range(10):
+        body = collection.get("doc_{}".format(i))["body"]
+        assert body["updates"] == 3
+        assert body["content"] == i
+
+
+def test_update_docs_bulk_refetches_only_conflicts(sg, monkeypatch):
+    # Bodies are given, so nothing is fetched unless it conflicts
+    docs = create_docs(sg, 5)
+    client = create_client(sg, monkeypatch)
+    bump(sg, "doc_2")
+
+    updated = client.update_docs_bulk(sg.url, "db", docs, number_updates=2, channels=["ABC"])
+
+    assert client.fetched == [["doc_2"]]
+    # The first round, doc_2 again after its conflict, the second round
+    assert sg.requests["POST _bulk_docs"] == 3
+    assert {doc["id"]: doc["rev"] for doc in updated}["doc_2"].startswith("4-")
+    body = sg.database("db").keyspace("db").get("doc_2")["body"]
+    assert body["other"] == "update"
+    assert body["channels"] == ["ABC"]
+
+
+def test_update_docs_bulk_gives_up_on_repeated_conflicts(sg, monkeypatch):
+    create_docs(sg, 2)
+
+    def bump_fetched(doc_ids):
+        for doc_id in doc_ids:
+            bump(sg, doc_id)
+
+    client = create_client(sg, monkeypatch, on_fetch=bump_fetched)
+
+    with pytest.raises(RestError):
+        client.update_docs_bulk(sg.url, "db", [{"id": "doc_0"}, {"id": "doc_1"}], number_updates=1, retries=2)
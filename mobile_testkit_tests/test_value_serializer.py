@@ -0,0 +1,110 @@
+import json
+import random
+
+from collections import OrderedDict
+
+import pytest
+
+from CBLClient.MemoryPointer import MemoryPointer
+from CBLClient.ValueSerializer import ValueSerializer
+from libraries.data import doc_generators
+
+
+def reference_serialize(value):
+    """ The original recursive encoder, kept as the wire format reference """
+    if value is None or value == "None":
+        return "null"
+    elif isinstance(value, MemoryPointer):
+        return value.getAddress()
+    elif isinstance(value, str):
+        if value.endswith(",LONGTYPE"):
+            return "L" + value.split(',')[0]
+        return "\"" + value + "\""
+    elif isinstance(value, bool):
+        return "true" if value else "false"
+    elif isinstance(value, int):
+        if value < 1000000 and value > -1000000:
+            return "I" + str(value)
+        return "L" + str(value)
+    elif isinstance(value, float):
+        return "F" + str(value)
+    elif isinstance(value, dict):
+        return json.dumps({k: reference_serialize(v.decode() if isinstance(v, bytes) else v) for k, v in value.items()})
+    elif isinstance(value, list):
+        return json.dumps([reference_serialize(v) for v in value])
+    raise RuntimeError("Invalid value type: {}: {}".format(value, type(value)))
+
+
+def random_value(rand, depth=0):
+    choice = rand.randint(0, 9 if depth < 4 else 6)
+    if choice == 0:
+        return None
+    elif choice == 1:
+        return rand.choice([True, False])
+    elif choice == 2:
+        return rand.randint(-10 ** 12, 10 ** 12)
+    elif choice == 3:
+        return rand.uniform(-1e9, 1e9)
+    elif choice == 4:
+        return "".join(rand.choice("abc \\/é中\t") for _ in range(rand.randint(0, 8)))
+    elif choice == 5:
+        return "{},LONGTYPE".format(rand.randint(0, 10 ** 15))
+    elif choice == 6:
+        return MemoryPointer("@{}".format(rand.randint(1, 1000)))
+    elif choice == 7:
+        return [random_value(rand, depth + 1) for _ in range(rand.randint(0, 4))]
+    return {"k{}".format(i): random_value(rand, depth + 1) for i in range(rand.randint(0, 4))}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ({"name": "doc", "count": 3, "big": 12345678901, "ratio": 0.5, "ok": True, "none": None, "id": "7,LONGTYPE"},
+     '{"name": "\\"doc\\"", "count": "I3", "big": "L12345678901", "ratio": "F0.5", "ok": "true", "none": "null", "id": "L7"}'),
+    ([1, [2, {"k": "v"}], MemoryPointer("@4")],
+     '["I1", "[\\"I2\\", \\"{\\\\\\"k\\\\\\": \\\\\\"\\\\\\\\\\\\\\"v\\\\\\\\\\\\\\"\\\\\\"}\\"]", "@4"]'),
+    ({"u": "café", "q": "a\"b"},
+     '{"u": "\\"caf\\u00e9\\"", "q": "\\"a\\"b\\""}'),
+])
+def test_serialize_wire_format(value, expected):
+    assert ValueSerializer.serialize(value) == expected
+
+
+def test_serialize_dict_subclass():
+    value = OrderedDict([("a", 1), ("b", OrderedDict([("c", "x")]))])
+    assert ValueSerializer.serialize(value) == reference_serialize(value)
+
+
+def test_serialize_matches_reference_encoder():
+    rand = random.Random(1234)
+    for _ in range(2000):
+        value = random_value(rand)
+        assert ValueSerializer.serialize(value) == reference_serialize(value)
+
+
+@pytest.mark.parametrize("generator", ["simple", "simple_user", "four_k", "complex_doc"])
+def test_round_trip_generated_docs(generator):
+    doc = getattr(doc_generators, generator)()
+    encoded = ValueSerializer.serialize(doc)
+    assert encoded == reference_serialize(doc)
+    assert ValueSerializer.deserialize(encoded) == doc
+
+
+def test_deserialize_scalars():
+    assert ValueSerializer.deserialize("null") is None
+    assert ValueSerializer.deserialize("I12") == 12
+    assert ValueSerializer.deserialize("L12345678901") == 12345678901
+    assert ValueSerializer.deserialize("F1.5") == 1.5
+    assert ValueSerializer.deserialize("#3") == 3
+    assert ValueSerializer.deserialize("#3.5") == 3.5
+    assert ValueSerializer.deserialize("\"text\"") == "text"
+    assert ValueSerializer.deserialize("true") is True
+    assert ValueSerializer.deserialize("@7").getAddress() == "@7"
+
+
+def test_deserialize_raw_nested_containers():
+    assert ValueSerializer.deserialize('{"a": ["I1"]}') == {"a": [1]}
+    assert ValueSerializer.deserialize('[{"b": "F1.5"}]') == [{"b": 1.5}]
+
+
+def test_serialize_rejects_unknown_types():
+    with pytest.raises(RuntimeError):
+        ValueSerializer.serialize({"t": (1, 2)})
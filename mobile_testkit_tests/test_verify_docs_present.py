@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from keywords.MobileRestClient import MobileRestClient
+from keywords.exceptions import TimeoutException
+
+
+class FakeRequest(object):
+    method = "POST"
+    url = ""
+    headers = {}
+    body = ""
+
+
+class FakeResponse(object):
+    def __init__(self, body, content_type="application/json"):
+        self.text = body
+        self.status_code = 200
+        self.request = FakeRequest()
+        self.headers = {"Content-Type": content_type}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        # Small chunks so boundaries straddle reads
+        body = self.text.encode("utf-8")
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSyncGateway(object):
+    """ Answers _bulk_get with whatever docs have 'arrived' so far """
+
+    def __init__(self, docs, arrivals):
+        self.docs = docs
+        self.arrivals = arrivals
+        self.requested = []
+        self.polls = 0
+
+    def get(self, url, **kwargs):
+        return FakeResponse(json.dumps({"vendor": {"name": "Couchbase Sync Gateway"}}))
+
+    def post(self, url, data=None, **kwargs):
+        ids = [doc["id"] for doc in json.loads(data)["docs"]]
+        self.requested.append(sorted(ids))
+        self.polls += 1
+        arrived = self.arrivals(self.polls)
+        parts = []
+        for doc_id in ids:
+            if doc_id in arrived:
+                body = {"_id": doc_id, "_rev": self.docs[doc_id]}
+            else:
+                body = {"error": "not_found", "id": doc_id, "status": 404}
+            parts.append("--b\r\nContent-Type: application/json\r\n\r\n{}".format(json.dumps(body)))
+        return FakeResponse("\r\n".join(parts) + "\r\n--b--", content_type="multipart/mixed; boundary=\"b\"")
+
+
+def create_client(session):
+    MobileRestClient.forget_server()
+    client = MobileRestClient()
+    client._session = session
+    return client
+
+
+def test_verify_docs_present_only_repolls_missing_docs(monkeypatch):
+    monkeypatch.setattr("keywords.MobileRestClient.time.sleep", lambda secs: None)
+    docs = {"doc_{}".format(i): "1-abc" for i in range(5)}
+    sg = FakeSyncGateway(docs, lambda poll: ["doc_0", "doc_1", "doc_2"] if poll == 1 else list(docs))
+    client = create_client(sg)
+
+    expected = [{"id": doc_id, "rev": rev} for doc_id, rev in docs.items()]
+    client.verify_docs_present("http://sg:4984", "db", expected, chunk_size=10, max_workers=1)
+
+    assert sg.requested == [sorted(docs), ["doc_3", "doc_4"]]
+
+
+def test_verify_docs_present_chunks_requests(monkeypatch):
+    docs = {"doc_{}".format(i): "1-abc" for i in range(25)}
+    sg = FakeSyncGateway(docs, lambda poll: list(docs))
+    client = create_client(sg)
+
+    expected = [{"id": doc_id, "rev": rev} for doc_id, rev in docs.items()]
+    client.verify_docs_present("http://sg:4984", "db", expected, chunk_size=10)
+
+    assert sorted(len(ids) for ids in sg.requested) == [5, 10, 10]
+
+
+def test_verify_docs_present_waits_for_expected_rev(monkeypatch):
+    monkeypatch.setattr("keywords.MobileRestClient.time.sleep", lambda secs: None)
+    sg = FakeSyncGateway({"doc_0": "1-abc"}, lambda poll: ["doc_0"])
+    client = create_client(sg)
+
+    with pytest.raises(TimeoutException):
+        client.verify_docs_present("http://sg:4984", "db", {"id": "doc_0", "rev": "2-def"}, timeout=0.01)
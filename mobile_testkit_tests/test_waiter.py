@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from keywords.exceptions import TimeoutError
+from keywords.waiter import Backoff, reset_wait_metrics, wait_metrics, wait_until
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_wait_metrics()
+    yield
+    reset_wait_metrics()
+
+
+def test_backoff_grows_to_maximum_and_resets():
+    backoff = Backoff(initial=0.1, maximum=0.5, multiplier=2, jitter=0)
+    assert [backoff.next_interval() for _ in range(5)] == [0.1, 0.2, 0.4, 0.5, 0.5]
+    backoff.reset()
+    assert backoff.next_interval() == 0.1
+
+
+def test_backoff_jitter_stays_in_bounds():
+    backoff = Backoff(initial=1, maximum=1, jitter=0.2)
+    for _ in range(100):
+        assert 0.8 <= backoff.next_interval() <= 1.2
+
+
+def test_wait_until_returns_condition_value_and_records_metrics():
+    results = iter([None, 0, {"ok": True}])
+    assert wait_until(lambda: next(results), 5, name="site", backoff=Backoff(initial=0.01, jitter=0)) == {"ok": True}
+
+    stats = wait_metrics()["site"]
+    assert (stats.calls, stats.polls, stats.timeouts) == (1, 3, 0)
+
+
+def test_wait_until_retries_listed_exceptions():
+    attempts = []
+
+    def condition():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ValueError("not yet")
+        return True
+
+    assert wait_until(condition, 5, backoff=Backoff(initial=0.01), retry_on=ValueError) is True
+
+    with pytest.raises(KeyError):
+        wait_until(lambda: {}["missing"], 5, retry_on=ValueError)
+
+
+def test_wait_until_timeout():
+    start = time.monotonic()
+    with pytest.raises(TimeoutError) as e:
+        wait_until(lambda: False, 0.3, name="slow", backoff=Backoff(initial=0.05, maximum=10), timeout_message="never")
+    # Never sleeps past the deadline
+    assert time.monotonic() - start < 1
+    assert str(e.value) == "never"
+    assert wait_metrics()["slow"].timeouts == 1
+
+    assert wait_until(lambda: [], 0.1, raise_on_timeout=False) == []
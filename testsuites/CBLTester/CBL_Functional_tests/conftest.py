@@ -19,6 +19,7 @@ from keywords.exceptions import ProvisioningError
 from keywords.tklogging import Logging
 from keywords.constants import RESULTS_DIR
 
+from CBLClient.Client import Client
 from CBLClient.FileLogging import FileLogging
 from CBLClient.Replication import Replication
 from CBLClient.Collection import Collection
@@ -841,6 +842,10 @@ def params_from_base_test_setup(request, params_from_base_suite_setup):
         else:
             path = '/'.join(path.split('/')[:-1])
 
+    # Handles the test creates and never releases are released, and reported, at teardown
+    handle_scope = Client(base_url).handle_scope(test_name)
+    handle_scope.open()
+
     # This dictionary is passed to each test
     yield {
         "cluster_config": cluster_config,
@@ -892,6 +897,13 @@ def params_from_base_test_setup(request, params_from_base_suite_setup):
         "collection_name": collection_name
     }
 
+    try:
+        handle_scope.close()
+    except Exception as err:
+        log_info("Releasing the handles of {} failed: {}".format(test_name, err))
+    log_info("{}: {} TestServer handles created, {} released, {} leaked".format(
+        test_name, handle_scope.created, handle_scope.released, handle_scope.leaked))
+
     if request.node.rep_call.failed and enable_file_logging and create_db_per_test is not None:
         test_id = request.node.nodeid
         log_info("\n Collecting logs for failed test: {}".format(test_id))
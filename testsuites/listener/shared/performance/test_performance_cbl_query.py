@@ -37,7 +37,9 @@ def test_view_query_performance(setup_client_syncgateway_test):
     ls_db_docs1 = client.add_bulk_docs(url=ls_url, db=ls_db, docs=bulk_docs_content)
     assert len(ls_db_docs1) == num_content_docs_per_db
 
-    client.update_docs(url=ls_url, db=ls_db, docs=ls_db_docs1, number_updates=3, delay=0.1)
+    # The bodies written above with their revs, so the updates need no GET per doc
+    docs_with_revs = [dict(doc, _rev=added["rev"]) for doc, added in zip(bulk_docs_content, ls_db_docs1)]
+    client.update_docs_bulk(url=ls_url, db=ls_db, docs=docs_with_revs, number_updates=3, batch_size=1000, delay=0.1)
     # Design doc to to fetch doc._id, doc._rev for docs with content
     view = """{
     "language" : "javascript",
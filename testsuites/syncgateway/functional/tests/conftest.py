@@ -153,6 +153,10 @@ def pytest_addoption(parser):
                      action="store_true",
                      help="magma-storage: Enable magma storage on couchbase server")
 
+    parser.addoption("--recycle-buckets",
+                     action="store_true",
+                     help="recycle-buckets: Flush and reuse matching buckets on each cluster reset instead of recreating them")
+
     parser.addoption("--cbs-ce", action="store_true",
                      help="If set, community edition will get picked up , default is enterprise", default=False)
 
@@ -244,6 +248,7 @@ def params_from_base_suite_setup(request):
     number_replicas = request.config.getoption("--number-replicas")
     delta_sync_enabled = request.config.getoption("--delta-sync")
     magma_storage_enabled = request.config.getoption("--magma-storage")
+    recycle_buckets = request.config.getoption("--recycle-buckets")
     prometheus_enabled = request.config.getoption("--prometheus-enable")
     hide_product_version = request.config.getoption("--hide-product-version")
     skip_couchbase_provision = request.config.getoption("--skip-couchbase-provision")
@@ -414,6 +419,8 @@ def params_from_base_suite_setup(request):
         log_info("Running without magma storage")
         persist_cluster_config_environment_prop(cluster_config, 'magma_storage_enabled', False, False)
 
+    persist_cluster_config_environment_prop(cluster_config, 'recycle_buckets', recycle_buckets, False)
+
     try:
         sg_ce
     except NameError:
@@ -124,8 +124,8 @@ def main(cluster_config, test_id, gateload_params):
         total_num_users = int(gateload_params.number_pullers) + int(gateload_params.number_pushers)
         user_offset = idx * total_num_users
 
-        # assign a sync gateway to this gateload, get its ip
-        sync_gateway = sync_gateway_hosts[idx]
+        # assign a sync gateway to this gateload (round robin when there are more gateloads), get its ip
+        sync_gateway = sync_gateway_hosts[idx % len(sync_gateway_hosts)]
 
         upload_gateload_config(
             cluster_config=cluster_config,
@@ -2,17 +2,22 @@
 # This is intended to replace run_perf_test.py once gateload has been replaced by sgload
 
 
+import collections
+import functools
 import sys
 import os
+import time
 
 from libraries.provision.ansible_runner import AnsibleRunner
-from keywords.exceptions import ProvisioningError
+from libraries.testkit.pipeline import run_concurrently
+from keywords.exceptions import ProvisioningError, RemoteCommandError
 
 from libraries.utilities.provisioning_config_parser import hosts_for_tag
 from libraries.utilities.fetch_sync_gateway_profile import fetch_sync_gateway_profile
 
 from keywords.utils import log_info
 from keywords.remoteexecutor import RemoteExecutor
+from testsuites.syncgateway.performance.sgload_shards import assign_hosts, max_shards, shard_sgload_args
 
 
 import argparse
@@ -28,16 +33,38 @@ def build_sgload(ansible_runner):
         raise ProvisioningError("Failed to build sgload")
 
 
-def run_sgload_on_single_loadgenerator(lgs_hosts, sgload_arg_list, sg_host):
+SgloadResult = collections.namedtuple("SgloadResult", ["lg_host", "sg_host", "status", "secs", "panics", "output_tail"])
+
+# Lines of each load generator's output kept for the report
+OUTPUT_TAIL_LINES = 20
+
+
+def run_sgload_on_loadgenerators(lgs_hosts, sgload_arg_list, sg_hosts, output_dir=None):
     """
-    This method blocks until sgload completes execution.  It only runs
-    sgload on the first lg host. (for now)
+    Shards the sgload args across the load generators (see sgload_shards), runs the
+    shards concurrently against the sync gateways (round robin) and blocks until
+    all of them complete. Each shard's output is streamed to the console prefixed
+    with its host, and to <output_dir>/sgload-<host>.log if 'output_dir' is set.
+    Raises RemoteCommandError if any shard failed or panicked.
     """
-    lg_host = lgs_hosts[0]
-    execute_sgload(lg_host, sgload_arg_list, sg_host)
+    num_shards = max_shards(sgload_arg_list, len(lgs_hosts))
+    shards = shard_sgload_args(sgload_arg_list, num_shards)
+    hosts = assign_hosts(lgs_hosts, sg_hosts, num_shards)
+    log_info("Running sgload on {} of {} load generators".format(num_shards, len(lgs_hosts)))
+
+    lanes = [functools.partial(execute_sgload, lg_host, shard, sg_host, output_dir)
+             for (lg_host, sg_host), shard in zip(hosts, shards)]
+    results = run_concurrently(*lanes)
 
+    log_info(sgload_report(results))
+    failed = [result.lg_host for result in results if result.status != 0 or result.panics]
+    if failed:
+        raise RemoteCommandError("sgload failed on load generators: {}".format(failed))
+    return results
 
-def execute_sgload(lgs_host, sgload_arg_list, sg_host):
+
+def execute_sgload(lgs_host, sgload_arg_list, sg_host, output_dir=None):
+    """ Runs sgload on one load generator and returns its SgloadResult, it does not raise if sgload fails """
 
     # Update the arg list the the appropriate SG
     sgload_arg_list_modified = add_sync_gateway_url(sgload_arg_list, sg_host)
@@ -50,19 +77,48 @@ def execute_sgload(lgs_host, sgload_arg_list, sg_host):
 
     # Build sgload command to pass to ssh client
     # eg, "sgload --createreaders --numreaders 100"
-    log_info("sgload {}".format(sgload_args_str))
     command = "sgload {}".format(sgload_args_str)
-    rex.must_execute(command)
-
-    log_info("execute_sgload done.")
 
+    panics = []
+    dest_file = None
+    if output_dir is not None:
+        dest_file = open(os.path.join(output_dir, "sgload-{}.log".format(lgs_host)), "w")
 
-def stream_output(stdio_file_pointer, dest_file_pointer, abort_if_panic=False):
+    def on_line(line):
+        print("[{}] {}".format(lgs_host, line.rstrip()))
+        if dest_file is not None:
+            dest_file.write(line)
+        if "panic" in line:
+            panics.append(line.rstrip())
 
-    for line in stdio_file_pointer:
-        print(line, file=dest_file_pointer)
-        if abort_if_panic and "panic" in line:
-            raise Exception("Detected panic: {}".format(line))
+    start = time.monotonic()
+    try:
+        status, stdout, stderr = rex.execute(command, on_stdout=on_line, on_stderr=on_line,
+                                             max_lines=OUTPUT_TAIL_LINES, echo=False)
+        output_tail = stdout + stderr
+    except Exception as e:
+        log_info("sgload could not run on {}: {}".format(lgs_host, e))
+        status, output_tail = -1, [str(e)]
+    finally:
+        if dest_file is not None:
+            dest_file.close()
+
+    log_info("execute_sgload done on {} (exit status {}).".format(lgs_host, status))
+    return SgloadResult(lgs_host, sg_host, status, time.monotonic() - start, panics, output_tail)
+
+
+def sgload_report(results):
+    """ One line per load generator, followed by the output tail of the ones that failed """
+    lines = ["sgload results ({} load generators, {} failed)".format(
+        len(results), len([result for result in results if result.status != 0 or result.panics]))]
+    for result in results:
+        lines.append("  {} -> {}: exit status {}, {:.1f}s, {} panics".format(
+            result.lg_host, result.sg_host, result.status, result.secs, len(result.panics)))
+    for result in results:
+        if result.status != 0 or result.panics:
+            lines.append("  --- {} ---".format(result.lg_host))
+            lines.extend("  {}".format(line.rstrip()) for line in result.panics + result.output_tail)
+    return "\n".join(lines)
 
 
 def get_load_generators_hosts(cluster_config):
@@ -119,13 +175,10 @@ def run_sgload_perf_test(cluster_config, sgload_arg_list_main, skip_build_sgload
     lg_hosts_main = get_load_generators_hosts(cluster_config)
     sg_hosts_main = get_sync_gateways_hosts(cluster_config)
 
-    # Get the first SG host from the list of SG hosts
-    sg_host_main = sg_hosts_main[0]
-
-    run_sgload_on_single_loadgenerator(
+    run_sgload_on_loadgenerators(
         lg_hosts_main,
         sgload_arg_list_main,
-        sg_host_main
+        sg_hosts_main
     )
 
     log_info("Finished")
@@ -0,0 +1,64 @@
+"""
+Splits one sgload run across several load generators.
+
+The counts in SPLIT_OPTIONS are divided between the shards so that the shards
+together generate the load the arguments ask for. --numchannels is split the same
+way when there are at least as many channels as shards, otherwise every shard
+uses all of them. Every other argument is passed to each shard unchanged, except
+--testsessionid which gets a per shard suffix so the shards' users and doc ids
+do not collide.
+"""
+
+SPLIT_OPTIONS = ("--numreaders", "--numwriters", "--numupdaters", "--numdocs")
+CHANNELS_OPTION = "--numchannels"
+SESSION_ID_OPTION = "--testsessionid"
+
+
+def split_count(total, num_shards):
+    """ Splits 'total' into 'num_shards' counts that differ by at most one, ex. 10, 3 -> [4, 3, 3] """
+    base, remainder = divmod(total, num_shards)
+    return [base + 1 if i < remainder else base for i in range(num_shards)]
+
+
+def get_option(sgload_arg_list, option):
+    """ Value following 'option' in the arg list, or None """
+    for i, arg in enumerate(sgload_arg_list[:-1]):
+        if arg == option:
+            return sgload_arg_list[i + 1]
+    return None
+
+
+def max_shards(sgload_arg_list, num_load_generators):
+    """
+    Number of shards to run: one per load generator, but never more than the smallest
+    non zero count being split, so that no shard ends up with e.g. docs but no writers.
+    The channel count does not limit it (see shard_sgload_args)
+    """
+    counts = [int(get_option(sgload_arg_list, option)) for option in SPLIT_OPTIONS
+              if get_option(sgload_arg_list, option) is not None]
+    non_zero = [count for count in counts if count > 0]
+    if not non_zero:
+        return max(1, num_load_generators)
+    return max(1, min([num_load_generators] + non_zero))
+
+
+def shard_sgload_args(sgload_arg_list, num_shards):
+    """
+    Returns 'num_shards' sgload arg lists that together add up to 'sgload_arg_list'
+    eg, ["--numreaders", "10", "--numdocs", "5"], 2 ->
+        [["--numreaders", "5", "--numdocs", "3"], ["--numreaders", "5", "--numdocs", "2"]]
+    """
+    shards = [sgload_arg_list[:] for _ in range(num_shards)]
+    for i, arg in enumerate(sgload_arg_list[:-1]):
+        if arg in SPLIT_OPTIONS or (arg == CHANNELS_OPTION and int(sgload_arg_list[i + 1]) >= num_shards):
+            for shard, count in zip(shards, split_count(int(sgload_arg_list[i + 1]), num_shards)):
+                shard[i + 1] = str(count)
+        elif arg == SESSION_ID_OPTION and num_shards > 1:
+            for shard_index, shard in enumerate(shards):
+                shard[i + 1] = "{}-{}".format(sgload_arg_list[i + 1], shard_index)
+    return shards
+
+
+def assign_hosts(lg_hosts, sg_hosts, num_shards):
+    """ (load generator, sync gateway) for each shard, sync gateways round robin """
+    return [(lg_hosts[i], sg_hosts[i % len(sg_hosts)]) for i in range(num_shards)]
@@ -1,4 +1,3 @@
-import json
 import random
 import time
 
@@ -8,6 +7,7 @@ from requests import Session
 from requests.exceptions import HTTPError
 
 from keywords import couchbaseserver, document
+from keywords.ChangesMultiplexer import ChangesMultiplexer
 from keywords.ClusterKeywords import ClusterKeywords
 from keywords.MobileRestClient import MobileRestClient
 from keywords.SyncGateway import sync_gateway_config_path_for_mode, SyncGateway
@@ -185,7 +185,8 @@ def test_system_test(params_from_base_test_setup):
     log_info('------------------------------------------')
 
     # Start changes processing
-    with ProcessPoolExecutor(max_workers=((len(users) * 3) + update_batch_size + 3)) as pex:
+    # The changes feeds for every user run on one event loop in a single background process
+    with ProcessPoolExecutor(max_workers=1) as pex:
 
         # Start changes feeds in background process
         changes_workers_task = pex.submit(
@@ -276,194 +277,44 @@ def send_changes_termination_doc(sg_url, sg_db, users, terminator_doc_id, termin
     sg_client.add_doc(url=sg_url, db=sg_db, doc=doc, auth=random_user['auth'])
 
 
-def start_polling_changes_worker(sg_url, sg_db, user_name, user_auth, changes_delay, changes_limit, terminator_doc_id, feed, channels_filtered, doc_ids_filtered):
-    sg_client = MobileRestClient()
-    since = 0
-    latest_changes = {}
-    found_terminator = False
-
-    # Pass a channel filter to changes request if filtered is true
-    filter_type = None
-    filter_channels = None
-    filter_doc_ids = None
-
-    if channels_filtered:
-        filter_type = 'sync_gateway/bychannel'
-        filter_channels = ['even', 'terminator']
-
-    elif doc_ids_filtered:
-        filter_type = '_doc_ids'
-        filter_doc_ids = ['terminator']
-
-    while True:
-
-        # If terminator doc is found, terminate the polling loop
-        if found_terminator:
-            log_info('Found terminator ({}, {})'.format(user_name, feed))
-            return user_name, latest_changes
-
-        log_info('_changes ({}) for ({}) since: {}'.format(feed, user_name, since))
-        changes = sg_client.get_changes(
-            url=sg_url,
-            db=sg_db,
-            since=since,
-            auth=user_auth,
-            feed=feed,
-            limit=changes_limit,
-            filter_type=filter_type,
-            filter_channels=filter_channels,
-            filter_doc_ids=filter_doc_ids
-        )
-
-        # A termination doc was processed, exit on the next loop
-        for change in changes['results']:
-            if change['id'] == terminator_doc_id:
-                found_terminator = True
-            else:
-                # Add latest rev to to latest_changes map
-                if len(change['changes']) >= 1:
-                    latest_changes[change['id']] = change['changes'][0]['rev']
-                else:
-                    latest_changes[change['id']] = ''
-
-        since = changes['last_seq']
-        time.sleep(changes_delay)
-
-
-def start_continuous_changes_worker(sg_url, sg_db, user_name, user_auth, terminator_doc_id, channels_filtered):
-
-    sg_client = MobileRestClient()
-
-    latest_changes = {}
-
-    # Pass a channel filter to changes request if filtered is true
-    filter_type = None
-    filter_channels = None
-
-    if channels_filtered:
-        filter_type = 'sync_gateway/bychannel'
-        filter_channels = ['even', 'terminator']
-
-    log_info('_changes (continuous) for ({}) since: 0'.format(user_name))
-    stream = sg_client.stream_continuous_changes(
-        sg_url,
-        sg_db,
-        since=0,
-        auth=user_auth,
-        filter_type=filter_type,
-        filter_channels=filter_channels
-    )
-
-    for line in stream.iter_lines():
-
-        # filter out keep-alive new lines
-        if line:
-            decoded_line = line.decode('utf-8')
-            change = json.loads(decoded_line)
-
-            if change['id'] == terminator_doc_id:
-                log_info('Found terminator ({}, continuous)'.format(user_name))
-                return user_name, latest_changes
-
-            else:
-                if len(change['changes']) >= 1:
-                    latest_changes[change['id']] = change['changes'][0]['rev']
-                else:
-                    latest_changes[change['id']] = ''
-
-
 def start_changes_processing(sg_url, sg_db, users, changes_delay, changes_limit, terminator_doc_id):
 
-    # Make sure there are enough workers for 3 changes feed types for each user
-    workers = len(users) * 3
-
-    with ProcessPoolExecutor(max_workers=workers) as changes_pex:
-
-        # Start 3 changes feed types for each user:
-        #  - looping normal
-        #  - looping longpoll
-        #  - continuous
-        # For 'filtered_channel_user' users:
-        #  - Apply a syncgateway/bychannel filter to the changes feed
-        # For 'filtered_doc_ids_user' users:
-        #  - Apply a _doc_ids filter to the normal changes feed (limitation of the filter type)
-
-        normal_changes_tasks = []
-        longpoll_changes_tasks = []
-        continuous_changes_tasks = []
-
-        for user_key, user_val in list(users.items()):
-
-            channels_filtered = False
-            doc_ids_filtered = False
-            if user_key.startswith('filtered_channel'):
-                channels_filtered = True
-            elif user_key.startswith('filtered_doc_ids'):
-                doc_ids_filtered = True
-
-            # Start a looping normal changes feed for user
-            normal_changes_tasks.append(
-                changes_pex.submit(
-                    start_polling_changes_worker,
-                    sg_url,
-                    sg_db,
-                    user_key,
-                    user_val['auth'],
-                    changes_delay,
-                    changes_limit,
-                    terminator_doc_id,
-                    "normal",
-                    channels_filtered,
-                    doc_ids_filtered
-                )
-            )
-
-            # Start a looping longpoll changes feed for user
-            if not doc_ids_filtered:
-                longpoll_changes_tasks.append(
-                    changes_pex.submit(
-                        start_polling_changes_worker,
-                        sg_url,
-                        sg_db,
-                        user_key,
-                        user_val['auth'],
-                        changes_delay,
-                        changes_limit,
-                        terminator_doc_id,
-                        "longpoll",
-                        channels_filtered,
-                        False
-                    )
-                )
-
-            # Start continuous changes feed for each user
-            if not doc_ids_filtered:
-                continuous_changes_tasks.append(
-                    changes_pex.submit(
-                        start_continuous_changes_worker,
-                        sg_url,
-                        sg_db,
-                        user_key,
-                        user_val['auth'],
-                        terminator_doc_id,
-                        channels_filtered
-                    )
-                )
-
-        # Block on termination of "normal" changes feeds
-        for changes_task in as_completed(normal_changes_tasks):
-            user_name, latest_change = changes_task.result()
-            users[user_name]['normal'] = latest_change
-
-        # Block on termination of "longpoll" changes feeds
-        for changes_task in as_completed(longpoll_changes_tasks):
-            user_name, latest_change = changes_task.result()
-            users[user_name]['longpoll'] = latest_change
-
-        # Block on termination of "continuous" changes feeds
-        for changes_task in as_completed(continuous_changes_tasks):
-            user_name, latest_change = changes_task.result()
-            users[user_name]['continuous'] = latest_change
+    # All feeds run as coroutines on one event loop in this process, one connection per feed.
+    # ChangesMultiplexer raises the open files limit to fit them (see ChangesMultiplexer)
+    mux = ChangesMultiplexer(sg_url, sg_db, terminator_doc_id, changes_delay=changes_delay, changes_limit=changes_limit)
+
+    # Start 3 changes feed types for each user:
+    #  - looping normal
+    #  - looping longpoll
+    #  - continuous
+    # For 'filtered_channel_user' users:
+    #  - Apply a syncgateway/bychannel filter to the changes feed
+    # For 'filtered_doc_ids_user' users:
+    #  - Apply a _doc_ids filter to the normal changes feed (limitation of the filter type)
+
+    for user_key, user_val in list(users.items()):
+
+        filter_type = None
+        filter_channels = None
+        filter_doc_ids = None
+        if user_key.startswith('filtered_channel'):
+            filter_type = 'sync_gateway/bychannel'
+            filter_channels = ['even', 'terminator']
+        elif user_key.startswith('filtered_doc_ids'):
+            filter_type = '_doc_ids'
+            filter_doc_ids = ['terminator']
+
+        # Start a looping normal changes feed for user
+        mux.add_feed(user_key, user_val['auth'], 'normal', filter_type, filter_channels, filter_doc_ids)
+
+        if filter_type != '_doc_ids':
+            # Start a looping longpoll changes feed and a continuous changes feed for user
+            mux.add_feed(user_key, user_val['auth'], 'longpoll', filter_type, filter_channels)
+            mux.add_feed(user_key, user_val['auth'], 'continuous', filter_type, filter_channels)
+
+    # Block on termination of all changes feeds
+    for user_name, latest_changes_by_feed in list(mux.run().items()):
+        users[user_name].update(latest_changes_by_feed)
 
     return users
 
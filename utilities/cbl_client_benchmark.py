@@ -0,0 +1,205 @@
+import argparse
+import json
+import time
+
+from CBLClient.Args import Args
+from CBLClient.Client import Client
+from CBLClient.Database import Database
+from CBLClient.Document import Document
+from CBLClient.Query import Query
+from keywords.utils import log_info
+from libraries.testkit.mock_test_server import MockTestServer
+
+
+class ClientProfiler(object):
+    """
+    Times the client side (de)serialization of every CBLClient call made while active,
+    by wrapping the Client hooks each call and response goes through. 'calls' counts
+    serialized calls (batched ones included), 'round_trips' the responses decoded.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.round_trips = 0
+        self.serialize_secs = 0.0
+        self.deserialize_secs = 0.0
+        self._originals = {}
+
+    def _timed(self, name, counter, secs):
+        original = self._originals[name] = Client.__dict__[name]
+        function = original.__func__
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                setattr(self, secs, getattr(self, secs) + time.perf_counter() - start)
+                setattr(self, counter, getattr(self, counter) + 1)
+        setattr(Client, name, staticmethod(wrapper))
+
+    def __enter__(self):
+        self._timed("_serializeArgs", "calls", "serialize_secs")
+        self._timed("_deserializeResponse", "round_trips", "deserialize_secs")
+        self._timed("_batchResults", "round_trips", "deserialize_secs")
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._originals.items():
+            setattr(Client, name, original)
+        return False
+
+
+def documents_scenario(base_url, iterations):
+    """ Builds and saves docs one property per call, then reads each back, like most functional tests """
+    database = Database(base_url)
+    document = Document(base_url, client=database._client)
+    db = database.create("bench_documents")
+    for i in range(iterations):
+        doc = document.create("doc_{}".format(i))
+        document.setString(doc, "type", "bench")
+        document.setString(doc, "name", "doc {}".format(i))
+        document.setInt(doc, "index", i)
+        database.saveDocument(db, doc)
+    for i in range(iterations):
+        document.toMap(database.getDocument(db, "doc_{}".format(i)))
+
+
+def batched_documents_scenario(base_url, iterations):
+    """ documents_scenario's writes, one Batch round trip per doc """
+    client = Client(base_url)
+    db = Database(base_url, client=client).create("bench_batched_documents")
+    for i in range(iterations):
+        with client.batch() as batch:
+            args = Args()
+            args.setString("id", "doc_{}".format(i))
+            doc = batch.invokeMethod("document_create", args)
+            for key, value in (("type", "bench"), ("name", "doc {}".format(i))):
+                args = Args()
+                args.setMemoryPointer("document", doc)
+                args.setString("key", key)
+                args.setString("value", value)
+                batch.invokeMethod("document_setString", args)
+            args = Args()
+            args.setMemoryPointer("database", db)
+            args.setMemoryPointer("document", doc)
+            batch.invokeMethod("database_save", args)
+
+
+def bulk_scenario(base_url, iterations):
+    """ Bulk create, read and update """
+    database = Database(base_url)
+    db = database.create("bench_bulk")
+    database.create_bulk_docs(iterations, "bulk", db, generator="simple_user", batch_size=100)
+    database.getBulkDocs(db)
+    database.update_bulk_docs(db)
+
+
+def query_scenario(base_url, iterations):
+    """ Full scan, paging and single doc queries """
+    database = Database(base_url)
+    query = Query(base_url)
+    db = database.create("bench_query")
+    doc_ids = database.create_bulk_docs(iterations, "query", db, batch_size=100)
+    query.query_selectAll(db)
+    for offset in range(0, iterations, 10):
+        query.query_get_docs_limit_offset(db, 10, offset)
+    for doc_id in doc_ids[:10]:
+        query.query_get_doc(db, doc_id)
+
+
+SCENARIOS = {
+    "documents": documents_scenario,
+    "batched_documents": batched_documents_scenario,
+    "bulk": bulk_scenario,
+    "query": query_scenario,
+}
+
+
+def run_benchmark(base_url, scenario, iterations, test_server=None, handle_scope=False):
+    """
+    Runs 'scenario' against the TestServer at 'base_url' and returns its report: calls per
+    second, client (de)serialization time and, with the MockTestServer serving 'base_url'
+    as 'test_server', how much the handle table grew. With 'handle_scope' the scenario runs
+    in a HandleScope, which releases what it leaked when it ends.
+    """
+    handles_before = None
+    if test_server is not None:
+        test_server.reset_stats()
+        handles_before = test_server.handle_count()
+
+    scope = Client(base_url).handle_scope(scenario) if handle_scope else None
+    with ClientProfiler() as profiler:
+        start = time.perf_counter()
+        if scope is None:
+            SCENARIOS[scenario](base_url, iterations)
+        else:
+            with scope:
+                SCENARIOS[scenario](base_url, iterations)
+        elapsed = time.perf_counter() - start
+
+    serialization_secs = profiler.serialize_secs + profiler.deserialize_secs
+    report = {
+        "scenario": scenario,
+        "iterations": iterations,
+        "calls": profiler.calls,
+        "round_trips": profiler.round_trips,
+        "secs": elapsed,
+        "calls_per_sec": profiler.calls / elapsed if elapsed else 0.0,
+        "serialize_secs": profiler.serialize_secs,
+        "deserialize_secs": profiler.deserialize_secs,
+        "serialization_share": serialization_secs / elapsed if elapsed else 0.0,
+        "handle_growth": None,
+        "handles_created": None,
+        "peak_handles": None,
+        "leaked_handles": scope.leaked if scope is not None else None,
+        "release_rpcs": scope.release_rpcs if scope is not None else None,
+    }
+    if test_server is not None:
+        report["handle_growth"] = test_server.handle_count() - handles_before
+        report["handles_created"] = test_server.handles_created
+        report["peak_handles"] = test_server.peak_handles
+    return report
+
+
+def log_report(report):
+    log_info("{scenario}: {calls} calls / {round_trips} round trips in {secs:.3f}s = {calls_per_sec:.0f} calls/s, "
+             "serialization {serialize_secs:.3f}s + {deserialize_secs:.3f}s ({serialization_share:.1%})".format(**report))
+    if report["handle_growth"] is not None:
+        log_info("{scenario}: handle table grew by {handle_growth} ({handles_created} created, peak {peak_handles})".format(**report))
+    if report["leaked_handles"] is not None:
+        log_info("{scenario}: {leaked_handles} leaked handles released in {release_rpcs} release RPCs".format(**report))
+
+
+def main(base_url, scenarios, iterations, latency, output, handle_scope=False):
+    test_server = None
+    if base_url is None:
+        test_server = MockTestServer(latency=latency)
+        test_server.start()
+        base_url = test_server.url
+
+    try:
+        reports = [run_benchmark(base_url, scenario, iterations, test_server, handle_scope) for scenario in scenarios]
+    finally:
+        if test_server is not None:
+            test_server.stop()
+
+    for report in reports:
+        log_report(report)
+    if output:
+        with open(output, "w") as f:
+            json.dump(reports, f, indent=2)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CBLClient RPC layer against a TestServer")
+    parser.add_argument("--base-url", help="TestServer to benchmark against, defaults to an in-process mock TestServer")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable), defaults to all")
+    parser.add_argument("--iterations", type=int, default=500, help="Docs per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the mock TestServer adds to every request")
+    parser.add_argument("--output", help="Write the reports to this JSON file")
+    parser.add_argument("--handle-scope", action="store_true", help="Run each scenario in a HandleScope")
+    args = parser.parse_args()
+
+    main(args.base_url, args.scenario or sorted(SCENARIOS), args.iterations, args.latency, args.output, args.handle_scope)
@@ -287,6 +287,15 @@ def is_magma_enabled(cluster_config):
         return False
 
 
+def is_bucket_recycling_enabled(cluster_config):
+    """ Loads cluster config to see if buckets are flushed and reused between resets instead of recreated """
+    cluster = load_cluster_config_json(cluster_config)
+    try:
+        return cluster["environment"]["recycle_buckets"]
+    except KeyError:
+        return False
+
+
 def copy_to_temp_conf(cluster_config, mode):
     # Creating temporary cluster config and json files to add configuration dynamically
     temp_cluster_config = "resources/cluster_configs/temp_cluster_config_{}".format(mode)
@@ -1,7 +1,14 @@
 import argparse
+import bisect
+import collections
+import concurrent.futures
+import json
 import os
+import re
 import zipfile
 
+from contextlib import contextmanager
+
 from keywords.utils import log_info
 from keywords.exceptions import LogScanningError
 
@@ -32,25 +39,231 @@ def unzip_log_files(directory):
             zf.extractall(zip_file_extract_dir)
 
 
-def scan_logs(directory):
-    """ Unzips .zip files and scans directory recursively for .log files and scan them for error key words.
-    Raise an exception if any of the error keywords are found.
+# Keywords scan_logs fails on
+ERROR_KEYWORDS = ['panic', 'data race']
+
+# Lines longer than this are scanned in pieces, so a log without newlines can't exhaust memory
+MAX_LINE_BYTES = 1024 * 1024
+
+# The index keeps one (timestamp, offset) entry per this many bytes of log
+INDEX_STRIDE_BYTES = 4 * 1024 * 1024
+
+INDEX_FILE_SUFFIX = '.scanindex.json'
+
+_TIMESTAMP = re.compile(rb'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})')
+
+
+def compile_keywords(keywords):
+    """ One case insensitive regex matching any of 'keywords' (longest first) """
+    alternatives = sorted(set(keyword.lower() for keyword in keywords), key=len, reverse=True)
+    if not alternatives:
+        return re.compile(b'(?!)')
+    return re.compile('|'.join(re.escape(keyword) for keyword in alternatives).encode('utf-8'), re.IGNORECASE)
+
+
+def find_log_sources(path):
+    """
+    Walks 'path' (a directory or a .zip) once and returns the .log files in it, without
+    extracting anything. A source is (file path, None) for a file on disk or
+    (zip path, member name) for a .log inside a .zip.
     """
-    # Unzip logs
-    unzip_log_files(directory)
+    if os.path.isfile(path):
+        file_paths = [path]
+    else:
+        file_paths = get_file_paths_with_extension(path, '')
+
+    sources = []
+    for file_path in file_paths:
+        if file_path.endswith('.log'):
+            sources.append((file_path, None))
+        elif file_path.endswith('.zip'):
+            with zipfile.ZipFile(file_path) as zf:
+                sources.extend((file_path, name) for name in zf.namelist() if name.endswith('.log'))
+    return sources
+
+
+def source_name(source):
+    file_path, member = source
+    return file_path if member is None else '{}!{}'.format(file_path, member)
+
+
+def source_stamp(source):
+    """ Changes whenever the source does, so an index entry can be reused while it is the same """
+    file_path, member = source
+    if member is None:
+        stat = os.stat(file_path)
+        return [stat.st_size, stat.st_mtime]
+    with zipfile.ZipFile(file_path) as zf:
+        info = zf.getinfo(member)
+        return [info.file_size, info.CRC]
+
+
+@contextmanager
+def open_source(source):
+    """ Binary stream of a source, zip members are decompressed as they are read """
+    file_path, member = source
+    if member is None:
+        with open(file_path, 'rb') as f:
+            yield f
+    else:
+        with zipfile.ZipFile(file_path) as zf:
+            with zf.open(member) as f:
+                yield f
+
+
+def scan_source(source, keywords):
+    """
+    Scans one source in a single pass for all 'keywords'. Returns a dict with the
+    match count and first matching line of each keyword found, the line / byte
+    counts, the first and last timestamps and a sparse [timestamp, offset] index.
+    """
+    matcher = compile_keywords(keywords)
+    by_lower = {keyword.lower(): keyword for keyword in keywords}
+    counts = collections.Counter()
+    first_matches = {}
+    timestamps = []
+    first_timestamp = last_timestamp = None
+    next_index_offset = 0
+    offset = 0
+    line_no = 0
+
+    with open_source(source) as f:
+        for line in iter(lambda: f.readline(MAX_LINE_BYTES), b''):
+            line_no += 1
+            timestamp = _TIMESTAMP.match(line)
+            if timestamp is not None:
+                last_timestamp = timestamp.group(1).decode('ascii')
+                if first_timestamp is None:
+                    first_timestamp = last_timestamp
+                if offset >= next_index_offset:
+                    timestamps.append([last_timestamp, offset])
+                    next_index_offset = offset + INDEX_STRIDE_BYTES
+            for match in matcher.finditer(line):
+                keyword = by_lower[match.group(0).decode('utf-8').lower()]
+                counts[keyword] += 1
+                if keyword not in first_matches:
+                    first_matches[keyword] = [line_no, line.decode('utf-8', 'replace').rstrip()]
+            offset += len(line)
+
+    return {
+        'source': source_name(source),
+        'stamp': source_stamp(source),
+        'lines': line_no,
+        'bytes': offset,
+        'matches': dict(counts),
+        'first_matches': first_matches,
+        'first_timestamp': first_timestamp,
+        'last_timestamp': last_timestamp,
+        'timestamps': timestamps,
+    }
+
 
-    log_file_paths = get_file_paths_with_extension(directory, '.log')
+def _scan_source_task(args):
+    source, keywords = args
+    return scan_source(source, keywords)
 
-    found_errors = False
-    for logfile_path in log_file_paths:
-        try:
-            scan_for_errors(logfile_path, ['panic', 'data race'])
-        except LogScanningError:
-            log_info('Error found for: {}'.format(logfile_path))
-            found_errors = True
 
-    if found_errors:
+class LogIndex:
+    """
+    Results of scanning a log bundle: per .log error counts and timestamp offsets.
+    Saved as JSON next to the bundle so later queries (and rescans of the same
+    bundle) do not read the logs again.
+    """
+
+    def __init__(self, keywords, files=None):
+        self.keywords = list(keywords)
+        self.files = files or {}
+
+    @staticmethod
+    def path_for(path):
+        if os.path.isdir(path):
+            return os.path.join(path, INDEX_FILE_SUFFIX.lstrip('.'))
+        return path + INDEX_FILE_SUFFIX
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path) as f:
+            data = json.load(f)
+        return cls(data['keywords'], data['files'])
+
+    def save(self, index_path):
+        with open(index_path, 'w') as f:
+            json.dump({'keywords': self.keywords, 'files': self.files}, f)
+
+    def error_counts(self):
+        """ {source: {keyword: count}} for the sources with at least one match """
+        return {name: entry['matches'] for name, entry in self.files.items() if entry['matches']}
+
+    def total_counts(self):
+        totals = collections.Counter()
+        for entry in self.files.values():
+            totals.update(entry['matches'])
+        return dict(totals)
+
+    def sources_with(self, keyword):
+        return sorted(name for name, entry in self.files.items() if keyword in entry['matches'])
+
+    def time_range(self, name):
+        entry = self.files[name]
+        return entry['first_timestamp'], entry['last_timestamp']
+
+    def offset_for(self, name, timestamp):
+        """ Byte offset in the source to start reading from to see lines at or after 'timestamp' """
+        entries = self.files[name]['timestamps']
+        i = bisect.bisect_left([entry[0] for entry in entries], timestamp)
+        return entries[i - 1][1] if i > 0 else 0
+
+
+def build_log_index(path, keywords=ERROR_KEYWORDS, processes=None, index_path=None, save=True):
+    """
+    Scans every .log under 'path' (a directory or .zip, zips are read in place) for
+    all 'keywords' at once, across 'processes' worker processes (default: one per
+    core). Sources already in the index at 'index_path' with the same keywords and
+    unchanged size are not scanned again. Returns the LogIndex, saved when 'save'.
+    """
+    index_path = index_path or LogIndex.path_for(path)
+    index = LogIndex(keywords)
+    if os.path.isfile(index_path):
+        cached = LogIndex.load(index_path)
+        if cached.keywords == index.keywords:
+            index = cached
+
+    pending = []
+    for source in find_log_sources(path):
+        entry = index.files.get(source_name(source))
+        if entry is None or entry['stamp'] != source_stamp(source):
+            pending.append(source)
+
+    log_info('Scanning {} log files in {} ({} already indexed)'.format(
+        len(pending), path, len(index.files)))
+    tasks = [(source, keywords) for source in pending]
+    if len(tasks) > 1 and processes != 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_scan_source_task, tasks))
+    else:
+        results = [_scan_source_task(task) for task in tasks]
+    for result in results:
+        index.files[result['source']] = result
+
+    if save:
+        index.save(index_path)
+    return index
+
+
+def scan_logs(directory, keywords=ERROR_KEYWORDS, processes=None, index=False):
+    """ Scans .log files in directory recursively, and inside any .zip without extracting it, for error key words.
+    Raise an exception if any of the error keywords are found.
+    With 'index', the scan results are kept in a LogIndex next to 'directory', see build_log_index.
+    """
+    log_index = build_log_index(directory, keywords, processes=processes, save=index)
+
+    error_counts = log_index.error_counts()
+    for name, counts in sorted(error_counts.items()):
+        log_info('Error found for: {} {}'.format(name, counts))
+
+    if error_counts:
         raise LogScanningError('Found errors in the sync gateway / sg accel logs!!')
+    return log_index
 
 
 def scan_for_errors(log_file_path, error_strings):
@@ -65,14 +278,16 @@ def scan_for_errors(log_file_path, error_strings):
     if not isinstance(error_strings, list):
         raise ValueError('error_strings must be a list')
 
-    # Scan each line in the log file for the words to search for
-    with open(log_file_path) as f:
-        for line in f:
-            for word in error_strings:
-                # convert the word to lowercase and the line to all lower case
-                # which handles the case where 'warning' will catch 'WARNING' and 'Warning', etc
-                if word.lower() in line.lower():
-                    raise LogScanningError('{} found!! Please review: {} '.format(word, log_file_path))
+    # Scan each line in the log file for all the words at once, case insensitively
+    # which handles the case where 'warning' will catch 'WARNING' and 'Warning', etc
+    matcher = compile_keywords(error_strings)
+    with open(log_file_path, 'rb') as f:
+        for line in iter(lambda: f.readline(MAX_LINE_BYTES), b''):
+            match = matcher.search(line)
+            if match is not None:
+                found = match.group(0).decode('utf-8').lower()
+                word = next(word for word in error_strings if word.lower() == found)
+                raise LogScanningError('{} found!! Please review: {} '.format(word, log_file_path))
 
 
 def scan_for_pattern(logfile_path, pattern_list):
@@ -98,8 +313,10 @@ def scan_for_pattern(logfile_path, pattern_list):
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('--path-to-log-dir', help='Directory containing the log files', required=True)
+    parser.add_argument('--path-to-log-dir', help='Directory (or .zip) containing the log files', required=True)
+    parser.add_argument('--processes', type=int, help='Number of worker processes, defaults to one per core')
+    parser.add_argument('--index', action='store_true', help='Keep the scan results in an index next to the logs')
     args = parser.parse_args()
 
     # Scan all log files in the directory for 'panic' and 'data races'
-    scan_logs(args.path_to_log_dir)
+    scan_logs(args.path_to_log_dir, processes=args.processes, index=args.index)